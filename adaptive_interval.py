@@ -0,0 +1,255 @@
+"""A controller that adapts the capture interval to scene activity."""
+from collections import deque
+from time import monotonic
+
+SECONDS_PER_HOUR = 3600
+
+
+def _validate_positive_number(value, name):
+    """Make sure a value is a number greater than 0.
+
+    Args:
+        value: The value to check.
+        name: The name of the value, used in exception messages.
+
+    Raises:
+        ValueError: If value is not greater than 0.
+        TypeError: If value is not a numeric type.
+    """
+    try:
+        if not value > 0:
+            raise ValueError(name + " must be greater than 0.")
+    except TypeError as error:
+        exception_message = name + " must be a numeric type."
+        raise TypeError(exception_message) from error
+
+
+class AdaptiveIntervalController:
+    """Shorten the interval while the scene is busy and lengthen it when idle.
+
+    After each frame the controller is given a measure of activity, such as
+    the difference reported by a ChangeDetectionFilter. Once activity has
+    been at or above high_activity for hysteresis_frames frames in a row the
+    interval is multiplied by speed_up_factor, and once it has been at or
+    below low_activity for as long the interval is multiplied by
+    back_off_factor, always staying between min_interval and max_interval.
+    Optional hourly frame and byte budgets lengthen the interval further
+    when they would otherwise be exceeded.
+    """
+
+    def __init__(self,
+                 min_interval,
+                 max_interval,
+                 high_activity=0.05,
+                 low_activity=0.01,
+                 speed_up_factor=0.5,
+                 back_off_factor=1.5,
+                 hysteresis_frames=3,
+                 max_frames_per_hour=None,
+                 max_bytes_per_hour=None,
+                 clock=monotonic):
+        """Initialise the controller.
+
+        Args:
+            min_interval: The shortest interval (in seconds) to use.
+            max_interval: The longest interval (in seconds) to use.
+            high_activity: The activity at or above which the interval is
+                shortened.
+            low_activity: The activity at or below which the interval is
+                lengthened.
+            speed_up_factor: The factor (below 1) the interval is multiplied
+                by when shortening it.
+            back_off_factor: The factor (above 1) the interval is multiplied
+                by when lengthening it.
+            hysteresis_frames: The number of frames in a row activity must
+                stay high or low before the interval changes.
+            max_frames_per_hour: The maximum number of frames to capture in
+                any hour (or None for no limit).
+            max_bytes_per_hour: The maximum number of bytes to capture in any
+                hour (or None for no limit).
+            clock: A function returning the current monotonic time.
+
+        Raises:
+            ValueError: If min_interval, max_interval, max_frames_per_hour or
+                max_bytes_per_hour is not greater than 0, if min_interval is
+                greater than max_interval, if low_activity is greater than
+                high_activity or if a factor is on the wrong side of 1.
+            TypeError: If min_interval, max_interval, max_frames_per_hour or
+                max_bytes_per_hour is not a numeric type.
+        """
+        _validate_positive_number(min_interval, "min_interval")
+        _validate_positive_number(max_interval, "max_interval")
+        if min_interval > max_interval:
+            raise ValueError("min_interval must not be greater than "
+                             "max_interval.")
+        if low_activity > high_activity:
+            raise ValueError("low_activity must not be greater than "
+                             "high_activity.")
+        if not 0 < speed_up_factor < 1:
+            raise ValueError("speed_up_factor must be between 0 and 1.")
+        if not back_off_factor > 1:
+            raise ValueError("back_off_factor must be greater than 1.")
+        if max_frames_per_hour is not None:
+            _validate_positive_number(max_frames_per_hour,
+                                      "max_frames_per_hour")
+        if max_bytes_per_hour is not None:
+            _validate_positive_number(max_bytes_per_hour,
+                                      "max_bytes_per_hour")
+
+        self._min_interval = min_interval
+        self._max_interval = max_interval
+        self._high_activity = high_activity
+        self._low_activity = low_activity
+        self._speed_up_factor = speed_up_factor
+        self._back_off_factor = back_off_factor
+        self._hysteresis_frames = hysteresis_frames
+        self._max_frames_per_hour = max_frames_per_hour
+        self._max_bytes_per_hour = max_bytes_per_hour
+        self._clock = clock
+
+        self._interval = max_interval
+        self._high_streak = 0
+        self._low_streak = 0
+        self._recent_frames = deque()
+        self._recent_bytes = 0
+
+    @property
+    def interval(self):
+        """Return the interval (in seconds) chosen by the controller.
+
+        Returns: The interval (in seconds) chosen by the controller.
+        """
+        return self._interval
+
+    @property
+    def min_interval(self):
+        """Return the shortest interval (in seconds) the controller uses.
+
+        Returns: The shortest interval (in seconds) the controller uses.
+        """
+        return self._min_interval
+
+    @property
+    def max_interval(self):
+        """Return the longest interval (in seconds) the controller uses.
+
+        Returns: The longest interval (in seconds) the controller uses.
+        """
+        return self._max_interval
+
+    @property
+    def tracks_bytes(self):
+        """Return whether the controller needs the size of each frame.
+
+        Returns: A boolean specifying whether an hourly byte budget is set.
+        """
+        return self._max_bytes_per_hour is not None
+
+    def reset(self, interval):
+        """Start adapting from the given interval.
+
+        Args:
+            interval: The interval (in seconds) to start from, which is
+                clamped between min_interval and max_interval.
+
+        Returns: The clamped interval.
+        """
+        self._interval = self._clamp(interval)
+        self._high_streak = 0
+        self._low_streak = 0
+
+        return self._interval
+
+    def update(self, activity, frame_bytes=0):
+        """Choose the interval to use after a frame has been captured.
+
+        Args:
+            activity: The activity measured for the frame (or None if it
+                could not be measured, which leaves the interval alone).
+            frame_bytes: The number of bytes stored for the frame.
+
+        Returns: The interval (in seconds) to use before the next frame.
+        """
+        self._record_frame(frame_bytes)
+
+        if activity is not None and activity >= self._high_activity:
+            self._high_streak += 1
+            self._low_streak = 0
+        elif activity is not None and activity <= self._low_activity:
+            self._low_streak += 1
+            self._high_streak = 0
+        else:
+            self._high_streak = 0
+            self._low_streak = 0
+
+        if self._high_streak >= self._hysteresis_frames:
+            self._interval = self._clamp(self._interval *
+                                         self._speed_up_factor)
+        elif self._low_streak >= self._hysteresis_frames:
+            self._interval = self._clamp(self._interval *
+                                         self._back_off_factor)
+
+        return max(self._interval, self._get_budget_interval())
+
+    def _clamp(self, interval):
+        """Clamp an interval between min_interval and max_interval.
+
+        Args:
+            interval: The interval (in seconds) to clamp.
+
+        Returns: The clamped interval.
+        """
+        return min(self._max_interval, max(self._min_interval, interval))
+
+    def _record_frame(self, frame_bytes):
+        """Add a frame to the last hour of frames.
+
+        Args:
+            frame_bytes: The number of bytes stored for the frame.
+        """
+        if self._max_frames_per_hour is None and not self.tracks_bytes:
+            return
+
+        now = self._clock()
+        self._recent_frames.append((now, frame_bytes))
+        self._recent_bytes += frame_bytes
+
+        while self._recent_frames[0][0] <= now - SECONDS_PER_HOUR:
+            _, expired_bytes = self._recent_frames.popleft()
+            self._recent_bytes -= expired_bytes
+
+    def _get_budget_interval(self):
+        """Return the shortest interval that keeps within the hourly budgets.
+
+        Returns: The shortest interval (in seconds) allowed by the budgets.
+        """
+        budget_interval = 0
+
+        if self._max_frames_per_hour is not None:
+            budget_interval = SECONDS_PER_HOUR / self._max_frames_per_hour
+
+            if len(self._recent_frames) >= self._max_frames_per_hour:
+                budget_interval = max(budget_interval,
+                                      self._get_time_until_expiry())
+
+        if self.tracks_bytes and self._recent_frames:
+            mean_frame_bytes = self._recent_bytes / len(self._recent_frames)
+            budget_interval = max(budget_interval,
+                                  SECONDS_PER_HOUR * mean_frame_bytes /
+                                  self._max_bytes_per_hour)
+
+            if self._recent_bytes >= self._max_bytes_per_hour:
+                budget_interval = max(budget_interval,
+                                      self._get_time_until_expiry())
+
+        return budget_interval
+
+    def _get_time_until_expiry(self):
+        """Return the time until the oldest recent frame leaves the window.
+
+        Returns: The time (in seconds) until the oldest frame of the last hour
+            is more than an hour old.
+        """
+        oldest_time, _ = self._recent_frames[0]
+
+        return oldest_time + SECONDS_PER_HOUR - self._clock()
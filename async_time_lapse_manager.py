@@ -0,0 +1,362 @@
+"""A library for managing time-lapse sequences from an asyncio event loop."""
+from asyncio import Event, ensure_future, gather, run, shield, wait_for
+from asyncio import TimeoutError as AsyncTimeoutError
+from time import monotonic
+
+from camera.abstract_async_camera import AbstractAsyncCamera
+from camera.async_camera_adapter import AsyncCameraAdapter
+from camera.exceptions import CameraTimeoutError
+from frame_capture import CameraCaptureResult, FrameCaptureResult
+from instrumentation import EVENT_SET_UP, EVENT_TEAR_DOWN
+from time_lapse_manager import TimeLapseManager
+
+
+class AsyncTimeLapseManager(TimeLapseManager):
+    """A time-lapse manager that runs as a coroutine on an event loop.
+
+    Cameras may either be AbstractAsyncCamera instances or blocking cameras,
+    which are wrapped in an AsyncCameraAdapter so that they run in an
+    executor. All of the cameras capture concurrently on the event loop.
+
+    The coroutine versions of the synchronous methods of TimeLapseManager
+    have an _async suffix, and the synchronous methods run them on an event
+    loop of their own, so code written for TimeLapseManager keeps working.
+    """
+
+    def __init__(self,
+                 cameras=None,
+                 capture_interval=10,
+                 capture_limit=None,
+                 executor=None,
+                 **kwargs):
+        """Initialise the time-lapse manager with the camera that will be used.
+
+        Args:
+            cameras: A collection of cameras that will be used when capturing
+                images using this time-lapse manager.
+            capture_interval: The interval (in seconds) between the start of
+                each frame.
+            capture_limit: The maximum number of images to capture (or None for
+                infinite).
+            executor: The concurrent.futures executor that blocking cameras
+                are run in (or None for the default executor of the event
+                loop).
+            **kwargs: Any further arguments accepted by TimeLapseManager.
+
+        Raises:
+            ValueError: If capture_interval is not greater than 0, if
+                capture_limit is not greater than 0 or None or if late_policy
+                is not a recognised policy.
+            TypeError: If capture_interval is not a numeric type or if
+                capture_limit is not a numeric type or None.
+        """
+        super().__init__(cameras, capture_interval, capture_limit, **kwargs)
+
+        self._executor = executor
+        self._async_cameras = {}
+        self._capture_tasks = {}
+        self._stop_requested = False
+        self._stop_event = None
+        self._running = False
+
+    @property
+    def running(self):
+        """Return whether the time-lapse is currently running.
+
+        Returns: A boolean specifying whether the time-lapse is running.
+        """
+        return self._running
+
+    def stop(self):
+        """Ask the time-lapse to stop once the current frame is done.
+
+        If the time-lapse has not started yet, it stops as soon as it does.
+        This must be called from the event loop running the time-lapse.
+        """
+        self._stop_requested = True
+
+        if self._stop_event is not None:
+            self._stop_event.set()
+
+    def start_time_lapse(self):
+        """Start the time-lapse process.
+
+        This runs start_time_lapse_async on an event loop of its own, so it
+        cannot be called from a running event loop.
+        """
+        run(self.start_time_lapse_async())
+
+    async def start_time_lapse_async(self):
+        """Start the time-lapse process.
+
+        This runs until capture_limit frames have been captured, stop is
+        called or the task running it is cancelled. The cameras are torn down
+        in every case.
+        """
+        self._running = True
+        # An asyncio Event belongs to the event loop it is first used on, so
+        # each run has its own.
+        self._stop_event = Event()
+        if self._stop_requested:
+            self._stop_event.set()
+        resumed = self._resume_from_checkpoint()
+
+        try:
+            set_ups = [self._set_up_async_camera(camera)
+                       for camera in self.get_cameras()]
+            await gather(*set_ups)
+
+            if not resumed:
+                self._scheduler.start()
+
+            while not self._is_capture_limit_reached():
+                if await self._wait_for_next_frame_or_stop():
+                    break
+
+                self._frame_timings.append(self._scheduler.begin_frame())
+                await self.capture_frame_async()
+                self._save_checkpoint()
+
+            self._remove_finished_checkpoint()
+        finally:
+            self._running = False
+            self._stop_requested = False
+            self._stop_event = None
+            await self._tear_down_cameras_async()
+
+    def capture_frame(self):
+        """Capture images using the cameras on this manager.
+
+        This runs capture_frame_async on an event loop of its own, so it
+        cannot be called from a running event loop.
+
+        Raises:
+            Exception: The first exception raised by a camera (or, with a
+                health monitor, the first it does not handle), once the
+                outcome of the frame has been recorded in last_frame_result.
+        """
+        run(self.capture_frame_async())
+
+    async def capture_frame_async(self):
+        """Capture images concurrently using the cameras on this manager.
+
+        With a health monitor, only cameras whose circuits are not open
+        capture, and their failures are recorded rather than raised.
+
+        Raises:
+            Exception: The first exception raised by a camera (or, with a
+                health monitor, the first it does not handle), once the
+                outcome of the frame has been recorded in last_frame_result.
+        """
+        if self._is_capture_limit_reached():
+            await self._tear_down_cameras_async()
+            return
+
+        cameras = await self._get_capturing_async_cameras()
+        timeouts = (self._get_capture_timeouts(cameras) or
+                    [None] * len(cameras))
+        camera_results = await gather(*(
+            self._capture_with_camera(camera, timeout)
+            for camera, timeout in zip(cameras, timeouts)))
+
+        frame_result = FrameCaptureResult(list(camera_results))
+        self._record_frame_result(frame_result)
+        self._check_frame_result(frame_result)
+        self._captured_frames += 1
+        self._adapt_capture_interval()
+
+    async def _wait_for_next_frame_or_stop(self):
+        """Wait until the next frame is due or a stop is requested.
+
+        Returns: A boolean specifying whether a stop was requested.
+        """
+        delay = self._scheduler.get_delay()
+
+        if self._stop_event.is_set():
+            return True
+
+        if delay > 0:
+            try:
+                await wait_for(self._stop_event.wait(), delay)
+            except AsyncTimeoutError:
+                pass
+
+        return self._stop_event.is_set()
+
+    async def _capture_with_camera(self, camera, timeout=None):
+        """Capture an image with a camera and time it.
+
+        A capture that times out keeps running in the background, and the
+        camera is not asked to capture again until it has finished.
+
+        Args:
+            camera: The camera to capture with.
+            timeout: The time (in seconds) the camera is given to capture (or
+                None to wait indefinitely).
+
+        Returns: A CameraCaptureResult.
+        """
+        started = monotonic()
+
+        if timeout is None:
+            try:
+                await self._get_async_camera(camera).capture_image()
+            except Exception as exc:
+                return CameraCaptureResult(camera, started, monotonic(), exc)
+
+            return CameraCaptureResult(camera, started, monotonic(), None)
+
+        capture_task = self._capture_tasks.get(camera)
+
+        if capture_task is None or capture_task.done():
+            capture_task = ensure_future(
+                self._get_async_camera(camera).capture_image())
+            capture_task.add_done_callback(self._retrieve_task_exception)
+            self._capture_tasks[camera] = capture_task
+
+            try:
+                await wait_for(shield(capture_task), timeout)
+            except AsyncTimeoutError:
+                pass
+            except Exception as exc:
+                return CameraCaptureResult(camera, started, monotonic(), exc)
+            else:
+                return CameraCaptureResult(camera, started, monotonic(), None)
+
+        exception = CameraTimeoutError(str(camera) +
+                                       " did not finish capturing in time.")
+
+        return CameraCaptureResult(camera, started, monotonic(), exception)
+
+    async def _set_up_async_camera(self, camera):
+        """Set up a camera, sidelining it if the health monitor allows.
+
+        Args:
+            camera: The camera.
+
+        Returns: A boolean specifying whether the camera was set up.
+        """
+        try:
+            await self._run_async_camera_step(
+                EVENT_SET_UP,
+                camera,
+                self._get_async_camera(camera).set_up)
+        except Exception as exc:
+            if not self._is_handled_failure(exc):
+                raise
+            self._health_monitor.record_failure(camera,
+                                                exc,
+                                                needs_set_up=True)
+            return False
+
+        if self._health_monitor is not None:
+            self._health_monitor.record_set_up(camera)
+
+        return True
+
+    async def _tear_down_async_camera(self, camera):
+        """Tear down a camera, ignoring failures the health monitor handles.
+
+        Args:
+            camera: The camera.
+        """
+        try:
+            await self._run_async_camera_step(
+                EVENT_TEAR_DOWN,
+                camera,
+                self._get_async_camera(camera).tear_down)
+        except Exception as exc:
+            if not self._is_handled_failure(exc):
+                raise
+
+    async def _get_capturing_async_cameras(self):
+        """Return the cameras that should capture the next frame.
+
+        Cameras whose circuits are open are left out, and cameras coming
+        back from a failure are torn down and set up again first.
+
+        Returns: A list of cameras.
+        """
+        if self._health_monitor is None:
+            return self.get_cameras()
+
+        cameras = []
+
+        for camera in self.get_cameras():
+            if not self._health_monitor.is_available(camera):
+                continue
+
+            if self._health_monitor.needs_set_up(camera):
+                await self._tear_down_async_camera(camera)
+                if not await self._set_up_async_camera(camera):
+                    continue
+
+            cameras.append(camera)
+
+        return cameras
+
+    def _tear_down_cameras(self):
+        """Tear down every camera on an event loop of its own."""
+        run(self._tear_down_cameras_async())
+
+    async def _tear_down_cameras_async(self):
+        """Tear down every camera, even if some of them fail."""
+        tear_downs = [self._tear_down_async_camera(camera)
+                      for camera in self.get_cameras()]
+        results = await gather(*tear_downs, return_exceptions=True)
+
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
+
+    async def _run_async_camera_step(self, event, camera, step):
+        """Run a camera coroutine, reporting it to the instrumentation.
+
+        Args:
+            event: The instrumentation event of the operation.
+            camera: The camera performing the operation.
+            step: A coroutine function performing the operation.
+        """
+        if self._instrumentation is None:
+            await step()
+            return
+
+        started = monotonic()
+
+        try:
+            await step()
+        except Exception as exc:
+            self._instrumentation.observe(event,
+                                          camera,
+                                          monotonic() - started,
+                                          exc)
+            raise
+
+        self._instrumentation.observe(event, camera, monotonic() - started)
+
+    def _get_async_camera(self, camera):
+        """Return a coroutine-based view of a camera.
+
+        Args:
+            camera: Either an AbstractAsyncCamera or a blocking camera.
+
+        Returns: An AbstractAsyncCamera.
+        """
+        if isinstance(camera, AbstractAsyncCamera):
+            return camera
+
+        if camera not in self._async_cameras:
+            self._async_cameras[camera] = AsyncCameraAdapter(camera,
+                                                             self._executor)
+
+        return self._async_cameras[camera]
+
+    @staticmethod
+    def _retrieve_task_exception(task):
+        """Retrieve the exception of a capture that may have been abandoned.
+
+        Args:
+            task: The finished capture task.
+        """
+        if not task.cancelled():
+            task.exception()
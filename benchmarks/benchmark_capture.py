@@ -0,0 +1,461 @@
+"""Benchmarks for capture throughput, jitter, storage and memory use.
+
+Run from the root of the project with, for example:
+
+    python -m benchmarks.benchmark_capture --frames 100000 \
+        --payload-size 65536 --output new.json
+
+and compare two runs with:
+
+    python -m benchmarks.benchmark_capture --compare old.json new.json
+"""
+import json
+import platform
+import sys
+from argparse import ArgumentParser
+from statistics import mean, median
+from subprocess import DEVNULL, CalledProcessError, check_output
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from capture_scheduler import LATE_POLICY_CATCH_UP
+from frame_capture import ParallelFrameCapturer, SerialFrameCapturer
+from storage.write_behind_storage import WriteBehindStorage
+from tests.mocks.mock_camera import MockCamera
+from time_lapse_manager import TimeLapseManager
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+RESULTS_FORMAT_VERSION = 1
+
+
+def get_peak_rss():
+    """Return the peak resident set size of this process.
+
+    Returns: The peak resident set size (in bytes), or None if it cannot be
+        measured on this platform.
+    """
+    if resource is None:
+        return None
+
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    if sys.platform == "darwin":
+        return peak_rss
+
+    return peak_rss * 1024
+
+
+def get_percentile(values, percentile):
+    """Return a percentile of some values by the nearest-rank method.
+
+    Args:
+        values: The values.
+        percentile: The percentile (from 0 to 100).
+
+    Returns: The value at the percentile (or None if there are no values).
+    """
+    if not values:
+        return None
+
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1,
+                      round(percentile / 100 * len(ordered)) - 1))
+
+    return ordered[rank]
+
+
+def summarise(values):
+    """Summarise a distribution of measurements.
+
+    Args:
+        values: The measurements.
+
+    Returns: A dictionary of summary statistics.
+    """
+    if not values:
+        return {"count": 0}
+
+    return {"count": len(values),
+            "mean": mean(values),
+            "median": median(values),
+            "p99": get_percentile(values, 99),
+            "max": max(values)}
+
+
+def create_cameras(camera_count,
+                   capture_latency=0,
+                   failure_rate=0,
+                   payload_size=None,
+                   seed=0):
+    """Create a set of synthetic cameras.
+
+    Args:
+        camera_count: The number of cameras.
+        capture_latency: The time (in seconds) each capture takes.
+        failure_rate: The probability that a capture fails.
+        payload_size: The size (in bytes) of each image.
+        seed: The seed for random failures.
+
+    Returns: A list of MockCamera.
+    """
+    return [MockCamera("Camera " + str(index),
+                       capture_latency=capture_latency,
+                       failure_rate=failure_rate,
+                       payload_size=payload_size,
+                       seed=seed + index)
+            for index in range(camera_count)]
+
+
+def benchmark_throughput(frames,
+                         camera_count,
+                         failure_rate=0,
+                         block_size=10000):
+    """Measure how fast frames can be captured and whether the cost grows.
+
+    Frames are captured back to back, without waiting between them, in
+    blocks of block_size frames.
+
+    Args:
+        frames: The number of frames to capture.
+        camera_count: The number of cameras.
+        failure_rate: The probability that a capture fails.
+        block_size: The number of frames in each timed block.
+
+    Returns: A dictionary of results.
+    """
+    manager = TimeLapseManager(create_cameras(camera_count,
+                                              failure_rate=failure_rate))
+    block_costs = []
+    failed_frames = 0
+
+    started = perf_counter()
+    remaining_frames = frames
+
+    while remaining_frames > 0:
+        block_frames = min(block_size, remaining_frames)
+        block_started = perf_counter()
+
+        for _ in range(block_frames):
+            try:
+                manager.capture_frame()
+            except Exception:
+                failed_frames += 1
+
+        block_costs.append((perf_counter() - block_started) / block_frames)
+        remaining_frames -= block_frames
+
+    elapsed = perf_counter() - started
+
+    return {"frames": frames,
+            "cameras": camera_count,
+            "failed_frames": failed_frames,
+            "frames_per_second": frames / elapsed,
+            "captures_per_second": frames * camera_count / elapsed,
+            "first_block_cost": block_costs[0],
+            "last_block_cost": block_costs[-1],
+            "cost_growth": block_costs[-1] / block_costs[0],
+            "peak_rss": get_peak_rss()}
+
+
+def benchmark_jitter(frames, capture_interval, capture_latency):
+    """Measure how closely frames follow the schedule.
+
+    Args:
+        frames: The number of frames to capture.
+        capture_interval: The interval (in seconds) between frames.
+        capture_latency: The time (in seconds) each capture takes.
+
+    Returns: A dictionary of results.
+    """
+    manager = TimeLapseManager(create_cameras(1, capture_latency),
+                               capture_interval,
+                               frames,
+                               late_policy=LATE_POLICY_CATCH_UP,
+                               timing_history=frames)
+    manager.start_time_lapse()
+
+    timings = manager.get_frame_timings()
+    drift = timings[-1].started - timings[0].started - \
+        (len(timings) - 1) * capture_interval
+
+    return {"frames": frames,
+            "capture_interval": capture_interval,
+            "capture_latency": capture_latency,
+            "lateness": summarise([timing.lateness for timing in timings]),
+            "jitter": summarise([abs(timing.jitter)
+                                 for timing in timings[1:]]),
+            "drift": drift}
+
+
+def benchmark_skew(frames, camera_count, capture_latency):
+    """Measure the spread between cameras within each frame.
+
+    Args:
+        frames: The number of frames to capture.
+        camera_count: The number of cameras.
+        capture_latency: The time (in seconds) each capture takes.
+
+    Returns: A dictionary of results for serial and concurrent capture.
+    """
+    results = {}
+
+    cameras = create_cameras(camera_count, capture_latency)
+
+    for mode, frame_capturer in (("serial", SerialFrameCapturer()),
+                                 ("concurrent", ParallelFrameCapturer())):
+        spreads = []
+        durations = []
+
+        for _ in range(frames):
+            frame_result = frame_capturer.capture(cameras)
+            spreads.append(frame_result.spread)
+            durations.append(frame_result.duration)
+
+        frame_capturer.shut_down()
+
+        results[mode] = {"spread": summarise(spreads),
+                         "duration": summarise(durations)}
+
+    results["frames"] = frames
+    results["cameras"] = camera_count
+    results["capture_latency"] = capture_latency
+
+    return results
+
+
+def benchmark_storage(frames, camera_count, payload_size):
+    """Measure capture throughput when every image is written to disk.
+
+    Each camera hands a payload of payload_size bytes to a shared
+    WriteBehindStorage, which writes it to a temporary directory.
+
+    Args:
+        frames: The number of frames to capture.
+        camera_count: The number of cameras.
+        payload_size: The size (in bytes) of each image.
+
+    Returns: A dictionary of results.
+    """
+    storage_writer = WriteBehindStorage()
+    failed_frames = 0
+
+    with TemporaryDirectory() as storage_directory:
+        cameras = create_cameras(camera_count, payload_size=payload_size)
+
+        for camera in cameras:
+            camera.storage_directory = storage_directory
+            camera.storage_writer = storage_writer
+
+        manager = TimeLapseManager(cameras)
+        storage_writer.start()
+
+        try:
+            started = perf_counter()
+
+            for _ in range(frames):
+                try:
+                    manager.capture_frame()
+                except Exception:
+                    failed_frames += 1
+
+            capture_elapsed = perf_counter() - started
+            storage_writer.flush()
+            elapsed = perf_counter() - started
+        finally:
+            storage_writer.stop()
+
+    written_bytes = storage_writer.written_frames * payload_size
+
+    return {"frames": frames,
+            "cameras": camera_count,
+            "payload_size": payload_size,
+            "failed_frames": failed_frames,
+            "written_frames": storage_writer.written_frames,
+            "dropped_frames": storage_writer.dropped_frames,
+            "failed_writes": storage_writer.failed_writes,
+            "capture_frames_per_second": frames / capture_elapsed,
+            "frames_per_second": frames / elapsed,
+            "bytes_per_second": written_bytes / elapsed,
+            "mean_write_latency": storage_writer.mean_write_latency,
+            "max_write_latency": storage_writer.max_write_latency,
+            "peak_rss": get_peak_rss()}
+
+
+def get_version():
+    """Return the version of the code being benchmarked.
+
+    Returns: The git description of the working tree (or None if it is not
+        available).
+    """
+    try:
+        return check_output(["git", "describe", "--always", "--dirty"],
+                            stderr=DEVNULL).decode().strip()
+    except (OSError, CalledProcessError):
+        return None
+
+
+def run_benchmarks(frames=100000,
+                   camera_count=4,
+                   failure_rate=0,
+                   jitter_frames=200,
+                   capture_interval=0.01,
+                   capture_latency=0.002,
+                   skew_frames=50,
+                   storage_frames=1000,
+                   payload_size=65536):
+    """Run every benchmark.
+
+    Args:
+        frames: The number of frames for the throughput benchmark.
+        camera_count: The number of cameras.
+        failure_rate: The probability that a capture fails.
+        jitter_frames: The number of frames for the jitter benchmark.
+        capture_interval: The interval (in seconds) for the jitter benchmark.
+        capture_latency: The capture latency (in seconds) for the jitter and
+            skew benchmarks.
+        skew_frames: The number of frames for the skew benchmark.
+        storage_frames: The number of frames for the storage benchmark.
+        payload_size: The size (in bytes) of each image in the storage
+            benchmark.
+
+    Returns: A dictionary of results, suitable for saving as JSON.
+    """
+    block_size = max(1, min(10000, frames // 10))
+
+    return {"format_version": RESULTS_FORMAT_VERSION,
+            "environment": {"version": get_version(),
+                            "python": platform.python_version(),
+                            "implementation":
+                                platform.python_implementation(),
+                            "platform": platform.platform()},
+            "results": {
+                "throughput": benchmark_throughput(frames,
+                                                   camera_count,
+                                                   failure_rate,
+                                                   block_size),
+                "jitter": benchmark_jitter(jitter_frames,
+                                           capture_interval,
+                                           capture_latency),
+                "skew": benchmark_skew(skew_frames,
+                                       camera_count,
+                                       capture_latency),
+                "storage": benchmark_storage(storage_frames,
+                                             camera_count,
+                                             payload_size)}}
+
+
+def flatten_results(results, prefix=""):
+    """Flatten nested results into dotted metric names.
+
+    Args:
+        results: A dictionary of results.
+        prefix: The prefix for the metric names.
+
+    Returns: A dictionary mapping metric names to numbers.
+    """
+    metrics = {}
+
+    for name, value in results.items():
+        if isinstance(value, dict):
+            metrics.update(flatten_results(value, prefix + name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            metrics[prefix + name] = value
+
+    return metrics
+
+
+def compare_results(old_results, new_results):
+    """Compare the metrics of two benchmark runs.
+
+    Args:
+        old_results: The results of the earlier run.
+        new_results: The results of the later run.
+
+    Returns: A list of (metric, old value, new value, relative change)
+        tuples, where the relative change is None if the old value is 0.
+    """
+    old_metrics = flatten_results(old_results["results"])
+    new_metrics = flatten_results(new_results["results"])
+    comparison = []
+
+    for metric in sorted(old_metrics.keys() & new_metrics.keys()):
+        old_value = old_metrics[metric]
+        new_value = new_metrics[metric]
+
+        if old_value == 0:
+            change = None
+        else:
+            change = (new_value - old_value) / abs(old_value)
+
+        comparison.append((metric, old_value, new_value, change))
+
+    return comparison
+
+
+def main(arguments=None):
+    """Run the benchmarks or compare two runs from the command line.
+
+    Args:
+        arguments: The command line arguments (or None for sys.argv).
+    """
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--frames", type=int, default=100000)
+    parser.add_argument("--cameras", type=int, default=4)
+    parser.add_argument("--failure-rate", type=float, default=0)
+    parser.add_argument("--jitter-frames", type=int, default=200)
+    parser.add_argument("--capture-interval", type=float, default=0.01)
+    parser.add_argument("--capture-latency", type=float, default=0.002)
+    parser.add_argument("--skew-frames", type=int, default=50)
+    parser.add_argument("--storage-frames", type=int, default=1000)
+    parser.add_argument("--payload-size",
+                        type=int,
+                        default=65536,
+                        help="the size (in bytes) of each image written in "
+                             "the storage benchmark")
+    parser.add_argument("--output", help="the file to save results to")
+    parser.add_argument("--compare",
+                        nargs=2,
+                        metavar=("OLD", "NEW"),
+                        help="compare two saved results instead")
+    options = parser.parse_args(arguments)
+
+    if options.compare:
+        with open(options.compare[0], encoding="utf-8") as old_file:
+            old_results = json.load(old_file)
+        with open(options.compare[1], encoding="utf-8") as new_file:
+            new_results = json.load(new_file)
+
+        for metric, old_value, new_value, change in compare_results(
+                old_results, new_results):
+            if change is None:
+                change_text = "n/a"
+            else:
+                change_text = "{:+.1%}".format(change)
+            print("{:<45} {:>14.6g} {:>14.6g} {:>9}".format(
+                metric, old_value, new_value, change_text))
+        return
+
+    results = run_benchmarks(options.frames,
+                             options.cameras,
+                             options.failure_rate,
+                             options.jitter_frames,
+                             options.capture_interval,
+                             options.capture_latency,
+                             options.skew_frames,
+                             options.storage_frames,
+                             options.payload_size)
+    output = json.dumps(results, indent=2)
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
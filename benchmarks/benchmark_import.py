@@ -0,0 +1,178 @@
+"""Benchmarks for the cold start time of importing the package's modules.
+
+Every module is imported in a fresh interpreter, so nothing is cached
+between measurements. For each module, the script records a summary of
+the import times, the number of modules loaded and which dependencies
+listed in HEAVY_MODULES were pulled in. Run from the root of the project
+with, for example:
+
+    python -m benchmarks.benchmark_import --output new.json
+
+Passing --budget makes the benchmark fail if any module takes longer than
+the budget to import, or if it imports a dependency listed in
+HEAVY_MODULES.
+"""
+import json
+import platform
+import sys
+from argparse import ArgumentParser
+from os.path import abspath, dirname
+from subprocess import check_output
+
+from benchmarks.benchmark_capture import get_version, summarise
+
+RESULTS_FORMAT_VERSION = 1
+
+DEFAULT_MODULES = ("time_lapse_manager",
+                   "async_time_lapse_manager",
+                   "multi_rate_time_lapse_manager",
+                   "camera.registry",
+                   "camera.implementations.raspberry_pi_camera",
+                   "camera.implementations.screenshot_camera")
+
+HEAVY_MODULES = ("numpy", "picamera", "wx", "PIL", "http.server")
+
+_IMPORT_SCRIPT = """
+import json
+import sys
+from importlib import import_module
+from time import perf_counter
+
+started = perf_counter()
+import_module(sys.argv[1])
+elapsed = perf_counter() - started
+
+print(json.dumps({"seconds": elapsed,
+                  "modules": sorted(sys.modules)}))
+"""
+
+_PROJECT_DIRECTORY = dirname(dirname(abspath(__file__)))
+
+
+def measure_import(module_name):
+    """Import a module in a fresh interpreter.
+
+    Args:
+        module_name: The name of the module to import.
+
+    Returns: A (seconds, modules) tuple of the time taken to import the
+        module and the names of every module loaded afterwards.
+    """
+    output = check_output([sys.executable, "-c", _IMPORT_SCRIPT, module_name],
+                          cwd=_PROJECT_DIRECTORY)
+    measurement = json.loads(output.decode())
+
+    return measurement["seconds"], measurement["modules"]
+
+
+def benchmark_import(module_name, repeats=5):
+    """Measure how long a module takes to import from a cold start.
+
+    Args:
+        module_name: The name of the module to import.
+        repeats: The number of fresh interpreters to import it in.
+
+    Returns: A dictionary of results.
+    """
+    times = []
+    modules = []
+
+    for _ in range(repeats):
+        seconds, modules = measure_import(module_name)
+        times.append(seconds)
+
+    return {"seconds": summarise(times),
+            "loaded_modules": len(modules),
+            "heavy_modules": [name for name in HEAVY_MODULES
+                              if name in modules]}
+
+
+def run_benchmarks(modules=DEFAULT_MODULES, repeats=5):
+    """Run the import benchmark for every module.
+
+    Args:
+        modules: The names of the modules to import.
+        repeats: The number of fresh interpreters to import each one in.
+
+    Returns: A dictionary of results, suitable for saving as JSON.
+    """
+    return {"format_version": RESULTS_FORMAT_VERSION,
+            "environment": {"version": get_version(),
+                            "python": platform.python_version(),
+                            "implementation":
+                                platform.python_implementation(),
+                            "platform": platform.platform()},
+            "results": {"import": {module_name: benchmark_import(module_name,
+                                                                 repeats)
+                                   for module_name in modules}}}
+
+
+def check_budget(results, budget):
+    """Find the modules that are too slow or heavy to import.
+
+    Args:
+        results: The results of run_benchmarks.
+        budget: The maximum median time (in seconds) to import a module.
+
+    Returns: A list of messages describing each module over the budget.
+    """
+    problems = []
+
+    for module_name, result in sorted(results["results"]["import"].items()):
+        median_seconds = result["seconds"]["median"]
+
+        if median_seconds > budget:
+            problems.append("{} takes {:.1f}ms to import".format(
+                module_name, median_seconds * 1000))
+
+        if result["heavy_modules"]:
+            problems.append("{} imports {}".format(
+                module_name, ", ".join(result["heavy_modules"])))
+
+    return problems
+
+
+def main(arguments=None):
+    """Run the import benchmark from the command line.
+
+    Args:
+        arguments: The command line arguments (or None for sys.argv).
+
+    Returns: The exit status, which is 1 if a module is over the budget.
+    """
+    parser = ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("modules",
+                        nargs="*",
+                        default=DEFAULT_MODULES,
+                        help="the modules to import")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--budget",
+                        type=float,
+                        help="the maximum time (in seconds) to import a "
+                             "module")
+    parser.add_argument("--output", help="the file to save results to")
+    options = parser.parse_args(arguments)
+
+    results = run_benchmarks(options.modules, options.repeats)
+    output = json.dumps(results, indent=2)
+
+    if options.output:
+        with open(options.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+    if options.budget is not None:
+        problems = check_budget(results, options.budget)
+
+        for problem in problems:
+            print(problem, file=sys.stderr)
+
+        if problems:
+            return 1
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+"""An abstract representation of a camera driven from an asyncio event loop."""
+
+from abc import ABC, abstractmethod
+
+
+class AbstractAsyncCamera(ABC):
+    """An abstract class representing a camera with coroutine methods."""
+
+    def __init__(self, name=""):
+        """Initialise the camera.
+
+        Args:
+            name: The name or reference of this camera.
+        """
+        self._name = name
+
+    @abstractmethod
+    async def set_up(self):
+        """Set up the camera so that it is ready to capture an image."""
+        pass
+
+    @abstractmethod
+    async def tear_down(self):
+        """Free any resources held by the camera."""
+        pass
+
+    def __str__(self):
+        """Return a string representation of this camera.
+
+        Returns: A string representation of this camera.
+        """
+        return self._name
+
+    @abstractmethod
+    async def capture_image(self):
+        """Capture an image to the default storage_directory.
+
+        Raises:
+            CameraConnectionError: If there is an issue with contacting the
+                camera.
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+            ImageStorageError: If the image can be captured but cannot be
+                stored successfully.
+        """
+        pass
@@ -1,10 +1,49 @@
 """An abstract representation of a basic camera."""
 
 from abc import ABC, abstractmethod
+from collections import deque
+from functools import partial
+from os.path import getsize, join
+from time import monotonic
+
+from camera.capture_ledger import (CAPTURE_STATUS_CAPTURED,
+                                   CAPTURE_STATUS_EVICTED,
+                                   CAPTURE_STATUS_FAILED,
+                                   CAPTURE_STATUS_SKIPPED, CaptureLedger)
+from camera.exceptions import ImageStorageError
+from camera.frame import FramePool
+from instrumentation import EVENT_STORE
 
 
 class AbstractCamera(ABC):
-    """An abstract class representing a basic camera."""
+    """An abstract class representing a basic camera.
+
+    Attributes:
+        storage_writer: A WriteBehindStorage that in-memory images are handed
+            to for writing (or None to write images during capture). Images
+            are recorded as captured once accepted, and as failed if their
+            writes later fail.
+        frame_store: A SegmentFrameStore that in-memory images are appended
+            to instead of being written as one file per image (or None).
+            Such images have no path in the capture ledger or catalog; read
+            them with a SegmentFrameReader by camera name and sequence
+            number.
+        frame_filter: A filter such as ChangeDetectionFilter whose
+            should_keep method decides from an image's pixels whether it is
+            stored (or None to store every image).
+        instrumentation: An Instrumentation that the time taken to store
+            each image is reported to (or None).
+        capture_catalog: A CaptureCatalog that every capture is recorded in,
+            whatever its outcome (or None).
+        thumbnail_generator: A ThumbnailGenerator that every stored image
+            is handed to, at full resolution, for building previews (or
+            None).
+        frame_pool: The FramePool that capture_to_frame takes frames from
+            (or None for a pool created on first use).
+        storage_manager: A StorageQuotaManager that every image stored as a
+            file is reported to, so that it can be evicted or recompressed
+            (or None).
+    """
 
     def __init__(self,
                  name="",
@@ -24,6 +63,16 @@ class AbstractCamera(ABC):
         self.storage_directory = storage_directory
         self.file_extension = file_extension
         self.images_stored_locally = images_stored_locally
+        self.storage_writer = None
+        self.frame_store = None
+        self.frame_filter = None
+        self.instrumentation = None
+        self.capture_catalog = None
+        self.thumbnail_generator = None
+        self.frame_pool = None
+        self.storage_manager = None
+        self._capture_ledger = CaptureLedger()
+        self._unwritten_images = deque()
 
     @abstractmethod
     def set_up(self):
@@ -56,21 +105,329 @@ class AbstractCamera(ABC):
         """
         pass
 
-    @abstractmethod
+    def capture_to_frame(self):
+        """Capture an image into a reusable in-memory frame without storing it.
+
+        The frame should be released once it is no longer needed, so that
+        its buffer can be reused by the next capture.
+
+        Returns: A Frame.
+
+        Raises:
+            NotImplementedError: If the camera cannot capture into memory.
+            CameraConnectionError: If there is an issue with contacting the
+                camera.
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+        """
+        raise NotImplementedError(type(self).__name__ +
+                                  " cannot capture into memory.")
+
     def get_captured_image_paths(self):
         """Return a list of filepaths of the images captured.
 
-        Returns: A list of filepaths of the images captured.
+        Returns: A read-only list of filepaths of the images captured, with
+            None for any image that was not stored.
         """
-        pass
+        self._record_unwritten_images()
+        return self._capture_ledger.get_paths()
 
-    @abstractmethod
     def get_next_filename(self):
         """Return the filename of the next image that will be captured.
 
         Returns: The filename of the next image that will be captured.
         """
-        pass
+        return self._capture_ledger.get_next_filename()
+
+    @property
+    def capture_ledger(self):
+        """Return the record of the images captured by this camera.
+
+        Returns: The CaptureLedger of this camera.
+        """
+        self._record_unwritten_images()
+        return self._capture_ledger
+
+    @property
+    def stores_images_in_memory(self):
+        """Return whether captured images are handed on from memory.
+
+        Returns: A boolean specifying whether a storage writer or frame store
+            is set, in which case images should be captured into memory and
+            passed to _store_image rather than written directly to disk.
+        """
+        return self.storage_writer is not None or self.frame_store is not None
+
+    def get_next_image_path(self):
+        """Return the path that the next image will be stored to.
+
+        Returns: The path that the next image will be stored to.
+        """
+        filename = self.get_next_filename() + "." + self.file_extension
+
+        if self.storage_directory is None:
+            return filename
+
+        return join(self.storage_directory, filename)
+
+    def _get_frame_pool(self):
+        """Return the pool that frames are taken from, creating it if needed.
+
+        Returns: A FramePool.
+        """
+        if self.frame_pool is None:
+            self.frame_pool = FramePool()
+
+        return self.frame_pool
+
+    def _should_store_image(self, get_pixels):
+        """Return whether the frame filter wants the next image stored.
+
+        An image that is not wanted is recorded as skipped.
+
+        Args:
+            get_pixels: A function returning the pixels of the image as an
+                array-like, which is only called if a frame filter is set.
+
+        Returns: A boolean specifying whether the image should be stored.
+        """
+        if self.frame_filter is None:
+            return True
+
+        if not self.frame_filter.should_keep(get_pixels()):
+            self._record_skipped_image()
+            return False
+
+        return True
+
+    def _submit_thumbnail(self, filename, image):
+        """Hand a stored image to the thumbnail generator, if one is set.
+
+        This should only be called once the image has been stored, so that
+        no thumbnail is built for an image that does not exist.
+
+        Args:
+            filename: The filename (without extension) of the image.
+            image: The full resolution image as pixels, encoded bytes or a
+                path, or a function returning one of these, which is only
+                called if the thumbnail generator accepts the image. Encoded
+                images are decoded by the generator, off the capture thread.
+        """
+        if self.thumbnail_generator is not None:
+            self.thumbnail_generator.submit(str(self), filename, image)
+
+    def _store_image(self, image_data, encoder=None):
+        """Store an in-memory image as the next image and record it.
+
+        The image is appended to the frame store if one is set, otherwise it
+        is handed to the storage writer if one is set, otherwise it is
+        written to the next image path straight away.
+
+        Args:
+            image_data: The encoded image as a bytes-like object, or an
+                object understood by encoder.
+            encoder: A function that converts image_data to bytes (or None if
+                image_data is already encoded).
+
+        Returns: A boolean specifying whether the image was stored, which is
+            False when the storage writer did not accept it.
+
+        Raises:
+            ImageStorageError: If the image cannot be stored.
+        """
+        instrumentation = self.instrumentation
+
+        if instrumentation is None:
+            return self._write_image(image_data, encoder)
+
+        started = monotonic()
+
+        try:
+            image_stored = self._write_image(image_data, encoder)
+        except ImageStorageError as exc:
+            instrumentation.observe(EVENT_STORE,
+                                    self,
+                                    monotonic() - started,
+                                    exc)
+            raise
+
+        instrumentation.observe(EVENT_STORE, self, monotonic() - started)
+
+        return image_stored
+
+    def _write_image(self, image_data, encoder):
+        """Store an in-memory image as the next image and record it.
+
+        Args:
+            image_data: The encoded image as a bytes-like object, or an
+                object understood by encoder.
+            encoder: A function that converts image_data to bytes (or None if
+                image_data is already encoded).
+
+        Returns: A boolean specifying whether the image was stored.
+
+        Raises:
+            ImageStorageError: If the image cannot be stored.
+        """
+        self._record_unwritten_images()
+        full_path = self.get_next_image_path()
+
+        try:
+            if self.frame_store is not None:
+                if encoder is not None:
+                    image_data = encoder(image_data)
+                    encoder = None
+                self.frame_store.append(str(self),
+                                        self._capture_ledger.next_sequence,
+                                        image_data)
+                image_accepted = True
+            elif self.storage_writer is not None:
+                image_accepted = self.storage_writer.submit(
+                    full_path,
+                    image_data,
+                    encoder,
+                    partial(self._unwritten_images.append,
+                            self._capture_ledger.next_sequence))
+            else:
+                if encoder is not None:
+                    image_data = encoder(image_data)
+                    encoder = None
+                with open(full_path, "wb") as image_file:
+                    image_file.write(image_data)
+                image_accepted = True
+        except Exception as exc:
+            self._record_failed_image()
+            raise ImageStorageError from exc
+
+        if not image_accepted:
+            self._record_failed_image()
+        elif encoder is None:
+            self._record_captured_image(image_data)
+        # The storage writer encodes the image later, so it has no bytes yet.
+        else:
+            self._record_captured_image()
+
+        return image_accepted
+
+    def _record_captured_image(self, image_data=None):
+        """Record that the next image has been captured and stored.
+
+        Args:
+            image_data: The encoded image as a bytes-like object, used for
+                the size and digest in the capture catalog and the size in the
+                storage manager (or None to take the size from the stored
+                file).
+
+        Returns: The path of the captured image (or None if it was appended
+            to the frame store).
+        """
+        sequence = self._capture_ledger.next_sequence
+        file_extension = self.file_extension
+        storage_manager = self.storage_manager
+
+        # Images appended to the frame store are not files of their own.
+        if self.frame_store is not None:
+            file_extension = None
+            storage_manager = None
+
+        path = self._capture_ledger.record_capture(self.storage_directory,
+                                                   file_extension)
+
+        if self.capture_catalog is None and storage_manager is None:
+            return path
+
+        size = None
+        if image_data is not None:
+            size = memoryview(image_data).nbytes
+        elif path is not None:
+            try:
+                size = getsize(path)
+            except OSError:
+                pass
+
+        if self.capture_catalog is not None:
+            self.capture_catalog.record(str(self),
+                                        sequence,
+                                        CAPTURE_STATUS_CAPTURED,
+                                        path,
+                                        image_data,
+                                        size)
+
+        # Images stored by the storage writer are sized once they exist.
+        if storage_manager is not None:
+            storage_manager.record(str(self), sequence, path, size, self)
+
+        return path
+
+    def store_image(self, image_data):
+        """Store an image captured elsewhere as the next image and record it.
+
+        This lets a copy of the camera store frames that another copy
+        captured with capture_to_buffer, such as in a worker process.
+
+        Args:
+            image_data: The encoded image as a bytes-like object.
+
+        Returns: A boolean specifying whether the image was stored, which is
+            False when the storage writer did not accept it.
+
+        Raises:
+            ImageStorageError: If the image cannot be stored.
+        """
+        return self._store_image(image_data)
+
+    def record_failed_image(self):
+        """Record that an image captured elsewhere could not be captured."""
+        self._record_failed_image()
+
+    def record_evicted_image(self, sequence):
+        """Record that a stored image has since been deleted to free space.
+
+        Args:
+            sequence: The sequence number of the image.
+        """
+        self._capture_ledger.record_eviction(sequence)
+
+        if self.capture_catalog is not None:
+            self.capture_catalog.set_status(str(self),
+                                            sequence,
+                                            CAPTURE_STATUS_EVICTED)
+
+    def _record_unwritten_images(self):
+        """Record images the storage writer accepted but could not write.
+
+        The storage writer reports these from its own threads, so they are
+        queued and recorded here, on the thread using the camera.
+        """
+        while self._unwritten_images:
+            sequence = self._unwritten_images.popleft()
+            self._capture_ledger.record_lost_image(sequence)
+
+            if self.capture_catalog is not None:
+                self.capture_catalog.set_status(str(self),
+                                                sequence,
+                                                CAPTURE_STATUS_FAILED)
+
+            if self.storage_manager is not None:
+                self.storage_manager.forget(str(self), sequence)
+
+    def _record_failed_image(self):
+        """Record that the next image could not be captured or stored."""
+        if self.capture_catalog is not None:
+            self.capture_catalog.record(str(self),
+                                        self._capture_ledger.next_sequence,
+                                        CAPTURE_STATUS_FAILED)
+
+        self._capture_ledger.record_failure()
+
+    def _record_skipped_image(self):
+        """Record that the next image was captured but not kept."""
+        if self.capture_catalog is not None:
+            self.capture_catalog.record(str(self),
+                                        self._capture_ledger.next_sequence,
+                                        CAPTURE_STATUS_SKIPPED)
+
+        self._capture_ledger.record_skip()
 
     @property
     def file_extension(self):
@@ -0,0 +1,61 @@
+"""An adapter that lets a blocking camera be awaited from an event loop."""
+
+from asyncio import get_running_loop
+
+from camera.abstract_async_camera import AbstractAsyncCamera
+
+
+class AsyncCameraAdapter(AbstractAsyncCamera):
+    """Run the blocking methods of a camera in an executor."""
+
+    def __init__(self, camera, executor=None):
+        """Initialise the adapter.
+
+        Args:
+            camera: The blocking camera (an AbstractCamera) to wrap.
+            executor: The concurrent.futures executor to run the camera in (or
+                None for the default executor of the event loop).
+        """
+        super().__init__(str(camera))
+        self._camera = camera
+        self._executor = executor
+
+    @property
+    def camera(self):
+        """Return the blocking camera wrapped by this adapter.
+
+        Returns: The blocking camera wrapped by this adapter.
+        """
+        return self._camera
+
+    async def set_up(self):
+        """Set up the camera so that it is ready to capture an image."""
+        await self._run_in_executor(self._camera.set_up)
+
+    async def tear_down(self):
+        """Free any resources held by the camera."""
+        await self._run_in_executor(self._camera.tear_down)
+
+    async def capture_image(self):
+        """Capture an image to the default storage_directory.
+
+        Raises:
+            CameraConnectionError: If there is an issue with contacting the
+                camera.
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+            ImageStorageError: If the image can be captured but cannot be
+                stored successfully.
+        """
+        await self._run_in_executor(self._camera.capture_image)
+
+    async def _run_in_executor(self, function):
+        """Run a blocking function in the executor and wait for it.
+
+        Args:
+            function: The blocking function to run.
+
+        Returns: The value returned by the function.
+        """
+        return await get_running_loop().run_in_executor(self._executor,
+                                                        function)
@@ -0,0 +1,439 @@
+"""A compact record of the images captured by a camera."""
+
+from bisect import bisect_right
+from collections.abc import Sequence
+from os.path import join
+
+CAPTURE_STATUS_CAPTURED = "captured"
+CAPTURE_STATUS_FAILED = "failed"
+CAPTURE_STATUS_SKIPPED = "skipped"
+CAPTURE_STATUS_EVICTED = "evicted"
+
+
+class CaptureLedger:
+    """Record the outcome of every capture in constant space per change.
+
+    Rather than storing a path for every image, the ledger stores a sequence
+    counter, the storage settings in use whenever they change and runs of
+    consecutive failed or skipped captures. Evicted images are stored
+    separately as strided runs, so evicting the oldest images one after
+    another, or every other image of a thinning pass, extends a single run.
+    Paths are generated on demand, so recording a capture costs O(1) time
+    and memory stays flat over arbitrarily long sessions.
+    """
+
+    def __init__(self, filename_width=8, first_sequence=1):
+        """Initialise the ledger.
+
+        Args:
+            filename_width: The number of digits in generated filenames.
+            first_sequence: The sequence number of the first capture.
+        """
+        self._filename_width = filename_width
+        self._first_sequence = first_sequence
+        self._next_sequence = first_sequence
+
+        self._segment_starts = []
+        self._segments = []
+
+        self._run_starts = []
+        self._runs = []
+
+        self._eviction_starts = []
+        self._evictions = []
+        self._last_eviction = None
+
+        self._status_counts = {CAPTURE_STATUS_CAPTURED: 0,
+                               CAPTURE_STATUS_FAILED: 0,
+                               CAPTURE_STATUS_SKIPPED: 0,
+                               CAPTURE_STATUS_EVICTED: 0}
+
+    def __len__(self):
+        """Return the number of captures recorded.
+
+        Returns: The number of captures recorded, whatever their status.
+        """
+        return self._next_sequence - self._first_sequence
+
+    @property
+    def first_sequence(self):
+        """Return the sequence number of the first capture.
+
+        Returns: The sequence number of the first capture.
+        """
+        return self._first_sequence
+
+    @property
+    def next_sequence(self):
+        """Return the sequence number of the next capture.
+
+        Returns: The sequence number of the next capture.
+        """
+        return self._next_sequence
+
+    def get_status_count(self, status):
+        """Return the number of captures recorded with the given status.
+
+        Args:
+            status: One of the CAPTURE_STATUS_* constants.
+
+        Returns: The number of captures recorded with the given status.
+        """
+        return self._status_counts[status]
+
+    def get_filename(self, sequence):
+        """Return the filename (without extension) for a sequence number.
+
+        Args:
+            sequence: The sequence number of the capture.
+
+        Returns: The filename (without extension) for the sequence number.
+        """
+        return str(sequence).rjust(self._filename_width, "0")
+
+    def get_next_filename(self):
+        """Return the filename of the next image that will be captured.
+
+        Returns: The filename of the next image that will be captured.
+        """
+        return self.get_filename(self._next_sequence)
+
+    def record_capture(self, storage_directory, file_extension):
+        """Record that the next image has been captured.
+
+        Args:
+            storage_directory: The directory the image was stored in (or None
+                if it was stored relative to the working directory).
+            file_extension: The file extension of the image (or None if the
+                image was not stored as a file of its own, such as one
+                appended to a SegmentFrameStore).
+
+        Returns: The path of the captured image (or None if it was not
+            stored as a file).
+        """
+        if (not self._segments or
+                self._segments[-1] != (storage_directory, file_extension)):
+            self._segment_starts.append(self._next_sequence)
+            self._segments.append((storage_directory, file_extension))
+
+        path = self._build_path(self._next_sequence,
+                                storage_directory,
+                                file_extension)
+        self._advance(CAPTURE_STATUS_CAPTURED)
+
+        return path
+
+    def record_failure(self):
+        """Record that the next image could not be captured or stored."""
+        self._add_to_run(CAPTURE_STATUS_FAILED)
+        self._advance(CAPTURE_STATUS_FAILED)
+
+    def record_skip(self):
+        """Record that the next image was captured but not kept."""
+        self._add_to_run(CAPTURE_STATUS_SKIPPED)
+        self._advance(CAPTURE_STATUS_SKIPPED)
+
+    def record_eviction(self, sequence):
+        """Record that a captured image has since been deleted.
+
+        An eviction that continues the stride of the previous one extends
+        its run, so a ring buffer of images, or a thinning pass, uses
+        constant memory.
+
+        Args:
+            sequence: The sequence number of the capture.
+
+        Raises:
+            IndexError: If no capture has been recorded with the sequence
+                number.
+        """
+        if self.get_status(sequence) != CAPTURE_STATUS_CAPTURED:
+            return
+
+        run = self._last_eviction
+
+        if (run is not None and sequence > run[0] and
+                (run[2] == 1 or sequence == run[0] + run[1] * run[2])):
+            if run[2] == 1:
+                run[1] = sequence - run[0]
+            run[2] += 1
+        else:
+            run = [sequence, 1, 1]
+            run_index = bisect_right(self._eviction_starts, sequence)
+            self._eviction_starts.insert(run_index, sequence)
+            self._evictions.insert(run_index, run)
+            self._last_eviction = run
+
+        self._status_counts[CAPTURE_STATUS_CAPTURED] -= 1
+        self._status_counts[CAPTURE_STATUS_EVICTED] += 1
+
+    def record_lost_image(self, sequence):
+        """Record that a capture recorded as captured was never stored.
+
+        This is for images handed to something that stores them later, such
+        as a WriteBehindStorage, whose writes then fail.
+
+        Args:
+            sequence: The sequence number of the capture.
+
+        Raises:
+            IndexError: If no capture has been recorded with the sequence
+                number.
+        """
+        if self.get_status(sequence) != CAPTURE_STATUS_CAPTURED:
+            return
+
+        run_index = bisect_right(self._run_starts, sequence)
+        run_end = sequence + 1
+
+        if (run_index < len(self._runs) and
+                self._run_starts[run_index] == run_end and
+                self._runs[run_index][1] == CAPTURE_STATUS_FAILED):
+            run_end = self._runs[run_index][0]
+            del self._run_starts[run_index]
+            del self._runs[run_index]
+
+        if (run_index > 0 and
+                self._runs[run_index - 1] == (sequence,
+                                              CAPTURE_STATUS_FAILED)):
+            self._runs[run_index - 1] = (run_end, CAPTURE_STATUS_FAILED)
+        else:
+            self._run_starts.insert(run_index, sequence)
+            self._runs.insert(run_index, (run_end, CAPTURE_STATUS_FAILED))
+
+        self._status_counts[CAPTURE_STATUS_CAPTURED] -= 1
+        self._status_counts[CAPTURE_STATUS_FAILED] += 1
+
+    def get_status(self, sequence):
+        """Return the status of a capture.
+
+        Args:
+            sequence: The sequence number of the capture.
+
+        Returns: One of the CAPTURE_STATUS_* constants.
+
+        Raises:
+            IndexError: If no capture has been recorded with the sequence
+                number.
+        """
+        self._check_sequence(sequence)
+
+        run_index = bisect_right(self._run_starts, sequence) - 1
+
+        if run_index >= 0:
+            run_end, status = self._runs[run_index]
+            if sequence < run_end:
+                return status
+
+        # Strided runs interleave, so every run starting at or before the
+        # sequence number may hold it.
+        for run_index in range(bisect_right(self._eviction_starts, sequence)):
+            run_start, stride, count = self._evictions[run_index]
+            offset = sequence - run_start
+            if offset % stride == 0 and offset // stride < count:
+                return CAPTURE_STATUS_EVICTED
+
+        return CAPTURE_STATUS_CAPTURED
+
+    def get_path(self, sequence):
+        """Return the path of a captured image.
+
+        Args:
+            sequence: The sequence number of the capture.
+
+        Returns: The path of the image (or None if it was not kept, was
+            evicted or was not stored as a file).
+
+        Raises:
+            IndexError: If no capture has been recorded with the sequence
+                number.
+        """
+        if self.get_status(sequence) != CAPTURE_STATUS_CAPTURED:
+            return None
+
+        segment_index = bisect_right(self._segment_starts, sequence) - 1
+        storage_directory, file_extension = self._segments[segment_index]
+
+        return self._build_path(sequence, storage_directory, file_extension)
+
+    def get_paths(self):
+        """Return a view of the paths of the images captured so far.
+
+        Returns: A CapturedImagePaths view, with None for any capture that
+            was not kept.
+        """
+        return CapturedImagePaths(self,
+                                  self._first_sequence,
+                                  self._next_sequence)
+
+    def get_state(self):
+        """Return the state of the ledger so that it can be saved.
+
+        Returns: A dictionary of JSON-serialisable values, whose size depends
+            on the number of changes of storage settings and runs of
+            uncaptured images rather than on the number of captures.
+        """
+        return {"filename_width": self._filename_width,
+                "first_sequence": self._first_sequence,
+                "next_sequence": self._next_sequence,
+                "segment_starts": self._segment_starts[:],
+                "segments": [list(segment) for segment in self._segments],
+                "run_starts": self._run_starts[:],
+                "runs": [list(run) for run in self._runs],
+                "evictions": [list(run) for run in self._evictions],
+                "status_counts": dict(self._status_counts)}
+
+    def set_state(self, state):
+        """Replace the contents of the ledger with a saved state.
+
+        Args:
+            state: A dictionary returned by get_state.
+        """
+        self._filename_width = state["filename_width"]
+        self._first_sequence = state["first_sequence"]
+        self._next_sequence = state["next_sequence"]
+        self._segment_starts = list(state["segment_starts"])
+        self._segments = [tuple(segment) for segment in state["segments"]]
+        self._run_starts = list(state["run_starts"])
+        self._runs = [tuple(run) for run in state["runs"]]
+        # Older states hold evictions among the runs of uncaptured images
+        # instead, which get_status still reads.
+        self._evictions = [list(run) for run in state.get("evictions", [])]
+        self._eviction_starts = [run[0] for run in self._evictions]
+        self._last_eviction = None
+        # States saved before evictions were recorded have no count for
+        # them.
+        self._status_counts[CAPTURE_STATUS_EVICTED] = 0
+        self._status_counts.update(state["status_counts"])
+
+    def _advance(self, status):
+        """Move on to the next sequence number.
+
+        Args:
+            status: The status of the capture being recorded.
+        """
+        self._status_counts[status] += 1
+        self._next_sequence += 1
+
+    def _add_to_run(self, status):
+        """Add the next sequence number to a run of uncaptured images.
+
+        Args:
+            status: The status of the capture being recorded.
+        """
+        if self._runs:
+            run_end, run_status = self._runs[-1]
+            if run_end == self._next_sequence and run_status == status:
+                self._runs[-1] = (run_end + 1, status)
+                return
+
+        self._run_starts.append(self._next_sequence)
+        self._runs.append((self._next_sequence + 1, status))
+
+    def _build_path(self, sequence, storage_directory, file_extension):
+        """Return the path of an image.
+
+        Args:
+            sequence: The sequence number of the capture.
+            storage_directory: The directory the image was stored in.
+            file_extension: The file extension of the image (or None).
+
+        Returns: The path of the image (or None if there is no file
+            extension).
+        """
+        if file_extension is None:
+            return None
+
+        filename = self.get_filename(sequence) + "." + file_extension
+
+        if storage_directory is None:
+            return filename
+
+        return join(storage_directory, filename)
+
+    def _check_sequence(self, sequence):
+        """Make sure that a capture has been recorded with a sequence number.
+
+        Args:
+            sequence: The sequence number of the capture.
+
+        Raises:
+            IndexError: If no capture has been recorded with the sequence
+                number.
+        """
+        if not self._first_sequence <= sequence < self._next_sequence:
+            raise IndexError("No capture recorded with sequence number " +
+                             str(sequence) + ".")
+
+
+class CapturedImagePaths(Sequence):
+    """A read-only, lazily generated list of captured image paths.
+
+    The view covers the captures recorded when it was created, so later
+    captures do not change it. Slicing returns a list, which allows long
+    sessions to be paged through without generating every path.
+    """
+
+    def __init__(self, ledger, start_sequence, stop_sequence):
+        """Initialise the view.
+
+        Args:
+            ledger: The CaptureLedger the paths are generated from.
+            start_sequence: The sequence number of the first path.
+            stop_sequence: The sequence number after the last path.
+        """
+        self._ledger = ledger
+        self._start_sequence = start_sequence
+        self._stop_sequence = stop_sequence
+
+    def __len__(self):
+        """Return the number of paths in the view.
+
+        Returns: The number of paths in the view.
+        """
+        return self._stop_sequence - self._start_sequence
+
+    def __getitem__(self, index):
+        """Return a path or a list of paths from the view.
+
+        Args:
+            index: An integer index or a slice.
+
+        Returns: A path (or None), or a list of them if index is a slice.
+
+        Raises:
+            IndexError: If index is out of range.
+        """
+        if isinstance(index, slice):
+            return [self._ledger.get_path(self._start_sequence + position)
+                    for position in range(*index.indices(len(self)))]
+
+        if index < 0:
+            index += len(self)
+
+        if not 0 <= index < len(self):
+            raise IndexError("captured image path index out of range")
+
+        return self._ledger.get_path(self._start_sequence + index)
+
+    def __eq__(self, other):
+        """Return whether the view holds the same paths as another sequence.
+
+        Args:
+            other: The sequence to compare with.
+
+        Returns: A boolean specifying whether the paths are the same.
+        """
+        if not isinstance(other, (list, tuple, CapturedImagePaths)):
+            return NotImplemented
+
+        return len(self) == len(other) and list(self) == list(other)
+
+    def __repr__(self):
+        """Return a representation of the view.
+
+        Returns: A representation of the view.
+        """
+        return ("CapturedImagePaths(" + str(len(self)) + " paths, " +
+                "sequences " + str(self._start_sequence) + " to " +
+                str(self._stop_sequence - 1) + ")")
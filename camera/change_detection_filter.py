@@ -0,0 +1,192 @@
+"""A frame filter that skips images which have not changed noticeably."""
+
+import numpy
+
+_LUMA_WEIGHTS = numpy.array([0.299, 0.587, 0.114], dtype=numpy.float32)
+
+
+def reduce_pixels(pixels, reduced_size):
+    """Convert an image into a small greyscale array for comparison.
+
+    The image is converted to luminance and downscaled by averaging whole
+    blocks of pixels, using vectorised NumPy operations throughout.
+
+    Args:
+        pixels: The image as an array-like of shape (height, width) or
+            (height, width, channels). Integer images are assumed to be 8-bit.
+        reduced_size: The (width, height) to reduce the image to. Images
+            smaller than this are not upscaled.
+
+    Returns: A float32 array with values from 0 to 1.
+    """
+    pixels = numpy.asarray(pixels)
+
+    if numpy.issubdtype(pixels.dtype, numpy.integer):
+        scale = 1 / 255
+    else:
+        scale = 1
+
+    if pixels.ndim == 3:
+        channels = pixels.shape[2]
+        if channels >= 3:
+            luminance = pixels[..., :3].astype(numpy.float32) @ _LUMA_WEIGHTS
+        else:
+            luminance = pixels[..., 0].astype(numpy.float32)
+    else:
+        luminance = pixels.astype(numpy.float32)
+
+    height, width = luminance.shape
+    reduced_width = min(reduced_size[0], width)
+    reduced_height = min(reduced_size[1], height)
+    block_width = width // reduced_width
+    block_height = height // reduced_height
+
+    blocks = luminance[:reduced_height * block_height,
+                       :reduced_width * block_width].reshape(reduced_height,
+                                                             block_height,
+                                                             reduced_width,
+                                                             block_width)
+
+    return blocks.mean(axis=(1, 3)) * scale
+
+
+class ChangeDetectionFilter:
+    """Keep only frames that differ noticeably from the last kept frame.
+
+    Each frame is reduced to a small greyscale array and compared with the
+    reduced copy of the last kept frame. The frame is kept if the mean
+    absolute difference over the region mask reaches the threshold, or if
+    max_gap frames have passed since a frame was last kept.
+    """
+
+    def __init__(self,
+                 threshold=0.02,
+                 reduced_size=(64, 48),
+                 region_mask=None,
+                 max_gap=None):
+        """Initialise the filter.
+
+        Args:
+            threshold: The mean absolute difference (from 0 to 1) at which a
+                frame counts as changed.
+            reduced_size: The (width, height) frames are reduced to before
+                being compared.
+            region_mask: A boolean array-like of shape (height, width) at the
+                reduced size marking the pixels to compare (or None to
+                compare every pixel).
+            max_gap: The maximum number of frames in a row that may be
+                skipped before a frame is kept regardless (or None for no
+                limit).
+
+        Raises:
+            ValueError: If threshold is negative or if max_gap is not greater
+                than 0 or None.
+        """
+        if threshold < 0:
+            raise ValueError("threshold must not be negative.")
+        if max_gap is not None and max_gap <= 0:
+            raise ValueError("max_gap must be greater than 0.")
+
+        self._threshold = threshold
+        self._reduced_size = reduced_size
+        self._max_gap = max_gap
+
+        if region_mask is None:
+            self._region_mask = None
+        else:
+            self._region_mask = numpy.asarray(region_mask, dtype=bool)
+
+        self._reference = None
+        self._skipped_since_kept = 0
+        self._last_difference = None
+        self._kept_frames = 0
+        self._skipped_frames = 0
+
+    @property
+    def reduced_size(self):
+        """Return the (width, height) frames are reduced to for comparison.
+
+        Returns: The (width, height) frames are reduced to for comparison.
+        """
+        return self._reduced_size
+
+    @property
+    def last_difference(self):
+        """Return the difference measured for the most recent frame.
+
+        Returns: The mean absolute difference (from 0 to 1) between the most
+            recent frame and the frame it was compared with (or None if no
+            comparison has been made).
+        """
+        return self._last_difference
+
+    @property
+    def kept_frames(self):
+        """Return the number of frames that have been kept.
+
+        Returns: The number of frames that have been kept.
+        """
+        return self._kept_frames
+
+    @property
+    def skipped_frames(self):
+        """Return the number of frames that have been skipped.
+
+        Returns: The number of frames that have been skipped.
+        """
+        return self._skipped_frames
+
+    def reset(self):
+        """Forget the last kept frame so that the next frame is kept."""
+        self._reference = None
+        self._skipped_since_kept = 0
+        self._last_difference = None
+
+    def should_keep(self, pixels):
+        """Return whether a frame should be stored.
+
+        Args:
+            pixels: The frame as an array-like of shape (height, width) or
+                (height, width, channels).
+
+        Returns: A boolean specifying whether the frame should be stored.
+        """
+        reduced = reduce_pixels(pixels, self._reduced_size)
+
+        if self._reference is None or self._reference.shape != reduced.shape:
+            self._last_difference = None
+            return self._keep(reduced)
+
+        difference = numpy.abs(reduced - self._reference)
+
+        if self._region_mask is not None:
+            difference = difference[self._region_mask]
+
+        if difference.size == 0:
+            self._last_difference = 0.0
+        else:
+            self._last_difference = float(difference.mean())
+
+        if (self._last_difference >= self._threshold or
+                (self._max_gap is not None and
+                 self._skipped_since_kept >= self._max_gap)):
+            return self._keep(reduced)
+
+        self._skipped_since_kept += 1
+        self._skipped_frames += 1
+
+        return False
+
+    def _keep(self, reduced):
+        """Make a frame the new reference and count it as kept.
+
+        Args:
+            reduced: The reduced frame.
+
+        Returns: True.
+        """
+        self._reference = reduced
+        self._skipped_since_kept = 0
+        self._kept_frames += 1
+
+        return True
@@ -14,3 +14,8 @@ class CameraCaptureError(Exception):
 class ImageStorageError(Exception):
     """Image could not be stored."""
     pass
+
+
+class CameraTimeoutError(CameraCaptureError):
+    """Camera did not finish capturing the image in time."""
+    pass
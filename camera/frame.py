@@ -0,0 +1,225 @@
+"""Reusable in-memory frames for capturing without touching the disk."""
+
+from io import BytesIO
+from threading import Lock
+
+FRAME_FORMAT_RGB = "rgb"
+
+
+class Frame:
+    """An image held in a reusable buffer, along with its metadata.
+
+    Frames come from a FramePool and should be released back to it once
+    they are no longer needed, either by calling release or by using the
+    frame as a context manager. The data, and any arrays made from it, must
+    not be used after the frame has been released.
+
+    Attributes:
+        camera_name: The name of the camera that captured the frame.
+        timestamp: The monotonic time at which the capture started.
+        width: The width of the image in pixels (or 0 if it is encoded).
+        height: The height of the image in pixels (or 0 if it is encoded).
+        pixel_format: FRAME_FORMAT_RGB for raw 8-bit RGB pixels, or the file
+            extension of an encoded image.
+        stride: The number of bytes from the start of one row of pixels to
+            the next, which may include padding.
+        length: The number of bytes of the buffer holding the image.
+    """
+
+    def __init__(self, pool, capacity):
+        """Initialise the frame.
+
+        Args:
+            pool: The FramePool the frame belongs to.
+            capacity: The size (in bytes) of the buffer.
+        """
+        self._pool = pool
+        self._buffer = bytearray(capacity)
+        self._view = memoryview(self._buffer)
+
+        self.camera_name = None
+        self.timestamp = None
+        self.width = 0
+        self.height = 0
+        self.pixel_format = None
+        self.stride = 0
+        self.length = 0
+
+    def __enter__(self):
+        """Return the frame for use in a with statement.
+
+        Returns: The frame.
+        """
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        """Release the frame at the end of a with statement."""
+        self.release()
+
+    @property
+    def capacity(self):
+        """Return the size (in bytes) of the buffer.
+
+        Returns: The size (in bytes) of the buffer.
+        """
+        return len(self._buffer)
+
+    @property
+    def buffer(self):
+        """Return a writable view of the whole buffer.
+
+        Returns: A memoryview of the buffer.
+        """
+        return self._view
+
+    @property
+    def data(self):
+        """Return a read-only view of the image.
+
+        Returns: A memoryview of the first length bytes of the buffer.
+        """
+        return self._view[:self.length].toreadonly()
+
+    def set_metadata(self,
+                     camera_name,
+                     timestamp,
+                     width,
+                     height,
+                     pixel_format,
+                     length,
+                     stride=None):
+        """Describe the image that has been written into the buffer.
+
+        Args:
+            camera_name: The name of the camera that captured the frame.
+            timestamp: The monotonic time at which the capture started.
+            width: The width of the image in pixels (or 0 if it is encoded).
+            height: The height of the image in pixels (or 0 if it is
+                encoded).
+            pixel_format: FRAME_FORMAT_RGB or the file extension of an
+                encoded image.
+            length: The number of bytes of the buffer holding the image.
+            stride: The number of bytes from the start of one row to the
+                next (or None for rows without padding).
+        """
+        self.camera_name = camera_name
+        self.timestamp = timestamp
+        self.width = width
+        self.height = height
+        self.pixel_format = pixel_format
+        self.length = length
+
+        if stride is None:
+            stride = width * 3 if pixel_format == FRAME_FORMAT_RGB else 0
+        self.stride = stride
+
+    def as_array(self):
+        """Return a NumPy view of the image without copying it.
+
+        Returns: A uint8 array of shape (height, width, 3) for RGB frames, or
+            a one-dimensional uint8 array of the encoded image otherwise.
+        """
+        # NumPy is only needed when frames are used as arrays.
+        import numpy
+
+        if self.pixel_format != FRAME_FORMAT_RGB:
+            return numpy.frombuffer(self._buffer,
+                                    dtype=numpy.uint8,
+                                    count=self.length)
+
+        rows = self.length // self.stride
+        pixels = numpy.frombuffer(self._buffer,
+                                  dtype=numpy.uint8,
+                                  count=rows * self.stride)
+
+        return pixels.reshape(rows, self.stride)[
+            :self.height, :self.width * 3].reshape(self.height, self.width, 3)
+
+    def release(self):
+        """Return the frame to its pool so that its buffer can be reused."""
+        self._pool.release(self)
+
+
+class FramePool:
+    """A pool of frames whose buffers are reused from one capture to the next.
+
+    Once the pool holds a frame large enough for the images being captured,
+    acquiring and releasing frames allocates no new buffers.
+    """
+
+    def __init__(self, max_free_frames=4):
+        """Initialise the pool.
+
+        Args:
+            max_free_frames: The maximum number of released frames kept for
+                reuse.
+        """
+        self._max_free_frames = max_free_frames
+        self._free_frames = []
+        self._lock = Lock()
+        self._allocated_frames = 0
+
+    @property
+    def allocated_frames(self):
+        """Return the number of frames the pool has had to allocate.
+
+        Returns: The number of frames the pool has had to allocate.
+        """
+        return self._allocated_frames
+
+    @property
+    def free_frames(self):
+        """Return the number of released frames waiting to be reused.
+
+        Returns: The number of released frames waiting to be reused.
+        """
+        return len(self._free_frames)
+
+    def acquire(self, size):
+        """Return a frame with a buffer of at least the given size.
+
+        Args:
+            size: The size (in bytes) the buffer must hold.
+
+        Returns: A Frame, which is reused from the pool if possible.
+        """
+        with self._lock:
+            for index in range(len(self._free_frames) - 1, -1, -1):
+                if self._free_frames[index].capacity >= size:
+                    return self._free_frames.pop(index)
+
+            self._allocated_frames += 1
+
+        return Frame(self, size)
+
+    def release(self, frame):
+        """Return a frame to the pool.
+
+        Args:
+            frame: A Frame acquired from this pool.
+        """
+        with self._lock:
+            if (len(self._free_frames) < self._max_free_frames and
+                    frame not in self._free_frames):
+                self._free_frames.append(frame)
+
+
+def decode_pixels(image):
+    """Decode an encoded image into RGB pixels.
+
+    Args:
+        image: The encoded image as a bytes-like object, or the path of an
+            image file.
+
+    Returns: A NumPy array of shape (height, width, 3).
+    """
+    # Pillow and NumPy are only needed when a frame filter or thumbnail
+    # generator is set.
+    import numpy
+    from PIL import Image
+
+    if not isinstance(image, str):
+        image = BytesIO(image)
+
+    with Image.open(image) as opened_image:
+        return numpy.asarray(opened_image.convert("RGB"))
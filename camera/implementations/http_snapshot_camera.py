@@ -0,0 +1,527 @@
+"""An interface for network cameras that serve snapshots over HTTP."""
+
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from os import remove
+from threading import BoundedSemaphore, Lock
+from time import monotonic
+from urllib.parse import urlsplit
+
+from camera.abstract_camera import AbstractCamera
+from camera.exceptions import (CameraCaptureError, CameraConnectionError,
+                               ImageStorageError)
+from camera.frame import decode_pixels
+
+HTTP_OK = 200
+HTTP_NOT_MODIFIED = 304
+
+
+class HTTPConnectionPool:
+    """A thread-safe pool of keep-alive connections shared between cameras.
+
+    Connections are kept open between requests and reused for the next
+    request to the same host, so each snapshot avoids a new TCP (and TLS)
+    handshake. The number of connections open to each host at once is
+    limited, so cameras that share a host (such as the channels of a
+    network video recorder) do not overwhelm it when they capture
+    concurrently.
+    """
+
+    def __init__(self, max_connections_per_host=4, timeout=10):
+        """Initialise the pool.
+
+        Args:
+            max_connections_per_host: The maximum number of connections open
+                to each host at once.
+            timeout: The time (in seconds) to wait for a connection, and for
+                each network operation on it.
+
+        Raises:
+            ValueError: If max_connections_per_host is not greater than 0.
+        """
+        if max_connections_per_host <= 0:
+            raise ValueError("max_connections_per_host must be greater than "
+                             "0.")
+
+        self._max_connections_per_host = max_connections_per_host
+        self._timeout = timeout
+        self._lock = Lock()
+        self._idle_connections = {}
+        self._host_slots = {}
+        self._created_connections = 0
+
+    @property
+    def created_connections(self):
+        """Return the number of connections the pool has had to open.
+
+        Returns: The number of connections the pool has had to open.
+        """
+        return self._created_connections
+
+    @property
+    def idle_connections(self):
+        """Return the number of open connections waiting to be reused.
+
+        Returns: The number of open connections waiting to be reused.
+        """
+        with self._lock:
+            return sum(len(connections)
+                       for connections in self._idle_connections.values())
+
+    def acquire(self, scheme, host, port):
+        """Return a connection to a host, reusing an idle one if possible.
+
+        Args:
+            scheme: "http" or "https".
+            host: The host name.
+            port: The port (or None for the default port of the scheme).
+
+        Returns: A (connection, reused) tuple, where reused is whether the
+            connection has been used for an earlier request.
+
+        Raises:
+            CameraConnectionError: If no connection to the host becomes
+                available within the timeout.
+        """
+        key = (scheme, host, port)
+
+        with self._lock:
+            host_slots = self._host_slots.get(key)
+
+            if host_slots is None:
+                host_slots = BoundedSemaphore(self._max_connections_per_host)
+                self._host_slots[key] = host_slots
+
+        if not host_slots.acquire(timeout=self._timeout):
+            raise CameraConnectionError("No connection to " + host +
+                                        " became available.")
+
+        with self._lock:
+            idle_connections = self._idle_connections.get(key)
+
+            if idle_connections:
+                return idle_connections.pop(), True
+
+            self._created_connections += 1
+
+        if scheme == "https":
+            connection_class = HTTPSConnection
+        else:
+            connection_class = HTTPConnection
+
+        return connection_class(host, port, timeout=self._timeout), False
+
+    def release(self, scheme, host, port, connection, reusable=True):
+        """Return a connection to the pool.
+
+        Args:
+            scheme: The scheme the connection was acquired with.
+            host: The host the connection was acquired with.
+            port: The port the connection was acquired with.
+            connection: The connection.
+            reusable: Whether the connection can be used for another request,
+                which requires the last response to have been read in full.
+        """
+        key = (scheme, host, port)
+
+        with self._lock:
+            host_slots = self._host_slots[key]
+
+            if reusable:
+                self._idle_connections.setdefault(key, []).append(connection)
+
+        if not reusable:
+            connection.close()
+
+        host_slots.release()
+
+    def close(self):
+        """Close every idle connection."""
+        with self._lock:
+            idle_connections = self._idle_connections
+            self._idle_connections = {}
+
+        for connections in idle_connections.values():
+            for connection in connections:
+                connection.close()
+
+
+DEFAULT_CONNECTION_POOL = HTTPConnectionPool()
+
+
+class HTTPSnapshotCamera(AbstractCamera):
+    """A class representing a network camera with an HTTP snapshot URL.
+
+    Snapshots are fetched over keep-alive connections from a connection
+    pool, which is shared between every camera by default, and the body of
+    each response is streamed straight to the next image path rather than
+    being held in memory.
+
+    When conditional requests are enabled, the ETag and Last-Modified
+    headers of the last snapshot are sent back to the camera, and an image
+    the camera reports as unchanged (304 Not Modified) is recorded as
+    skipped instead of being downloaded and stored again.
+    """
+
+    def __init__(self,
+                 url,
+                 name="HTTP Snapshot Camera",
+                 storage_directory=None,
+                 file_extension="jpeg",
+                 images_stored_locally=False,
+                 connection_pool=None,
+                 headers=None,
+                 conditional=True,
+                 chunk_size=65536):
+        """Initialise the HTTP snapshot camera.
+
+        Args:
+            url: The http or https URL that serves the latest snapshot.
+            name: The name or reference of this camera.
+            storage_directory: The directory that images will be stored to.
+            file_extension: The file extension to be used on this camera.
+            images_stored_locally: Whether the images are stored on a locally
+                accessible device or not.
+            connection_pool: The HTTPConnectionPool to fetch snapshots with
+                (or None for DEFAULT_CONNECTION_POOL).
+            headers: A dictionary of extra headers to send with every
+                request, such as Authorization.
+            conditional: Whether to send conditional requests so that
+                unchanged snapshots are not downloaded again.
+            chunk_size: The size (in bytes) of the chunks the body of each
+                response is streamed in.
+
+        Raises:
+            ValueError: If the URL is not an http or https URL.
+        """
+        super().__init__(name,
+                         storage_directory,
+                         file_extension,
+                         images_stored_locally)
+
+        parts = urlsplit(url)
+
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("url must be an http or https URL.")
+
+        self._url = url
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._target = parts.path or "/"
+
+        if parts.query:
+            self._target += "?" + parts.query
+
+        self._connection_pool = connection_pool
+        self._headers = dict(headers or {})
+        self._conditional = conditional
+        self._chunk = memoryview(bytearray(chunk_size))
+        self._etag = None
+        self._last_modified = None
+
+    @property
+    def url(self):
+        """Return the URL that snapshots are fetched from.
+
+        Returns: The URL that snapshots are fetched from.
+        """
+        return self._url
+
+    @property
+    def connection_pool(self):
+        """Return the pool that connections are taken from.
+
+        Returns: The HTTPConnectionPool used by this camera.
+        """
+        if self._connection_pool is None:
+            return DEFAULT_CONNECTION_POOL
+
+        return self._connection_pool
+
+    def set_up(self):
+        """Set up the camera so that it is ready to capture an image."""
+        pass
+
+    def tear_down(self):
+        """Free any resources held by the camera.
+
+        Pooled connections are shared with other cameras, so they are left
+        open; close the pool to close them.
+        """
+        pass
+
+    def capture_image(self):
+        """Capture an image to the default storage_directory.
+
+        Raises:
+            CameraConnectionError: If there is an issue with contacting the
+                camera.
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+            ImageStorageError: If the image can be captured but cannot be
+                stored successfully.
+        """
+        in_memory = (self.stores_images_in_memory or
+                     self.frame_filter is not None or
+                     self.thumbnail_generator is not None)
+
+        if in_memory:
+            handle_body = self._read_body
+        else:
+            handle_body = self._stream_body_to_file
+
+        try:
+            image_data, validators = self._fetch(handle_body,
+                                                 self._conditional)
+        except (CameraConnectionError,
+                CameraCaptureError,
+                ImageStorageError):
+            self._record_failed_image()
+            raise
+
+        if image_data is None:
+            self._record_skipped_image()
+            return
+
+        if not in_memory:
+            self._record_captured_image()
+        else:
+            filename = self.get_next_filename()
+
+            if not (self._should_store_image(
+                    lambda: decode_pixels(image_data)) and
+                    self._store_image(image_data)):
+                return
+
+            # The thumbnail generator decodes the snapshot itself.
+            self._submit_thumbnail(filename, image_data)
+
+        # The validators are only kept once the snapshot has been stored, so
+        # a snapshot that failed to store is downloaded again rather than
+        # being reported as unchanged.
+        if validators is not None:
+            self._etag, self._last_modified = validators
+
+    def capture_to_buffer(self):
+        """Capture an image into memory without storing it.
+
+        Returns: The encoded image as bytes.
+
+        Raises:
+            CameraConnectionError: If there is an issue with contacting the
+                camera.
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+        """
+        return self._fetch(self._read_body, False)[0]
+
+    def capture_to_frame(self):
+        """Capture an encoded image into a reusable in-memory frame.
+
+        When the camera sends a Content-Length, the body is read straight
+        into the buffer of a pooled frame.
+
+        Returns: A Frame holding the encoded image.
+
+        Raises:
+            CameraConnectionError: If there is an issue with contacting the
+                camera.
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+        """
+        timestamp = monotonic()
+        frame = self._fetch(self._read_body_to_frame, False)[0]
+        frame.set_metadata(str(self),
+                           timestamp,
+                           0,
+                           0,
+                           self.file_extension,
+                           frame.length)
+
+        return frame
+
+    def _fetch(self, handle_body, conditional, retry=True):
+        """Request a snapshot and hand the body of the response on.
+
+        A request that fails on a reused keep-alive connection, which the
+        camera may have closed while it was idle, is retried once on a new
+        connection.
+
+        Args:
+            handle_body: A function that takes a successful response and
+                consumes its body, returning the result of the fetch.
+            conditional: Whether to make the request conditional on the
+                snapshot having changed.
+            retry: Whether to retry a request that fails on a reused
+                connection.
+
+        Returns: A (result, validators) tuple, where result is the result of
+            handle_body (or None if the snapshot has not changed since the
+            last one) and validators is an (ETag, Last-Modified) tuple of
+            the snapshot (or None if the request was not conditional or the
+            snapshot has not changed).
+
+        Raises:
+            CameraConnectionError: If the camera cannot be contacted.
+            CameraCaptureError: If the camera does not return a snapshot.
+            ImageStorageError: If handle_body cannot store the snapshot.
+        """
+        pool = self.connection_pool
+        connection, reused = pool.acquire(self._scheme, self._host, self._port)
+        reusable = False
+
+        try:
+            try:
+                connection.request("GET",
+                                   self._target,
+                                   headers=self._get_request_headers(
+                                       conditional))
+                response = connection.getresponse()
+            except (OSError, HTTPException) as exc:
+                if reused and retry:
+                    pool.release(self._scheme, self._host, self._port,
+                                 connection, False)
+                    connection = None
+                    return self._fetch(handle_body, conditional, False)
+                raise CameraConnectionError from exc
+
+            try:
+                validators = None
+
+                if response.status == HTTP_NOT_MODIFIED:
+                    response.read()
+                    result = None
+                elif response.status == HTTP_OK:
+                    result = handle_body(response)
+
+                    if conditional:
+                        validators = (response.getheader("ETag"),
+                                      response.getheader("Last-Modified"))
+                else:
+                    response.read()
+                    reusable = not response.will_close
+                    raise CameraCaptureError(
+                        "Snapshot request failed with status " +
+                        str(response.status) + ".")
+            except (OSError, HTTPException) as exc:
+                reusable = False
+                raise CameraConnectionError from exc
+
+            reusable = not response.will_close
+
+            return result, validators
+        finally:
+            if connection is not None:
+                pool.release(self._scheme, self._host, self._port,
+                             connection, reusable)
+
+    def _get_request_headers(self, conditional):
+        """Return the headers to send with a snapshot request.
+
+        Args:
+            conditional: Whether to make the request conditional on the
+                snapshot having changed.
+
+        Returns: A dictionary of headers.
+        """
+        headers = dict(self._headers)
+
+        if conditional:
+            if self._etag is not None:
+                headers["If-None-Match"] = self._etag
+            if self._last_modified is not None:
+                headers["If-Modified-Since"] = self._last_modified
+
+        return headers
+
+    def _read_body(self, response):
+        """Read the body of a response into memory.
+
+        Args:
+            response: An http.client.HTTPResponse.
+
+        Returns: The body as bytes.
+        """
+        return response.read()
+
+    def _read_body_to_frame(self, response):
+        """Read the body of a response into a pooled frame.
+
+        Args:
+            response: An http.client.HTTPResponse.
+
+        Returns: A Frame whose length is the size of the body.
+        """
+        if response.length is None:
+            image_data = response.read()
+            frame = self._get_frame_pool().acquire(len(image_data))
+            frame.buffer[:len(image_data)] = image_data
+            frame.length = len(image_data)
+            return frame
+
+        length = response.length
+        frame = self._get_frame_pool().acquire(length)
+        position = 0
+
+        try:
+            while position < length:
+                read = response.readinto(frame.buffer[position:length])
+                if not read:
+                    raise CameraCaptureError("Snapshot ended early.")
+                position += read
+        except BaseException:
+            frame.release()
+            raise
+
+        frame.length = length
+
+        return frame
+
+    def _stream_body_to_file(self, response):
+        """Write the body of a response to the next image path in chunks.
+
+        Args:
+            response: An http.client.HTTPResponse.
+
+        Returns: The path the image was written to.
+
+        Raises:
+            ImageStorageError: If the image cannot be written.
+        """
+        full_path = self.get_next_image_path()
+        chunk = self._chunk
+
+        try:
+            image_file = open(full_path, "wb")
+        except OSError as exc:
+            raise ImageStorageError from exc
+
+        with image_file:
+            try:
+                while True:
+                    read = response.readinto(chunk)
+                    if not read:
+                        break
+
+                    try:
+                        image_file.write(chunk[:read])
+                    except OSError as exc:
+                        raise ImageStorageError from exc
+            except BaseException:
+                image_file.close()
+                _remove_quietly(full_path)
+                raise
+
+        return full_path
+
+
+def _remove_quietly(path):
+    """Remove a partly written file, ignoring any error.
+
+    Args:
+        path: The path of the file.
+    """
+    try:
+        remove(path)
+    except OSError:
+        pass
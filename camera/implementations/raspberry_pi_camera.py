@@ -1,20 +1,79 @@
 """An interface for using the camera module on a Raspberry Pi."""
 
-from os.path import join
+from io import BytesIO
+from time import monotonic
 
 from camera.abstract_camera import AbstractCamera
 from camera.exceptions import CameraCaptureError
-from picamera import PiCamera, PiCameraError
+from camera.frame import FRAME_FORMAT_RGB
+
+# The continuous capture holds splitter port 0 of the video port, so raw
+# captures use another port to run alongside it.
+RAW_SPLITTER_PORT = 1
+
+
+def _get_padded_size(width, height):
+    """Return the size of a raw capture, including the camera's padding.
+
+    Args:
+        width: The width of the image in pixels.
+        height: The height of the image in pixels.
+
+    Returns: The (width, height) padded to a multiple of 32 by 16 pixels.
+    """
+    return (width + 31) // 32 * 32, (height + 15) // 16 * 16
+
+
+class _BufferWriter:
+    """A file-like object that writes into a preallocated buffer."""
+
+    def __init__(self, buffer):
+        """Initialise the writer.
+
+        Args:
+            buffer: A writable memoryview to write into.
+        """
+        self._buffer = buffer
+        self.position = 0
+
+    def write(self, data):
+        """Copy data into the buffer after anything already written.
+
+        Args:
+            data: A bytes-like object.
+
+        Returns: The number of bytes written.
+        """
+        length = len(data)
+        self._buffer[self.position:self.position + length] = data
+        self.position += length
+
+        return length
+
+    def flush(self):
+        """Do nothing, as the data is already in the buffer."""
+        pass
 
 
 class RaspberryPiCamera(AbstractCamera):
-    """A class representing the Raspberry Pi camera module."""
+    """A class representing the Raspberry Pi camera module.
+
+    The picamera package is imported, and the camera module opened, by
+    set_up (or the first capture) rather than on construction, so cameras
+    can be created on machines without the camera module attached.
+
+    In continuous mode the sensor keeps streaming through the video port
+    between captures, avoiding the mode switch and exposure settling that a
+    still-port capture performs for every frame.
+    """
 
     def __init__(self,
                  name="Raspberry Pi Camera",
                  storage_directory=None,
                  file_extension="jpeg",
-                 images_stored_locally=True):
+                 images_stored_locally=True,
+                 continuous=False,
+                 filter_resolution=(128, 96)):
         """Initialise the Raspberry Pi camera module.
 
         Args:
@@ -23,22 +82,60 @@ class RaspberryPiCamera(AbstractCamera):
             file_extension: The file extension to be used on this camera.
             images_stored_locally: Whether the images are stored on a locally
                 accessible device or not.
+            continuous: Whether to keep the sensor streaming between captures
+                rather than performing a full still capture for every image.
+            filter_resolution: The (width, height) of the low resolution
+                image captured for the frame filter, if one is set.
         """
         super().__init__(name,
                          storage_directory,
                          file_extension,
                          images_stored_locally)
-        self._captured_image_paths = []
-        
-        self._camera_handle = PiCamera()
+
+        self._continuous = continuous
+        self._filter_resolution = filter_resolution
+        self._continuous_stream = None
+        self._continuous_captures = None
+
+        self._camera_handle = None
+
+    @property
+    def continuous(self):
+        """Return whether the sensor keeps streaming between captures.
+
+        Returns: A boolean specifying whether the sensor keeps streaming
+            between captures.
+        """
+        return self._continuous
 
     def set_up(self):
-        """Set up the camera so that it is ready to capture an image."""
-        pass
+        """Set up the camera so that it is ready to capture an image.
+
+        The camera module is opened again if it was closed by tear_down.
+        """
+        if self._camera_handle is None or self._camera_handle.closed:
+            # picamera is only importable on a Raspberry Pi, so it is
+            # imported when the camera is first used.
+            from picamera import PiCamera
+
+            self._camera_handle = PiCamera()
+
+        if self._continuous and self._continuous_captures is None:
+            self._continuous_stream = BytesIO()
+            self._continuous_captures = self._camera_handle.capture_continuous(
+                self._continuous_stream,
+                format=self.file_extension,
+                use_video_port=True)
 
     def tear_down(self):
         """Free any resources held by the camera."""
-        self._camera_handle.close()
+        if self._continuous_captures is not None:
+            self._continuous_captures.close()
+            self._continuous_captures = None
+            self._continuous_stream = None
+
+        if self._camera_handle is not None:
+            self._camera_handle.close()
 
     def capture_image(self):
         """Capture an image to the default storage_directory.
@@ -51,31 +148,148 @@ class RaspberryPiCamera(AbstractCamera):
             ImageStorageError: If the image can be captured but cannot be
                 stored successfully.
         """
+        PiCameraError = self._get_camera_error()
+
         try:
-            new_image_filename = (self.get_next_filename() +
-                                  "." +
-                                  self.file_extension)
+            if not self._should_store_image(self._get_pixels):
+                return
+
+            filename = self.get_next_filename()
+
+            # The filter pixels are captured at a low resolution, so
+            # thumbnails are built from the stored image instead.
+            if self.stores_images_in_memory or self._continuous:
+                image_data = self._capture_to_memory()
+
+                if self._store_image(image_data):
+                    self._submit_thumbnail(filename, image_data)
+            else:
+                image_path = self.get_next_image_path()
+                self._camera_handle.capture(image_path,
+                                            format=self.file_extension)
+                self._record_captured_image()
+                self._submit_thumbnail(filename, image_path)
+        except PiCameraError as exc:
+            self.tear_down()
+            self._record_failed_image()
+            raise CameraCaptureError from exc
+
+    def capture_to_buffer(self):
+        """Capture an image into memory without storing it.
 
-            full_path = join(self.storage_directory,
-                             new_image_filename)
+        Returns: The encoded image as bytes.
+
+        Raises:
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
+        """
+        PiCameraError = self._get_camera_error()
 
-            self._camera_handle.capture(full_path, format=self.file_extension)
-            self._captured_image_paths.append(full_path)
+        try:
+            return self._capture_to_memory()
         except PiCameraError as exc:
             self.tear_down()
-            self._captured_image_paths.append(None)
             raise CameraCaptureError from exc
 
-    def get_captured_image_paths(self):
-        """Return a list of filepaths of the images captured.
+    def capture_to_frame(self):
+        """Capture raw RGB pixels into a reusable in-memory frame.
+
+        The camera writes straight into the buffer of a pooled frame through
+        the video port, so no image is allocated once the pool is warm. In
+        continuous mode a second splitter port is used, so the capture runs
+        alongside the stream.
 
-        Returns: A list of filepaths of the images captured.
+        Returns: A Frame of RGB pixels at the resolution of the camera, whose
+            rows are padded to a multiple of 32 pixels.
+
+        Raises:
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
         """
-        return self._captured_image_paths[:]
+        PiCameraError = self._get_camera_error()
+        timestamp = monotonic()
+        width, height = self._camera_handle.resolution
+        padded_width, padded_height = _get_padded_size(width, height)
+
+        frame = self._get_frame_pool().acquire(padded_width * padded_height *
+                                               3)
+        writer = _BufferWriter(frame.buffer)
+
+        try:
+            self._camera_handle.capture(writer,
+                                        format="rgb",
+                                        use_video_port=True,
+                                        splitter_port=RAW_SPLITTER_PORT)
+        except (PiCameraError, ValueError) as exc:
+            frame.release()
+            self.tear_down()
+            raise CameraCaptureError from exc
 
-    def get_next_filename(self):
-        """Return the filename of the next image that will be captured.
+        frame.set_metadata(str(self),
+                           timestamp,
+                           width,
+                           height,
+                           FRAME_FORMAT_RGB,
+                           writer.position,
+                           padded_width * 3)
 
-        Returns: The filename of the next image that will be captured.
+        return frame
+
+    def _get_camera_error(self):
+        """Open the camera module if it has not been set up yet.
+
+        Returns: The picamera.PiCameraError class, for handling failures.
+        """
+        if self._camera_handle is None:
+            self.set_up()
+
+        from picamera import PiCameraError
+
+        return PiCameraError
+
+    def _capture_to_memory(self):
+        """Capture an encoded image into memory.
+
+        Returns: The encoded image as bytes.
+        """
+        if not self._continuous:
+            stream = BytesIO()
+            self._camera_handle.capture(stream, format=self.file_extension)
+            return stream.getvalue()
+
+        self.set_up()
+        next(self._continuous_captures)
+
+        image_data = self._continuous_stream.getvalue()
+        self._continuous_stream.seek(0)
+        self._continuous_stream.truncate()
+
+        return image_data
+
+    def _get_pixels(self):
+        """Capture a low resolution image for the frame filter.
+
+        The image is resized by the camera's hardware from the video port.
+        In continuous mode it is taken from the stream that is already
+        running, through a second splitter port. Otherwise the video port is
+        started for it, so every kept image costs two sensor captures: this
+        one and the still capture that is stored.
+
+        Returns: A NumPy array of shape (height, width, 3).
         """
-        return str(len(self.get_captured_image_paths()) + 1).rjust(8, "0")
+        # NumPy is only needed when a frame filter is set.
+        import numpy
+
+        width, height = self._filter_resolution
+        padded_width, padded_height = _get_padded_size(width, height)
+
+        stream = BytesIO()
+        self._camera_handle.capture(stream,
+                                    format="rgb",
+                                    use_video_port=True,
+                                    resize=(padded_width, padded_height),
+                                    splitter_port=RAW_SPLITTER_PORT)
+
+        pixels = numpy.frombuffer(stream.getbuffer(), dtype=numpy.uint8)
+
+        return pixels.reshape(padded_height, padded_width, 3)[:height, :width]
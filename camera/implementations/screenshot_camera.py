@@ -1,18 +1,46 @@
 """An interface for capturing screenshots."""
 
-from os.path import join
+from functools import lru_cache, partial
+from io import BytesIO
+from time import monotonic
 
 from camera.abstract_camera import AbstractCamera
-import wx
+from camera.exceptions import CameraCaptureError
+from camera.frame import FRAME_FORMAT_RGB
+
+
+def _encode_image(file_type, image):
+    """Encode a wx.Image in memory.
+
+    Args:
+        file_type: The wx bitmap type to encode the image as.
+        image: The wx.Image to encode.
+
+    Returns: The encoded image as bytes.
+    """
+    stream = BytesIO()
+    image.SaveFile(stream, file_type)
+
+    return stream.getvalue()
+
 
 class ScreenshotCamera(AbstractCamera):
-    """A class representing a screenshot camera."""
+    """A class representing a screenshot camera.
+
+    The wx application, screen and bitmap used for capturing are created by
+    set_up and reused for every capture, with the bitmap only being
+    reallocated when the size of the captured area changes. wx itself is
+    not imported until set_up, so cameras can be created on machines
+    without a display.
+    """
 
     def __init__(self,
                  name="Screenshot Camera",
                  storage_directory=None,
                  file_extension=None,
-                 images_stored_locally=True):
+                 images_stored_locally=True,
+                 capture_region=None,
+                 scale=1):
         """Initialise the screenshot camera.
 
         Args:
@@ -21,21 +49,49 @@ class ScreenshotCamera(AbstractCamera):
             file_extension: The file extension to be used on this camera.
             images_stored_locally: Whether the images are stored on a locally
                 accessible device or not.
+            capture_region: The (x, y, width, height) region of the screen to
+                capture (or None for the whole screen).
+            scale: The factor to scale captured images by, where values below
+                1 capture a downscaled image.
+
+        Raises:
+            ValueError: If scale is not greater than 0.
+            TypeError: If scale is not a numeric type.
         """
         super().__init__(name,
                          storage_directory,
                          file_extension,
                          images_stored_locally)
 
-        self._captured_image_paths = []
+        self.capture_region = capture_region
+        self.scale = scale
+
+        self._wx = None
+        self._app = None
+        self._screen = None
+        self._bitmap = None
+        self._bitmap_size = None
+        self._memory = None
 
     def set_up(self):
         """Set up the camera so that it is ready to capture an image."""
-        pass
+        if self._screen is not None:
+            return
+
+        # wx needs a display and is slow to import, so it is imported when
+        # the camera is first used.
+        import wx
+
+        self._wx = wx
+        self._app = wx.App.Get() or wx.App(False)
+        self._screen = wx.ScreenDC()
 
     def tear_down(self):
         """Free any resources held by the camera."""
-        pass
+        self._release_bitmap()
+
+        self._screen = None
+        self._app = None
 
     def __str__(self):
         """Return a string representation of this camera.
@@ -44,6 +100,35 @@ class ScreenshotCamera(AbstractCamera):
         """
         return self._name
 
+    @property
+    def scale(self):
+        """Get the factor that captured images are scaled by.
+
+        Returns: The factor that captured images are scaled by.
+        """
+        return self._scale
+
+    @scale.setter
+    def scale(self, scale):
+        """Set the factor that captured images are scaled by.
+
+        Args:
+            scale: The factor to scale captured images by, where values below
+                1 capture a downscaled image.
+
+        Raises:
+            ValueError: If scale is not greater than 0.
+            TypeError: If scale is not a numeric type.
+        """
+        try:
+            if scale > 0:
+                self._scale = scale
+            else:
+                raise ValueError("scale must be greater than 0.")
+        except TypeError as error:
+            exception_message = "scale must be a numeric type."
+            raise TypeError(exception_message) from error
+
     def capture_image(self):
         """Capture an image to the default storage_directory.
 
@@ -55,52 +140,67 @@ class ScreenshotCamera(AbstractCamera):
             ImageStorageError: If the image can be captured but cannot be
                 stored successfully.
         """
-        new_image_filename = (self.get_next_filename() +
-                              "." +
-                              self.file_extension)
-
-        full_path = join(self.storage_directory,
-                         new_image_filename)
-
-        if self.file_extension.lower() in ("jpg", "jpeg"):
-            file_type = wx.BITMAP_TYPE_JPEG
-        elif self.file_extension.lower() == "png":
-            file_type = wx.BITMAP_TYPE_PNG
-        elif self.file_extension.lower() == "gif":
-            file_type = wx.BITMAP_TYPE_GIF
-        else:
-            file_type == wx.BITMAP_TYPE_JPEG
-
         try:
-            app = wx.App()
-            screen = wx.ScreenDC()
+            self._grab_screen()
+        except Exception as exc:
+            self._record_failed_image()
+            raise CameraCaptureError from exc
 
-            screen_width, screen_height = screen.GetSize()
+        file_type = self._get_file_type()
+        # The frame filter and thumbnail generator share one conversion.
+        get_pixels = lru_cache(maxsize=1)(self._get_pixels)
 
-            bitmap = wx.Bitmap(screen_width, screen_height)
+        if not self._should_store_image(get_pixels):
+            return
 
-            memory = wx.MemoryDC(bitmap)
-            memory.Blit(0, 0, screen_width, screen_height, screen, 0, 0)
-        except Exception as exc:
-            self._captured_image_paths.append(None)
-            raise CameraCaptureError from exc
+        filename = self.get_next_filename()
 
-        bitmap.SaveFile(full_path, file_type)
-        self._captured_image_paths.append(full_path)
+        if self.stores_images_in_memory:
+            if not self._store_image(self._bitmap.ConvertToImage(),
+                                     partial(_encode_image, file_type)):
+                return
+        else:
+            self._bitmap.SaveFile(self.get_next_image_path(), file_type)
+            self._record_captured_image()
 
-    def get_captured_image_paths(self):
-        """Return a list of filepaths of the images captured.
+        self._submit_thumbnail(filename, get_pixels)
 
-        Returns: A list of filepaths of the images captured.
-        """
-        return self._captured_image_paths[:]
+    def capture_to_frame(self):
+        """Capture the screen into a reusable in-memory frame.
+
+        The pixels are copied straight from the bitmap into the buffer of a
+        pooled frame, so no image is allocated once the pool is warm.
 
-    def get_next_filename(self):
-        """Return the filename of the next image that will be captured.
+        Returns: A Frame of RGB pixels.
 
-        Returns: The filename of the next image that will be captured.
+        Raises:
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
         """
-        return str(len(self.get_captured_image_paths()) + 1).rjust(8, "0")
+        timestamp = monotonic()
+        frame = None
+
+        try:
+            self._grab_screen()
+
+            width, height = self._bitmap_size
+            length = width * height * 3
+            frame = self._get_frame_pool().acquire(length)
+            self._bitmap.CopyToBuffer(frame.buffer[:length],
+                                      self._wx.BitmapBufferFormat_RGB)
+        except Exception as exc:
+            if frame is not None:
+                frame.release()
+            raise CameraCaptureError from exc
+
+        frame.set_metadata(str(self),
+                           timestamp,
+                           width,
+                           height,
+                           FRAME_FORMAT_RGB,
+                           length)
+
+        return frame
 
     @property
     def file_extension(self):
@@ -118,3 +218,99 @@ class ScreenshotCamera(AbstractCamera):
             file_extension: The file extension to be used on this camera.
         """
         self._file_extension = file_extension
+
+    def _grab_screen(self):
+        """Copy the capture area of the screen into the bitmap.
+
+        The bitmap is only selected into the memory DC for the copy, as on
+        Windows a selected bitmap cannot be saved or converted.
+        """
+        self.set_up()
+
+        x, y, width, height = self._get_capture_area()
+        output_width = max(1, round(width * self.scale))
+        output_height = max(1, round(height * self.scale))
+
+        self._ensure_bitmap(output_width, output_height)
+        self._memory.SelectObject(self._bitmap)
+
+        try:
+            if (output_width, output_height) == (width, height):
+                self._memory.Blit(0, 0, width, height, self._screen, x, y)
+            else:
+                self._memory.StretchBlit(0, 0, output_width, output_height,
+                                         self._screen, x, y, width, height)
+        finally:
+            self._memory.SelectObject(self._wx.NullBitmap)
+
+    def _get_pixels(self):
+        """Return the pixels of the most recent capture.
+
+        Returns: A NumPy array of shape (height, width, 3).
+        """
+        # NumPy is only needed when a frame filter or thumbnail generator is
+        # set.
+        import numpy
+
+        width, height = self._bitmap_size
+        image = self._bitmap.ConvertToImage()
+
+        return numpy.frombuffer(image.GetData(),
+                                dtype=numpy.uint8).reshape(height, width, 3)
+
+    def _get_file_type(self):
+        """Return the wx bitmap type matching the file extension.
+
+        Returns: The wx bitmap type matching the file extension, which is
+            JPEG if the extension is not recognised.
+        """
+        file_extension = self.file_extension.lower()
+
+        if file_extension == "png":
+            return self._wx.BITMAP_TYPE_PNG
+        elif file_extension == "gif":
+            return self._wx.BITMAP_TYPE_GIF
+        else:
+            return self._wx.BITMAP_TYPE_JPEG
+
+    def _get_capture_area(self):
+        """Return the area of the screen to capture.
+
+        Returns: An (x, y, width, height) tuple, clipped to the screen.
+        """
+        screen_width, screen_height = self._screen.GetSize()
+
+        if self.capture_region is None:
+            return 0, 0, screen_width, screen_height
+
+        x, y, width, height = self.capture_region
+        x = min(max(0, x), screen_width - 1)
+        y = min(max(0, y), screen_height - 1)
+
+        return (x,
+                y,
+                max(1, min(width, screen_width - x)),
+                max(1, min(height, screen_height - y)))
+
+    def _ensure_bitmap(self, width, height):
+        """Make sure the reusable bitmap has the given size.
+
+        Args:
+            width: The width of the bitmap.
+            height: The height of the bitmap.
+        """
+        if self._bitmap is not None and self._bitmap_size == (width, height):
+            return
+
+        self._release_bitmap()
+
+        self._bitmap = self._wx.Bitmap(width, height)
+        self._bitmap_size = (width, height)
+        self._memory = self._wx.MemoryDC()
+
+    def _release_bitmap(self):
+        """Free the reusable bitmap."""
+        self._memory = None
+
+        self._bitmap = None
+        self._bitmap_size = None
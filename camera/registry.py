@@ -0,0 +1,248 @@
+"""A registry that resolves camera types by name without importing them.
+
+Cameras are registered as "module:ClassName" references, so neither the
+camera's module nor its dependencies (such as picamera or wx) are imported
+until a camera of that type is first created. Third-party packages can
+provide their own cameras through the ENTRY_POINT_GROUP entry point group,
+for example in setup.py:
+
+    entry_points={"time_lapse_manager.cameras": [
+        "webcam = my_package.webcam:WebcamCamera"]}
+"""
+from importlib import import_module
+from threading import RLock
+
+ENTRY_POINT_GROUP = "time_lapse_manager.cameras"
+
+BUILT_IN_CAMERAS = {
+    "http_snapshot":
+        "camera.implementations.http_snapshot_camera:HTTPSnapshotCamera",
+    "raspberry_pi":
+        "camera.implementations.raspberry_pi_camera:RaspberryPiCamera",
+    "screenshot": "camera.implementations.screenshot_camera:ScreenshotCamera"}
+
+
+def _load_reference(reference):
+    """Import the object a "module:attribute" reference refers to.
+
+    Args:
+        reference: A string of the form "package.module:attribute".
+
+    Returns: The object the reference refers to.
+
+    Raises:
+        ValueError: If the reference is not of the form "module:attribute".
+    """
+    module_name, separator, attribute_path = reference.partition(":")
+
+    if not separator or not module_name or not attribute_path:
+        raise ValueError("reference must be of the form module:attribute.")
+
+    target = import_module(module_name)
+
+    for attribute in attribute_path.split("."):
+        target = getattr(target, attribute)
+
+    return target
+
+
+def _get_entry_points(group):
+    """Return the installed entry points in a group.
+
+    Args:
+        group: The name of the entry point group.
+
+    Returns: A list of importlib.metadata.EntryPoint.
+    """
+    # importlib.metadata scans every installed distribution, so it is only
+    # imported when a name is not registered directly.
+    from importlib import metadata
+
+    entry_points = metadata.entry_points()
+
+    if hasattr(entry_points, "select"):
+        return list(entry_points.select(group=group))
+
+    return list(entry_points.get(group, ()))
+
+
+class CameraRegistry:
+    """A mapping of camera type names to lazily imported camera classes."""
+
+    def __init__(self,
+                 entry_point_group=ENTRY_POINT_GROUP,
+                 include_built_in=True):
+        """Initialise the registry.
+
+        Args:
+            entry_point_group: The entry point group that third-party cameras
+                are discovered from (or None to ignore entry points).
+            include_built_in: Whether to register the cameras that come with
+                this package.
+        """
+        self._entry_point_group = entry_point_group
+        self._references = {}
+        self._camera_classes = {}
+        self._entry_points = None
+        self._lock = RLock()
+
+        if include_built_in:
+            self._references.update(BUILT_IN_CAMERAS)
+
+    def register(self, name, camera_class):
+        """Register a camera type.
+
+        Args:
+            name: The name the camera type is resolved by.
+            camera_class: The camera class, or a "module:ClassName" string
+                that is only imported when the camera type is first used.
+        """
+        with self._lock:
+            self._camera_classes.pop(name, None)
+
+            if isinstance(camera_class, str):
+                self._references[name] = camera_class
+            else:
+                self._references.pop(name, None)
+                self._camera_classes[name] = camera_class
+
+    def unregister(self, name):
+        """Remove a camera type registered with register.
+
+        Args:
+            name: The name of the camera type.
+        """
+        with self._lock:
+            self._references.pop(name, None)
+            self._camera_classes.pop(name, None)
+
+    def get_names(self):
+        """Return the names of every available camera type.
+
+        Returns: A sorted list of the names of the registered camera types
+            and those provided through entry points.
+        """
+        with self._lock:
+            names = (set(self._references) | set(self._camera_classes) |
+                     set(self._get_entry_points()))
+
+        return sorted(names)
+
+    def is_loaded(self, name):
+        """Return whether the class of a camera type has been imported.
+
+        Args:
+            name: The name of the camera type.
+
+        Returns: A boolean specifying whether the camera type has been
+            resolved to its class.
+        """
+        return name in self._camera_classes
+
+    def get_camera_class(self, name):
+        """Return the class of a camera type, importing it if needed.
+
+        Types registered with register take precedence over those provided
+        through entry points.
+
+        Args:
+            name: The name of the camera type.
+
+        Returns: The camera class.
+
+        Raises:
+            ValueError: If there is no camera type with the name.
+        """
+        with self._lock:
+            camera_class = self._camera_classes.get(name)
+
+            if camera_class is not None:
+                return camera_class
+
+            if name in self._references:
+                camera_class = _load_reference(self._references[name])
+            else:
+                entry_point = self._get_entry_points().get(name)
+
+                if entry_point is None:
+                    raise ValueError("Unknown camera type: " + str(name))
+
+                camera_class = entry_point.load()
+
+            self._camera_classes[name] = camera_class
+
+        return camera_class
+
+    def create_camera(self, name, *args, **kwargs):
+        """Create a camera of a named type.
+
+        Args:
+            name: The name of the camera type.
+            *args: The positional arguments for the camera's constructor.
+            **kwargs: The keyword arguments for the camera's constructor.
+
+        Returns: A new camera.
+
+        Raises:
+            ValueError: If there is no camera type with the name.
+        """
+        return self.get_camera_class(name)(*args, **kwargs)
+
+    def _get_entry_points(self):
+        """Return the entry points for cameras, discovering them once.
+
+        Returns: A dictionary mapping names to entry points.
+        """
+        if self._entry_points is None:
+            if self._entry_point_group is None:
+                self._entry_points = {}
+            else:
+                self._entry_points = {
+                    entry_point.name: entry_point
+                    for entry_point in _get_entry_points(
+                        self._entry_point_group)}
+
+        return self._entry_points
+
+
+DEFAULT_REGISTRY = CameraRegistry()
+
+
+def register_camera(name, camera_class):
+    """Register a camera type with the default registry.
+
+    Args:
+        name: The name the camera type is resolved by.
+        camera_class: The camera class, or a "module:ClassName" string.
+    """
+    DEFAULT_REGISTRY.register(name, camera_class)
+
+
+def get_camera_class(name):
+    """Return the class of a camera type from the default registry.
+
+    Args:
+        name: The name of the camera type.
+
+    Returns: The camera class.
+
+    Raises:
+        ValueError: If there is no camera type with the name.
+    """
+    return DEFAULT_REGISTRY.get_camera_class(name)
+
+
+def create_camera(name, *args, **kwargs):
+    """Create a camera of a named type from the default registry.
+
+    Args:
+        name: The name of the camera type.
+        *args: The positional arguments for the camera's constructor.
+        **kwargs: The keyword arguments for the camera's constructor.
+
+    Returns: A new camera.
+
+    Raises:
+        ValueError: If there is no camera type with the name.
+    """
+    return DEFAULT_REGISTRY.create_camera(name, *args, **kwargs)
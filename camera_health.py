@@ -0,0 +1,244 @@
+"""Circuit breakers that sideline failing cameras and bring them back."""
+from time import monotonic
+
+from camera.exceptions import CameraCaptureError, CameraConnectionError
+
+CIRCUIT_CLOSED = "closed"
+CIRCUIT_OPEN = "open"
+CIRCUIT_HALF_OPEN = "half_open"
+
+CIRCUIT_STATES = (CIRCUIT_CLOSED, CIRCUIT_OPEN, CIRCUIT_HALF_OPEN)
+
+
+class CameraHealth:
+    """The circuit breaker of a single camera.
+
+    Attributes:
+        state: One of the CIRCUIT_* constants.
+        consecutive_failures: The number of operations that have failed since
+            the camera last captured successfully.
+        retry_time: The monotonic time after which an open circuit lets the
+            camera try again (or None if the circuit is not open).
+        needs_set_up: Whether the camera must be set up again before it next
+            captures.
+        last_exception: The most recent exception raised by the camera (or
+            None).
+    """
+
+    def __init__(self):
+        """Initialise the health of a camera that has not yet failed."""
+        self.state = CIRCUIT_CLOSED
+        self.consecutive_failures = 0
+        self.retry_time = None
+        self.needs_set_up = False
+        self.last_exception = None
+
+
+class CameraHealthMonitor:
+    """Decide which cameras capture each frame, backing off from failures.
+
+    A camera that fails is retried on the next frame until it has failed
+    failure_threshold times in a row. Its circuit then opens and the camera
+    sits out every frame until its backoff has passed, which doubles with
+    each further failure up to max_backoff. Once the backoff has passed the
+    circuit is half open: the camera is torn down and set up again and gets
+    one capture to prove itself, closing the circuit if it succeeds. The
+    other cameras keep capturing on schedule throughout.
+    """
+
+    def __init__(self,
+                 failure_threshold=3,
+                 base_backoff=10,
+                 max_backoff=600,
+                 capture_timeout=None,
+                 handled_exceptions=(CameraConnectionError,
+                                     CameraCaptureError),
+                 clock=monotonic):
+        """Initialise the monitor.
+
+        Args:
+            failure_threshold: The number of consecutive failures after which
+                the circuit of a camera opens.
+            base_backoff: The time (in seconds) a camera sits out when its
+                circuit first opens.
+            max_backoff: The longest time (in seconds) a camera sits out.
+            capture_timeout: The time (in seconds) each camera is given to
+                capture an image before it is treated as failed (or None to
+                wait indefinitely).
+            handled_exceptions: The exception types treated as camera
+                failures. Any other exception is raised from the manager.
+            clock: A function returning the current monotonic time.
+
+        Raises:
+            ValueError: If failure_threshold, base_backoff, max_backoff or
+                capture_timeout is not greater than 0.
+        """
+        if failure_threshold <= 0:
+            raise ValueError("failure_threshold must be greater than 0.")
+        if base_backoff <= 0:
+            raise ValueError("base_backoff must be greater than 0.")
+        if max_backoff <= 0:
+            raise ValueError("max_backoff must be greater than 0.")
+        if capture_timeout is not None and capture_timeout <= 0:
+            raise ValueError("capture_timeout must be greater than 0.")
+
+        self._failure_threshold = failure_threshold
+        self._base_backoff = base_backoff
+        self._max_backoff = max_backoff
+        self._capture_timeout = capture_timeout
+        self._handled_exceptions = tuple(handled_exceptions)
+        self._clock = clock
+
+        self._health = {}
+        self._capture_timeouts = {}
+
+    def get_health(self, camera):
+        """Return the circuit breaker of a camera.
+
+        Args:
+            camera: The camera.
+
+        Returns: The CameraHealth of the camera.
+        """
+        if camera not in self._health:
+            self._health[camera] = CameraHealth()
+
+        return self._health[camera]
+
+    def get_state(self, camera):
+        """Return the state of the circuit of a camera.
+
+        Args:
+            camera: The camera.
+
+        Returns: One of the CIRCUIT_* constants.
+        """
+        return self.get_health(camera).state
+
+    def get_capture_timeout(self, camera):
+        """Return the time a camera is given to capture an image.
+
+        Args:
+            camera: The camera.
+
+        Returns: The timeout (in seconds), or None to wait indefinitely.
+        """
+        return self._capture_timeouts.get(camera, self._capture_timeout)
+
+    def set_capture_timeout(self, camera, capture_timeout):
+        """Give a camera its own capture timeout.
+
+        Args:
+            camera: The camera.
+            capture_timeout: The time (in seconds) the camera is given to
+                capture an image (or None to wait indefinitely).
+
+        Raises:
+            ValueError: If capture_timeout is not greater than 0 or None.
+        """
+        if capture_timeout is not None and capture_timeout <= 0:
+            raise ValueError("capture_timeout must be greater than 0.")
+
+        self._capture_timeouts[camera] = capture_timeout
+
+    def handles(self, exception):
+        """Return whether an exception is treated as a camera failure.
+
+        Args:
+            exception: The exception raised by a camera.
+
+        Returns: A boolean specifying whether the exception is handled.
+        """
+        return isinstance(exception, self._handled_exceptions)
+
+    def is_available(self, camera):
+        """Return whether a camera should capture the current frame.
+
+        An open circuit whose backoff has passed becomes half open, and the
+        camera is marked as needing to be set up again.
+
+        Args:
+            camera: The camera.
+
+        Returns: A boolean specifying whether the camera should capture.
+        """
+        health = self.get_health(camera)
+
+        if health.state != CIRCUIT_OPEN:
+            return True
+
+        if self._clock() < health.retry_time:
+            return False
+
+        health.state = CIRCUIT_HALF_OPEN
+        health.retry_time = None
+        health.needs_set_up = True
+
+        return True
+
+    def needs_set_up(self, camera):
+        """Return whether a camera must be set up again before capturing.
+
+        Args:
+            camera: The camera.
+
+        Returns: A boolean specifying whether the camera must be set up.
+        """
+        return self.get_health(camera).needs_set_up
+
+    def record_set_up(self, camera):
+        """Record that a camera has been set up again.
+
+        Args:
+            camera: The camera.
+        """
+        self.get_health(camera).needs_set_up = False
+
+    def record_success(self, camera):
+        """Record that a camera captured an image, closing its circuit.
+
+        Args:
+            camera: The camera.
+        """
+        health = self.get_health(camera)
+
+        health.state = CIRCUIT_CLOSED
+        health.consecutive_failures = 0
+        health.retry_time = None
+
+    def record_failure(self, camera, exception, needs_set_up=False):
+        """Record that a camera failed, opening its circuit if need be.
+
+        Args:
+            camera: The camera.
+            exception: The exception raised by the camera.
+            needs_set_up: Whether the camera must be set up again before it
+                next captures, such as when setting it up failed.
+        """
+        health = self.get_health(camera)
+
+        health.consecutive_failures += 1
+        health.last_exception = exception
+        health.needs_set_up = health.needs_set_up or needs_set_up
+
+        if (health.state == CIRCUIT_HALF_OPEN or
+                health.consecutive_failures >= self._failure_threshold):
+            health.state = CIRCUIT_OPEN
+            health.retry_time = self._clock() + self.get_backoff(camera)
+
+    def get_backoff(self, camera):
+        """Return how long a camera sits out once its circuit opens.
+
+        Args:
+            camera: The camera.
+
+        Returns: The backoff (in seconds), doubling with each failure beyond
+            failure_threshold.
+        """
+        failures_beyond_threshold = max(
+            0,
+            self.get_health(camera).consecutive_failures -
+            self._failure_threshold)
+
+        return min(self._max_backoff,
+                   self._base_backoff * 2 ** failures_beyond_threshold)
@@ -0,0 +1,262 @@
+"""A drift-free scheduler for timing time-lapse frames."""
+
+from collections import namedtuple
+from math import floor
+from time import monotonic, sleep
+
+LATE_POLICY_CATCH_UP = "catch_up"
+LATE_POLICY_SKIP = "skip"
+LATE_POLICY_COALESCE = "coalesce"
+
+LATE_POLICIES = (LATE_POLICY_CATCH_UP, LATE_POLICY_SKIP, LATE_POLICY_COALESCE)
+
+FrameTiming = namedtuple("FrameTiming", ["slot",
+                                         "deadline",
+                                         "started",
+                                         "lateness",
+                                         "jitter",
+                                         "skipped_slots",
+                                         "interval"])
+FrameTiming.__doc__ = """The measured timing of a single scheduled frame.
+
+Attributes:
+    slot: The index of the slot on the schedule that this frame filled.
+    deadline: The monotonic time at which this frame was due.
+    started: The monotonic time at which this frame actually started.
+    lateness: How late (in seconds) the frame started relative to its
+        deadline.
+    jitter: The difference (in seconds) between the measured period since the
+        previous frame and the interval in use.
+    skipped_slots: The number of slots that were dropped before this frame.
+    interval: The interval (in seconds) this frame was scheduled on, which
+        differs from the new interval for the first frame after a change if
+        that frame was due straight away.
+"""
+
+
+class CaptureScheduler:
+    """Schedule frames against absolute deadlines on a monotonic clock.
+
+    Each frame is due at a fixed offset from the start of the schedule rather
+    than a fixed delay after the previous frame, so the time taken to capture
+    a frame does not accumulate into drift.
+    """
+
+    def __init__(self,
+                 interval,
+                 late_policy=LATE_POLICY_SKIP,
+                 clock=monotonic,
+                 sleeper=sleep):
+        """Initialise the scheduler.
+
+        Args:
+            interval: The interval (in seconds) between frames.
+            late_policy: What to do when one or more slots have been missed;
+                LATE_POLICY_CATCH_UP fires every missed slot back-to-back,
+                LATE_POLICY_SKIP drops missed slots and waits for the next
+                future slot and LATE_POLICY_COALESCE fires a single frame
+                immediately in place of all missed slots.
+            clock: A function returning the current monotonic time.
+            sleeper: A function that blocks for the given number of seconds.
+
+        Raises:
+            ValueError: If late_policy is not a recognised policy.
+        """
+        if late_policy not in LATE_POLICIES:
+            raise ValueError("late_policy must be one of: " +
+                             ", ".join(LATE_POLICIES) + ".")
+
+        self._interval = interval
+        self._late_policy = late_policy
+        self._clock = clock
+        self._sleeper = sleeper
+
+        self._anchor = None
+        self._anchor_slot = 0
+        self._next_slot = 0
+        self._skipped_slots = 0
+        self._last_started = None
+        self._slot_interval = None
+
+    @property
+    def interval(self):
+        """Get the interval (in seconds) between frames.
+
+        Returns: The interval (in seconds) between frames.
+        """
+        return self._interval
+
+    @interval.setter
+    def interval(self, interval):
+        """Set the interval (in seconds) between frames.
+
+        Once a frame has been started, the next frame is due the new interval
+        after the deadline of that frame (or straight away, if that has
+        already passed), so a shorter interval takes effect immediately
+        rather than after one more of the old intervals. Before the first
+        frame, the first deadline is kept.
+
+        Args:
+            interval: The interval (in seconds) between frames.
+        """
+        if self._anchor is not None:
+            if self._last_started is None:
+                self._anchor = self.get_deadline(self._next_slot)
+            else:
+                last_deadline = self.get_deadline(self._next_slot - 1)
+                self._anchor = max(last_deadline + interval, self._clock())
+                self._slot_interval = self._anchor - last_deadline
+            self._anchor_slot = self._next_slot
+        self._interval = interval
+
+    @property
+    def late_policy(self):
+        """Get the policy used when one or more slots have been missed.
+
+        Returns: The policy used when one or more slots have been missed.
+        """
+        return self._late_policy
+
+    @property
+    def started(self):
+        """Return whether the schedule has been started.
+
+        Returns: A boolean specifying whether the schedule has been started.
+        """
+        return self._anchor is not None
+
+    @property
+    def next_slot(self):
+        """Return the index of the next slot that will be filled.
+
+        Returns: The index of the next slot that will be filled.
+        """
+        return self._next_slot
+
+    def start(self, anchor=None, slot=0):
+        """Start the schedule.
+
+        Args:
+            anchor: The monotonic time at which the given slot is due (or None
+                for now).
+            slot: The index of the slot that is due at anchor.
+        """
+        if anchor is None:
+            anchor = self._clock()
+
+        self._anchor = anchor
+        self._anchor_slot = slot
+        self._next_slot = slot
+        self._skipped_slots = 0
+        self._last_started = None
+        self._slot_interval = None
+
+    def get_deadline(self, slot):
+        """Return the monotonic time at which the given slot is due.
+
+        Args:
+            slot: The index of the slot.
+
+        Returns: The monotonic time at which the given slot is due.
+        """
+        return self._anchor + (slot - self._anchor_slot) * self._interval
+
+    def get_delay(self):
+        """Return how long to wait (in seconds) before the next frame is due.
+
+        Returns: How long to wait (in seconds) before the next frame is due,
+            which is 0 if it is already due.
+        """
+        if self._anchor is None:
+            self.start()
+
+        now = self._clock()
+        self._advance_to(self._resolve_next_slot(now))
+
+        return max(0.0, self.get_deadline(self._next_slot) - now)
+
+    def begin_frame(self):
+        """Mark the next frame as started and advance the schedule.
+
+        This should be called once the delay returned by get_delay has
+        elapsed.
+
+        Returns: A FrameTiming describing the frame that has been started.
+        """
+        if self._anchor is None:
+            self.start()
+
+        now = self._clock()
+        self._advance_to(self._resolve_next_slot(now))
+        slot = self._next_slot
+        deadline = self.get_deadline(slot)
+
+        # The first frame after an interval change may have been scheduled
+        # on a different spacing than the new interval.
+        slot_interval = self._slot_interval
+        if slot_interval is None:
+            slot_interval = self._interval
+
+        if self._last_started is None:
+            jitter = 0.0
+        else:
+            jitter = (now - self._last_started) - slot_interval
+
+        timing = FrameTiming(slot=slot,
+                             deadline=deadline,
+                             started=now,
+                             lateness=max(0.0, now - deadline),
+                             jitter=jitter,
+                             skipped_slots=self._skipped_slots,
+                             interval=slot_interval)
+
+        self._next_slot = slot + 1
+        self._skipped_slots = 0
+        self._slot_interval = None
+        self._last_started = now
+
+        return timing
+
+    def wait_for_next_frame(self):
+        """Block until the next frame is due and then begin it.
+
+        Returns: A FrameTiming describing the frame that has been started.
+        """
+        delay = self.get_delay()
+
+        if delay > 0:
+            self._sleeper(delay)
+
+        return self.begin_frame()
+
+    def _advance_to(self, slot):
+        """Move the next slot forward, counting any slots that are dropped.
+
+        Args:
+            slot: The index of the slot that the next frame should fill.
+        """
+        self._skipped_slots += slot - self._next_slot
+        self._next_slot = slot
+
+    def _resolve_next_slot(self, now):
+        """Return the slot that the next frame should fill under the policy.
+
+        Args:
+            now: The current monotonic time.
+
+        Returns: The index of the slot that the next frame should fill.
+        """
+        if (self._late_policy == LATE_POLICY_CATCH_UP or
+                now < self.get_deadline(self._next_slot)):
+            return self._next_slot
+
+        elapsed_slots = floor((now - self._anchor) / self._interval)
+        latest_due_slot = self._anchor_slot + elapsed_slots
+
+        if self._late_policy == LATE_POLICY_COALESCE:
+            return max(self._next_slot, latest_due_slot)
+
+        if latest_due_slot <= self._next_slot:
+            return self._next_slot
+
+        return latest_due_slot + 1
@@ -0,0 +1,493 @@
+"""Strategies for triggering every camera for a single time-lapse frame."""
+
+from collections import namedtuple
+from queue import SimpleQueue
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from camera.exceptions import CameraTimeoutError
+
+CameraCaptureResult = namedtuple("CameraCaptureResult", ["camera",
+                                                         "started",
+                                                         "finished",
+                                                         "exception"])
+CameraCaptureResult.__doc__ = """The outcome of capturing with one camera.
+
+Attributes:
+    camera: The camera that captured the image.
+    started: The monotonic time at which the capture started.
+    finished: The monotonic time at which the capture finished.
+    exception: The exception raised by the camera (or None on success).
+"""
+
+
+class FrameCaptureResult:
+    """The outcome of capturing a single frame across every camera."""
+
+    def __init__(self, camera_results):
+        """Initialise the frame capture result.
+
+        Args:
+            camera_results: A list of CameraCaptureResult, one per camera.
+        """
+        self._camera_results = camera_results
+
+    def get_camera_results(self):
+        """Return the result of each camera for this frame.
+
+        Returns: A list of CameraCaptureResult.
+        """
+        return self._camera_results[:]
+
+    def get_exceptions(self):
+        """Return the exceptions raised while capturing this frame.
+
+        Returns: A list of the exceptions raised, in camera order.
+        """
+        return [result.exception for result in self._camera_results
+                if result.exception is not None]
+
+    @property
+    def succeeded(self):
+        """Return whether every camera captured successfully.
+
+        Returns: A boolean specifying whether every camera captured
+            successfully.
+        """
+        return not self.get_exceptions()
+
+    @property
+    def duration(self):
+        """Return the time taken (in seconds) to capture the whole frame.
+
+        Returns: The time between the first camera starting and the last
+            camera finishing.
+        """
+        if not self._camera_results:
+            return 0.0
+
+        return (max(result.finished for result in self._camera_results) -
+                min(result.started for result in self._camera_results))
+
+    @property
+    def spread(self):
+        """Return the skew (in seconds) between the cameras of this frame.
+
+        Returns: The time between the first and last camera finishing.
+        """
+        if not self._camera_results:
+            return 0.0
+
+        finished_times = [result.finished for result in self._camera_results]
+
+        return max(finished_times) - min(finished_times)
+
+    def raise_first_exception(self):
+        """Re-raise the first exception raised by a camera, if any."""
+        exceptions = self.get_exceptions()
+
+        if exceptions:
+            raise exceptions[0]
+
+
+def capture_with_camera(camera):
+    """Capture an image with a camera and time it.
+
+    Args:
+        camera: The camera to capture with.
+
+    Returns: A CameraCaptureResult.
+    """
+    started = monotonic()
+
+    try:
+        camera.capture_image()
+    except Exception as exc:
+        return CameraCaptureResult(camera, started, monotonic(), exc)
+
+    return CameraCaptureResult(camera, started, monotonic(), None)
+
+
+class _PendingCapture:
+    """A capture handed to a CaptureWorker that may not have finished."""
+
+    def __init__(self, trigger):
+        """Initialise the pending capture.
+
+        Args:
+            trigger: An Event to wait for before capturing (or None).
+        """
+        self.trigger = trigger
+        self.done = Event()
+        self.result = None
+
+
+class CaptureWorker:
+    """A daemon thread that captures with a single camera.
+
+    Callers wait for each capture with a timeout, so a camera that hangs
+    only holds up its own worker. A worker still busy with an abandoned
+    capture refuses new ones until the camera returns.
+    """
+
+    def __init__(self, camera):
+        """Initialise the worker and start its thread.
+
+        Args:
+            camera: The camera to capture with.
+        """
+        self._camera = camera
+        self._requests = SimpleQueue()
+        self._pending = None
+        self._thread = Thread(target=self._run,
+                              name="capture-" + str(camera),
+                              daemon=True)
+        self._thread.start()
+
+    @property
+    def busy(self):
+        """Return whether the worker is still capturing.
+
+        Returns: A boolean specifying whether the worker is still capturing.
+        """
+        return self._pending is not None and not self._pending.done.is_set()
+
+    def submit(self, trigger=None):
+        """Start a capture.
+
+        Args:
+            trigger: An Event to wait for before capturing (or None to
+                capture straight away).
+
+        Returns: A _PendingCapture to pass to wait.
+        """
+        self._pending = _PendingCapture(trigger)
+        self._requests.put(self._pending)
+
+        return self._pending
+
+    def wait(self, pending, started, timeout):
+        """Wait for a capture to finish.
+
+        Args:
+            pending: The _PendingCapture returned by submit.
+            started: The monotonic time from which the capture is timed.
+            timeout: The time (in seconds) the capture is given from started
+                (or None to wait indefinitely).
+
+        Returns: A CameraCaptureResult, whose exception is a
+            CameraTimeoutError if the capture did not finish in time.
+        """
+        if timeout is None:
+            pending.done.wait()
+        else:
+            pending.done.wait(max(0, started + timeout - monotonic()))
+
+        if pending.done.is_set():
+            return pending.result
+
+        return self.time_out(started)
+
+    def time_out(self, started):
+        """Return the result of a capture that did not finish in time.
+
+        Args:
+            started: The monotonic time from which the capture is timed.
+
+        Returns: A CameraCaptureResult with a CameraTimeoutError.
+        """
+        exception = CameraTimeoutError(str(self._camera) +
+                                       " did not finish capturing in time.")
+
+        return CameraCaptureResult(self._camera,
+                                   started,
+                                   monotonic(),
+                                   exception)
+
+    def stop(self):
+        """Ask the thread to exit once any capture it is running finishes."""
+        self._requests.put(None)
+
+    def _run(self):
+        """Capture each time a request is submitted, until stopped."""
+        while True:
+            pending = self._requests.get()
+
+            if pending is None:
+                return
+
+            if pending.trigger is not None:
+                pending.trigger.wait()
+
+            pending.result = capture_with_camera(self._camera)
+            pending.done.set()
+
+
+class _TimedCapturer:
+    """The CaptureWorkers used by a capturer when captures are timed."""
+
+    def __init__(self):
+        """Initialise the capturer without any workers."""
+        self._workers = {}
+        self._lock = Lock()
+
+    def capture(self, cameras, timeouts, trigger, stop_on_failure):
+        """Capture with each camera on its worker, giving up on late ones.
+
+        Args:
+            cameras: The cameras to capture with.
+            timeouts: The timeout (in seconds, or None) of each camera.
+            trigger: An Event that releases every camera at once (or None to
+                capture with each camera in turn).
+            stop_on_failure: Whether to stop at the first failure when
+                capturing in turn.
+
+        Returns: A list of CameraCaptureResult.
+        """
+        if trigger is None:
+            camera_results = []
+
+            for camera, timeout in zip(cameras, timeouts):
+                worker, pending = self._submit(camera, None)
+                result = self._finish(worker, pending, timeout, monotonic())
+                camera_results.append(result)
+
+                if stop_on_failure and result.exception is not None:
+                    break
+
+            return camera_results
+
+        started = monotonic()
+        pending_captures = [self._submit(camera, trigger)
+                            for camera in cameras]
+        trigger.set()
+
+        return [self._finish(worker, pending, timeout, started)
+                for (worker, pending), timeout
+                in zip(pending_captures, timeouts)]
+
+    def release_camera(self, camera):
+        """Stop the worker of a camera that will no longer capture.
+
+        Args:
+            camera: The camera.
+        """
+        with self._lock:
+            worker = self._workers.pop(camera, None)
+
+        if worker is not None:
+            worker.stop()
+
+    def shut_down(self):
+        """Stop every worker without waiting for hung cameras."""
+        with self._lock:
+            workers = self._workers
+            self._workers = {}
+
+        for worker in workers.values():
+            worker.stop()
+
+    def _submit(self, camera, trigger):
+        """Start a capture on the worker of a camera.
+
+        Args:
+            camera: The camera to capture with.
+            trigger: An Event to wait for before capturing (or None).
+
+        Returns: A (worker, pending) tuple of the CaptureWorker and the
+            _PendingCapture, which is None if the worker is still busy with
+            an earlier capture.
+        """
+        with self._lock:
+            if camera not in self._workers:
+                self._workers[camera] = CaptureWorker(camera)
+
+            worker = self._workers[camera]
+
+        if worker.busy:
+            return worker, None
+
+        return worker, worker.submit(trigger)
+
+    @staticmethod
+    def _finish(worker, pending, timeout, started):
+        """Wait for a capture started by _submit.
+
+        Args:
+            worker: The CaptureWorker capturing.
+            pending: The _PendingCapture (or None if it was never started).
+            timeout: The timeout (in seconds) of the camera (or None).
+            started: The monotonic time from which the capture is timed.
+
+        Returns: A CameraCaptureResult.
+        """
+        if pending is None:
+            return worker.time_out(started)
+
+        return worker.wait(pending, started, timeout)
+
+
+class SerialFrameCapturer:
+    """Capture with each camera in turn, stopping at the first failure."""
+
+    def __init__(self, stop_on_failure=True):
+        """Initialise the serial capturer.
+
+        Args:
+            stop_on_failure: Whether cameras after the first to fail are
+                left out of the frame.
+        """
+        self._stop_on_failure = stop_on_failure
+        self._timed_capturer = _TimedCapturer()
+
+    def capture(self, cameras, timeouts=None):
+        """Capture an image with each of the cameras in turn.
+
+        Args:
+            cameras: The cameras to capture with.
+            timeouts: The time (in seconds, or None to wait indefinitely)
+                each camera is given to capture, or None to capture on the
+                calling thread without any timeouts.
+
+        Returns: A FrameCaptureResult.
+        """
+        if _has_timeouts(timeouts):
+            return FrameCaptureResult(self._timed_capturer.capture(
+                cameras, timeouts, None, self._stop_on_failure))
+
+        camera_results = []
+
+        for camera in cameras:
+            result = capture_with_camera(camera)
+            camera_results.append(result)
+
+            if self._stop_on_failure and result.exception is not None:
+                break
+
+        return FrameCaptureResult(camera_results)
+
+    def release_camera(self, camera):
+        """Free any resources held for a camera that has been removed.
+
+        Args:
+            camera: The camera.
+        """
+        self._timed_capturer.release_camera(camera)
+
+    def shut_down(self):
+        """Free any resources held by the capturer."""
+        self._timed_capturer.shut_down()
+
+
+class ParallelFrameCapturer:
+    """Trigger every camera at the same instant from a reusable thread pool.
+
+    The pool is sized to the camera set and kept between frames, only being
+    replaced when a frame has more cameras than the pool has threads.
+    """
+
+    def __init__(self):
+        """Initialise the parallel capturer."""
+        self._executor = None
+        self._pool_size = 0
+        self._timed_capturer = _TimedCapturer()
+
+    @property
+    def pool_size(self):
+        """Return the number of threads in the pool.
+
+        Returns: The number of threads in the pool.
+        """
+        return self._pool_size
+
+    def capture(self, cameras, timeouts=None):
+        """Capture an image with all of the cameras concurrently.
+
+        Every camera is given the chance to capture, even if others fail.
+        When there are timeouts, each camera captures on its own
+        CaptureWorker instead of the pool.
+
+        Args:
+            cameras: The cameras to capture with.
+            timeouts: The time (in seconds, or None to wait indefinitely)
+                each camera is given to capture, or None to wait for every
+                camera.
+
+        Returns: A FrameCaptureResult.
+        """
+        if not cameras:
+            return FrameCaptureResult([])
+
+        if _has_timeouts(timeouts):
+            return FrameCaptureResult(self._timed_capturer.capture(
+                cameras, timeouts, Event(), False))
+
+        self._ensure_pool_size(len(cameras))
+
+        trigger = Event()
+        futures = [self._executor.submit(self._capture_when_triggered,
+                                         camera,
+                                         trigger)
+                   for camera in cameras]
+        trigger.set()
+
+        return FrameCaptureResult([future.result() for future in futures])
+
+    def release_camera(self, camera):
+        """Free any resources held for a camera that has been removed.
+
+        Args:
+            camera: The camera.
+        """
+        self._timed_capturer.release_camera(camera)
+
+    def shut_down(self):
+        """Stop the thread pool and wait for its threads to finish."""
+        self._timed_capturer.shut_down()
+
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._pool_size = 0
+
+    def _ensure_pool_size(self, camera_count):
+        """Make sure there is a thread available for every camera.
+
+        Args:
+            camera_count: The number of cameras that will capture at once.
+        """
+        if camera_count > self._pool_size:
+            # concurrent.futures is slow to import and only needed for
+            # parallel capture.
+            from concurrent.futures import ThreadPoolExecutor
+
+            self.shut_down()
+            self._executor = ThreadPoolExecutor(
+                max_workers=camera_count,
+                thread_name_prefix="capture")
+            self._pool_size = camera_count
+
+    @staticmethod
+    def _capture_when_triggered(camera, trigger):
+        """Wait for the trigger and then capture with the camera.
+
+        Args:
+            camera: The camera to capture with.
+            trigger: The Event that releases every camera at once.
+
+        Returns: A CameraCaptureResult.
+        """
+        trigger.wait()
+        return capture_with_camera(camera)
+
+
+def _has_timeouts(timeouts):
+    """Return whether any camera has a capture timeout.
+
+    Args:
+        timeouts: The timeout of each camera (or None).
+
+    Returns: A boolean specifying whether any timeout is set.
+    """
+    return timeouts is not None and any(timeout is not None
+                                        for timeout in timeouts)
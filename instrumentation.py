@@ -0,0 +1,305 @@
+"""Instrumentation for the camera operations of a time-lapse session."""
+from bisect import bisect_left
+from threading import Lock, Thread
+
+EVENT_SET_UP = "set_up"
+EVENT_CAPTURE = "capture"
+EVENT_STORE = "store"
+EVENT_TEAR_DOWN = "tear_down"
+
+EVENTS = (EVENT_SET_UP, EVENT_CAPTURE, EVENT_STORE, EVENT_TEAR_DOWN)
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                   1, 2.5, 5, 10)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class LatencyHistogram:
+    """A histogram of durations with fixed bucket boundaries."""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialise the histogram.
+
+        Args:
+            buckets: The upper bounds (in seconds) of the buckets, in
+                ascending order. A final unbounded bucket is always added.
+        """
+        self._buckets = tuple(buckets)
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._count = 0
+        self._sum = 0.0
+
+    @property
+    def count(self):
+        """Return the number of durations observed.
+
+        Returns: The number of durations observed.
+        """
+        return self._count
+
+    @property
+    def sum(self):
+        """Return the total of the durations observed.
+
+        Returns: The total (in seconds) of the durations observed.
+        """
+        return self._sum
+
+    def observe(self, duration):
+        """Add a duration to the histogram.
+
+        Args:
+            duration: The duration (in seconds).
+        """
+        self._counts[bisect_left(self._buckets, duration)] += 1
+        self._count += 1
+        self._sum += duration
+
+    def get_cumulative_counts(self):
+        """Return the number of durations at or below each bucket bound.
+
+        Returns: A list of (upper bound, count) tuples, ending with an upper
+            bound of infinity.
+        """
+        cumulative_counts = []
+        total = 0
+
+        for upper_bound, count in zip(self._buckets + (float("inf"),),
+                                      self._counts):
+            total += count
+            cumulative_counts.append((upper_bound, total))
+
+        return cumulative_counts
+
+
+class Instrumentation:
+    """Collect latency histograms, error counts and hooks for cameras.
+
+    Durations are grouped by event (set_up, capture, store or tear_down) and
+    camera. Errors are counted by event, camera and exception type. Hooks
+    are called after every observation with the event, camera, duration and
+    exception (or None).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """Initialise the instrumentation.
+
+        Args:
+            buckets: The upper bounds (in seconds) of the histogram buckets.
+        """
+        self._buckets = buckets
+        self._lock = Lock()
+        self._histograms = {}
+        self._error_counts = {}
+        self._hooks = {event: [] for event in EVENTS}
+
+    def add_hook(self, event, callback):
+        """Call a function after every observation of an event.
+
+        Args:
+            event: One of the EVENT_* constants.
+            callback: A function taking the event, camera, duration (in
+                seconds) and exception (or None).
+
+        Raises:
+            ValueError: If event is not a recognised event.
+        """
+        if event not in self._hooks:
+            raise ValueError("event must be one of: " + ", ".join(EVENTS) +
+                             ".")
+
+        self._hooks[event].append(callback)
+
+    def remove_hook(self, event, callback):
+        """Stop calling a function after observations of an event.
+
+        Args:
+            event: One of the EVENT_* constants.
+            callback: The function passed to add_hook.
+
+        Raises:
+            ValueError: If the hook does not exist.
+        """
+        self._hooks[event].remove(callback)
+
+    def observe(self, event, camera, duration, exception=None):
+        """Record an operation performed by a camera.
+
+        Args:
+            event: One of the EVENT_* constants.
+            camera: The camera that performed the operation.
+            duration: The time (in seconds) the operation took.
+            exception: The exception raised by the operation (or None).
+        """
+        camera_name = str(camera)
+
+        with self._lock:
+            histogram = self._histograms.get((event, camera_name))
+            if histogram is None:
+                histogram = LatencyHistogram(self._buckets)
+                self._histograms[(event, camera_name)] = histogram
+            histogram.observe(duration)
+
+            if exception is not None:
+                error_key = (event, camera_name, type(exception).__name__)
+                self._error_counts[error_key] = \
+                    self._error_counts.get(error_key, 0) + 1
+
+        for callback in self._hooks[event]:
+            callback(event, camera, duration, exception)
+
+    def get_histogram(self, event, camera):
+        """Return the latency histogram of an event on a camera.
+
+        Args:
+            event: One of the EVENT_* constants.
+            camera: The camera (or its name).
+
+        Returns: A LatencyHistogram (or None if nothing has been observed).
+        """
+        return self._histograms.get((event, str(camera)))
+
+    def get_error_count(self, camera, exception_type, event=None):
+        """Return how many times a camera has raised a type of exception.
+
+        Args:
+            camera: The camera (or its name).
+            exception_type: The exception class (or its name).
+            event: The event to count errors for (or None for every event).
+
+        Returns: The number of errors.
+        """
+        if isinstance(exception_type, type):
+            exception_type = exception_type.__name__
+
+        with self._lock:
+            return sum(count for (error_event, camera_name, error_type), count
+                       in self._error_counts.items()
+                       if camera_name == str(camera) and
+                       error_type == exception_type and
+                       event in (None, error_event))
+
+    def render_prometheus(self):
+        """Render the collected metrics in the Prometheus text format.
+
+        Returns: The metrics as a string.
+        """
+        histogram_name = "time_lapse_camera_operation_seconds"
+        lines = ["# HELP " + histogram_name + " Time taken by camera "
+                 "operations.",
+                 "# TYPE " + histogram_name + " histogram"]
+
+        with self._lock:
+            for (event, camera_name), histogram in sorted(
+                    self._histograms.items()):
+                labels = ('camera="' + _escape_label(camera_name) +
+                          '",operation="' + event + '"')
+
+                for upper_bound, count in histogram.get_cumulative_counts():
+                    if upper_bound == float("inf"):
+                        bound_text = "+Inf"
+                    else:
+                        bound_text = repr(float(upper_bound))
+                    lines.append(histogram_name + "_bucket{" + labels +
+                                 ',le="' + bound_text + '"} ' + str(count))
+
+                lines.append(histogram_name + "_sum{" + labels + "} " +
+                             repr(histogram.sum))
+                lines.append(histogram_name + "_count{" + labels + "} " +
+                             str(histogram.count))
+
+            lines.append("# HELP time_lapse_camera_errors_total Exceptions "
+                         "raised by camera operations.")
+            lines.append("# TYPE time_lapse_camera_errors_total counter")
+
+            for (event, camera_name, error_type), count in sorted(
+                    self._error_counts.items()):
+                lines.append('time_lapse_camera_errors_total{camera="' +
+                             _escape_label(camera_name) +
+                             '",operation="' + event +
+                             '",exception="' + error_type + '"} ' +
+                             str(count))
+
+        return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    """Escape a Prometheus label value.
+
+    Args:
+        value: The label value.
+
+    Returns: The escaped label value.
+    """
+    return (value.replace("\\", "\\\\")
+            .replace("\"", "\\\"")
+            .replace("\n", "\\n"))
+
+
+class PrometheusExporter:
+    """Serve instrumentation metrics over HTTP for Prometheus to scrape."""
+
+    def __init__(self, instrumentation, host="127.0.0.1", port=9464):
+        """Initialise the exporter.
+
+        Args:
+            instrumentation: The Instrumentation to export.
+            host: The address to listen on.
+            port: The port to listen on (or 0 for any free port).
+        """
+        self._instrumentation = instrumentation
+        self._host = host
+        self._port = port
+        self._server = None
+        self._thread = None
+
+    @property
+    def port(self):
+        """Return the port the exporter is listening on.
+
+        Returns: The port the exporter is listening on.
+        """
+        if self._server is not None:
+            return self._server.server_address[1]
+
+        return self._port
+
+    def start(self):
+        """Start serving metrics at /metrics from a background thread."""
+        # http.server is slow to import and only needed by the exporter.
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        instrumentation = self._instrumentation
+
+        class MetricsRequestHandler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+
+                body = instrumentation.render_prometheus().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((self._host, self._port),
+                                           MetricsRequestHandler)
+        self._thread = Thread(target=self._server.serve_forever,
+                              name="prometheus-exporter",
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop serving metrics."""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._thread.join()
+            self._server = None
+            self._thread = None
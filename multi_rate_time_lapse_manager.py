@@ -0,0 +1,579 @@
+"""A time-lapse manager whose cameras each capture at their own rate."""
+from heapq import heappop, heappush
+from itertools import count
+from threading import Condition
+from time import monotonic
+
+from capture_scheduler import CaptureScheduler
+from time_lapse_manager import TimeLapseManager
+
+
+class CameraSchedule:
+    """The timetable of one camera on a MultiRateTimeLapseManager.
+
+    Each camera has its own drift-free CaptureScheduler, started phase
+    seconds after the time-lapse, and stops capturing once it has captured
+    capture_limit frames.
+    """
+
+    def __init__(self,
+                 camera,
+                 capture_interval,
+                 phase=0,
+                 capture_limit=None,
+                 late_policy=None):
+        """Initialise the schedule.
+
+        Args:
+            camera: The camera the schedule belongs to.
+            capture_interval: The interval (in seconds) between the frames of
+                the camera.
+            phase: The delay (in seconds) from the start of the time-lapse to
+                the first frame of the camera.
+            capture_limit: The maximum number of frames the camera captures
+                (or None for infinite).
+            late_policy: The policy used when frames of the camera are missed
+                (see capture_scheduler), or None for the default.
+
+        Raises:
+            ValueError: If capture_interval is not greater than 0, if phase
+                is negative or if capture_limit is not greater than 0 or
+                None.
+        """
+        if capture_interval <= 0:
+            raise ValueError("capture_interval must be greater than 0.")
+        if phase < 0:
+            raise ValueError("phase must not be negative.")
+        if capture_limit is not None and capture_limit <= 0:
+            raise ValueError("capture_limit must be greater than 0.")
+
+        if late_policy is None:
+            self._scheduler = CaptureScheduler(capture_interval)
+        else:
+            self._scheduler = CaptureScheduler(capture_interval, late_policy)
+
+        self._camera = camera
+        self._phase = phase
+        self._capture_limit = capture_limit
+        self._captured_frames = 0
+        self._heap_token = 0
+        self._is_set_up = False
+        self._last_frame_timing = None
+
+    @property
+    def camera(self):
+        """Return the camera the schedule belongs to.
+
+        Returns: The camera the schedule belongs to.
+        """
+        return self._camera
+
+    @property
+    def capture_interval(self):
+        """Get the interval (in seconds) between the frames of the camera.
+
+        Returns: The interval (in seconds) between the frames of the camera.
+        """
+        return self._scheduler.interval
+
+    @capture_interval.setter
+    def capture_interval(self, capture_interval):
+        """Set the interval (in seconds) between the frames of the camera.
+
+        The frame already scheduled keeps its deadline.
+
+        Args:
+            capture_interval: The interval (in seconds) between the frames of
+                the camera.
+
+        Raises:
+            ValueError: If capture_interval is not greater than 0.
+        """
+        if capture_interval <= 0:
+            raise ValueError("capture_interval must be greater than 0.")
+
+        self._scheduler.interval = capture_interval
+
+    @property
+    def phase(self):
+        """Return the delay (in seconds) before the first frame of the camera.
+
+        Returns: The delay (in seconds) before the first frame of the camera.
+        """
+        return self._phase
+
+    @property
+    def capture_limit(self):
+        """Return the maximum number of frames the camera captures.
+
+        Returns: The maximum number of frames (or None for infinite).
+        """
+        return self._capture_limit
+
+    @property
+    def captured_frames(self):
+        """Return the number of frames the camera has been scheduled for.
+
+        Returns: The number of frames the camera has been scheduled for.
+        """
+        return self._captured_frames
+
+    @property
+    def finished(self):
+        """Return whether the camera has reached its capture limit.
+
+        Returns: A boolean specifying whether the camera has reached its
+            capture limit.
+        """
+        return (self._capture_limit is not None and
+                self._captured_frames >= self._capture_limit)
+
+    @property
+    def next_deadline(self):
+        """Return the monotonic time at which the next frame is due.
+
+        Returns: The monotonic time of the next frame (or None if the
+            schedule has not started).
+        """
+        if not self._scheduler.started:
+            return None
+
+        return self._scheduler.get_deadline(self._scheduler.next_slot)
+
+    @property
+    def last_frame_timing(self):
+        """Return the timing of the most recent frame of the camera.
+
+        Returns: A FrameTiming (or None if no frame has been scheduled).
+        """
+        return self._last_frame_timing
+
+    @property
+    def heap_token(self):
+        """Return the token of the entry of the camera on the frame heap.
+
+        Returns: The token; heap entries holding an older token are stale.
+        """
+        return self._heap_token
+
+    @property
+    def is_set_up(self):
+        """Return whether the camera has been set up.
+
+        Returns: A boolean specifying whether the camera has been set up.
+        """
+        return self._is_set_up
+
+    def start(self, now):
+        """Start the timeline of the camera.
+
+        Args:
+            now: The monotonic time the time-lapse started.
+        """
+        self._scheduler.start(now + self._phase)
+
+    def invalidate_heap_entry(self):
+        """Mark any entry of the camera on the frame heap as stale.
+
+        Returns: The token for the next entry of the camera.
+        """
+        self._heap_token += 1
+
+        return self._heap_token
+
+    def set_up_camera(self, set_up):
+        """Set up the camera unless it has already been set up.
+
+        Args:
+            set_up: A function that sets up the camera and returns whether
+                it succeeded.
+
+        Returns: A boolean specifying whether the camera is set up.
+        """
+        if not self._is_set_up:
+            self._is_set_up = set_up(self._camera)
+
+        return self._is_set_up
+
+    def begin_frame(self):
+        """Start the next frame of the camera if it is due.
+
+        Returns: The FrameTiming of the frame, or None if the late policy has
+            moved the frame to a later deadline.
+        """
+        if self._scheduler.get_delay() > 0:
+            return None
+
+        self._last_frame_timing = self._scheduler.begin_frame()
+
+        return self._last_frame_timing
+
+    def count_frame(self):
+        """Record that a frame of the camera has been scheduled."""
+        self._captured_frames += 1
+
+    def mark_torn_down(self):
+        """Record that the camera has been torn down."""
+        self._is_set_up = False
+
+    def reset(self):
+        """Forget the progress of an earlier time-lapse.
+
+        The camera is set up again and its capture limit counts from 0.
+        """
+        self._captured_frames = 0
+        self._is_set_up = False
+        self._last_frame_timing = None
+
+
+class MultiRateTimeLapseManager(TimeLapseManager):
+    """A time-lapse manager where each camera has its own interval.
+
+    The next deadline of every camera is kept in a heap, so the manager
+    sleeps until the earliest one and each frame costs O(log n) in the
+    number of cameras. Cameras that fall due together capture together.
+    Cameras can be added and removed while the time-lapse is running, from
+    any thread; added cameras are set up just before their first frame and
+    removed cameras are torn down on the capture thread.
+    """
+
+    def __init__(self,
+                 cameras=None,
+                 capture_interval=10,
+                 capture_limit=None,
+                 **kwargs):
+        """Initialise the time-lapse manager with the camera that will be used.
+
+        Args:
+            cameras: A collection of cameras that will be used when capturing
+                images using this time-lapse manager, each capturing every
+                capture_interval seconds until add_camera gives it its own
+                schedule.
+            capture_interval: The default interval (in seconds) between the
+                frames of each camera.
+            capture_limit: The maximum number of frames to capture, where a
+                frame is every camera due at once (or None for infinite).
+            **kwargs: Any further arguments accepted by TimeLapseManager,
+                other than interval_controller and checkpoint.
+
+        Raises:
+            ValueError: If capture_interval is not greater than 0, if
+                capture_limit is not greater than 0 or None, if late_policy
+                is not a recognised policy or if an interval_controller or
+                checkpoint is given, as they follow a single timeline.
+            TypeError: If capture_interval is not a numeric type or if
+                capture_limit is not a numeric type or None.
+        """
+        for argument_name in ("interval_controller", "checkpoint"):
+            if kwargs.get(argument_name) is not None:
+                raise ValueError(argument_name + " is not supported when "
+                                 "cameras have their own intervals.")
+
+        self._condition = Condition()
+        self._schedules = {}
+        self._heap = []
+        self._heap_order = count()
+        self._pending_tear_downs = []
+        self._running = False
+        self._stop_requested = False
+
+        super().__init__(None, capture_interval, capture_limit, **kwargs)
+
+        if cameras is not None:
+            self.set_cameras(cameras)
+
+    @property
+    def running(self):
+        """Return whether the time-lapse is currently running.
+
+        Returns: A boolean specifying whether the time-lapse is running.
+        """
+        return self._running
+
+    def add_camera(self,
+                   camera,
+                   capture_interval=None,
+                   phase=0,
+                   capture_limit=None):
+        """Add a camera with its own schedule, even while running.
+
+        Args:
+            camera: The camera to add.
+            capture_interval: The interval (in seconds) between the frames of
+                the camera (or None for the capture_interval of the manager).
+            phase: The delay (in seconds) from the start of the time-lapse,
+                or from now if it is already running, to the first frame of
+                the camera.
+            capture_limit: The maximum number of frames the camera captures
+                (or None for infinite).
+
+        Raises:
+            ValueError: If capture_interval is not greater than 0, if phase
+                is negative or if capture_limit is not greater than 0 or
+                None.
+        """
+        if capture_interval is None:
+            capture_interval = self.capture_interval
+
+        schedule = CameraSchedule(camera,
+                                  capture_interval,
+                                  phase,
+                                  capture_limit,
+                                  self.late_policy)
+
+        with self._condition:
+            if camera in self._schedules:
+                return
+
+            super().add_camera(camera)
+            self._schedules[camera] = schedule
+
+            if self._running:
+                self._start_schedule(schedule, monotonic())
+                self._condition.notify()
+
+    def remove_camera(self, camera):
+        """Remove a camera, even while running.
+
+        Raises:
+            ValueError: If the camera does not exist.
+        """
+        with self._condition:
+            super().remove_camera(camera)
+            schedule = self._schedules.pop(camera)
+            schedule.invalidate_heap_entry()
+
+            if self._running and schedule.is_set_up:
+                self._pending_tear_downs.append(camera)
+                self._condition.notify()
+
+    def set_cameras(self, cameras):
+        """Set the cameras, each capturing every capture_interval seconds.
+
+        Args:
+            cameras: The cameras that will be used when capturing images using
+                this time-lapse manager.
+        """
+        with self._condition:
+            for camera in list(self._schedules):
+                self.remove_camera(camera)
+
+            super().set_cameras([])
+
+            for camera in cameras:
+                self.add_camera(camera)
+
+    def get_camera_schedule(self, camera):
+        """Return the schedule of a camera.
+
+        Args:
+            camera: The camera.
+
+        Returns: The CameraSchedule of the camera.
+
+        Raises:
+            KeyError: If the camera does not exist.
+        """
+        with self._condition:
+            return self._schedules[camera]
+
+    def stop(self):
+        """Ask a running time-lapse to stop once the current frame is done."""
+        with self._condition:
+            self._stop_requested = True
+            self._condition.notify()
+
+    def start_time_lapse(self):
+        """Start the time-lapse process.
+
+        Each camera captures on its own timeline until it reaches its capture
+        limit. The time-lapse ends once no camera has frames left, the
+        manager reaches capture_limit or stop is called.
+        """
+        with self._condition:
+            self._stop_requested = False
+            self._running = True
+            cameras = self.get_cameras()
+
+            for schedule in self._schedules.values():
+                schedule.reset()
+
+        try:
+            for camera in cameras:
+                self._schedules[camera].set_up_camera(self._set_up_camera)
+
+            with self._condition:
+                now = monotonic()
+                for schedule in self._schedules.values():
+                    self._start_schedule(schedule, now)
+
+            while not self._is_capture_limit_reached():
+                schedules = self._wait_for_due_schedules()
+
+                if schedules is None:
+                    break
+
+                self._capture_with_schedules(schedules)
+        finally:
+            with self._condition:
+                self._running = False
+                self._heap = []
+
+            self._tear_down_removed_cameras()
+            self._frame_capturer.shut_down()
+            self._tear_down_cameras()
+
+    def capture_frame(self):
+        """Capture with every camera whose next frame is already due.
+
+        The timeline of any camera that has not started yet starts now.
+
+        Raises:
+            Exception: The first exception raised by a camera (or, with a
+                health monitor, the first it does not handle), once the
+                outcome of the frame has been recorded in last_frame_result.
+        """
+        if self._is_capture_limit_reached():
+            self._tear_down_cameras()
+            return
+
+        with self._condition:
+            now = monotonic()
+            for schedule in self._schedules.values():
+                if schedule.next_deadline is None:
+                    self._start_schedule(schedule, now)
+
+            schedules = self._pop_due_schedules(now)
+
+        if schedules:
+            self._capture_with_schedules(schedules)
+
+    def _start_schedule(self, schedule, now):
+        """Start the timeline of a camera and queue its first frame.
+
+        The condition must be held by the caller.
+
+        Args:
+            schedule: The CameraSchedule.
+            now: The monotonic time the time-lapse started.
+        """
+        schedule.start(now)
+        self._push_schedule(schedule)
+
+    def _push_schedule(self, schedule):
+        """Queue the next frame of a camera on the heap.
+
+        The condition must be held by the caller.
+
+        Args:
+            schedule: The CameraSchedule.
+        """
+        heap_token = schedule.invalidate_heap_entry()
+        heappush(self._heap, (schedule.next_deadline,
+                              next(self._heap_order),
+                              heap_token,
+                              schedule))
+
+    def _wait_for_due_schedules(self):
+        """Sleep until at least one camera is due to capture.
+
+        Returns: A list of the CameraSchedule of each camera due, or None if
+            a stop was requested or every camera has reached its limit.
+        """
+        while True:
+            self._tear_down_removed_cameras()
+
+            with self._condition:
+                if self._pending_tear_downs:
+                    continue
+
+                if self._stop_requested or not self._heap:
+                    return None
+
+                now = monotonic()
+                schedules = self._pop_due_schedules(now)
+
+                if schedules:
+                    return schedules
+
+                if self._heap:
+                    self._condition.wait(self._heap[0][0] - now)
+
+    def _pop_due_schedules(self, now):
+        """Take every camera whose next frame is due off the heap.
+
+        The condition must be held by the caller. Cameras whose frames were
+        dropped by the late policy are queued again for their next frame.
+
+        Args:
+            now: The current monotonic time.
+
+        Returns: A list of the CameraSchedule of each camera due.
+        """
+        schedules = []
+        requeued_schedules = []
+
+        while self._heap and self._heap[0][0] <= now:
+            _, _, heap_token, schedule = heappop(self._heap)
+
+            if heap_token != schedule.heap_token:
+                continue
+
+            frame_timing = schedule.begin_frame()
+
+            if frame_timing is None:
+                requeued_schedules.append(schedule)
+                continue
+
+            self._frame_timings.append(frame_timing)
+            schedules.append(schedule)
+
+        for schedule in requeued_schedules:
+            self._push_schedule(schedule)
+
+        return schedules
+
+    def _capture_with_schedules(self, schedules):
+        """Capture with the cameras that are due and queue their next frames.
+
+        Args:
+            schedules: The CameraSchedule of each camera due.
+        """
+        cameras = []
+
+        for schedule in schedules:
+            if schedule.set_up_camera(self._set_up_camera):
+                cameras.append(schedule.camera)
+
+        try:
+            self._capture_with_cameras(cameras)
+        finally:
+            with self._condition:
+                for schedule in schedules:
+                    schedule.count_frame()
+
+                    if (not schedule.finished and
+                            self._schedules.get(schedule.camera) is schedule):
+                        self._push_schedule(schedule)
+
+    def _tear_down_cameras(self):
+        """Tear down every camera on this time-lapse manager."""
+        try:
+            super()._tear_down_cameras()
+        finally:
+            with self._condition:
+                for schedule in self._schedules.values():
+                    schedule.mark_torn_down()
+
+    def _tear_down_removed_cameras(self):
+        """Tear down the cameras removed while the time-lapse was running.
+
+        The condition must not be held by the caller, so that a slow camera
+        does not block cameras being added or removed on other threads.
+        """
+        with self._condition:
+            cameras = self._pending_tear_downs
+            self._pending_tear_downs = []
+
+        for camera in cameras:
+            self._tear_down_camera(camera)
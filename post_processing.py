@@ -0,0 +1,528 @@
+"""Deflicker and stabilise captured frames in batches across processes."""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import cpu_count, makedirs
+from itertools import chain, islice
+from os.path import basename, join, splitext
+
+import numpy
+
+from storage.thumbnail_generator import encode_ppm
+
+LUMA_WEIGHTS = (0.299, 0.587, 0.114)
+NATIVE_EXTENSIONS = ("ppm", "pgm")
+
+
+def read_frame(path):
+    """Read an 8-bit image.
+
+    Binary PPM and PGM files are read directly, and any other format is read
+    with Pillow.
+
+    Args:
+        path: The path of the image.
+
+    Returns: A uint8 array of shape (height, width) or (height, width, 3).
+
+    Raises:
+        ValueError: If a PPM or PGM file is not an 8-bit binary image.
+    """
+    if splitext(path)[1][1:].lower() not in NATIVE_EXTENSIONS:
+        # Pillow is only needed for formats other than PPM and PGM.
+        from PIL import Image
+
+        with Image.open(path) as image:
+            return numpy.asarray(image)
+
+    with open(path, "rb") as image_file:
+        data = image_file.read()
+
+    fields = []
+    position = 0
+
+    while len(fields) < 4:
+        while data[position:position + 1].isspace():
+            position += 1
+        if data[position:position + 1] == b"#":
+            position = data.index(b"\n", position)
+            continue
+        end = position
+        while not data[end:end + 1].isspace():
+            end += 1
+        fields.append(data[position:end])
+        position = end
+
+    magic_number, width, height, max_value = fields
+    if magic_number not in (b"P5", b"P6") or max_value != b"255":
+        raise ValueError(path + " is not an 8-bit binary PPM or PGM file.")
+
+    shape = (int(height), int(width))
+    if magic_number == b"P6":
+        shape += (3,)
+
+    return numpy.frombuffer(data,
+                            dtype=numpy.uint8,
+                            count=int(numpy.prod(shape)),
+                            offset=position + 1).reshape(shape)
+
+
+def write_frame(path, pixels):
+    """Write an 8-bit image in the format given by its extension.
+
+    Args:
+        path: The path of the image.
+        pixels: A uint8 array of shape (height, width) or
+            (height, width, channels).
+    """
+    if splitext(path)[1][1:].lower() in NATIVE_EXTENSIONS:
+        with open(path, "wb") as image_file:
+            image_file.write(encode_ppm(pixels))
+        return
+
+    # Pillow is only needed for formats other than PPM and PGM.
+    from PIL import Image
+
+    Image.fromarray(pixels).save(path)
+
+
+def get_luminance(frames):
+    """Return the mean luminance of each frame in a batch.
+
+    Args:
+        frames: A uint8 array of shape (frames, height, width) or
+            (frames, height, width, channels).
+
+    Returns: A float64 array with one mean luminance per frame.
+    """
+    return get_grey(frames).mean(axis=(1, 2), dtype=numpy.float64)
+
+
+def get_grey(frames):
+    """Convert a batch of frames to greyscale.
+
+    Args:
+        frames: A uint8 array of shape (frames, height, width) or
+            (frames, height, width, channels).
+
+    Returns: A float32 array of shape (frames, height, width).
+    """
+    if frames.ndim == 3:
+        return frames.astype(numpy.float32)
+    if frames.shape[3] < 3:
+        return frames[..., 0].astype(numpy.float32)
+
+    return frames[..., :3] @ numpy.array(LUMA_WEIGHTS, dtype=numpy.float32)
+
+
+def rolling_mean(values, window):
+    """Return the mean of each value and its neighbours.
+
+    Args:
+        values: A one-dimensional array.
+        window: The number of values averaged, centred on each value. The
+            window is cut short at either end of the array.
+
+    Returns: A float64 array of the same length.
+    """
+    values = numpy.asarray(values, dtype=numpy.float64)
+    sums = numpy.concatenate(([0.0], numpy.cumsum(values)))
+    indexes = numpy.arange(len(values))
+    starts = numpy.clip(indexes - window // 2, 0, len(values))
+    ends = numpy.clip(indexes + (window + 1) // 2, 0, len(values))
+
+    return (sums[ends] - sums[starts]) / (ends - starts)
+
+
+def downscale_grey(grey, factor):
+    """Shrink a batch of greyscale frames by averaging blocks of pixels.
+
+    Args:
+        grey: A float32 array of shape (frames, height, width).
+        factor: The factor to shrink each side by.
+
+    Returns: A float32 array of shape
+        (frames, height // factor, width // factor).
+    """
+    if factor == 1:
+        return grey
+
+    height = grey.shape[1] // factor
+    width = grey.shape[2] // factor
+
+    return grey[:, :height * factor, :width * factor].reshape(
+        grey.shape[0], height, factor, width, factor).mean(axis=(2, 4))
+
+
+def estimate_shifts(grey, reference):
+    """Find the translation that aligns each frame with a reference frame.
+
+    The translations are found together by phase correlation, using one
+    batched FFT for the whole batch.
+
+    Args:
+        grey: A float32 array of shape (frames, height, width).
+        reference: A float32 array of shape (height, width).
+
+    Returns: An int array of shape (frames, 2) holding the (rows, columns)
+        each frame must be moved by to line up with the reference.
+    """
+    height, width = reference.shape
+    window = numpy.outer(numpy.hanning(height),
+                         numpy.hanning(width)).astype(numpy.float32)
+
+    frame_spectra = numpy.fft.rfft2(
+        (grey - grey.mean(axis=(1, 2), keepdims=True)) * window)
+    reference_spectrum = numpy.fft.rfft2((reference - reference.mean()) *
+                                         window)
+
+    cross_power = reference_spectrum * numpy.conj(frame_spectra)
+    cross_power /= numpy.maximum(numpy.abs(cross_power), 1e-12)
+    correlation = numpy.fft.irfft2(cross_power, s=(height, width))
+
+    peaks = correlation.reshape(len(grey), -1).argmax(axis=1)
+    rows, columns = numpy.unravel_index(peaks, (height, width))
+    rows = numpy.where(rows > height // 2, rows - height, rows)
+    columns = numpy.where(columns > width // 2, columns - width, columns)
+
+    return numpy.stack((rows, columns), axis=1)
+
+
+def apply_corrections(frames, gains, shifts):
+    """Scale the brightness of, and move, each frame in a batch.
+
+    Pixels moved in from beyond the edge of a frame repeat the edge.
+
+    Args:
+        frames: A uint8 array of shape (frames, height, width) or
+            (frames, height, width, channels).
+        gains: The factor to multiply the brightness of each frame by.
+        shifts: An int array of shape (frames, 2) holding the (rows, columns)
+            to move each frame by.
+
+    Returns: A uint8 array of the same shape as frames.
+    """
+    frame_count, height, width = frames.shape[:3]
+
+    rows = numpy.clip(numpy.arange(height)[numpy.newaxis, :] -
+                      shifts[:, 0:1], 0, height - 1)
+    columns = numpy.clip(numpy.arange(width)[numpy.newaxis, :] -
+                         shifts[:, 1:2], 0, width - 1)
+    moved = frames[numpy.arange(frame_count)[:, numpy.newaxis, numpy.newaxis],
+                   rows[:, :, numpy.newaxis],
+                   columns[:, numpy.newaxis, :]]
+
+    gains = numpy.asarray(gains, dtype=numpy.float32).reshape(
+        (frame_count,) + (1,) * (frames.ndim - 1))
+    corrected = moved * gains
+
+    return numpy.clip(numpy.rint(corrected), 0, 255).astype(numpy.uint8)
+
+
+def _measure_batch(paths, reference, alignment_factor, frame_reader):
+    """Measure the luminance and misalignment of a batch of frames.
+
+    This runs in a worker process.
+
+    Args:
+        paths: The paths of the frames.
+        reference: The downscaled greyscale reference frame (or None to skip
+            alignment).
+        alignment_factor: The factor frames are shrunk by before alignment.
+        frame_reader: A function reading a frame from a path.
+
+    Returns: A tuple of the luminance of each frame and an int array of the
+        shift of each frame.
+    """
+    frames = numpy.stack([frame_reader(path) for path in paths])
+    grey = get_grey(frames)
+    luminance = grey.mean(axis=(1, 2), dtype=numpy.float64)
+
+    if reference is None:
+        return luminance, numpy.zeros((len(paths), 2), dtype=numpy.int64)
+
+    shifts = estimate_shifts(downscale_grey(grey, alignment_factor),
+                             reference)
+
+    return luminance, shifts * alignment_factor
+
+
+def _correct_batch(paths,
+                   output_paths,
+                   gains,
+                   shifts,
+                   frame_reader,
+                   frame_writer):
+    """Correct and write a batch of frames.
+
+    This runs in a worker process.
+
+    Args:
+        paths: The paths of the frames.
+        output_paths: The paths to write the corrected frames to.
+        gains: The factor to multiply the brightness of each frame by.
+        shifts: The (rows, columns) to move each frame by.
+        frame_reader: A function reading a frame from a path.
+        frame_writer: A function writing a frame to a path.
+
+    Returns: The paths the corrected frames were written to.
+    """
+    frames = numpy.stack([frame_reader(path) for path in paths])
+
+    for output_path, pixels in zip(output_paths,
+                                   apply_corrections(frames, gains, shifts)):
+        frame_writer(output_path, pixels)
+
+    return output_paths
+
+
+class PostProcessor:
+    """Deflicker and stabilise a sequence of captured frames.
+
+    Frames are handled in batches of batch_size in two stages. The first
+    measures the luminance of every frame and its translation from the first
+    frame by phase correlation, and the second scales each frame towards the
+    rolling mean luminance of its neighbours and moves it into line with the
+    first frame. A batch is corrected as soon as the luminance of the frames
+    deflicker_window // 2 after it has been measured, and only the
+    measurements still inside the window are kept. Batches of both stages
+    run in a process pool, with at most two batches per process in flight,
+    so memory stays the same however long the session.
+    """
+
+    def __init__(self,
+                 output_directory,
+                 batch_size=32,
+                 deflicker_window=15,
+                 deflicker=True,
+                 stabilise=True,
+                 alignment_factor=1,
+                 process_count=None,
+                 output_extension=None,
+                 frame_reader=read_frame,
+                 frame_writer=write_frame):
+        """Initialise the post-processor.
+
+        Args:
+            output_directory: The directory corrected frames are written to,
+                under the filenames of the originals.
+            batch_size: The number of frames processed together.
+            deflicker_window: The number of frames whose mean luminance each
+                frame is scaled towards.
+            deflicker: Whether to even out the brightness of frames.
+            stabilise: Whether to move frames into line with the first.
+            alignment_factor: The factor frames are shrunk by before they are
+                aligned, trading accuracy for speed.
+            process_count: The number of worker processes (or None for one
+                per CPU).
+            output_extension: The extension, and so format, of the corrected
+                frames (or None to keep the extension of each original).
+            frame_reader: A picklable function reading a frame from a path.
+            frame_writer: A picklable function writing a frame to a path.
+
+        Raises:
+            ValueError: If batch_size, deflicker_window or alignment_factor
+                is not greater than 0.
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be greater than 0.")
+        if deflicker_window <= 0:
+            raise ValueError("deflicker_window must be greater than 0.")
+        if alignment_factor <= 0:
+            raise ValueError("alignment_factor must be greater than 0.")
+
+        self._output_directory = output_directory
+        self._batch_size = batch_size
+        self._deflicker_window = deflicker_window
+        self._deflicker = deflicker
+        self._stabilise = stabilise
+        self._alignment_factor = alignment_factor
+        self._process_count = process_count
+        self._output_extension = output_extension
+        self._frame_reader = frame_reader
+        self._frame_writer = frame_writer
+
+    def get_output_path(self, image_path):
+        """Return the path a corrected frame is written to.
+
+        Args:
+            image_path: The path of the original frame.
+
+        Returns: The path of the corrected frame.
+        """
+        filename, extension = splitext(basename(image_path))
+
+        if self._output_extension is not None:
+            extension = "." + self._output_extension
+
+        return join(self._output_directory, filename + extension)
+
+    def process(self, image_paths):
+        """Correct a sequence of frames.
+
+        Args:
+            image_paths: An iterable of the paths of the frames in order,
+                such as the result of get_captured_image_paths on a camera.
+                Paths of None (images that were not stored) are skipped.
+
+        Returns: A list of the paths of the corrected frames.
+        """
+        batches = self._get_batches(path for path in image_paths
+                                    if path is not None)
+        first_batch = next(batches, None)
+
+        if first_batch is None:
+            return []
+
+        makedirs(self._output_directory, exist_ok=True)
+        output_paths = []
+        reference = None
+
+        if self._stabilise:
+            first_frame = self._frame_reader(first_batch[0])
+            reference = downscale_grey(get_grey(first_frame[numpy.newaxis]),
+                                       self._alignment_factor)[0]
+
+        with ProcessPoolExecutor(self._process_count) as executor:
+            measurements = self._measure(executor,
+                                         [first_batch],
+                                         batches,
+                                         reference)
+
+            for written_paths in self._run_batches(
+                    executor,
+                    _correct_batch,
+                    self._get_corrections(measurements)):
+                output_paths.extend(written_paths)
+
+        return output_paths
+
+    def _get_batches(self, image_paths):
+        """Split paths into batches.
+
+        Args:
+            image_paths: An iterator of paths.
+
+        Returns: A generator of lists of at most batch_size paths.
+        """
+        while True:
+            batch = list(islice(image_paths, self._batch_size))
+            if not batch:
+                return
+            yield batch
+
+    def _measure(self, executor, first_batches, batches, reference):
+        """Measure the luminance and misalignment of every frame.
+
+        Args:
+            executor: The ProcessPoolExecutor to run batches in.
+            first_batches: The batches of paths already taken from batches.
+            batches: An iterator of the remaining batches of paths.
+            reference: The downscaled greyscale reference frame (or None to
+                skip alignment).
+
+        Returns: A generator of tuples of the paths of a batch, a float64
+            array of the luminance of each frame and an int array of shape
+            (frames, 2) of the shift of each frame, in order.
+        """
+        submitted = deque()
+
+        def get_arguments():
+            for batch in chain(first_batches, batches):
+                submitted.append(batch)
+                yield (batch,
+                       reference,
+                       self._alignment_factor,
+                       self._frame_reader)
+
+        for luminance, shifts in self._run_batches(executor,
+                                                   _measure_batch,
+                                                   get_arguments()):
+            yield submitted.popleft(), luminance, shifts
+
+    def _get_corrections(self, measurements):
+        """Turn measured batches into the arguments of correction batches.
+
+        Only the measurements of frames still to be corrected, and of the
+        deflicker_window // 2 frames before them, are kept.
+
+        Args:
+            measurements: A generator of measured batches from _measure.
+
+        Returns: A generator of the arguments of _correct_batch for each
+            batch.
+        """
+        if self._deflicker:
+            behind = self._deflicker_window // 2
+            ahead = (self._deflicker_window + 1) // 2 - 1
+        else:
+            behind = ahead = 0
+
+        # The measurements held, starting with frame number first.
+        paths = []
+        luminance = []
+        shifts = []
+        first = 0
+        start = 0
+
+        finished = False
+
+        while not finished or start < first + len(paths):
+            measured = next(measurements, None)
+
+            if measured is None:
+                finished = True
+            else:
+                paths.extend(measured[0])
+                luminance.extend(measured[1])
+                shifts.extend(measured[2])
+
+            measured_count = first + len(paths)
+
+            while (start < measured_count and
+                   (finished or measured_count - ahead - start >=
+                    self._batch_size)):
+                end = min(start + self._batch_size, measured_count)
+                window_end = min(end + ahead, measured_count)
+                batch = slice(start - first, end - first)
+
+                if self._deflicker:
+                    window = numpy.array(luminance[:window_end - first])
+                    gains = (rolling_mean(window, self._deflicker_window) /
+                             numpy.maximum(window, 1e-6))[batch]
+                else:
+                    gains = numpy.ones(end - start)
+
+                yield (paths[batch],
+                       [self.get_output_path(path) for path in paths[batch]],
+                       gains,
+                       numpy.array(shifts[batch]),
+                       self._frame_reader,
+                       self._frame_writer)
+
+                start = end
+                dropped = max(start - behind - first, 0)
+                del paths[:dropped]
+                del luminance[:dropped]
+                del shifts[:dropped]
+                first += dropped
+
+    def _run_batches(self, executor, function, arguments):
+        """Run a function on each batch, keeping a few batches in flight.
+
+        Args:
+            executor: The ProcessPoolExecutor to run batches in.
+            function: The function to run on each batch.
+            arguments: The arguments of the function for each batch.
+
+        Returns: A generator of the results, in order.
+        """
+        max_in_flight = 2 * (self._process_count or cpu_count() or 1)
+        futures = deque()
+
+        for batch_arguments in arguments:
+            if len(futures) >= max_in_flight:
+                yield futures.popleft().result()
+            futures.append(executor.submit(function, *batch_arguments))
+
+        while futures:
+            yield futures.popleft().result()
@@ -0,0 +1,248 @@
+"""Crash-safe checkpoints that let an interrupted time-lapse resume."""
+import json
+from os import O_RDONLY, close, fsync, open as open_fd, remove, replace
+from os.path import abspath, dirname, exists, join
+from time import monotonic, time
+
+CHECKPOINT_FORMAT_VERSION = 1
+
+
+class CheckpointError(Exception):
+    """Raised when a checkpoint cannot be used to resume a session."""
+    pass
+
+
+class SessionCheckpoint:
+    """Save and restore the progress of a time-lapse manager.
+
+    A checkpoint holds the number of frames captured, the capture limit and
+    interval, the phase of the schedule and the capture ledger of every
+    camera. The phase is saved as the wall-clock time of the next deadline,
+    so a resumed session stays on the timeline it started on. Checkpoints
+    are written to a temporary file and renamed over the previous one, so a
+    crash never leaves a partial checkpoint behind. Each save syncs the file
+    and its directory to disk, so saves are spread out by save_every and
+    save_interval rather than made after every frame.
+
+    Images captured after the last save are not in the checkpoint, so on
+    restore each camera moves past them rather than overwriting them: a
+    camera storing images locally continues after the last of the next
+    save_every images found on disk, and any other camera skips save_every
+    sequence numbers. Skipped sequence numbers are recorded as failed.
+    """
+
+    def __init__(self,
+                 path,
+                 save_every=100,
+                 save_interval=60,
+                 clock=monotonic,
+                 wall_clock=time):
+        """Initialise the checkpoint.
+
+        Args:
+            path: The path of the checkpoint file.
+            save_every: The most frames captured between saves, which is
+                also how many sequence numbers each camera may skip when the
+                checkpoint is restored.
+            save_interval: The most time (in seconds) between saves, so that
+                slow time-lapses are saved before save_every frames (or None
+                to save on frame counts alone).
+            clock: A function returning the current monotonic time, as used
+                by the scheduler of the manager.
+            wall_clock: A function returning the current wall-clock time (in
+                seconds since the epoch).
+
+        Raises:
+            ValueError: If save_every or save_interval is not greater than 0.
+        """
+        if save_every <= 0:
+            raise ValueError("save_every must be greater than 0.")
+        if save_interval is not None and save_interval <= 0:
+            raise ValueError("save_interval must be greater than 0.")
+
+        self._path = path
+        self._save_every = save_every
+        self._save_interval = save_interval
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._frames_since_save = 0
+        self._last_saved = None
+
+    @property
+    def path(self):
+        """Return the path of the checkpoint file.
+
+        Returns: The path of the checkpoint file.
+        """
+        return self._path
+
+    def exists(self):
+        """Return whether a checkpoint has been saved.
+
+        Returns: A boolean specifying whether the checkpoint file exists.
+        """
+        return exists(self._path)
+
+    def frame_captured(self, manager):
+        """Save a checkpoint once enough frames or time have passed.
+
+        Args:
+            manager: The TimeLapseManager that captured the frame.
+        """
+        self._frames_since_save += 1
+        now = self._clock()
+
+        if self._last_saved is None:
+            self._last_saved = now
+
+        if (self._frames_since_save >= self._save_every or
+                (self._save_interval is not None and
+                 now - self._last_saved >= self._save_interval)):
+            self.save(manager)
+
+    def save(self, manager):
+        """Save the progress of a time-lapse manager atomically.
+
+        Args:
+            manager: The TimeLapseManager to save.
+        """
+        self._frames_since_save = 0
+        self._last_saved = self._clock()
+
+        state = manager.get_session_state()
+        state["format_version"] = CHECKPOINT_FORMAT_VERSION
+        state["save_every"] = self._save_every
+        if state["next_deadline"] is not None:
+            state["next_deadline"] += self._wall_clock() - self._clock()
+
+        with open(self._path + ".tmp", "w", encoding="utf-8") as state_file:
+            json.dump(state, state_file)
+            state_file.flush()
+            fsync(state_file.fileno())
+
+        replace(self._path + ".tmp", self._path)
+        self._fsync_directory(dirname(abspath(self._path)))
+
+    def load(self):
+        """Return the saved checkpoint.
+
+        Returns: A dictionary of the saved state (or None if no checkpoint
+            has been saved).
+
+        Raises:
+            CheckpointError: If the checkpoint was saved in an unknown format.
+        """
+        if not self.exists():
+            return None
+
+        with open(self._path, "r", encoding="utf-8") as state_file:
+            state = json.load(state_file)
+
+        if state.get("format_version") != CHECKPOINT_FORMAT_VERSION:
+            raise CheckpointError("Unsupported checkpoint format: " +
+                                  str(state.get("format_version")) + ".")
+
+        return state
+
+    def restore(self, manager):
+        """Restore the progress of a time-lapse manager from the checkpoint.
+
+        The counters, capture limit, interval and camera ledgers are restored
+        and the scheduler of the manager is started on the saved timeline,
+        however long ago the checkpoint was saved. Each camera ledger is then
+        moved past the images that may have been captured after the save.
+
+        Args:
+            manager: The TimeLapseManager to restore, with the same cameras
+                as the one that was saved.
+
+        Returns: A boolean specifying whether a checkpoint was restored.
+
+        Raises:
+            CheckpointError: If the checkpoint is in an unknown format or
+                names a camera the manager does not have.
+        """
+        state = self.load()
+
+        if state is None:
+            return False
+
+        camera_names = {str(camera) for camera in manager.get_cameras()}
+        missing_cameras = set(state["cameras"]) - camera_names
+        if missing_cameras:
+            raise CheckpointError("The checkpoint names cameras that are not "
+                                  "on the manager: " +
+                                  ", ".join(sorted(missing_cameras)) + ".")
+
+        if state["next_deadline"] is not None:
+            state["next_deadline"] += self._clock() - self._wall_clock()
+
+        manager.restore_session_state(state)
+
+        unsaved_frames = state.get("save_every", self._save_every)
+        for camera in manager.get_cameras():
+            if str(camera) in state["cameras"]:
+                self._skip_unsaved_captures(camera, unsaved_frames)
+
+        self._frames_since_save = 0
+        self._last_saved = self._clock()
+
+        return True
+
+    def remove(self):
+        """Delete the checkpoint, so that the next session starts afresh."""
+        if self.exists():
+            remove(self._path)
+
+    @staticmethod
+    def _skip_unsaved_captures(camera, unsaved_frames):
+        """Move a camera past the images captured after the last save.
+
+        Args:
+            camera: The camera, whose ledger has just been restored.
+            unsaved_frames: The most frames that may have been captured after
+                the last save.
+        """
+        # Images appended to a frame store have no files to overwrite.
+        if camera.frame_store is not None:
+            return
+
+        ledger = camera.capture_ledger
+
+        if not camera.images_stored_locally:
+            for _ in range(unsaved_frames):
+                ledger.record_failure()
+            return
+
+        found_images = []
+        for offset in range(unsaved_frames):
+            path = join(camera.storage_directory or "",
+                        ledger.get_filename(ledger.next_sequence + offset) +
+                        "." + camera.file_extension)
+            found_images.append(exists(path))
+
+        while any(found_images):
+            if found_images.pop(0):
+                ledger.record_capture(camera.storage_directory,
+                                      camera.file_extension)
+            else:
+                ledger.record_failure()
+
+    @staticmethod
+    def _fsync_directory(directory):
+        """Make the rename of the checkpoint durable.
+
+        Args:
+            directory: The directory holding the checkpoint.
+        """
+        try:
+            directory_descriptor = open_fd(directory, O_RDONLY)
+        except OSError:
+            return
+
+        try:
+            fsync(directory_descriptor)
+        except OSError:
+            pass
+        finally:
+            close(directory_descriptor)
@@ -0,0 +1,498 @@
+"""A library for managing time-lapse sequences across worker processes."""
+import pickle
+from multiprocessing import Pipe, Process, cpu_count
+from multiprocessing.shared_memory import SharedMemory
+from time import monotonic
+
+from camera.exceptions import (CameraCaptureError, CameraConnectionError,
+                               ImageStorageError)
+from frame_capture import CameraCaptureResult, FrameCaptureResult
+from instrumentation import EVENT_SET_UP, EVENT_TEAR_DOWN
+from time_lapse_manager import TimeLapseManager
+
+_COMMAND_SET_UP = "set_up"
+_COMMAND_CAPTURE = "capture"
+_COMMAND_TEAR_DOWN = "tear_down"
+_COMMAND_GET_LEDGERS = "get_ledgers"
+_COMMAND_STOP = "stop"
+
+
+def _make_picklable(exception):
+    """Return an exception that can be sent to the parent process.
+
+    Args:
+        exception: The exception raised by a camera.
+
+    Returns: The exception itself, or a CameraCaptureError describing it if
+        it cannot be pickled.
+    """
+    try:
+        pickle.dumps(exception)
+    except Exception:
+        return CameraCaptureError(repr(exception))
+
+    return exception
+
+
+def _run_camera_command(camera, command, frame_buffer):
+    """Run a command on a camera in a worker process.
+
+    Args:
+        camera: The camera.
+        command: One of the _COMMAND_* constants.
+        frame_buffer: The slice of shared memory that the camera's frames
+            are copied into (or None to let the camera store its own images).
+
+    Returns: A (started, finished, exception, frame length) tuple.
+    """
+    started = monotonic()
+    frame_length = 0
+
+    try:
+        if command == _COMMAND_SET_UP:
+            camera.set_up()
+        elif command == _COMMAND_TEAR_DOWN:
+            camera.tear_down()
+        elif frame_buffer is None:
+            camera.capture_image()
+        else:
+            image_data = memoryview(camera.capture_to_buffer()).cast("B")
+            frame_length = image_data.nbytes
+            if frame_length > frame_buffer.nbytes:
+                raise CameraCaptureError(
+                    "A frame of " + str(frame_length) + " bytes does not "
+                    "fit in the frame buffer.")
+            frame_buffer[:frame_length] = image_data
+    except Exception as exc:
+        return started, monotonic(), _make_picklable(exc), 0
+
+    return started, monotonic(), None, frame_length
+
+
+def _run_shard(connection, cameras, shared_memory, frame_buffer_size):
+    """Run commands from the parent process on a shard of cameras.
+
+    Args:
+        connection: The end of a Pipe connected to the parent process.
+        cameras: The cameras of the shard.
+        shared_memory: The SharedMemory holding a frame buffer for each
+            camera (or None if the cameras store their own images).
+        frame_buffer_size: The size (in bytes) of each frame buffer.
+    """
+    frame_buffers = [None] * len(cameras)
+
+    if shared_memory is not None:
+        frame_buffers = [shared_memory.buf[index * frame_buffer_size:
+                                           (index + 1) * frame_buffer_size]
+                         for index in range(len(cameras))]
+
+    try:
+        while True:
+            command = connection.recv()
+
+            if command in (_COMMAND_GET_LEDGERS, _COMMAND_STOP):
+                connection.send([camera.capture_ledger.get_state()
+                                 for camera in cameras])
+
+                if command == _COMMAND_STOP:
+                    break
+                continue
+
+            connection.send([_run_camera_command(camera, command, buffer)
+                             for camera, buffer in zip(cameras,
+                                                       frame_buffers)])
+    finally:
+        for frame_buffer in frame_buffers:
+            if frame_buffer is not None:
+                frame_buffer.release()
+        connection.close()
+
+
+class _Shard:
+    """The parent's handle on a worker process and its cameras."""
+
+    def __init__(self, cameras, frame_buffer_size):
+        """Start a worker process for some cameras.
+
+        Args:
+            cameras: The cameras of the shard.
+            frame_buffer_size: The size (in bytes) of the frame buffer for
+                each camera (or 0 to let the cameras store their own images).
+        """
+        self.cameras = cameras
+        self.shared_memory = None
+
+        if frame_buffer_size > 0:
+            self.shared_memory = SharedMemory(
+                create=True, size=frame_buffer_size * len(cameras))
+
+        self.connection, worker_connection = Pipe()
+        self.process = Process(target=_run_shard,
+                               args=(worker_connection,
+                                     cameras,
+                                     self.shared_memory,
+                                     frame_buffer_size),
+                               daemon=True)
+        self.process.start()
+        worker_connection.close()
+
+    def get_ledger_states(self):
+        """Return the capture ledger states of the cameras in the worker.
+
+        Returns: A list of the capture ledger states of the cameras in the
+            worker process (or None if the worker has stopped).
+        """
+        try:
+            self.connection.send(_COMMAND_GET_LEDGERS)
+            return self.connection.recv()
+        except (EOFError, OSError):
+            return None
+
+    def stop(self):
+        """Stop the worker process and free the shared memory.
+
+        Returns: A list of the capture ledger states of the cameras in the
+            worker process (or None if the worker had already stopped).
+        """
+        ledger_states = None
+
+        try:
+            self.connection.send(_COMMAND_STOP)
+            ledger_states = self.connection.recv()
+        except (EOFError, OSError):
+            pass
+
+        self.connection.close()
+        self.process.join()
+
+        if self.shared_memory is not None:
+            try:
+                self.shared_memory.close()
+            except BufferError:
+                # A frame handler kept a view of a frame instead of copying
+                # it, so the memory is unmapped once that view is freed.
+                pass
+            self.shared_memory.unlink()
+
+        return ledger_states
+
+
+class ShardedTimeLapseManager(TimeLapseManager):
+    """A time-lapse manager that spreads its cameras over worker processes.
+
+    The cameras are split round-robin into shards, each driven by its own
+    process so that the cameras do not compete for one interpreter. The
+    scheduler stays in the parent, which sends every shard a tick for each
+    frame and gathers the per-camera results, counting captured_frames and
+    raising errors just like TimeLapseManager.
+
+    When frame_buffer_size is set, workers capture with capture_to_buffer
+    and copy each frame into shared memory instead of pickling it. The
+    parent then either hands a memoryview of each frame to frame_handler or
+    stores it, and records failed captures, with its own copy of the camera,
+    so a single process writes to frame stores. Otherwise, the cameras store
+    their own images and their capture ledgers are copied back to the parent
+    whenever the session state is taken, such as for a checkpoint, and by
+    shut_down.
+
+    The cameras are sent to the workers when the shards start, so cameras
+    added afterwards are only used once the manager has been shut down.
+    """
+
+    def __init__(self,
+                 cameras=None,
+                 capture_interval=10,
+                 capture_limit=None,
+                 shard_count=None,
+                 frame_buffer_size=0,
+                 frame_handler=None,
+                 **kwargs):
+        """Initialise the time-lapse manager with the camera that will be used.
+
+        Args:
+            cameras: A collection of cameras that will be used when capturing
+                images using this time-lapse manager.
+            capture_interval: The interval (in seconds) between the start of
+                each frame.
+            capture_limit: The maximum number of images to capture (or None for
+                infinite).
+            shard_count: The number of worker processes (or None for one per
+                CPU). No more processes are started than there are cameras.
+            frame_buffer_size: The largest frame (in bytes) that can be passed
+                back through shared memory (or 0 to let the cameras store
+                their own images in the worker processes).
+            frame_handler: A function taking a camera and a memoryview of its
+                latest frame (or None to store frames with the parent's copy
+                of the camera). The memoryview is released once the function
+                returns, so a handler that keeps the frame must copy it,
+                such as with bytes(frame).
+            **kwargs: Any further arguments accepted by TimeLapseManager.
+
+        Raises:
+            ValueError: If capture_interval is not greater than 0, if
+                capture_limit is not greater than 0 or None, if late_policy
+                is not a recognised policy, if shard_count is not greater
+                than 0 or None, if frame_buffer_size is negative or if a
+                health_monitor is given, as the shards cannot be sidelined
+                one camera at a time.
+            TypeError: If capture_interval is not a numeric type or if
+                capture_limit is not a numeric type or None.
+        """
+        if shard_count is not None and shard_count <= 0:
+            raise ValueError("shard_count must be greater than 0.")
+        if frame_buffer_size < 0:
+            raise ValueError("frame_buffer_size must not be negative.")
+        if kwargs.get("health_monitor") is not None:
+            raise ValueError("health_monitor is not supported when "
+                             "cameras are sharded.")
+
+        super().__init__(cameras, capture_interval, capture_limit, **kwargs)
+
+        self._shard_count = shard_count or cpu_count()
+        self._frame_buffer_size = frame_buffer_size
+        self._frame_handler = frame_handler
+        self._shards = []
+
+    @property
+    def shard_count(self):
+        """Return the number of worker processes that are running.
+
+        Returns: The number of worker processes that are running.
+        """
+        return len(self._shards)
+
+    def start_time_lapse(self):
+        """Start the time-lapse process.
+
+        Frames are captured on a fixed timeline that starts when this is
+        called, so the time spent capturing does not delay later frames. If a
+        checkpoint has been saved, the time-lapse resumes from it instead.
+        The worker processes are shut down when the time-lapse ends.
+        """
+        resumed = self._resume_from_checkpoint()
+
+        try:
+            try:
+                self._start_shards()
+                self._run_shard_step(EVENT_SET_UP, _COMMAND_SET_UP)
+
+                if not resumed:
+                    self._scheduler.start()
+
+                while not self._is_capture_limit_reached():
+                    timing = self._scheduler.wait_for_next_frame()
+                    self._frame_timings.append(timing)
+                    self.capture_frame()
+                    self._save_checkpoint()
+            except Exception:
+                self._tear_down_cameras()
+                raise
+
+            self._tear_down_cameras()
+        finally:
+            self.shut_down()
+
+        self._remove_finished_checkpoint()
+
+    def capture_frame(self):
+        """Capture images using the cameras on this time-lapse manager.
+
+        The worker processes are started if they are not already running.
+
+        Raises:
+            Exception: The first exception raised by a camera, once the
+                outcome of the frame has been recorded in last_frame_result.
+        """
+        if self._is_capture_limit_reached():
+            self._tear_down_cameras()
+            return
+
+        self._start_shards()
+
+        camera_results = []
+
+        for shard, shard_results in self._send_to_shards(_COMMAND_CAPTURE):
+            for index, (camera, result) in enumerate(zip(shard.cameras,
+                                                         shard_results)):
+                started, finished, exception, frame_length = result
+
+                if exception is None and frame_length > 0:
+                    exception = self._handle_frame(
+                        camera,
+                        shard,
+                        index * self._frame_buffer_size,
+                        frame_length)
+                elif (exception is not None and self._frame_buffer_size and
+                      self._frame_handler is None):
+                    # The worker's copy of the camera stores nothing in
+                    # buffer mode, so the failure is recorded here.
+                    camera.record_failed_image()
+
+                camera_results.append(CameraCaptureResult(camera,
+                                                          started,
+                                                          finished,
+                                                          exception))
+
+        frame_result = FrameCaptureResult(camera_results)
+        self._record_frame_result(frame_result)
+        frame_result.raise_first_exception()
+        self._captured_frames += 1
+        self._adapt_capture_interval()
+
+    def get_session_state(self):
+        """Return the progress of this manager so that it can be resumed.
+
+        When the cameras store their own images, their capture ledgers are
+        first copied back from the worker processes, so that a resumed
+        session carries on from the last image they stored.
+
+        Returns: A dictionary of JSON-serialisable values, where
+            next_deadline is the monotonic time of the next frame (or None if
+            the time-lapse has not started).
+        """
+        for shard in self._shards:
+            self._copy_ledger_states(shard, shard.get_ledger_states())
+
+        return super().get_session_state()
+
+    def shut_down(self):
+        """Stop the worker processes.
+
+        When the cameras stored their own images, their capture ledgers are
+        copied back to the cameras on this manager.
+        """
+        for shard in self._shards:
+            self._copy_ledger_states(shard, shard.stop())
+
+        self._shards = []
+
+    def _copy_ledger_states(self, shard, ledger_states):
+        """Copy capture ledgers from a worker process to this manager.
+
+        Args:
+            shard: The shard the ledgers came from.
+            ledger_states: A list of the capture ledger states of the cameras
+                in the shard (or None if the worker has stopped).
+        """
+        # The parent records frames passed back through shared memory, so
+        # its ledgers are already up to date.
+        if ledger_states is None or self._frame_buffer_size > 0:
+            return
+
+        for camera, ledger_state in zip(shard.cameras, ledger_states):
+            camera.capture_ledger.set_state(ledger_state)
+
+    def _start_shards(self):
+        """Start a worker process for each shard if they are not running."""
+        if self._shards:
+            return
+
+        cameras = self.get_cameras()
+        shard_count = min(self._shard_count, len(cameras))
+
+        self._shards = [_Shard(cameras[index::shard_count],
+                               self._frame_buffer_size)
+                        for index in range(shard_count)]
+
+    def _tear_down_cameras(self):
+        """Tear down every camera in the worker processes."""
+        if self._shards:
+            self._run_shard_step(EVENT_TEAR_DOWN, _COMMAND_TEAR_DOWN)
+
+    def _run_shard_step(self, event, command):
+        """Run set_up or tear_down on every camera in the worker processes.
+
+        Args:
+            event: The instrumentation event of the operation.
+            command: The command to send to the workers.
+
+        Raises:
+            Exception: The first exception raised by a camera.
+        """
+        exceptions = []
+
+        for shard, shard_results in self._send_to_shards(command):
+            for camera, result in zip(shard.cameras, shard_results):
+                started, finished, exception, _ = result
+
+                if self._instrumentation is not None:
+                    self._instrumentation.observe(event,
+                                                  camera,
+                                                  finished - started,
+                                                  exception)
+                if exception is not None:
+                    exceptions.append(exception)
+
+        if exceptions:
+            raise exceptions[0]
+
+    def _send_to_shards(self, command):
+        """Send a command to every worker and gather their results.
+
+        Every worker is sent the command before any result is awaited, so
+        the shards run it at the same time.
+
+        Args:
+            command: One of the _COMMAND_* constants.
+
+        Returns: A list of (shard, results) tuples, where results holds a
+            (started, finished, exception, frame length) tuple per camera.
+        """
+        reachable_shards = []
+
+        for shard in self._shards:
+            try:
+                shard.connection.send(command)
+                reachable_shards.append(shard)
+            except OSError:
+                pass
+
+        shard_results = []
+
+        for shard in self._shards:
+            try:
+                if shard not in reachable_shards:
+                    raise EOFError
+                results = shard.connection.recv()
+            except (EOFError, OSError):
+                now = monotonic()
+                error = CameraConnectionError("The worker process for this "
+                                              "camera has stopped.")
+                results = [(now, now, error, 0) for _ in shard.cameras]
+
+            shard_results.append((shard, results))
+
+        return shard_results
+
+    def _handle_frame(self, camera, shard, offset, frame_length):
+        """Pass a frame from shared memory to the frame handler or storage.
+
+        Args:
+            camera: The camera that captured the frame.
+            shard: The shard holding the frame.
+            offset: The offset of the camera's buffer in the shared memory.
+            frame_length: The length (in bytes) of the frame.
+
+        Returns: The exception raised while handling the frame (or None).
+        """
+        frame = shard.shared_memory.buf[offset:offset + frame_length]
+        exception = None
+
+        # The frame is released even if the handler fails, so that a handler
+        # that keeps it without copying it fails as soon as it is used.
+        try:
+            if self._frame_handler is not None:
+                self._frame_handler(camera, frame)
+            elif camera.storage_writer is not None:
+                # The writer keeps the frame until after the buffer is reused.
+                camera.store_image(frame.tobytes())
+            else:
+                camera.store_image(frame)
+        except ImageStorageError as exc:
+            exception = exc
+        except Exception as exc:
+            exception = ImageStorageError(exc)
+
+        frame.release()
+
+        return exception
@@ -0,0 +1,300 @@
+"""An indexed SQLite catalog of every capture made by a set of cameras."""
+
+import sqlite3
+from collections import namedtuple
+from hashlib import new as new_hash
+from threading import Lock
+from time import monotonic, time
+
+from camera.capture_ledger import CAPTURE_STATUS_CAPTURED
+
+CatalogEntry = namedtuple("CatalogEntry", ["camera_name",
+                                           "sequence",
+                                           "monotonic_time",
+                                           "wall_time",
+                                           "path",
+                                           "size",
+                                           "digest",
+                                           "status"])
+CatalogEntry.__doc__ = """A capture recorded in a CaptureCatalog.
+
+Attributes:
+    camera_name: The name of the camera that made the capture.
+    sequence: The sequence number of the capture on the camera.
+    monotonic_time: The monotonic time at which the capture was recorded.
+    wall_time: The wall-clock time (in seconds since the epoch) at which the
+        capture was recorded.
+    path: The path of the stored image (or None if it was not stored).
+    size: The size (in bytes) of the image (or None if it is not known).
+    digest: The hex digest of the image (or None if it is not known).
+    status: One of the CAPTURE_STATUS_* constants.
+"""
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS captures (
+    camera_name TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    monotonic_time REAL NOT NULL,
+    wall_time REAL NOT NULL,
+    path TEXT,
+    size INTEGER,
+    digest TEXT,
+    status TEXT NOT NULL,
+    PRIMARY KEY (camera_name, sequence)
+);
+CREATE INDEX IF NOT EXISTS captures_by_camera_and_time
+    ON captures (camera_name, wall_time);
+CREATE INDEX IF NOT EXISTS captures_by_time ON captures (wall_time);
+"""
+
+_COLUMNS = ", ".join(CatalogEntry._fields)
+
+
+class CaptureCatalog:
+    """Record every capture in SQLite so that frames can be found quickly.
+
+    Captures are buffered in memory and written in a single transaction once
+    batch_size of them are waiting, so recording a capture does not wait for
+    the database. Status changes, such as evictions, are buffered the same
+    way. Queries flush any waiting captures first and use indexes
+    on camera and time, so finding frames never lists a directory.
+    """
+
+    def __init__(self,
+                 database_path,
+                 batch_size=100,
+                 hash_algorithm="blake2b",
+                 clock=monotonic,
+                 wall_clock=time):
+        """Initialise the catalog, creating the database if needed.
+
+        Args:
+            database_path: The path of the SQLite database (or ":memory:").
+            batch_size: The number of captures buffered before they are
+                written together.
+            hash_algorithm: The hashlib algorithm used to hash images (or
+                None to skip hashing).
+            clock: A function returning the current monotonic time.
+            wall_clock: A function returning the current wall-clock time (in
+                seconds since the epoch).
+
+        Raises:
+            ValueError: If batch_size is not greater than 0.
+        """
+        if batch_size <= 0:
+            raise ValueError("batch_size must be greater than 0.")
+
+        self._batch_size = batch_size
+        self._hash_algorithm = hash_algorithm
+        self._clock = clock
+        self._wall_clock = wall_clock
+        self._lock = Lock()
+        self._pending = []
+        self._pending_statuses = []
+
+        self._connection = sqlite3.connect(database_path,
+                                           check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.executescript(_SCHEMA)
+
+    def record(self,
+               camera_name,
+               sequence,
+               status=CAPTURE_STATUS_CAPTURED,
+               path=None,
+               image_data=None,
+               size=None):
+        """Add a capture to the catalog.
+
+        Args:
+            camera_name: The name of the camera that made the capture.
+            sequence: The sequence number of the capture on the camera.
+            status: One of the CAPTURE_STATUS_* constants.
+            path: The path of the stored image (or None).
+            image_data: The encoded image as a bytes-like object, used for
+                the size and digest (or None if it is not available).
+            size: The size (in bytes) of the image, used when image_data is
+                not available (or None).
+        """
+        digest = None
+
+        if image_data is not None:
+            image_data = memoryview(image_data)
+            size = image_data.nbytes
+            if self._hash_algorithm is not None:
+                digest = new_hash(self._hash_algorithm,
+                                  image_data.cast("B")).hexdigest()
+
+        entry = (camera_name, sequence, self._clock(), self._wall_clock(),
+                 path, size, digest, status)
+
+        with self._lock:
+            self._pending.append(entry)
+
+            if (len(self._pending) + len(self._pending_statuses) >=
+                    self._batch_size):
+                self._write_pending()
+
+    def set_status(self, camera_name, sequence, status):
+        """Change the status of a recorded capture.
+
+        Args:
+            camera_name: The name of the camera that made the capture.
+            sequence: The sequence number of the capture on the camera.
+            status: One of the CAPTURE_STATUS_* constants.
+        """
+        with self._lock:
+            self._pending_statuses.append((status, camera_name, sequence))
+
+            if (len(self._pending) + len(self._pending_statuses) >=
+                    self._batch_size):
+                self._write_pending()
+
+    def flush(self):
+        """Write every buffered capture to the database."""
+        with self._lock:
+            self._write_pending()
+
+    def close(self):
+        """Write every buffered capture and close the database."""
+        with self._lock:
+            self._write_pending()
+            self._connection.close()
+
+    def query(self,
+              camera_name=None,
+              start=None,
+              end=None,
+              every=1,
+              status=CAPTURE_STATUS_CAPTURED):
+        """Return captures in wall-clock order.
+
+        Args:
+            camera_name: The camera to return captures from (or None for
+                every camera).
+            start: The earliest wall-clock time (in seconds since the epoch)
+                to include (or None for no limit).
+            end: The wall-clock time (in seconds since the epoch) before which
+                captures are included (or None for no limit).
+            every: Return only every Nth matching capture, starting with the
+                first.
+            status: The status of the captures to return (or None for every
+                status).
+
+        Returns: A list of CatalogEntry.
+
+        Raises:
+            ValueError: If every is not greater than 0.
+        """
+        if every <= 0:
+            raise ValueError("every must be greater than 0.")
+
+        conditions = []
+        parameters = []
+
+        for column, operator, value in (("camera_name", "=", camera_name),
+                                        ("wall_time", ">=", start),
+                                        ("wall_time", "<", end),
+                                        ("status", "=", status)):
+            if value is not None:
+                conditions.append(column + " " + operator + " ?")
+                parameters.append(value)
+
+        where = ""
+        if conditions:
+            where = " WHERE " + " AND ".join(conditions)
+
+        sql = ("SELECT " + _COLUMNS + " FROM (SELECT " + _COLUMNS +
+               ", ROW_NUMBER() OVER (ORDER BY wall_time, sequence) - 1"
+               " AS position FROM captures" + where + ")"
+               " WHERE position % ? = 0 ORDER BY position")
+        parameters.append(every)
+
+        with self._lock:
+            self._write_pending()
+            rows = self._connection.execute(sql, parameters).fetchall()
+
+        return [CatalogEntry(*row) for row in rows]
+
+    def get_paths(self, camera_name=None, start=None, end=None, every=1):
+        """Return the paths of stored images in wall-clock order.
+
+        Args:
+            camera_name: The camera to return images from (or None for every
+                camera).
+            start: The earliest wall-clock time (in seconds since the epoch)
+                to include (or None for no limit).
+            end: The wall-clock time (in seconds since the epoch) before which
+                images are included (or None for no limit).
+            every: Return only every Nth image, starting with the first.
+
+        Returns: A list of paths, suitable for StreamingVideoAssembler.
+        """
+        return [entry.path for entry in self.query(camera_name,
+                                                   start,
+                                                   end,
+                                                   every)
+                if entry.path is not None]
+
+    def count(self, camera_name=None, status=None):
+        """Return the number of captures in the catalog.
+
+        Args:
+            camera_name: The camera to count captures from (or None for every
+                camera).
+            status: The status of the captures to count (or None for every
+                status).
+
+        Returns: The number of captures.
+        """
+        sql = "SELECT COUNT(*) FROM captures WHERE 1"
+        parameters = []
+
+        if camera_name is not None:
+            sql += " AND camera_name = ?"
+            parameters.append(camera_name)
+        if status is not None:
+            sql += " AND status = ?"
+            parameters.append(status)
+
+        with self._lock:
+            self._write_pending()
+            return self._connection.execute(sql, parameters).fetchone()[0]
+
+    def get_camera_names(self):
+        """Return the names of the cameras in the catalog.
+
+        Returns: A sorted list of camera names.
+        """
+        with self._lock:
+            self._write_pending()
+            rows = self._connection.execute(
+                "SELECT DISTINCT camera_name FROM captures "
+                "ORDER BY camera_name").fetchall()
+
+        return [row[0] for row in rows]
+
+    def _write_pending(self):
+        """Write the buffered captures and status changes in one transaction.
+
+        The captures are written first, so a status change to a capture
+        buffered with it applies.
+
+        The lock must be held by the caller.
+        """
+        if not self._pending and not self._pending_statuses:
+            return
+
+        with self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO captures (" + _COLUMNS + ") "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                self._pending)
+            self._connection.executemany(
+                "UPDATE captures SET status = ? "
+                "WHERE camera_name = ? AND sequence = ?",
+                self._pending_statuses)
+
+        self._pending = []
+        self._pending_statuses = []
@@ -0,0 +1,476 @@
+"""A minimal client for S3-compatible object storage.
+
+Requests are signed with AWS Signature Version 4 and sent with path-style
+addressing (endpoint/bucket/key), which every S3-compatible service
+supports. Each thread keeps its own keep-alive connection to the endpoint.
+"""
+import hmac
+from base64 import b64encode
+from collections import namedtuple
+from hashlib import md5, sha256
+from http.client import HTTPConnection, HTTPException, HTTPSConnection
+from threading import Lock, local
+from time import gmtime, strftime, time
+from urllib.parse import quote, urlsplit
+from xml.etree import ElementTree
+
+SIGNING_ALGORITHM = "AWS4-HMAC-SHA256"
+
+EMPTY_PAYLOAD_HASH = sha256(b"").hexdigest()
+
+S3Response = namedtuple("S3Response", ["status", "headers", "body"])
+S3Response.__doc__ = """A response from the object storage.
+
+Attributes:
+    status: The HTTP status.
+    headers: The headers, as a case-insensitive http.client.HTTPMessage.
+    body: The body as bytes.
+"""
+
+
+class S3Error(Exception):
+    """An error returned by, or while contacting, the object storage.
+
+    Attributes:
+        status: The HTTP status of the response (or None if there was no
+            response).
+        code: The S3 error code, such as "NoSuchBucket" (or None).
+    """
+
+    def __init__(self, message, status=None, code=None):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+
+
+def _hmac_sha256(key, message):
+    """Return the HMAC-SHA256 of a message.
+
+    Args:
+        key: The key as bytes.
+        message: The message as a string.
+
+    Returns: The digest as bytes.
+    """
+    return hmac.new(key, message.encode("utf-8"), sha256).digest()
+
+
+def _quote(value, safe="~"):
+    """URI-encode a value as Signature Version 4 requires.
+
+    Args:
+        value: The string to encode.
+        safe: The characters, beyond unreserved ones, to leave unencoded.
+
+    Returns: The encoded string.
+    """
+    return quote(value, safe=safe)
+
+
+def sign_request(method,
+                 path,
+                 query,
+                 headers,
+                 payload_hash,
+                 access_key,
+                 secret_key,
+                 region,
+                 amz_date):
+    """Return the Authorization header of a Signature Version 4 request.
+
+    Args:
+        method: The HTTP method.
+        path: The unencoded path of the request, such as "/bucket/key".
+        query: A dictionary of the query parameters.
+        headers: A dictionary of the headers to sign, which must include
+            Host, X-Amz-Date and X-Amz-Content-Sha256.
+        payload_hash: The hex SHA-256 digest of the body.
+        access_key: The access key ID.
+        secret_key: The secret access key.
+        region: The region of the endpoint.
+        amz_date: The time of the request in the form YYYYMMDDTHHMMSSZ.
+
+    Returns: The value of the Authorization header.
+    """
+    canonical_headers = sorted((name.lower(), " ".join(str(value).split()))
+                               for name, value in headers.items())
+    signed_headers = ";".join(name for name, _ in canonical_headers)
+    canonical_query = "&".join(
+        _quote(name) + "=" + _quote(value)
+        for name, value in sorted(query.items()))
+
+    canonical_request = "\n".join(
+        [method,
+         _quote(path, safe="/~"),
+         canonical_query,
+         "".join(name + ":" + value + "\n"
+                 for name, value in canonical_headers),
+         signed_headers,
+         payload_hash])
+
+    date = amz_date[:8]
+    scope = date + "/" + region + "/s3/aws4_request"
+    string_to_sign = "\n".join(
+        [SIGNING_ALGORITHM,
+         amz_date,
+         scope,
+         sha256(canonical_request.encode("utf-8")).hexdigest()])
+
+    signing_key = ("AWS4" + secret_key).encode("utf-8")
+    for part in (date, region, "s3", "aws4_request"):
+        signing_key = _hmac_sha256(signing_key, part)
+
+    signature = hmac.new(signing_key,
+                         string_to_sign.encode("utf-8"),
+                         sha256).hexdigest()
+
+    return (SIGNING_ALGORITHM + " Credential=" + access_key + "/" + scope +
+            ", SignedHeaders=" + signed_headers +
+            ", Signature=" + signature)
+
+
+def _parse_document(body):
+    """Parse the XML body of a response.
+
+    Args:
+        body: The body as bytes.
+
+    Returns: The root ElementTree element.
+
+    Raises:
+        S3Error: If the body is not valid XML.
+    """
+    try:
+        return ElementTree.fromstring(body)
+    except ElementTree.ParseError as exc:
+        raise S3Error("The response was not valid XML.") from exc
+
+
+def _find_text(element, name):
+    """Return the text of the first descendant with a local name.
+
+    S3 responses may or may not use the S3 XML namespace, so elements are
+    matched on their local name only.
+
+    Args:
+        element: An ElementTree element.
+        name: The local name of the descendant.
+
+    Returns: The text of the descendant (or None if there is none).
+    """
+    for child in element.iter():
+        if child.tag.rsplit("}", 1)[-1] == name:
+            return child.text
+
+    return None
+
+
+class S3Client:
+    """A thread-safe client for uploading objects to S3-compatible storage."""
+
+    def __init__(self,
+                 endpoint_url,
+                 access_key,
+                 secret_key,
+                 region="us-east-1",
+                 timeout=30,
+                 clock=time):
+        """Initialise the client.
+
+        Args:
+            endpoint_url: The http or https URL of the service, such as
+                "https://s3.eu-west-2.amazonaws.com".
+            access_key: The access key ID.
+            secret_key: The secret access key.
+            region: The region that requests are signed for.
+            timeout: The time (in seconds) to wait for each network
+                operation.
+            clock: A function returning the current wall clock time, which
+                requests are signed with.
+
+        Raises:
+            ValueError: If the endpoint is not an http or https URL.
+        """
+        parts = urlsplit(endpoint_url)
+
+        if parts.scheme not in ("http", "https") or not parts.hostname:
+            raise ValueError("endpoint_url must be an http or https URL.")
+
+        self._scheme = parts.scheme
+        self._host = parts.hostname
+        self._port = parts.port
+        self._host_header = parts.netloc.rsplit("@", 1)[-1]
+        self._base_path = parts.path.rstrip("/")
+        self._access_key = access_key
+        self._secret_key = secret_key
+        self._region = region
+        self._timeout = timeout
+        self._clock = clock
+        self._connections = local()
+        self._open_connections = set()
+        self._open_connections_lock = Lock()
+
+    def put_object(self, bucket, key, body, content_type=None):
+        """Upload an object in a single request.
+
+        Args:
+            bucket: The name of the bucket.
+            key: The key of the object.
+            body: The contents of the object as a bytes-like object.
+            content_type: The media type of the object (or None).
+
+        Returns: The ETag of the stored object.
+
+        Raises:
+            S3Error: If the object cannot be stored.
+        """
+        headers = {}
+        if content_type is not None:
+            headers["Content-Type"] = content_type
+
+        response = self._request("PUT", bucket, key, body=body,
+                                 headers=headers)
+
+        return response.headers.get("ETag")
+
+    def create_multipart_upload(self, bucket, key, content_type=None):
+        """Start a multipart upload.
+
+        Args:
+            bucket: The name of the bucket.
+            key: The key of the object.
+            content_type: The media type of the object (or None).
+
+        Returns: The ID of the upload.
+
+        Raises:
+            S3Error: If the upload cannot be started.
+        """
+        headers = {}
+        if content_type is not None:
+            headers["Content-Type"] = content_type
+
+        response = self._request("POST", bucket, key, {"uploads": ""},
+                                 headers=headers)
+        upload_id = _find_text(_parse_document(response.body), "UploadId")
+
+        if not upload_id:
+            raise S3Error("The response did not include an upload ID.")
+
+        return upload_id
+
+    def upload_part(self, bucket, key, upload_id, part_number, body):
+        """Upload one part of a multipart upload.
+
+        Args:
+            bucket: The name of the bucket.
+            key: The key of the object.
+            upload_id: The ID of the upload.
+            part_number: The number of the part, starting from 1.
+            body: The contents of the part as a bytes-like object.
+
+        Returns: The ETag of the part.
+
+        Raises:
+            S3Error: If the part cannot be stored.
+        """
+        response = self._request("PUT",
+                                 bucket,
+                                 key,
+                                 {"partNumber": str(part_number),
+                                  "uploadId": upload_id},
+                                 body=body)
+
+        return response.headers.get("ETag")
+
+    def complete_multipart_upload(self, bucket, key, upload_id, parts):
+        """Join the uploaded parts into the object.
+
+        Args:
+            bucket: The name of the bucket.
+            key: The key of the object.
+            upload_id: The ID of the upload.
+            parts: A list of (part number, ETag) tuples in order.
+
+        Returns: The ETag of the stored object.
+
+        Raises:
+            S3Error: If the upload cannot be completed.
+        """
+        body = "".join(
+            "<Part><PartNumber>{}</PartNumber><ETag>{}</ETag></Part>".format(
+                part_number, etag.replace("&", "&amp;").replace('"',
+                                                                "&quot;"))
+            for part_number, etag in parts)
+        body = ("<CompleteMultipartUpload>" + body +
+                "</CompleteMultipartUpload>").encode("utf-8")
+
+        response = self._request("POST", bucket, key, {"uploadId": upload_id},
+                                 body=body)
+
+        # S3 can report a failure after a 200 status once it has started
+        # sending the response.
+        document = _parse_document(response.body)
+        if document.tag.rsplit("}", 1)[-1] == "Error":
+            raise S3Error(_find_text(document, "Message") or
+                          "The upload could not be completed.",
+                          response.status,
+                          _find_text(document, "Code"))
+
+        return _find_text(document, "ETag")
+
+    def abort_multipart_upload(self, bucket, key, upload_id):
+        """Abandon a multipart upload and discard its parts.
+
+        Args:
+            bucket: The name of the bucket.
+            key: The key of the object.
+            upload_id: The ID of the upload.
+
+        Raises:
+            S3Error: If the upload cannot be aborted.
+        """
+        self._request("DELETE", bucket, key, {"uploadId": upload_id})
+
+    def close(self):
+        """Close the connection of the calling thread."""
+        connection = getattr(self._connections, "connection", None)
+
+        if connection is not None:
+            connection.close()
+            self._connections.connection = None
+
+            with self._open_connections_lock:
+                self._open_connections.discard(connection)
+
+    def close_all(self):
+        """Close the connection of every thread.
+
+        This must not be called while requests are in progress. Threads open
+        a new connection on their next request.
+        """
+        with self._open_connections_lock:
+            connections = list(self._open_connections)
+            self._open_connections.clear()
+
+        for connection in connections:
+            connection.close()
+
+    def _request(self, method, bucket, key, query=None, body=b"",
+                 headers=None):
+        """Send a signed request, retrying once on a stale connection.
+
+        Args:
+            method: The HTTP method.
+            bucket: The name of the bucket.
+            key: The key of the object.
+            query: A dictionary of query parameters (or None).
+            body: The body as a bytes-like object.
+            headers: A dictionary of extra headers (or None).
+
+        Returns: An S3Response.
+
+        Raises:
+            S3Error: If the request fails or the response is an error.
+        """
+        query = query or {}
+        path = self._base_path + "/" + bucket + "/" + key
+        payload = memoryview(body).cast("B")
+        amz_date = strftime("%Y%m%dT%H%M%SZ", gmtime(self._clock()))
+        payload_hash = sha256(payload).hexdigest()
+
+        request_headers = dict(headers or {})
+        request_headers["Host"] = self._host_header
+        request_headers["X-Amz-Date"] = amz_date
+        request_headers["X-Amz-Content-Sha256"] = payload_hash
+        request_headers["Content-Length"] = str(payload.nbytes)
+        if method == "PUT":
+            # The service checks the body against this, so corrupted uploads
+            # are rejected rather than stored.
+            request_headers["Content-MD5"] = b64encode(
+                md5(payload).digest()).decode("ascii")
+
+        request_headers["Authorization"] = sign_request(method,
+                                                        path,
+                                                        query,
+                                                        request_headers,
+                                                        payload_hash,
+                                                        self._access_key,
+                                                        self._secret_key,
+                                                        self._region,
+                                                        amz_date)
+
+        target = _quote(path, safe="/~")
+        if query:
+            target += "?" + "&".join(
+                _quote(name) + ("=" + _quote(value) if value else "")
+                for name, value in sorted(query.items()))
+
+        for attempt in range(2):
+            connection, reused = self._get_connection()
+
+            try:
+                connection.request(method, target, payload, request_headers)
+                http_response = connection.getresponse()
+                response = S3Response(http_response.status,
+                                      http_response.msg,
+                                      http_response.read())
+            except (OSError, HTTPException) as exc:
+                self.close()
+
+                if reused and attempt == 0:
+                    continue
+
+                raise S3Error("The request to " + self._host + " failed: " +
+                              str(exc)) from exc
+
+            if http_response.will_close:
+                self.close()
+
+            break
+
+        if response.status >= 300:
+            code = None
+            message = "The request failed with status " + \
+                str(response.status) + "."
+
+            if response.body:
+                try:
+                    document = _parse_document(response.body)
+                except S3Error:
+                    pass
+                else:
+                    code = _find_text(document, "Code")
+                    message = _find_text(document, "Message") or message
+
+            raise S3Error(message, response.status, code)
+
+        return response
+
+    def _get_connection(self):
+        """Return the keep-alive connection of the calling thread.
+
+        Returns: A (connection, reused) tuple, where reused is whether the
+            connection has been used for an earlier request.
+        """
+        connection = getattr(self._connections, "connection", None)
+
+        with self._open_connections_lock:
+            # The connection may have been closed by close_all.
+            if connection in self._open_connections:
+                return connection, True
+
+        if self._scheme == "https":
+            connection_class = HTTPSConnection
+        else:
+            connection_class = HTTPConnection
+
+        connection = connection_class(self._host,
+                                      self._port,
+                                      timeout=self._timeout)
+        self._connections.connection = connection
+
+        with self._open_connections_lock:
+            self._open_connections.add(connection)
+
+        return connection, False
@@ -0,0 +1,481 @@
+"""An append-only container that stores many frames in a few large files."""
+
+from array import array
+from bisect import bisect_left
+from collections import namedtuple
+from mmap import ACCESS_READ, mmap
+from os import fsync, listdir, makedirs
+from os.path import exists, getsize, join
+from struct import Struct
+from threading import Lock
+from time import time
+
+INDEX_FILENAME = "index.dat"
+CAMERAS_FILENAME = "cameras.txt"
+SEGMENT_PREFIX = "segment-"
+SEGMENT_SUFFIX = ".dat"
+
+_INDEX_RECORD = Struct("<QdIIQI")
+
+FrameRecord = namedtuple("FrameRecord", ["frame_number",
+                                         "timestamp",
+                                         "camera_name",
+                                         "segment",
+                                         "offset",
+                                         "length"])
+FrameRecord.__doc__ = """The location of a frame within a segment store.
+
+Attributes:
+    frame_number: The sequence number of the frame on its camera.
+    timestamp: The wall-clock time (in seconds since the epoch) at which the
+        frame was stored.
+    camera_name: The name of the camera that captured the frame.
+    segment: The number of the segment file holding the frame.
+    offset: The offset (in bytes) of the frame within the segment file.
+    length: The length (in bytes) of the frame.
+"""
+
+
+def get_segment_filename(segment):
+    """Return the filename of a segment file.
+
+    Args:
+        segment: The number of the segment.
+
+    Returns: The filename of the segment file.
+    """
+    return SEGMENT_PREFIX + str(segment).rjust(8, "0") + SEGMENT_SUFFIX
+
+
+def _read_camera_names(directory):
+    """Read the camera names of a store, in camera id order.
+
+    Args:
+        directory: The directory of the store.
+
+    Returns: A list of camera names.
+    """
+    cameras_path = join(directory, CAMERAS_FILENAME)
+
+    if not exists(cameras_path):
+        return []
+
+    with open(cameras_path, "r", encoding="utf-8") as cameras_file:
+        return [line.rstrip("\n") for line in cameras_file]
+
+
+class SegmentFrameStore:
+    """Append frames to large segment files with a compact offset index.
+
+    Frames are appended to the current segment file until it reaches
+    max_segment_size, after which a new segment is started. Each frame adds
+    a fixed-size record to the index, so storing a frame never creates a
+    file and the directory holds a handful of entries however long the
+    session runs. Opening an existing store carries on appending to it.
+    """
+
+    def __init__(self,
+                 directory,
+                 max_segment_size=256 * 1024 * 1024,
+                 sync_every=None):
+        """Initialise the store, creating the directory if needed.
+
+        Args:
+            directory: The directory to hold the segment and index files.
+            max_segment_size: The size (in bytes) after which a new segment
+                file is started.
+            sync_every: The number of frames to append between fsyncs (or
+                None to leave flushing to the operating system).
+        """
+        makedirs(directory, exist_ok=True)
+
+        self._directory = directory
+        self._max_segment_size = max_segment_size
+        self._sync_every = sync_every
+        self._lock = Lock()
+        self._unsynced_frames = 0
+
+        self._camera_names = _read_camera_names(directory)
+        self._camera_ids = {name: camera_id for camera_id, name
+                            in enumerate(self._camera_names)}
+
+        index_path = join(directory, INDEX_FILENAME)
+        complete_records = 0
+        if exists(index_path):
+            complete_records = getsize(index_path) // _INDEX_RECORD.size
+
+        self._index_file = open(index_path, "ab")
+        self._index_file.truncate(complete_records * _INDEX_RECORD.size)
+        self._frame_count = complete_records
+
+        segments = sorted(int(filename[len(SEGMENT_PREFIX):
+                                       -len(SEGMENT_SUFFIX)])
+                          for filename in listdir(directory)
+                          if filename.startswith(SEGMENT_PREFIX) and
+                          filename.endswith(SEGMENT_SUFFIX))
+        self._segment = segments[-1] if segments else 1
+        self._segment_file = open(self._get_segment_path(self._segment), "ab")
+        self._segment_size = self._segment_file.tell()
+
+        self._cameras_file = open(join(directory, CAMERAS_FILENAME),
+                                  "a",
+                                  encoding="utf-8")
+
+    @property
+    def directory(self):
+        """Return the directory holding the store.
+
+        Returns: The directory holding the store.
+        """
+        return self._directory
+
+    def __len__(self):
+        """Return the number of frames in the store.
+
+        Returns: The number of frames in the store.
+        """
+        return self._frame_count
+
+    def append(self, camera_name, frame_number, image_data, timestamp=None):
+        """Append a frame to the store.
+
+        Args:
+            camera_name: The name of the camera that captured the frame.
+            frame_number: The sequence number of the frame on its camera.
+            image_data: The encoded frame as a bytes-like object.
+            timestamp: The wall-clock time of the frame (or None for now).
+
+        Returns: The FrameRecord of the stored frame.
+        """
+        if timestamp is None:
+            timestamp = time()
+
+        length = len(image_data)
+
+        with self._lock:
+            if (self._segment_size > 0 and
+                    self._segment_size + length > self._max_segment_size):
+                self._start_next_segment()
+
+            segment = self._segment
+            offset = self._segment_size
+            self._segment_file.write(image_data)
+            self._segment_size += length
+
+            self._index_file.write(
+                _INDEX_RECORD.pack(frame_number,
+                                   timestamp,
+                                   self._get_camera_id(camera_name),
+                                   segment,
+                                   offset,
+                                   length))
+            self._frame_count += 1
+
+            self._unsynced_frames += 1
+            if (self._sync_every is not None and
+                    self._unsynced_frames >= self._sync_every):
+                self._sync()
+
+        return FrameRecord(frame_number,
+                           timestamp,
+                           camera_name,
+                           segment,
+                           offset,
+                           length)
+
+    def flush(self, sync=False):
+        """Write any buffered frames to the operating system.
+
+        Args:
+            sync: Whether to also fsync the files to disk.
+        """
+        with self._lock:
+            if sync:
+                self._sync()
+            else:
+                self._flush_files()
+
+    def close(self):
+        """Flush, fsync and close the files of the store."""
+        with self._lock:
+            self._sync()
+            self._segment_file.close()
+            self._index_file.close()
+            self._cameras_file.close()
+
+    def _get_camera_id(self, camera_name):
+        """Return the id of a camera, registering it if it is new.
+
+        Args:
+            camera_name: The name of the camera.
+
+        Returns: The id of the camera within the store.
+        """
+        camera_id = self._camera_ids.get(camera_name)
+
+        if camera_id is None:
+            camera_id = len(self._camera_names)
+            self._camera_names.append(camera_name)
+            self._camera_ids[camera_name] = camera_id
+            self._cameras_file.write(camera_name + "\n")
+            self._cameras_file.flush()
+
+        return camera_id
+
+    def _start_next_segment(self):
+        """Close the current segment file and start a new one."""
+        self._segment_file.flush()
+        fsync(self._segment_file.fileno())
+        self._segment_file.close()
+
+        self._segment += 1
+        self._segment_file = open(self._get_segment_path(self._segment), "ab")
+        self._segment_size = 0
+
+    def _flush_files(self):
+        """Write the buffered segment and index data to the operating system.
+
+        The segment is flushed first so the index never refers to frame data
+        that has not been written.
+        """
+        self._segment_file.flush()
+        self._index_file.flush()
+
+    def _sync(self):
+        """Flush and fsync the segment and index files."""
+        self._segment_file.flush()
+        fsync(self._segment_file.fileno())
+        self._index_file.flush()
+        fsync(self._index_file.fileno())
+        self._unsynced_frames = 0
+
+    def _get_segment_path(self, segment):
+        """Return the path of a segment file.
+
+        Args:
+            segment: The number of the segment.
+
+        Returns: The path of the segment file.
+        """
+        return join(self._directory, get_segment_filename(segment))
+
+
+class SegmentFrameReader:
+    """Read frames from a segment store through memory maps.
+
+    Frames are returned as memoryview slices of the mapped segment files,
+    so reading does not copy frame data.
+    """
+
+    def __init__(self, directory):
+        """Open a store for reading.
+
+        Args:
+            directory: The directory holding the store.
+        """
+        self._directory = directory
+        self._camera_names = _read_camera_names(directory)
+
+        self._index_file = open(join(directory, INDEX_FILENAME), "rb")
+        index_size = getsize(join(directory, INDEX_FILENAME))
+        self._frame_count = index_size // _INDEX_RECORD.size
+
+        if self._frame_count > 0:
+            self._index = mmap(self._index_file.fileno(),
+                               self._frame_count * _INDEX_RECORD.size,
+                               access=ACCESS_READ)
+        else:
+            self._index = b""
+
+        self._segment_maps = {}
+        self._camera_frames = None
+
+    def __len__(self):
+        """Return the number of frames in the store.
+
+        Returns: The number of frames in the store.
+        """
+        return self._frame_count
+
+    def get_camera_names(self):
+        """Return the names of the cameras with frames in the store.
+
+        Returns: A list of camera names.
+        """
+        return self._camera_names[:]
+
+    def get_record(self, position):
+        """Return the record at a position in the index.
+
+        Args:
+            position: The position of the record, in the order frames were
+                appended.
+
+        Returns: A FrameRecord.
+
+        Raises:
+            IndexError: If position is out of range.
+        """
+        if not 0 <= position < self._frame_count:
+            raise IndexError("frame record position out of range")
+
+        (frame_number,
+         timestamp,
+         camera_id,
+         segment,
+         offset,
+         length) = _INDEX_RECORD.unpack_from(self._index,
+                                             position * _INDEX_RECORD.size)
+
+        return FrameRecord(frame_number,
+                           timestamp,
+                           self._camera_names[camera_id],
+                           segment,
+                           offset,
+                           length)
+
+    def read(self, record):
+        """Return the data of a frame.
+
+        Args:
+            record: The FrameRecord of the frame.
+
+        Returns: A read-only memoryview of the encoded frame.
+        """
+        if record.length == 0:
+            return memoryview(b"")
+
+        segment_map = self._get_segment_map(record.segment)
+
+        return memoryview(segment_map)[record.offset:
+                                       record.offset + record.length]
+
+    def get_frame(self, camera_name, frame_number):
+        """Return the data of a frame from a camera.
+
+        Args:
+            camera_name: The name of the camera that captured the frame.
+            frame_number: The sequence number of the frame on its camera.
+
+        Returns: A read-only memoryview of the encoded frame.
+
+        Raises:
+            KeyError: If the store does not hold the frame.
+        """
+        frame_numbers, positions = self._get_camera_frames().get(
+            camera_name, ((), ()))
+
+        index = bisect_left(frame_numbers, frame_number)
+
+        if index == len(frame_numbers) or frame_numbers[index] != frame_number:
+            raise KeyError((camera_name, frame_number))
+
+        return self.read(self.get_record(positions[index]))
+
+    def iter_frames(self, camera_name=None):
+        """Iterate over the frames in the order they were appended.
+
+        Args:
+            camera_name: The camera whose frames to return (or None for
+                every camera).
+
+        Returns: An iterator of (FrameRecord, memoryview) tuples.
+        """
+        for position in range(self._frame_count):
+            record = self.get_record(position)
+
+            if camera_name is None or record.camera_name == camera_name:
+                yield record, self.read(record)
+
+    def export_to_files(self, directory, file_extension, camera_name=None):
+        """Write frames back out as one file per frame.
+
+        Args:
+            directory: The directory to export to. When exporting every
+                camera, each camera is given its own subdirectory.
+            file_extension: The file extension to give the exported files.
+            camera_name: The camera whose frames to export (or None for
+                every camera).
+
+        Returns: The number of frames exported.
+        """
+        exported_frames = 0
+
+        for record, image_data in self.iter_frames(camera_name):
+            if camera_name is None:
+                camera_directory = join(directory, record.camera_name)
+            else:
+                camera_directory = directory
+            makedirs(camera_directory, exist_ok=True)
+
+            filename = (str(record.frame_number).rjust(8, "0") +
+                        "." +
+                        file_extension)
+
+            with open(join(camera_directory, filename), "wb") as image_file:
+                image_file.write(image_data)
+
+            exported_frames += 1
+
+        return exported_frames
+
+    def close(self):
+        """Release the memory maps of the store."""
+        for segment_map in self._segment_maps.values():
+            segment_map.close()
+        self._segment_maps = {}
+
+        if isinstance(self._index, mmap):
+            self._index.close()
+        self._index_file.close()
+
+    def _get_segment_map(self, segment):
+        """Return the memory map of a segment file, mapping it if needed.
+
+        Args:
+            segment: The number of the segment.
+
+        Returns: An mmap of the segment file.
+        """
+        segment_map = self._segment_maps.get(segment)
+
+        if segment_map is None:
+            segment_path = join(self._directory, get_segment_filename(segment))
+            with open(segment_path, "rb") as segment_file:
+                segment_map = mmap(segment_file.fileno(),
+                                   0,
+                                   access=ACCESS_READ)
+            self._segment_maps[segment] = segment_map
+
+        return segment_map
+
+    def _get_camera_frames(self):
+        """Return the frame numbers and index positions of every camera.
+
+        Returns: A dictionary mapping camera names to a pair of arrays holding
+            the frame numbers and their positions in the index, sorted by
+            frame number.
+        """
+        if self._camera_frames is None:
+            camera_frames = {}
+
+            for position, (frame_number, _, camera_id, _, _, _) in enumerate(
+                    _INDEX_RECORD.iter_unpack(self._index)):
+                camera_name = self._camera_names[camera_id]
+                frame_numbers, positions = camera_frames.setdefault(
+                    camera_name, (array("Q"), array("Q")))
+                frame_numbers.append(frame_number)
+                positions.append(position)
+
+            for camera_name, (frame_numbers,
+                              positions) in camera_frames.items():
+                if any(frame_numbers[index] > frame_numbers[index + 1]
+                       for index in range(len(frame_numbers) - 1)):
+                    ordered = sorted(zip(frame_numbers, positions))
+                    camera_frames[camera_name] = (
+                        array("Q", (pair[0] for pair in ordered)),
+                        array("Q", (pair[1] for pair in ordered)))
+
+            self._camera_frames = camera_frames
+
+        return self._camera_frames
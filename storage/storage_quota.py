@@ -0,0 +1,595 @@
+"""Byte quotas, retention and recompression for stored images."""
+
+from collections import OrderedDict, deque
+from os import remove, replace
+from os.path import getsize
+from threading import Condition, Thread, get_native_id
+from time import monotonic
+
+from camera.capture_ledger import CAPTURE_STATUS_CAPTURED
+
+EVICTION_POLICY_OLDEST = "oldest"
+EVICTION_POLICY_THIN = "thin"
+
+EVICTION_POLICIES = (EVICTION_POLICY_OLDEST, EVICTION_POLICY_THIN)
+
+
+def recompress_with_pillow(path, quality):
+    """Re-encode an image in place at a lower quality with Pillow.
+
+    Args:
+        path: The path of the image.
+        quality: The quality (1 to 95) to encode the image at.
+    """
+    # Pillow is only needed when the default recompressor is used.
+    from PIL import Image
+
+    with Image.open(path) as image:
+        image_format = image.format
+        image.load()
+
+    image.save(path + ".tmp", image_format, quality=quality)
+    replace(path + ".tmp", path)
+
+
+class _StoredImage:
+    """An image on disk that counts towards the quotas."""
+
+    __slots__ = ("path", "size", "recorded", "recompressed")
+
+    def __init__(self, path, size, recorded):
+        self.path = path
+        self.size = size
+        self.recorded = recorded
+        self.recompressed = False
+
+
+class _CameraImages:
+    """The images on disk from one camera, oldest first."""
+
+    def __init__(self):
+        self.camera = None
+        self.images = OrderedDict()
+        self.total_size = 0
+        self.thinning_level = 0
+        self.thinning_candidates = deque()
+
+
+class StorageQuotaManager:
+    """Keep the images stored by each camera, and by all of them, in budget.
+
+    Cameras report every image they store, with its size, so the usage of
+    each camera is kept in memory and the storage directory is never listed.
+    Once a camera goes over its quota its images are evicted, and once every
+    camera together goes over the global quota the camera using the most
+    bytes has its images evicted. EVICTION_POLICY_OLDEST deletes the oldest
+    image, making storage a ring buffer, and EVICTION_POLICY_THIN deletes
+    all but every thinning_step-th image, oldest first, thinning further on
+    each pass. The newest image of a camera is never evicted, and the camera
+    that stored an evicted image is told of it, so the image no longer
+    appears among its captured images. Evicted images are deleted, and their
+    cameras told, after the lock is released, so other cameras recording
+    images never wait on the filesystem.
+
+    Images older than recompress_after can also be re-encoded at a lower
+    quality by a background thread, which runs at the lowest CPU priority
+    where the platform allows.
+    """
+
+    def __init__(self,
+                 global_quota=None,
+                 camera_quota=None,
+                 eviction_policy=EVICTION_POLICY_OLDEST,
+                 thinning_step=2,
+                 recompress_after=None,
+                 recompression_quality=50,
+                 recompressor=recompress_with_pillow,
+                 eviction_handler=None,
+                 unsized_timeout=60,
+                 error_history=100,
+                 clock=monotonic):
+        """Initialise the storage manager.
+
+        Args:
+            global_quota: The most bytes every camera together may store (or
+                None for no limit).
+            camera_quota: The most bytes each camera may store (or None for
+                no limit), which set_camera_quota can override.
+            eviction_policy: One of EVICTION_POLICIES.
+            thinning_step: Each thinning pass under EVICTION_POLICY_THIN
+                keeps every thinning_step-th image of the one before.
+            recompress_after: The age (in seconds) at which images are
+                recompressed (or None to never recompress).
+            recompression_quality: The quality passed to recompressor.
+            recompressor: A function taking a path and a quality that
+                re-encodes the image in place.
+            eviction_handler: A function taking a camera name, sequence
+                number and path that is called after each eviction (or
+                None).
+            unsized_timeout: The time (in seconds) after which an image
+                whose size still cannot be read is assumed never to have
+                been written, and is no longer counted.
+            error_history: The number of recent errors to keep.
+            clock: A function returning the current monotonic time.
+
+        Raises:
+            ValueError: If eviction_policy is not a recognised policy, if a
+                quota or recompress_after is not greater than 0 or None, if
+                thinning_step is less than 2 or if unsized_timeout is not
+                greater than 0.
+        """
+        if eviction_policy not in EVICTION_POLICIES:
+            raise ValueError("eviction_policy must be one of: " +
+                             ", ".join(EVICTION_POLICIES) + ".")
+
+        for argument_name, value in (("global_quota", global_quota),
+                                     ("camera_quota", camera_quota),
+                                     ("recompress_after", recompress_after)):
+            if value is not None and value <= 0:
+                raise ValueError(argument_name + " must be greater than 0.")
+
+        if thinning_step < 2:
+            raise ValueError("thinning_step must be at least 2.")
+
+        if unsized_timeout <= 0:
+            raise ValueError("unsized_timeout must be greater than 0.")
+
+        self._global_quota = global_quota
+        self._camera_quota = camera_quota
+        self._camera_quotas = {}
+        self._eviction_policy = eviction_policy
+        self._thinning_step = thinning_step
+        self._recompress_after = recompress_after
+        self._recompression_quality = recompression_quality
+        self._recompressor = recompressor
+        self._eviction_handler = eviction_handler
+        self._unsized_timeout = unsized_timeout
+        self._clock = clock
+
+        self._condition = Condition()
+        self._cameras = {}
+        self._unsized_images = []
+        self._total_size = 0
+        self._evicted_images = 0
+        self._recompressed_images = 0
+        self._errors = deque(maxlen=error_history)
+        self._pending_evictions = deque()
+
+        self._recompression_queue = deque()
+        self._recompression_thread = None
+        self._stopping = False
+
+    @property
+    def total_size(self):
+        """Return the number of bytes stored by every camera together.
+
+        Returns: The number of bytes stored by every camera together.
+        """
+        return self._total_size
+
+    @property
+    def evicted_images(self):
+        """Return the number of images that have been evicted.
+
+        Returns: The number of images that have been evicted.
+        """
+        return self._evicted_images
+
+    @property
+    def recompressed_images(self):
+        """Return the number of images that have been recompressed.
+
+        Returns: The number of images that have been recompressed.
+        """
+        return self._recompressed_images
+
+    def get_camera_size(self, camera_name):
+        """Return the number of bytes stored by a camera.
+
+        Args:
+            camera_name: The name of the camera.
+
+        Returns: The number of bytes stored by the camera.
+        """
+        with self._condition:
+            if camera_name not in self._cameras:
+                return 0
+            return self._cameras[camera_name].total_size
+
+    def get_image_paths(self, camera_name):
+        """Return the paths of the images a camera still has on disk.
+
+        Args:
+            camera_name: The name of the camera.
+
+        Returns: A list of paths, oldest first.
+        """
+        with self._condition:
+            if camera_name not in self._cameras:
+                return []
+            return [image.path for image
+                    in self._cameras[camera_name].images.values()]
+
+    def get_camera_quota(self, camera_name):
+        """Return the most bytes a camera may store.
+
+        Args:
+            camera_name: The name of the camera.
+
+        Returns: The quota (in bytes), or None for no limit.
+        """
+        return self._camera_quotas.get(camera_name, self._camera_quota)
+
+    def set_camera_quota(self, camera_name, camera_quota):
+        """Give a camera its own quota.
+
+        Args:
+            camera_name: The name of the camera.
+            camera_quota: The most bytes the camera may store (or None for no
+                limit).
+
+        Raises:
+            ValueError: If camera_quota is not greater than 0 or None.
+        """
+        if camera_quota is not None and camera_quota <= 0:
+            raise ValueError("camera_quota must be greater than 0.")
+
+        with self._condition:
+            self._camera_quotas[camera_name] = camera_quota
+            if camera_name in self._cameras:
+                self._enforce_quotas(camera_name)
+
+        self._finish_evictions()
+
+    def get_errors(self):
+        """Return the most recent errors from deleting or recompressing.
+
+        Returns: A list of (path, exception) tuples, oldest first.
+        """
+        with self._condition:
+            return list(self._errors)
+
+    def record(self, camera_name, sequence, path, size=None, camera=None):
+        """Count a stored image and evict images until within the quotas.
+
+        Args:
+            camera_name: The name of the camera that stored the image.
+            sequence: The sequence number of the image on the camera.
+            path: The path of the image.
+            size: The size (in bytes) of the image (or None if the image is
+                still being written, in which case its size is read once it
+                exists).
+            camera: The camera that stored the image, whose
+                record_evicted_image method is called when one of its images
+                is evicted (or None).
+        """
+        image = _StoredImage(path, 0, self._clock())
+
+        with self._condition:
+            if camera_name not in self._cameras:
+                self._cameras[camera_name] = _CameraImages()
+
+            camera_images = self._cameras[camera_name]
+            camera_images.images[sequence] = image
+
+            if camera is not None:
+                camera_images.camera = camera
+
+            if size is None:
+                self._unsized_images.append((camera_name, sequence))
+            else:
+                self._resize(camera_name, image, size)
+
+            self._size_pending_images()
+            self._enforce_quotas(camera_name)
+
+            if self._recompress_after is not None:
+                self._recompression_queue.append((camera_name, sequence))
+                self._condition.notify()
+
+        self._finish_evictions()
+
+    def forget(self, camera_name, sequence):
+        """Stop counting an image that has been deleted elsewhere.
+
+        Call this when an image is removed by something other than this
+        manager, such as an UploadSync deleting uploaded images, so that it
+        no longer counts towards the quotas.
+
+        Args:
+            camera_name: The name of the camera that stored the image.
+            sequence: The sequence number of the image on the camera.
+        """
+        with self._condition:
+            camera_images = self._cameras.get(camera_name)
+            if camera_images is None:
+                return
+
+            image = camera_images.images.pop(sequence, None)
+            if image is None:
+                return
+
+            camera_images.total_size -= image.size
+            self._total_size -= image.size
+
+    def load_from_catalog(self, capture_catalog):
+        """Count the images recorded in a capture catalog that still exist.
+
+        This lets a restarted session resume within its quotas without
+        listing the storage directory.
+
+        Args:
+            capture_catalog: A CaptureCatalog.
+        """
+        for entry in capture_catalog.query(status=CAPTURE_STATUS_CAPTURED):
+            if entry.path is None:
+                continue
+
+            try:
+                size = getsize(entry.path)
+            except OSError:
+                continue
+
+            self.record(entry.camera_name, entry.sequence, entry.path, size)
+
+    def start(self):
+        """Start the recompression thread, if recompression is enabled."""
+        if (self._recompress_after is None or
+                self._recompression_thread is not None):
+            return
+
+        self._stopping = False
+        self._recompression_thread = Thread(target=self._recompress_images,
+                                            name="storage-recompressor",
+                                            daemon=True)
+        self._recompression_thread.start()
+
+    def stop(self):
+        """Stop the recompression thread once its current image is done."""
+        if self._recompression_thread is None:
+            return
+
+        with self._condition:
+            self._stopping = True
+            self._condition.notify()
+
+        self._recompression_thread.join()
+        self._recompression_thread = None
+
+    def _resize(self, camera_name, image, size):
+        """Change the size an image counts for.
+
+        The condition must be held by the caller.
+
+        Args:
+            camera_name: The name of the camera that stored the image.
+            image: The _StoredImage.
+            size: The new size (in bytes) of the image.
+        """
+        self._cameras[camera_name].total_size += size - image.size
+        self._total_size += size - image.size
+        image.size = size
+
+    def _size_pending_images(self):
+        """Read the sizes of images that have been written since recorded.
+
+        Images that still do not exist after unsized_timeout are forgotten,
+        as their writes have failed or been dropped.
+
+        The condition must be held by the caller.
+        """
+        still_unsized = []
+        expired = self._clock() - self._unsized_timeout
+
+        for camera_name, sequence in self._unsized_images:
+            images = self._cameras[camera_name].images
+            image = images.get(sequence)
+            if image is None:
+                continue
+
+            try:
+                self._resize(camera_name, image, getsize(image.path))
+            except OSError:
+                if image.recorded > expired:
+                    still_unsized.append((camera_name, sequence))
+                else:
+                    del images[sequence]
+
+        self._unsized_images = still_unsized
+
+    def _enforce_quotas(self, camera_name):
+        """Evict images until a camera, and every camera, is within quota.
+
+        The condition must be held by the caller.
+
+        Args:
+            camera_name: The name of the camera that has just stored an
+                image.
+        """
+        camera_quota = self.get_camera_quota(camera_name)
+
+        if camera_quota is not None:
+            while (self._cameras[camera_name].total_size > camera_quota and
+                   self._evict(camera_name)):
+                pass
+
+        if self._global_quota is None:
+            return
+
+        while self._total_size > self._global_quota:
+            largest_camera_name = max(
+                self._cameras,
+                key=lambda name: self._cameras[name].total_size)
+
+            if not self._evict(largest_camera_name):
+                break
+
+    def _evict(self, camera_name):
+        """Evict one image from a camera according to the eviction policy.
+
+        The image stops counting at once and is deleted by
+        _finish_evictions. The condition must be held by the caller.
+
+        Args:
+            camera_name: The name of the camera.
+
+        Returns: A boolean specifying whether an image was evicted, which is
+            False when the camera only has its newest image left.
+        """
+        camera_images = self._cameras[camera_name]
+
+        if len(camera_images.images) <= 1:
+            return False
+
+        if self._eviction_policy == EVICTION_POLICY_OLDEST:
+            sequence = next(iter(camera_images.images))
+        else:
+            sequence = self._get_thinning_candidate(camera_images)
+
+        image = camera_images.images.pop(sequence)
+        camera_images.total_size -= image.size
+        self._total_size -= image.size
+        self._evicted_images += 1
+        self._pending_evictions.append((camera_name, sequence, image.path,
+                                        camera_images.camera))
+
+        return True
+
+    def _finish_evictions(self):
+        """Delete evicted images and tell their cameras.
+
+        The condition must not be held by the caller.
+        """
+        while self._pending_evictions:
+            try:
+                camera_name, sequence, path, camera = (
+                    self._pending_evictions.popleft())
+            except IndexError:
+                # Another thread finished the last eviction.
+                return
+
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                with self._condition:
+                    self._errors.append((path, exc))
+
+            if camera is not None:
+                camera.record_evicted_image(sequence)
+
+            if self._eviction_handler is not None:
+                self._eviction_handler(camera_name, sequence, path)
+
+    def _get_thinning_candidate(self, camera_images):
+        """Return the oldest image the current thinning pass removes.
+
+        Each pass keeps only the images whose sequence numbers are multiples
+        of thinning_step to the power of the pass number. Once a pass has
+        nothing left to remove, the next, sparser pass begins.
+
+        Args:
+            camera_images: The _CameraImages of a camera with at least two
+                images.
+
+        Returns: The sequence number of the image to evict.
+        """
+        newest_sequence = next(reversed(camera_images.images))
+
+        while True:
+            candidates = camera_images.thinning_candidates
+
+            while candidates:
+                sequence = candidates.popleft()
+                if (sequence in camera_images.images and
+                        sequence != newest_sequence):
+                    return sequence
+
+            camera_images.thinning_level += 1
+            spacing = self._thinning_step ** camera_images.thinning_level
+            candidates.extend(sequence for sequence in camera_images.images
+                              if sequence % spacing != 0)
+
+            if not candidates:
+                # Every remaining image is on the grid, so thin the oldest.
+                candidates.append(next(iter(camera_images.images)))
+
+    def _recompress_images(self):
+        """Recompress images as they age, until stopped."""
+        self._lower_priority()
+
+        while True:
+            with self._condition:
+                item = self._wait_for_aged_image()
+                if item is None:
+                    return
+
+                camera_name, sequence = item
+                image = self._cameras[camera_name].images.get(sequence)
+                if image is None or image.recompressed:
+                    continue
+
+                path = image.path
+
+            try:
+                self._recompressor(path, self._recompression_quality)
+                size = getsize(path)
+            except Exception as exc:
+                with self._condition:
+                    self._errors.append((path, exc))
+                continue
+
+            with self._condition:
+                image.recompressed = True
+                self._recompressed_images += 1
+
+                if self._cameras[camera_name].images.get(sequence) is image:
+                    self._resize(camera_name, image, size)
+                    continue
+
+                # The image was evicted while it was being recompressed.
+                try:
+                    remove(path)
+                except OSError:
+                    pass
+
+    def _wait_for_aged_image(self):
+        """Wait until the oldest queued image is due to be recompressed.
+
+        The condition must be held by the caller.
+
+        Returns: A (camera name, sequence number) tuple, or None once the
+            thread has been told to stop.
+        """
+        while not self._stopping:
+            if not self._recompression_queue:
+                self._condition.wait()
+                continue
+
+            camera_name, sequence = self._recompression_queue[0]
+            image = self._cameras[camera_name].images.get(sequence)
+
+            if image is None:
+                self._recompression_queue.popleft()
+                continue
+
+            delay = image.recorded + self._recompress_after - self._clock()
+            if delay <= 0:
+                return self._recompression_queue.popleft()
+
+            self._condition.wait(delay)
+
+        return None
+
+    @staticmethod
+    def _lower_priority():
+        """Give the calling thread the lowest CPU priority, if possible."""
+        try:
+            # setpriority only exists on Unix, where Linux applies it to the
+            # thread alone.
+            from os import PRIO_PROCESS, setpriority
+
+            setpriority(PRIO_PROCESS, get_native_id(), 19)
+        except (ImportError, OSError):
+            pass
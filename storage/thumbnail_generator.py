@@ -0,0 +1,335 @@
+"""A background stage that builds preview thumbnails of captured frames."""
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from os import makedirs
+from os.path import dirname, join
+from threading import Lock
+
+import numpy
+
+from camera.frame import decode_pixels
+
+THUMBNAIL_FORMAT_PPM = "ppm"
+
+
+def downscale_pixels(pixels, factor):
+    """Shrink an image by averaging whole blocks of pixels.
+
+    Args:
+        pixels: An 8-bit image as an array of shape (height, width) or
+            (height, width, channels).
+        factor: The factor to shrink each side of the image by. Images
+            smaller than the factor are shrunk to a single pixel.
+
+    Returns: A uint8 array of the same number of dimensions.
+    """
+    height = max(1, pixels.shape[0] // factor)
+    width = max(1, pixels.shape[1] // factor)
+    block_height = pixels.shape[0] // height
+    block_width = pixels.shape[1] // width
+
+    blocks = pixels[:height * block_height,
+                    :width * block_width].reshape(
+        (height, block_height, width, block_width) + pixels.shape[2:])
+
+    return numpy.rint(blocks.mean(axis=(1, 3))).astype(numpy.uint8)
+
+
+def build_pyramid(pixels, factors):
+    """Shrink an image by each of a set of factors.
+
+    Each level is built from the largest smaller level whose factor divides
+    it, so a 1/16 thumbnail is made from the 1/4 thumbnail rather than from
+    the full image.
+
+    Args:
+        pixels: An 8-bit image as an array-like of shape (height, width) or
+            (height, width, channels).
+        factors: The factors to shrink the image by, in ascending order.
+
+    Returns: A list of uint8 arrays, one per factor.
+    """
+    pixels = numpy.asarray(pixels)
+    built_levels = []
+
+    for factor in factors:
+        source, source_factor = pixels, 1
+
+        for level_factor, level in reversed(built_levels):
+            if factor % level_factor == 0:
+                source, source_factor = level, level_factor
+                break
+
+        built_levels.append((factor,
+                             downscale_pixels(source,
+                                              factor // source_factor)))
+
+    return [level for _, level in built_levels]
+
+
+def encode_ppm(pixels):
+    """Encode an 8-bit image as a binary PPM (or PGM for greyscale) file.
+
+    Args:
+        pixels: A uint8 array of shape (height, width) or
+            (height, width, channels).
+
+    Returns: The encoded image as bytes.
+    """
+    if pixels.ndim == 3 and pixels.shape[2] >= 3:
+        magic_number = b"P6"
+        pixels = pixels[..., :3]
+    else:
+        magic_number = b"P5"
+        if pixels.ndim == 3:
+            pixels = pixels[..., 0]
+
+    header = b"%s\n%d %d\n255\n" % (magic_number,
+                                     pixels.shape[1],
+                                     pixels.shape[0])
+
+    return header + numpy.ascontiguousarray(pixels).tobytes()
+
+
+def _encode_thumbnail(pixels, image_format):
+    """Encode a thumbnail.
+
+    Args:
+        pixels: A uint8 array of shape (height, width) or
+            (height, width, channels).
+        image_format: THUMBNAIL_FORMAT_PPM or a format understood by Pillow.
+
+    Returns: The encoded thumbnail as bytes.
+    """
+    if image_format == THUMBNAIL_FORMAT_PPM:
+        return encode_ppm(pixels)
+
+    # Pillow is only needed for formats other than PPM.
+    from io import BytesIO
+    from PIL import Image
+
+    if pixels.ndim == 3 and pixels.shape[2] == 1:
+        pixels = pixels[..., 0]
+
+    stream = BytesIO()
+    Image.fromarray(pixels).save(stream, image_format)
+
+    return stream.getvalue()
+
+
+def _generate_thumbnails(image, factors, paths, image_format):
+    """Decode a frame if needed, then build, encode and write its thumbnails.
+
+    This runs in a worker process.
+
+    Args:
+        image: The frame as an 8-bit array-like, as the encoded image as
+            bytes or as the path of an image file.
+        factors: The factors to shrink the frame by.
+        paths: The path to write each thumbnail to.
+        image_format: The format to encode the thumbnails in.
+
+    Returns: The paths written.
+    """
+    if isinstance(image, (bytes, bytearray, str)):
+        image = decode_pixels(image)
+
+    for level, path in zip(build_pyramid(image, factors), paths):
+        makedirs(dirname(path), exist_ok=True)
+        with open(path, "wb") as thumbnail_file:
+            thumbnail_file.write(_encode_thumbnail(level, image_format))
+
+    return paths
+
+
+class ThumbnailGenerator:
+    """Build thumbnails of frames in a process pool while they are in memory.
+
+    Cameras hand each kept frame to submit, which returns straight away;
+    encoded frames are decoded in the worker processes rather than on the
+    capture thread. At most max_pending frames wait for the pool, and any
+    frame submitted beyond that is dropped before any work is done on it,
+    rather than delaying capture.
+    Thumbnails are written to
+    directory/<camera name>/1-<factor>/<filename>.<format>.
+    """
+
+    def __init__(self,
+                 directory,
+                 factors=(4, 16),
+                 max_pending=8,
+                 process_count=None,
+                 image_format=THUMBNAIL_FORMAT_PPM,
+                 error_history=100):
+        """Initialise the thumbnail generator.
+
+        Args:
+            directory: The directory thumbnails are written under.
+            factors: The factors to shrink each side of a frame by, one
+                thumbnail per factor.
+            max_pending: The maximum number of frames waiting for the pool.
+            process_count: The number of worker processes (or None for one
+                per CPU).
+            image_format: THUMBNAIL_FORMAT_PPM, or any format supported by
+                Pillow (such as "jpeg") if it is installed.
+            error_history: The number of recent errors to keep.
+
+        Raises:
+            ValueError: If max_pending is not greater than 0 or if a factor
+                is less than 2.
+            ImportError: If image_format needs Pillow and it is not installed.
+        """
+        if max_pending <= 0:
+            raise ValueError("max_pending must be greater than 0.")
+        if any(factor < 2 for factor in factors):
+            raise ValueError("factors must be at least 2.")
+        if image_format != THUMBNAIL_FORMAT_PPM:
+            # Fail now rather than in every worker if Pillow is missing.
+            import PIL
+
+        self._directory = directory
+        self._factors = tuple(sorted(factors))
+        self._max_pending = max_pending
+        self._process_count = process_count
+        self._image_format = image_format
+
+        self._executor = None
+        self._lock = Lock()
+        self._pending = 0
+        self._generated_frames = 0
+        self._dropped_frames = 0
+        self._failed_frames = 0
+        self._errors = deque(maxlen=error_history)
+
+    def start(self):
+        """Start the worker processes."""
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(self._process_count)
+
+    def stop(self, wait=True):
+        """Stop the worker processes.
+
+        Args:
+            wait: Whether to finish the frames waiting for the pool first.
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait, cancel_futures=not wait)
+            self._executor = None
+
+    def get_thumbnail_path(self, camera_name, filename, factor):
+        """Return the path of a thumbnail.
+
+        Args:
+            camera_name: The name of the camera that captured the frame.
+            filename: The filename (without extension) of the frame.
+            factor: The factor the thumbnail was shrunk by.
+
+        Returns: The path of the thumbnail.
+        """
+        return join(self._directory,
+                    camera_name,
+                    "1-" + str(factor),
+                    filename + "." + self._image_format)
+
+    def submit(self, camera_name, filename, image):
+        """Queue the thumbnails of a frame to be built.
+
+        Args:
+            camera_name: The name of the camera that captured the frame.
+            filename: The filename (without extension) of the frame.
+            image: The frame as an 8-bit array-like of shape (height, width)
+                or (height, width, channels), as the encoded image as a
+                bytes-like object or as the path of an image file, none of
+                which may be modified afterwards. It may also be a function
+                returning one of these, which is only called once the frame
+                has been accepted.
+
+        Returns: A boolean specifying whether the frame was accepted, which is
+            False when max_pending frames are already waiting.
+        """
+        with self._lock:
+            if self._pending >= self._max_pending:
+                self._dropped_frames += 1
+                return False
+            self._pending += 1
+            self.start()
+
+        try:
+            if callable(image):
+                image = image()
+            if isinstance(image, memoryview):
+                image = image.tobytes()
+
+            paths = [self.get_thumbnail_path(camera_name, filename, factor)
+                     for factor in self._factors]
+            future = self._executor.submit(_generate_thumbnails,
+                                           image,
+                                           self._factors,
+                                           paths,
+                                           self._image_format)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+
+        future.add_done_callback(self._finish_frame)
+
+        return True
+
+    @property
+    def pending(self):
+        """Return the number of frames waiting for thumbnails.
+
+        Returns: The number of frames waiting for thumbnails.
+        """
+        return self._pending
+
+    @property
+    def generated_frames(self):
+        """Return the number of frames whose thumbnails have been written.
+
+        Returns: The number of frames whose thumbnails have been written.
+        """
+        return self._generated_frames
+
+    @property
+    def dropped_frames(self):
+        """Return the number of frames dropped because too many were waiting.
+
+        Returns: The number of frames dropped because too many were waiting.
+        """
+        return self._dropped_frames
+
+    @property
+    def failed_frames(self):
+        """Return the number of frames whose thumbnails could not be built.
+
+        Returns: The number of frames whose thumbnails could not be built.
+        """
+        return self._failed_frames
+
+    def get_errors(self):
+        """Return the most recent errors raised while building thumbnails.
+
+        Returns: A list of exceptions, oldest first.
+        """
+        with self._lock:
+            return list(self._errors)
+
+    def _finish_frame(self, future):
+        """Record the outcome of a frame once the pool has finished with it.
+
+        Args:
+            future: The Future of the frame.
+        """
+        with self._lock:
+            self._pending -= 1
+
+            if future.cancelled():
+                self._dropped_frames += 1
+            elif future.exception() is not None:
+                self._failed_frames += 1
+                self._errors.append(future.exception())
+            else:
+                self._generated_frames += 1
@@ -0,0 +1,666 @@
+"""A stage that uploads captured frames to S3-compatible object storage."""
+
+import json
+import tarfile
+from collections import deque, namedtuple
+from io import BytesIO
+from os import O_RDONLY, close, fsync, open as open_fd, remove, replace
+from os.path import abspath, basename, dirname, exists, getsize, splitext
+from threading import Event, Lock, Thread
+from time import monotonic
+
+from storage.s3_client import S3Error
+
+CURSOR_FORMAT_VERSION = 1
+
+UPLOAD_MODE_SINGLE = "single"
+UPLOAD_MODE_BATCH = "batch"
+UPLOAD_MODE_MULTIPART = "multipart"
+
+SyncResult = namedtuple("SyncResult", ["uploaded_frames",
+                                       "uploaded_bytes",
+                                       "objects",
+                                       "failed_frames",
+                                       "duration"])
+SyncResult.__doc__ = """The outcome of one pass of an UploadSync.
+
+Attributes:
+    uploaded_frames: The number of frames confirmed by the object storage.
+    uploaded_bytes: The number of bytes of those frames.
+    objects: The number of objects those frames were stored as.
+    failed_frames: The number of frames that could not be uploaded, which
+        are retried by the next pass.
+    duration: The time (in seconds) the pass took.
+"""
+
+
+class _UploadJob:
+    """A group of frames from one camera that is uploaded as one object."""
+
+    __slots__ = ("camera_name", "mode", "frames", "size", "key",
+                 "storage_manager")
+
+    def __init__(self, camera_name, mode, frames, size, key,
+                 storage_manager=None):
+        self.camera_name = camera_name
+        self.mode = mode
+        self.frames = frames
+        self.size = size
+        self.key = key
+        self.storage_manager = storage_manager
+
+
+class _CameraProgress:
+    """The upload progress of one camera within a pass."""
+
+    __slots__ = ("next_sequence", "confirmed")
+
+    def __init__(self, next_sequence):
+        self.next_sequence = next_sequence
+        self.confirmed = set()
+
+
+class UploadSync:
+    """Upload the frames captured by cameras to an object storage bucket.
+
+    Each pass looks at the paths a camera has captured since the last
+    confirmed frame and uploads them from a bounded pool of threads, which
+    is kept between passes so that their keep-alive connections are reused
+    until close is called. Runs of
+    small frames are packed into a single uncompressed tar object to save a
+    request per frame, large frames are sent as multipart uploads so that
+    only one part is held in memory at a time, and everything else is sent
+    as one object per frame.
+
+    For every camera, the cursor records the sequence number below which
+    every frame has been confirmed. It is saved atomically after every pass
+    (if a cursor path is set), so an interrupted sync resumes where it left
+    off. A cursor saved for another bucket or prefix is ignored, as none of
+    its frames have been uploaded to this one. Frames confirmed beyond a
+    failed upload are remembered until the cursor catches up with them, so
+    only a restart can upload them twice. Frames whose files no longer
+    exist, such as those evicted by a storage quota, are skipped and
+    reported in get_errors. Cameras that append to a frame store are not
+    synced.
+    """
+
+    def __init__(self,
+                 client,
+                 bucket,
+                 prefix="",
+                 cursor_path=None,
+                 max_concurrency=4,
+                 batch_threshold=256 * 1024,
+                 max_batch_size=8 * 1024 * 1024,
+                 max_batch_frames=64,
+                 multipart_threshold=16 * 1024 * 1024,
+                 part_size=8 * 1024 * 1024,
+                 delete_uploaded=False,
+                 error_history=100):
+        """Initialise the sync stage.
+
+        Args:
+            client: The S3Client to upload with.
+            bucket: The name of the bucket to upload to.
+            prefix: The prefix of every key, such as "site-a/".
+            cursor_path: The path of the file the cursor is saved to (or None
+                to start from the first frame every time). A cursor saved
+                for another bucket or prefix is replaced.
+            max_concurrency: The maximum number of uploads in progress at
+                once.
+            batch_threshold: The size (in bytes) below which frames are
+                packed together into batches.
+            max_batch_size: The maximum size (in bytes) of the frames in a
+                batch.
+            max_batch_frames: The maximum number of frames in a batch.
+            multipart_threshold: The size (in bytes) from which frames are
+                uploaded in parts.
+            part_size: The size (in bytes) of each part of a multipart
+                upload, which must be at least 5 MiB for Amazon S3.
+            delete_uploaded: Whether to delete the local copy of each frame
+                once its upload has been confirmed, telling the camera's
+                storage_manager (if any) that it has gone.
+            error_history: The number of recent upload errors to keep.
+
+        Raises:
+            ValueError: If max_concurrency, max_batch_frames or part_size is
+                not greater than 0.
+        """
+        if max_concurrency <= 0:
+            raise ValueError("max_concurrency must be greater than 0.")
+
+        if max_batch_frames <= 0:
+            raise ValueError("max_batch_frames must be greater than 0.")
+
+        if part_size <= 0:
+            raise ValueError("part_size must be greater than 0.")
+
+        self._client = client
+        self._bucket = bucket
+        self._prefix = prefix
+        self._cursor_path = cursor_path
+        self._max_concurrency = max_concurrency
+        self._batch_threshold = batch_threshold
+        self._max_batch_size = max_batch_size
+        self._max_batch_frames = max_batch_frames
+        self._multipart_threshold = multipart_threshold
+        self._part_size = part_size
+        self._delete_uploaded = delete_uploaded
+
+        self._cursor = self._load_cursor()
+        self._confirmed_ahead = {}
+        self._sync_lock = Lock()
+        self._errors = deque(maxlen=error_history)
+        self._errors_lock = Lock()
+
+        self._executor = None
+
+        self._stop_event = Event()
+        self._thread = None
+
+    @property
+    def bucket(self):
+        """Return the name of the bucket frames are uploaded to.
+
+        Returns: The name of the bucket frames are uploaded to.
+        """
+        return self._bucket
+
+    def get_cursor(self, camera_name):
+        """Return the sequence number of the next frame to upload.
+
+        Args:
+            camera_name: The name of the camera.
+
+        Returns: The sequence number below which every frame of the camera
+            has been confirmed (or None if none have been).
+        """
+        return self._cursor.get(camera_name)
+
+    def get_errors(self):
+        """Return the most recent upload errors.
+
+        Returns: A list of (camera name, key, exception) tuples, oldest
+            first. Errors that ended a background pass have a camera name
+            and key of None.
+        """
+        with self._errors_lock:
+            return list(self._errors)
+
+    def get_key(self, camera_name, path):
+        """Return the key a single frame is uploaded to.
+
+        Args:
+            camera_name: The name of the camera that captured the frame.
+            path: The local path of the frame.
+
+        Returns: The key of the object.
+        """
+        return self._prefix + camera_name + "/" + basename(path)
+
+    def get_batch_key(self, camera_name, first_path, last_path):
+        """Return the key a batch of frames is uploaded to.
+
+        Args:
+            camera_name: The name of the camera that captured the frames.
+            first_path: The local path of the first frame in the batch.
+            last_path: The local path of the last frame in the batch.
+
+        Returns: The key of the tar object holding the batch.
+        """
+        return (self._prefix + camera_name + "/batches/" +
+                splitext(basename(first_path))[0] + "-" +
+                splitext(basename(last_path))[0] + ".tar")
+
+    def sync(self, cameras):
+        """Upload every frame captured since the last confirmed one.
+
+        Args:
+            cameras: The cameras whose captured frames are uploaded.
+
+        Returns: A SyncResult describing the pass.
+        """
+        with self._sync_lock:
+            started = monotonic()
+            progress = {}
+            jobs = []
+
+            for camera in cameras:
+                if camera.frame_store is not None:
+                    continue
+
+                camera_name = str(camera)
+                camera_progress, camera_jobs = self._plan_camera(camera)
+                progress[camera_name] = camera_progress
+                jobs.extend(camera_jobs)
+
+            uploaded_frames, uploaded_bytes, objects, failed_frames = \
+                self._run_jobs(jobs, progress)
+
+            for camera_name, camera_progress in progress.items():
+                next_sequence = self._advance(camera_progress)
+                self._cursor[camera_name] = next_sequence
+                self._confirmed_ahead[camera_name] = {
+                    sequence for sequence in camera_progress.confirmed
+                    if sequence > next_sequence}
+
+            self._save_cursor()
+
+            return SyncResult(uploaded_frames,
+                              uploaded_bytes,
+                              objects,
+                              failed_frames,
+                              monotonic() - started)
+
+    def start(self, cameras, sync_interval=10):
+        """Start syncing from a background thread.
+
+        Args:
+            cameras: The cameras whose captured frames are uploaded.
+            sync_interval: The time (in seconds) to wait between passes.
+        """
+        if self._thread is not None:
+            return
+
+        self._stop_event.clear()
+        self._thread = Thread(target=self._sync_periodically,
+                              args=(list(cameras), sync_interval),
+                              name="upload-sync",
+                              daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the background thread after a final pass, then close."""
+        if self._thread is None:
+            return
+
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self.close()
+
+    def close(self):
+        """Stop the upload threads and close the client's connections.
+
+        A later pass starts new upload threads.
+        """
+        with self._sync_lock:
+            if self._executor is None:
+                return
+
+            self._executor.shutdown()
+            self._executor = None
+            self._client.close_all()
+
+    def _sync_periodically(self, cameras, sync_interval):
+        """Sync the cameras until stopped, finishing with one last pass.
+
+        A pass that fails is recorded in get_errors, and the next pass runs
+        as usual.
+
+        Args:
+            cameras: The cameras whose captured frames are uploaded.
+            sync_interval: The time (in seconds) to wait between passes.
+        """
+        while True:
+            stopping = self._stop_event.wait(sync_interval)
+
+            try:
+                self.sync(cameras)
+            except Exception as exc:
+                self._record_error(None, None, exc)
+
+            if stopping:
+                return
+
+    def _plan_camera(self, camera):
+        """Group the frames of a camera that need uploading into jobs.
+
+        Args:
+            camera: The camera.
+
+        Returns: A (_CameraProgress, list of _UploadJob) tuple.
+        """
+        camera_name = str(camera)
+        storage_manager = camera.storage_manager
+        first_sequence = camera.capture_ledger.first_sequence
+        paths = camera.get_captured_image_paths()
+        path_count = len(paths)
+
+        # Frames handed to a storage writer may not be on disk yet.
+        if camera.storage_writer is not None:
+            camera.storage_writer.flush()
+
+        next_sequence = self._cursor.get(camera_name, first_sequence)
+        next_sequence = max(next_sequence, first_sequence)
+        progress = _CameraProgress(next_sequence)
+        confirmed_ahead = self._confirmed_ahead.get(camera_name, ())
+
+        jobs = []
+        batch = []
+        batch_size = 0
+
+        def flush_batch():
+            if len(batch) == 1:
+                sequence, path, size = batch[0]
+                jobs.append(_UploadJob(camera_name, UPLOAD_MODE_SINGLE,
+                                       list(batch), size,
+                                       self.get_key(camera_name, path),
+                                       storage_manager))
+            elif batch:
+                jobs.append(_UploadJob(camera_name, UPLOAD_MODE_BATCH,
+                                       list(batch), batch_size,
+                                       self.get_batch_key(camera_name,
+                                                          batch[0][1],
+                                                          batch[-1][1]),
+                                       storage_manager))
+            del batch[:]
+
+        for index in range(next_sequence - first_sequence, path_count):
+            sequence = first_sequence + index
+            path = paths[index]
+
+            if path is None or sequence in confirmed_ahead:
+                progress.confirmed.add(sequence)
+                continue
+
+            try:
+                size = getsize(path)
+            except OSError as exc:
+                # The frame is gone (for example, evicted by a storage
+                # quota), so there is nothing left to upload.
+                self._record_error(camera_name, path, exc)
+                progress.confirmed.add(sequence)
+                continue
+
+            if size < self._batch_threshold:
+                if (len(batch) >= self._max_batch_frames or
+                        batch_size + size > self._max_batch_size):
+                    flush_batch()
+                    batch_size = 0
+
+                batch.append((sequence, path, size))
+                batch_size += size
+                continue
+
+            flush_batch()
+            batch_size = 0
+
+            if size >= self._multipart_threshold:
+                mode = UPLOAD_MODE_MULTIPART
+            else:
+                mode = UPLOAD_MODE_SINGLE
+
+            jobs.append(_UploadJob(camera_name, mode, [(sequence, path, size)],
+                                   size, self.get_key(camera_name, path),
+                                   storage_manager))
+
+        flush_batch()
+
+        return progress, jobs
+
+    def _run_jobs(self, jobs, progress):
+        """Upload jobs from a bounded pool of threads.
+
+        Args:
+            jobs: The _UploadJob to run.
+            progress: A dictionary mapping camera names to _CameraProgress.
+
+        Returns: An (uploaded frames, uploaded bytes, objects, failed frames)
+            tuple.
+        """
+        # concurrent.futures is slow to import and only needed while
+        # uploading.
+        from concurrent.futures import FIRST_COMPLETED, wait
+
+        uploaded_frames = 0
+        uploaded_bytes = 0
+        objects = 0
+        failed_frames = 0
+
+        if not jobs:
+            return uploaded_frames, uploaded_bytes, objects, failed_frames
+
+        executor = self._get_executor()
+        pending_jobs = deque(jobs)
+        in_flight = {}
+
+        while pending_jobs or in_flight:
+            while pending_jobs and len(in_flight) < self._max_concurrency:
+                job = pending_jobs.popleft()
+                in_flight[executor.submit(self._upload, job)] = job
+
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                job = in_flight.pop(future)
+                exception = future.exception()
+
+                if exception is not None:
+                    self._record_error(job.camera_name, job.key, exception)
+                    failed_frames += len(job.frames)
+                    continue
+
+                camera_progress = progress[job.camera_name]
+                for sequence, path, _ in job.frames:
+                    camera_progress.confirmed.add(sequence)
+
+                uploaded_frames += len(job.frames)
+                uploaded_bytes += job.size
+                objects += 1
+
+                if self._delete_uploaded:
+                    self._delete_frames(job)
+
+        return uploaded_frames, uploaded_bytes, objects, failed_frames
+
+    def _get_executor(self):
+        """Return the pool of upload threads, starting it if needed.
+
+        The sync lock must be held by the caller.
+
+        Returns: A concurrent.futures.ThreadPoolExecutor.
+        """
+        if self._executor is None:
+            from concurrent.futures import ThreadPoolExecutor
+
+            self._executor = ThreadPoolExecutor(
+                max_workers=self._max_concurrency,
+                thread_name_prefix="upload")
+
+        return self._executor
+
+    def _upload(self, job):
+        """Upload a job as a single object.
+
+        Args:
+            job: The _UploadJob.
+
+        Raises:
+            S3Error: If the object storage rejects the upload.
+            OSError: If a frame cannot be read.
+        """
+        if job.mode == UPLOAD_MODE_BATCH:
+            self._client.put_object(self._bucket,
+                                    job.key,
+                                    self._build_batch(job),
+                                    "application/x-tar")
+        elif job.mode == UPLOAD_MODE_MULTIPART:
+            self._upload_in_parts(job)
+        else:
+            with open(job.frames[0][1], "rb") as frame_file:
+                self._client.put_object(self._bucket,
+                                        job.key,
+                                        frame_file.read())
+
+    def _build_batch(self, job):
+        """Pack the frames of a batch into an uncompressed tar archive.
+
+        Args:
+            job: The _UploadJob.
+
+        Returns: The archive as bytes.
+
+        Raises:
+            OSError: If a frame cannot be read.
+        """
+        archive_data = BytesIO()
+
+        with tarfile.open(fileobj=archive_data,
+                          mode="w",
+                          format=tarfile.PAX_FORMAT) as archive:
+            for _, path, _ in job.frames:
+                archive.add(path, arcname=basename(path), recursive=False)
+
+        return archive_data.getvalue()
+
+    def _upload_in_parts(self, job):
+        """Upload a large frame one part at a time.
+
+        The upload is aborted if any part fails, so no orphaned parts are
+        left to be charged for.
+
+        Args:
+            job: The _UploadJob.
+
+        Raises:
+            S3Error: If the object storage rejects the upload.
+            OSError: If the frame cannot be read.
+        """
+        upload_id = self._client.create_multipart_upload(self._bucket,
+                                                         job.key)
+        parts = []
+
+        try:
+            with open(job.frames[0][1], "rb") as frame_file:
+                part = bytearray(self._part_size)
+                part_view = memoryview(part)
+
+                while True:
+                    read = frame_file.readinto(part_view)
+                    if not read:
+                        break
+
+                    part_number = len(parts) + 1
+                    etag = self._client.upload_part(self._bucket,
+                                                    job.key,
+                                                    upload_id,
+                                                    part_number,
+                                                    part_view[:read])
+                    parts.append((part_number, etag))
+
+            self._client.complete_multipart_upload(self._bucket,
+                                                   job.key,
+                                                   upload_id,
+                                                   parts)
+        except BaseException:
+            try:
+                self._client.abort_multipart_upload(self._bucket,
+                                                    job.key,
+                                                    upload_id)
+            except S3Error:
+                pass
+            raise
+
+    def _delete_frames(self, job):
+        """Delete the local copies of frames that have been confirmed.
+
+        The camera's storage manager, if any, stops counting them towards
+        its quotas.
+
+        Args:
+            job: The confirmed _UploadJob.
+        """
+        for sequence, path, _ in job.frames:
+            try:
+                remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError as exc:
+                self._record_error(job.camera_name, path, exc)
+                continue
+
+            if job.storage_manager is not None:
+                job.storage_manager.forget(job.camera_name, sequence)
+
+    @staticmethod
+    def _advance(progress):
+        """Move a camera's cursor past every confirmed frame in order.
+
+        Args:
+            progress: The _CameraProgress of the camera.
+
+        Returns: The sequence number of the first unconfirmed frame.
+        """
+        next_sequence = progress.next_sequence
+
+        while next_sequence in progress.confirmed:
+            next_sequence += 1
+
+        return next_sequence
+
+    def _record_error(self, camera_name, key, exception):
+        """Keep an upload error for get_errors.
+
+        Args:
+            camera_name: The name of the camera.
+            key: The key or path the error relates to.
+            exception: The exception.
+        """
+        with self._errors_lock:
+            self._errors.append((camera_name, key, exception))
+
+    def _load_cursor(self):
+        """Load the saved cursor, if it was saved for this bucket and prefix.
+
+        Returns: A dictionary mapping camera names to sequence numbers.
+
+        Raises:
+            ValueError: If the cursor was saved in an unknown format.
+        """
+        if self._cursor_path is None or not exists(self._cursor_path):
+            return {}
+
+        with open(self._cursor_path, "r", encoding="utf-8") as cursor_file:
+            state = json.load(cursor_file)
+
+        if state.get("format_version") != CURSOR_FORMAT_VERSION:
+            raise ValueError("Unsupported cursor format: " +
+                             str(state.get("format_version")) + ".")
+
+        if (state.get("bucket") != self._bucket or
+                state.get("prefix") != self._prefix):
+            return {}
+
+        return dict(state["cameras"])
+
+    def _save_cursor(self):
+        """Save the cursor atomically, if a cursor path is set."""
+        if self._cursor_path is None:
+            return
+
+        state = {"format_version": CURSOR_FORMAT_VERSION,
+                 "bucket": self._bucket,
+                 "prefix": self._prefix,
+                 "cameras": self._cursor}
+
+        with open(self._cursor_path + ".tmp", "w",
+                  encoding="utf-8") as cursor_file:
+            json.dump(state, cursor_file)
+            cursor_file.flush()
+            fsync(cursor_file.fileno())
+
+        replace(self._cursor_path + ".tmp", self._cursor_path)
+
+        try:
+            directory_descriptor = open_fd(
+                dirname(abspath(self._cursor_path)), O_RDONLY)
+        except OSError:
+            return
+
+        try:
+            fsync(directory_descriptor)
+        except OSError:
+            pass
+        finally:
+            close(directory_descriptor)
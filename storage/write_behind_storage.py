@@ -0,0 +1,383 @@
+"""A bounded write-behind stage that persists frames off the capture path."""
+
+from collections import deque
+from os import O_RDONLY, close, fsync, open as open_fd, remove
+from os.path import dirname
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from time import monotonic
+
+OVERFLOW_POLICY_BLOCK = "block"
+OVERFLOW_POLICY_DROP_NEWEST = "drop_newest"
+OVERFLOW_POLICY_DROP_OLDEST = "drop_oldest"
+
+OVERFLOW_POLICIES = (OVERFLOW_POLICY_BLOCK,
+                     OVERFLOW_POLICY_DROP_NEWEST,
+                     OVERFLOW_POLICY_DROP_OLDEST)
+
+_STOP = object()
+
+
+class _PendingWrite:
+    """A frame waiting in the queue to be written."""
+
+    __slots__ = ("path", "data", "encoder", "failure_handler", "submitted")
+
+    def __init__(self, path, data, encoder, failure_handler):
+        self.path = path
+        self.data = data
+        self.encoder = encoder
+        self.failure_handler = failure_handler
+        self.submitted = monotonic()
+
+
+class WriteBehindStorage:
+    """Persist in-memory frames to disk from a pool of writer threads.
+
+    Cameras hand frames to submit and return immediately. Writers take
+    frames from a bounded queue in batches, encode them if needed, write
+    them and then fsync the whole batch together, so a slow disk only
+    affects capture once the queue is full.
+    """
+
+    def __init__(self,
+                 max_queue_size=64,
+                 writer_count=2,
+                 fsync_batch_size=16,
+                 overflow_policy=OVERFLOW_POLICY_BLOCK,
+                 error_history=100):
+        """Initialise the storage stage.
+
+        Args:
+            max_queue_size: The maximum number of frames waiting to be
+                written.
+            writer_count: The number of writer threads.
+            fsync_batch_size: The maximum number of frames written before they
+                are all fsynced together.
+            overflow_policy: What to do when the queue is full;
+                OVERFLOW_POLICY_BLOCK makes submit wait for space,
+                OVERFLOW_POLICY_DROP_NEWEST discards the submitted frame and
+                OVERFLOW_POLICY_DROP_OLDEST discards the oldest queued frame.
+            error_history: The number of recent write errors to keep.
+
+        Raises:
+            ValueError: If overflow_policy is not a recognised policy or if
+                max_queue_size, writer_count or fsync_batch_size is not
+                greater than 0.
+        """
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError("overflow_policy must be one of: " +
+                             ", ".join(OVERFLOW_POLICIES) + ".")
+
+        for argument_name, value in (("max_queue_size", max_queue_size),
+                                     ("writer_count", writer_count),
+                                     ("fsync_batch_size", fsync_batch_size)):
+            if value <= 0:
+                raise ValueError(argument_name + " must be greater than 0.")
+
+        self._queue = Queue(max_queue_size)
+        self._writer_count = writer_count
+        self._fsync_batch_size = fsync_batch_size
+        self._overflow_policy = overflow_policy
+
+        self._writers = []
+        self._statistics_lock = Lock()
+        self._submit_lock = Lock()
+
+        self._written_frames = 0
+        self._dropped_frames = 0
+        self._failed_writes = 0
+        self._total_write_latency = 0.0
+        self._max_write_latency = 0.0
+        self._last_write_latency = None
+        self._errors = deque(maxlen=error_history)
+
+    def start(self):
+        """Start the writer threads."""
+        if self._writers:
+            return
+
+        for index in range(self._writer_count):
+            writer = Thread(target=self._write_frames,
+                            name="storage-writer-" + str(index),
+                            daemon=True)
+            writer.start()
+            self._writers.append(writer)
+
+    def stop(self):
+        """Write every queued frame and then stop the writer threads."""
+        for _ in self._writers:
+            self._queue.put(_STOP)
+
+        for writer in self._writers:
+            writer.join()
+
+        self._writers = []
+
+    def flush(self):
+        """Block until every frame submitted so far has been written."""
+        self._queue.join()
+
+    def submit(self, path, data, encoder=None, failure_handler=None):
+        """Queue a frame to be written.
+
+        Args:
+            path: The path to write the frame to.
+            data: The frame, as bytes or as an object understood by encoder.
+            encoder: A function run on a writer thread that converts data to
+                bytes (or None if data is already bytes).
+            failure_handler: A function taking no arguments that is called if
+                the frame is accepted but never written, because writing it
+                fails or it is later dropped under
+                OVERFLOW_POLICY_DROP_OLDEST (or None). It may be called on a
+                writer thread.
+
+        Returns: A boolean specifying whether the frame was accepted, which is
+            only False when the queue is full under
+            OVERFLOW_POLICY_DROP_NEWEST, or under OVERFLOW_POLICY_DROP_OLDEST
+            while the writers are being stopped.
+        """
+        pending_write = _PendingWrite(path, data, encoder, failure_handler)
+
+        if self._overflow_policy == OVERFLOW_POLICY_BLOCK:
+            self._queue.put(pending_write)
+            return True
+
+        with self._submit_lock:
+            try:
+                self._queue.put_nowait(pending_write)
+                return True
+            except Full:
+                if self._overflow_policy == OVERFLOW_POLICY_DROP_NEWEST:
+                    self._count_dropped_frame()
+                    return False
+
+            try:
+                oldest = self._queue.get_nowait()
+                self._queue.task_done()
+            except Empty:
+                pass
+            else:
+                self._count_dropped_frame()
+
+                # A writer must still receive every stop signal, so the new
+                # frame is dropped instead.
+                if oldest is _STOP:
+                    self._queue.put_nowait(_STOP)
+                    return False
+
+                if oldest.failure_handler is not None:
+                    oldest.failure_handler()
+
+            self._queue.put_nowait(pending_write)
+            return True
+
+    @property
+    def queue_depth(self):
+        """Return the number of frames waiting to be written.
+
+        Returns: The number of frames waiting to be written.
+        """
+        return self._queue.qsize()
+
+    @property
+    def written_frames(self):
+        """Return the number of frames that have been written and fsynced.
+
+        Returns: The number of frames that have been written and fsynced.
+        """
+        return self._written_frames
+
+    @property
+    def dropped_frames(self):
+        """Return the number of frames dropped because the queue was full.
+
+        Returns: The number of frames dropped because the queue was full.
+        """
+        return self._dropped_frames
+
+    @property
+    def failed_writes(self):
+        """Return the number of frames that could not be written.
+
+        Returns: The number of frames that could not be written.
+        """
+        return self._failed_writes
+
+    @property
+    def last_write_latency(self):
+        """Return the time (in seconds) from submission to durability.
+
+        Returns: The latency of the most recently written frame (or None if
+            no frame has been written).
+        """
+        return self._last_write_latency
+
+    @property
+    def mean_write_latency(self):
+        """Return the mean time (in seconds) from submission to durability.
+
+        Returns: The mean latency of the frames written (or None if no frame
+            has been written).
+        """
+        if self._written_frames == 0:
+            return None
+
+        return self._total_write_latency / self._written_frames
+
+    @property
+    def max_write_latency(self):
+        """Return the largest time (in seconds) from submission to durability.
+
+        Returns: The largest latency of the frames written.
+        """
+        return self._max_write_latency
+
+    def get_errors(self):
+        """Return the most recent errors raised while writing frames.
+
+        Returns: A list of (path, exception) tuples, oldest first.
+        """
+        with self._statistics_lock:
+            return list(self._errors)
+
+    def _count_dropped_frame(self):
+        """Record that a frame has been dropped."""
+        with self._statistics_lock:
+            self._dropped_frames += 1
+
+    def _write_frames(self):
+        """Write batches of frames from the queue until told to stop."""
+        stopping = False
+
+        while not stopping:
+            batch = [self._queue.get()]
+
+            while len(batch) < self._fsync_batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except Empty:
+                    break
+
+            if _STOP in batch:
+                stopping = True
+                for _ in range(batch.count(_STOP) - 1):
+                    self._queue.put(_STOP)
+                for _ in range(batch.count(_STOP)):
+                    batch.remove(_STOP)
+                    self._queue.task_done()
+
+            try:
+                self._write_batch(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _write_batch(self, batch):
+        """Write a batch of frames and then fsync them all.
+
+        Args:
+            batch: A list of _PendingWrite.
+        """
+        open_files = []
+
+        for pending_write in batch:
+            image_file = None
+
+            try:
+                data = pending_write.data
+                if pending_write.encoder is not None:
+                    data = pending_write.encoder(data)
+
+                image_file = open(pending_write.path, "wb")
+                image_file.write(data)
+            except Exception as exc:
+                if image_file is not None:
+                    self._discard_file(pending_write.path, image_file)
+                self._record_error(pending_write, exc)
+                continue
+
+            open_files.append((pending_write, image_file))
+
+        directories = set()
+
+        for pending_write, image_file in open_files:
+            try:
+                image_file.flush()
+                fsync(image_file.fileno())
+                image_file.close()
+                directories.add(dirname(pending_write.path) or ".")
+            except Exception as exc:
+                self._discard_file(pending_write.path, image_file)
+                self._record_error(pending_write, exc)
+                continue
+
+            self._record_write(pending_write)
+
+        for directory in directories:
+            self._fsync_directory(directory)
+
+    @staticmethod
+    def _discard_file(path, image_file):
+        """Close and remove a partly written file.
+
+        Args:
+            path: The path of the file.
+            image_file: The open file.
+        """
+        try:
+            image_file.close()
+        except OSError:
+            pass
+
+        try:
+            remove(path)
+        except OSError:
+            pass
+
+    @staticmethod
+    def _fsync_directory(directory):
+        """Make the directory entries of newly written files durable.
+
+        Args:
+            directory: The directory to fsync.
+        """
+        try:
+            directory_descriptor = open_fd(directory, O_RDONLY)
+        except OSError:
+            return
+
+        try:
+            fsync(directory_descriptor)
+        except OSError:
+            pass
+        finally:
+            close(directory_descriptor)
+
+    def _record_write(self, pending_write):
+        """Record the latency of a frame that has been written.
+
+        Args:
+            pending_write: The _PendingWrite that has been written.
+        """
+        latency = monotonic() - pending_write.submitted
+
+        with self._statistics_lock:
+            self._written_frames += 1
+            self._total_write_latency += latency
+            self._max_write_latency = max(self._max_write_latency, latency)
+            self._last_write_latency = latency
+
+    def _record_error(self, pending_write, exc):
+        """Record a frame that could not be written.
+
+        Args:
+            pending_write: The _PendingWrite that could not be written.
+            exc: The exception that was raised.
+        """
+        with self._statistics_lock:
+            self._failed_writes += 1
+            self._errors.append((pending_write.path, exc))
+
+        if pending_write.failure_handler is not None:
+            pending_write.failure_handler()
@@ -0,0 +1,90 @@
+"""A minimal stand-in for the picamera package used by RaspberryPiCamera."""
+
+
+class PiCameraError(Exception):
+    """A stand-in for picamera.PiCameraError."""
+    pass
+
+
+class PiCamera:
+    """A stand-in for picamera.PiCamera that produces numbered frames.
+
+    Attributes:
+        still_captures: The number of captures made through the still port.
+        video_port_captures: The number of captures made through the video
+            port.
+        fail_next_capture: Whether the next capture should raise
+            PiCameraError.
+
+    Raw "rgb" captures are filled with the frame number, so that every
+    capture differs from the last. Like picamera, a video port capture
+    fails if its splitter port is held by a running continuous capture.
+    """
+
+    def __init__(self):
+        self.resolution = (100, 50)
+        self.closed = False
+        self.still_captures = 0
+        self.video_port_captures = 0
+        self.fail_next_capture = False
+        self._busy_splitter_ports = set()
+
+    def capture(self,
+                output,
+                format=None,
+                use_video_port=False,
+                resize=None,
+                splitter_port=0):
+        if use_video_port and splitter_port in self._busy_splitter_ports:
+            raise PiCameraError("The splitter port is already in use")
+
+        self._capture(output, format, use_video_port, resize)
+
+    def capture_continuous(self,
+                           output,
+                           format=None,
+                           use_video_port=False,
+                           splitter_port=0):
+        if use_video_port:
+            self._busy_splitter_ports.add(splitter_port)
+
+        try:
+            while True:
+                self._capture(output, format, use_video_port)
+                yield output
+        finally:
+            self._busy_splitter_ports.discard(splitter_port)
+
+    def close(self):
+        self.closed = True
+
+    def _capture(self, output, format, use_video_port, resize=None):
+        if use_video_port:
+            self.video_port_captures += 1
+        else:
+            self.still_captures += 1
+
+        self._write_frame(output, format, resize)
+
+    def _write_frame(self, output, format, resize=None):
+        if self.closed:
+            raise PiCameraError("Camera is closed")
+
+        if self.fail_next_capture:
+            self.fail_next_capture = False
+            raise PiCameraError("Capture failed")
+
+        frame_number = self.still_captures + self.video_port_captures
+
+        if format == "rgb":
+            width, height = resize or self.resolution
+            width, height = (width + 31) // 32 * 32, (height + 15) // 16 * 16
+            data = bytes([frame_number % 256]) * (width * height * 3)
+        else:
+            data = (str(format) + ":" + str(frame_number)).encode()
+
+        if hasattr(output, "write"):
+            output.write(data)
+        else:
+            with open(output, "wb") as image_file:
+                image_file.write(data)
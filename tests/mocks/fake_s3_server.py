@@ -0,0 +1,198 @@
+"""A local stand-in for S3-compatible object storage."""
+
+from base64 import b64encode
+from hashlib import md5, sha256
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from itertools import count
+from threading import Lock, Thread
+from time import sleep
+from urllib.parse import parse_qsl, unquote, urlsplit
+from xml.etree import ElementTree
+
+from storage.s3_client import sign_request
+
+
+class FakeS3Server:
+    """Serve a subset of the S3 API, checking every request's signature.
+
+    Attributes:
+        objects: A dictionary mapping (bucket, key) to the stored bytes.
+        uploads: A dictionary mapping upload IDs to dictionaries of parts.
+        failing_keys: Keys that every upload to fails with a 500 status.
+        latency: The time (in seconds) every request takes.
+        requests: A list of (method, path, query) tuples of every request.
+        max_active_requests: The most requests handled at once.
+        connections: The number of connections accepted.
+    """
+
+    def __init__(self, access_key="test-key", secret_key="test-secret",
+                 region="us-east-1"):
+        self.objects = {}
+        self.uploads = {}
+        self.failing_keys = set()
+        self.latency = 0
+        self.requests = []
+        self.max_active_requests = 0
+        self.connections = 0
+        self._active_requests = 0
+        self._upload_ids = count(1)
+        self._lock = Lock()
+
+        server = self
+
+        class S3RequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_PUT(self):
+                self._handle()
+
+            def do_POST(self):
+                self._handle()
+
+            def do_DELETE(self):
+                self._handle()
+
+            def _handle(self):
+                parts = urlsplit(self.path)
+                path = unquote(parts.path)
+                query = dict(parse_qsl(parts.query, keep_blank_values=True))
+                body = self.rfile.read(int(self.headers["Content-Length"]))
+
+                with server._lock:
+                    server.requests.append((self.command, path, query))
+                    server._active_requests += 1
+                    server.max_active_requests = max(
+                        server.max_active_requests, server._active_requests)
+
+                try:
+                    sleep(server.latency)
+                    status, headers, response_body = self._respond(path,
+                                                                   query,
+                                                                   body)
+                finally:
+                    with server._lock:
+                        server._active_requests -= 1
+
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(response_body)))
+                self.end_headers()
+                self.wfile.write(response_body)
+
+            def _respond(self, path, query, body):
+                if not self._has_valid_signature(path, query, body):
+                    return _error(403, "SignatureDoesNotMatch")
+
+                _, bucket, key = path.split("/", 2)
+
+                if key in server.failing_keys:
+                    return _error(500, "InternalError")
+
+                if self.command == "PUT":
+                    content_md5 = b64encode(md5(body).digest()).decode()
+                    if self.headers["Content-MD5"] != content_md5:
+                        return _error(400, "BadDigest")
+
+                    etag = '"' + md5(body).hexdigest() + '"'
+
+                    with server._lock:
+                        if "uploadId" in query:
+                            upload = server.uploads.get(query["uploadId"])
+                            if upload is None:
+                                return _error(404, "NoSuchUpload")
+                            upload[int(query["partNumber"])] = body
+                        else:
+                            server.objects[(bucket, key)] = body
+
+                    return 200, {"ETag": etag}, b""
+
+                if self.command == "POST" and "uploads" in query:
+                    upload_id = "upload-" + str(next(server._upload_ids))
+                    with server._lock:
+                        server.uploads[upload_id] = {}
+
+                    return 200, {}, (
+                        "<InitiateMultipartUploadResult><UploadId>" +
+                        upload_id +
+                        "</UploadId></InitiateMultipartUploadResult>"
+                    ).encode()
+
+                if self.command == "POST" and "uploadId" in query:
+                    part_numbers = [
+                        int(element.text) for element in
+                        ElementTree.fromstring(body).iter("PartNumber")]
+
+                    with server._lock:
+                        upload = server.uploads.pop(query["uploadId"])
+                        server.objects[(bucket, key)] = b"".join(
+                            upload[part_number]
+                            for part_number in part_numbers)
+
+                    return 200, {}, (
+                        b"<CompleteMultipartUploadResult><ETag>\"multipart\""
+                        b"</ETag></CompleteMultipartUploadResult>")
+
+                if self.command == "DELETE" and "uploadId" in query:
+                    with server._lock:
+                        server.uploads.pop(query["uploadId"], None)
+
+                    return 204, {}, b""
+
+                return _error(400, "NotImplemented")
+
+            def _has_valid_signature(self, path, query, body):
+                authorization = self.headers.get("Authorization", "")
+                signed_headers = authorization.split(
+                    "SignedHeaders=")[-1].split(",")[0].split(";")
+                payload_hash = self.headers["X-Amz-Content-Sha256"]
+
+                if payload_hash != sha256(body).hexdigest():
+                    return False
+
+                expected = sign_request(self.command,
+                                        path,
+                                        query,
+                                        {name: self.headers[name]
+                                         for name in signed_headers},
+                                        payload_hash,
+                                        access_key,
+                                        secret_key,
+                                        region,
+                                        self.headers["X-Amz-Date"])
+
+                return authorization == expected
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                           S3RequestHandler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever,
+                              args=(0.05,),
+                              daemon=True)
+        self._thread.start()
+
+    @property
+    def endpoint_url(self):
+        return "http://127.0.0.1:{}".format(self._server.server_address[1])
+
+    def stop(self):
+        if not self._thread.is_alive():
+            return
+
+        self._server.shutdown()
+        self._thread.join()
+        self._server.server_close()
+
+
+def _error(status, code):
+    return status, {"Content-Type": "application/xml"}, (
+        "<Error><Code>" + code + "</Code><Message>" + code +
+        "</Message></Error>").encode()
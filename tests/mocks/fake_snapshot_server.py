@@ -0,0 +1,93 @@
+"""A local stand-in for a network camera that serves HTTP snapshots."""
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+
+
+class FakeSnapshotServer:
+    """Serve a snapshot over keep-alive HTTP/1.1 connections.
+
+    Attributes:
+        image: The bytes of the snapshot currently being served.
+        status: The status to respond with instead of the snapshot (or None
+            to serve it).
+        chunked: Whether to send the snapshot without a Content-Length.
+        drop_idle_connections: Whether to close every connection after one
+            response without telling the client, as a camera that times out
+            idle connections would.
+        requests: The headers of every request received.
+        connections: The number of connections accepted.
+    """
+
+    def __init__(self, image=b"snapshot 1"):
+        self.image = image
+        self.status = None
+        self.chunked = False
+        self.drop_idle_connections = False
+        self.requests = []
+        self.connections = 0
+        self._lock = Lock()
+
+        server = self
+
+        class SnapshotRequestHandler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                with server._lock:
+                    server.connections += 1
+
+            def do_GET(self):
+                with server._lock:
+                    server.requests.append(dict(self.headers))
+                    image = server.image
+                    status = server.status
+
+                etag = '"' + str(hash(image)) + '"'
+
+                if status is not None:
+                    self.send_response(status)
+                    self.send_header("Content-Length", "0")
+                    self.end_headers()
+                elif self.headers.get("If-None-Match") == etag:
+                    self.send_response(304)
+                    self.send_header("ETag", etag)
+                    self.end_headers()
+                else:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "image/jpeg")
+                    self.send_header("ETag", etag)
+                    if server.chunked:
+                        self.send_header("Connection", "close")
+                    else:
+                        self.send_header("Content-Length", str(len(image)))
+                    self.end_headers()
+                    self.wfile.write(image)
+
+                if server.drop_idle_connections or server.chunked:
+                    self.close_connection = True
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0),
+                                           SnapshotRequestHandler)
+        self._server.daemon_threads = True
+        self._thread = Thread(target=self._server.serve_forever,
+                              args=(0.05,),
+                              daemon=True)
+        self._thread.start()
+
+    @property
+    def url(self):
+        return "http://127.0.0.1:{}/snapshot.jpg".format(
+            self._server.server_address[1])
+
+    def stop(self):
+        if not self._thread.is_alive():
+            return
+
+        self._server.shutdown()
+        self._thread.join()
+        self._server.server_close()
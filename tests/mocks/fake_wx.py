@@ -0,0 +1,123 @@
+"""A minimal stand-in for the parts of wxPython used by ScreenshotCamera."""
+
+BITMAP_TYPE_JPEG = "jpeg"
+BITMAP_TYPE_PNG = "png"
+BITMAP_TYPE_GIF = "gif"
+
+BitmapBufferFormat_RGB = "rgb"
+
+NullBitmap = None
+
+screen_size = (1920, 1080)
+screen_pixel_value = 0
+created_bitmaps = []
+created_apps = []
+
+
+class App:
+    """A stand-in for wx.App."""
+
+    _instance = None
+
+    def __init__(self, redirect=False):
+        App._instance = self
+        created_apps.append(self)
+
+    @classmethod
+    def Get(cls):
+        return cls._instance
+
+
+class ScreenDC:
+    """A stand-in for wx.ScreenDC whose size follows screen_size."""
+
+    def GetSize(self):
+        return screen_size
+
+
+class Image:
+    """A stand-in for wx.Image."""
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+
+    def GetData(self):
+        return bytes([screen_pixel_value]) * (self.width * self.height * 3)
+
+    def SaveFile(self, destination, file_type):
+        data = (file_type + ":" + str(self.width) + "x" +
+                str(self.height)).encode()
+
+        if hasattr(destination, "write"):
+            destination.write(data)
+        else:
+            with open(destination, "wb") as image_file:
+                image_file.write(data)
+
+
+class Bitmap:
+    """A stand-in for wx.Bitmap.
+
+    Like wxMSW, it refuses to be read while selected into a MemoryDC.
+    """
+
+    def __init__(self, width, height):
+        self.width = width
+        self.height = height
+        self.selected = False
+        created_bitmaps.append(self)
+
+    def GetSize(self):
+        return self.width, self.height
+
+    def ConvertToImage(self):
+        self._check_not_selected()
+        return Image(self.width, self.height)
+
+    def CopyToBuffer(self, data, format=BitmapBufferFormat_RGB, stride=-1):
+        self._check_not_selected()
+        length = self.width * self.height * 3
+        data[:length] = bytes([screen_pixel_value]) * length
+
+    def SaveFile(self, path, file_type):
+        self.ConvertToImage().SaveFile(path, file_type)
+
+    def _check_not_selected(self):
+        if self.selected:
+            raise RuntimeError("The bitmap is selected into a MemoryDC.")
+
+
+class MemoryDC:
+    """A stand-in for wx.MemoryDC that records the blits made into it."""
+
+    def __init__(self, bitmap=NullBitmap):
+        self.bitmap = None
+        self.blits = []
+        self.SelectObject(bitmap)
+
+    def Blit(self, *args):
+        self.blits.append(("Blit",) + args[:4] + args[5:])
+
+    def StretchBlit(self, *args):
+        self.blits.append(("StretchBlit",) + args[:4] + args[5:])
+
+    def SelectObject(self, bitmap):
+        if self.bitmap is not None:
+            self.bitmap.selected = False
+
+        self.bitmap = bitmap
+
+        if bitmap is not None:
+            bitmap.selected = True
+
+
+def reset():
+    """Forget every object created and restore the default screen size."""
+    global screen_size, screen_pixel_value
+
+    screen_size = (1920, 1080)
+    screen_pixel_value = 0
+    created_bitmaps.clear()
+    created_apps.clear()
+    App._instance = None
@@ -1,18 +1,34 @@
 """A mock implementation of a basic camera."""
 
-import os
-import sys
+from random import Random
+from time import monotonic, sleep
+
 from camera.abstract_camera import AbstractCamera
+from camera.exceptions import CameraCaptureError
+from camera.frame import FRAME_FORMAT_RGB
 
 
 class MockCamera(AbstractCamera):
-    """A class representing a mock camera."""
+    """A class representing a mock camera.
+
+    The camera can also act as a configurable synthetic camera for
+    benchmarks, with a fixed capture latency, a random failure rate and a
+    payload of a fixed size.
+
+    Attributes:
+        pixels: The array-like image shown to the frame filter and thumbnail
+            generator.
+    """
 
     def __init__(self,
                  name="",
                  storage_directory=None,
                  file_extension="jpg",
-                 images_stored_locally=True):
+                 images_stored_locally=True,
+                 capture_latency=0,
+                 failure_rate=0,
+                 payload_size=None,
+                 seed=None):
         """Initialise the mock camera.
 
         Args:
@@ -21,13 +37,29 @@ class MockCamera(AbstractCamera):
             file_extension: The file extension to be used on this camera.
             images_stored_locally: Whether the images are stored on a locally
                 accessible device or not.
+            capture_latency: The time (in seconds) each capture takes.
+            failure_rate: The probability (from 0 to 1) that a capture raises
+                CameraCaptureError.
+            payload_size: The size (in bytes) of the image handed to storage
+                (or None for an image holding the filename).
+            seed: The seed for the random failures (or None for a random
+                seed).
         """
         super().__init__(name,
                          storage_directory,
                          file_extension,
                          images_stored_locally)
 
-        self._captured_image_paths = []
+        self.pixels = None
+        self.capture_latency = capture_latency
+        self.failure_rate = failure_rate
+
+        if payload_size is None:
+            self._payload = None
+        else:
+            self._payload = bytes(payload_size)
+
+        self._random = Random(seed)
 
     def set_up(self):
         """Set up the camera so that it is ready to capture an image."""
@@ -48,30 +80,91 @@ class MockCamera(AbstractCamera):
             ImageStorageError: If the image can be captured but cannot be
                 stored successfully.
         """
-        new_image_filename = (self.get_next_filename() +
-                             "." +
-                             self.file_extension)
+        if self.capture_latency > 0:
+            sleep(self.capture_latency)
+
+        if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+            self._record_failed_image()
+            raise CameraCaptureError("Synthetic capture failure.")
+
+        if not self._should_store_image(lambda: self.pixels):
+            return
 
-        if self.storage_directory is not None:
-            new_image_path = os.path.join(self.storage_directory,
-                                          new_image_filename)
+        filename = self.get_next_filename()
+
+        if self.stores_images_in_memory and self._payload is not None:
+            image_stored = self._store_image(self._payload)
+        elif self.stores_images_in_memory:
+            image_stored = self._store_image(filename.encode())
         else:
-            new_image_path = new_image_filename
+            self._record_captured_image()
+            image_stored = True
+
+        if image_stored and self.pixels is not None:
+            self._submit_thumbnail(filename, self.pixels)
 
-        self._captured_image_paths.append(new_image_path)
+    def capture_to_buffer(self):
+        """Capture an image into memory without storing it.
 
-    def get_captured_image_paths(self):
-        """Return a list of filepaths of the images captured.
+        Returns: The image as bytes.
 
-        Returns: A list of filepaths of the images captured.
+        Raises:
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
         """
-        return self._captured_image_paths[:]
+        if self.capture_latency > 0:
+            sleep(self.capture_latency)
+
+        if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+            raise CameraCaptureError("Synthetic capture failure.")
+
+        if self._payload is not None:
+            return self._payload
 
-    def get_next_filename(self):
-        """Return the filename of the next image that will be captured.
+        return self.get_next_filename().encode()
 
-        Returns: The filename of the next image that will be captured.
+    def capture_to_frame(self):
+        """Capture pixels, or the image, into a reusable in-memory frame.
+
+        Returns: A Frame of RGB pixels if pixels is set, otherwise a Frame of
+            the image that would be stored.
+
+        Raises:
+            CameraCaptureError: If there is an issue with capturing the image
+                caused by the camera.
         """
-        number_of_captured_images = len(self.get_captured_image_paths())
-        
-        return str(number_of_captured_images + 1).rjust(8, "0")
+        timestamp = monotonic()
+
+        if self.pixels is None:
+            image_data = memoryview(self.capture_to_buffer())
+            frame = self._get_frame_pool().acquire(image_data.nbytes)
+            frame.buffer[:image_data.nbytes] = image_data
+            frame.set_metadata(str(self),
+                               timestamp,
+                               0,
+                               0,
+                               self.file_extension,
+                               image_data.nbytes)
+            return frame
+
+        if self.capture_latency > 0:
+            sleep(self.capture_latency)
+
+        if self.failure_rate > 0 and self._random.random() < self.failure_rate:
+            raise CameraCaptureError("Synthetic capture failure.")
+
+        # NumPy is only needed when pixels are set.
+        import numpy
+
+        pixels = numpy.ascontiguousarray(self.pixels, dtype=numpy.uint8)
+        height, width = pixels.shape[:2]
+        frame = self._get_frame_pool().acquire(pixels.nbytes)
+        frame.buffer[:pixels.nbytes] = pixels.reshape(-1)
+        frame.set_metadata(str(self),
+                           timestamp,
+                           width,
+                           height,
+                           FRAME_FORMAT_RGB,
+                           pixels.nbytes)
+
+        return frame
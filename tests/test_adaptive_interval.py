@@ -0,0 +1,77 @@
+from unittest import TestCase
+
+from adaptive_interval import AdaptiveIntervalController
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestAdaptiveIntervalController(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.controller = AdaptiveIntervalController(1,
+                                                     60,
+                                                     high_activity=0.1,
+                                                     low_activity=0.01,
+                                                     hysteresis_frames=2,
+                                                     clock=self.clock)
+        self.controller.reset(10)
+
+    def test_reset_clamps_interval(self):
+        self.assertEqual(60, self.controller.reset(600))
+
+    def test_high_activity_shortens_interval_after_hysteresis(self):
+        intervals = [self.controller.update(0.5) for _ in range(3)]
+
+        self.assertEqual([10, 5, 2.5], intervals)
+
+    def test_interval_does_not_go_below_min_interval(self):
+        for _ in range(20):
+            interval = self.controller.update(0.5)
+
+        self.assertEqual(1, interval)
+
+    def test_low_activity_lengthens_interval_after_hysteresis(self):
+        intervals = [self.controller.update(0.0) for _ in range(2)]
+
+        self.assertEqual([10, 15], intervals)
+
+    def test_alternating_activity_keeps_interval(self):
+        intervals = [self.controller.update(activity)
+                     for activity in (0.5, 0.0, 0.5, 0.0)]
+
+        self.assertEqual([10, 10, 10, 10], intervals)
+
+    def test_unmeasured_activity_keeps_interval(self):
+        self.assertEqual(10, self.controller.update(None))
+
+    def test_frame_budget_lengthens_interval(self):
+        controller = AdaptiveIntervalController(1,
+                                                60,
+                                                max_frames_per_hour=360,
+                                                clock=self.clock)
+        controller.reset(1)
+
+        self.assertEqual(10, controller.update(0.5))
+
+    def test_byte_budget_lengthens_interval(self):
+        controller = AdaptiveIntervalController(1,
+                                                60,
+                                                max_bytes_per_hour=3600000,
+                                                clock=self.clock)
+        controller.reset(1)
+
+        self.assertEqual(2, controller.update(0.5, frame_bytes=2000))
+
+    def test_init_raises_value_error_when_min_exceeds_max(self):
+        with self.assertRaises(ValueError):
+            AdaptiveIntervalController(10, 1)
+
+    def test_init_raises_type_error_when_interval_is_not_numeric(self):
+        with self.assertRaises(TypeError):
+            AdaptiveIntervalController("Test", 1)
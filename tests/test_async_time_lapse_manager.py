@@ -0,0 +1,138 @@
+from asyncio import CancelledError, Event, create_task, run, sleep
+from unittest import TestCase
+
+from async_time_lapse_manager import AsyncTimeLapseManager
+from camera.abstract_async_camera import AbstractAsyncCamera
+from camera.exceptions import CameraTimeoutError
+from camera_health import CameraHealthMonitor
+from tests.mocks.mock_camera import MockCamera
+
+
+class MockAsyncCamera(AbstractAsyncCamera):
+    def __init__(self, name=""):
+        super().__init__(name)
+        self.captures = 0
+        self.is_set_up = False
+
+    async def set_up(self):
+        self.is_set_up = True
+
+    async def tear_down(self):
+        self.is_set_up = False
+
+    async def capture_image(self):
+        await sleep(0)
+        self.captures += 1
+
+
+class HungAsyncCamera(MockAsyncCamera):
+    async def capture_image(self):
+        await Event().wait()
+
+
+class TestAsyncTimeLapseManager(TestCase):
+    def setUp(self):
+        self.mock_camera = MockCamera("Blocking")
+        self.mock_async_camera = MockAsyncCamera("Async")
+
+        self.time_lapse_manager = AsyncTimeLapseManager(
+            [self.mock_camera, self.mock_async_camera], 0.001, 3)
+
+    def test_start_time_lapse_honours_capture_limit(self):
+        run(self.time_lapse_manager.start_time_lapse_async())
+
+        self.assertEqual(3, self.time_lapse_manager.captured_frames)
+        self.assertEqual(3, len(self.mock_camera.get_captured_image_paths()))
+        self.assertEqual(3, self.mock_async_camera.captures)
+
+    def test_start_time_lapse_tears_down_cameras(self):
+        run(self.time_lapse_manager.start_time_lapse_async())
+
+        self.assertFalse(self.mock_async_camera.is_set_up)
+        self.assertFalse(self.time_lapse_manager.running)
+
+    def test_stop_ends_time_lapse_gracefully(self):
+        self.time_lapse_manager.capture_limit = None
+        self.time_lapse_manager.capture_interval = 60
+
+        async def run_and_stop():
+            task = create_task(
+                self.time_lapse_manager.start_time_lapse_async())
+            await sleep(0.05)
+            self.time_lapse_manager.stop()
+            await task
+
+        run(run_and_stop())
+
+        self.assertEqual(1, self.time_lapse_manager.captured_frames)
+        self.assertFalse(self.mock_async_camera.is_set_up)
+
+    def test_stop_before_start_is_kept(self):
+        self.time_lapse_manager.stop()
+
+        run(self.time_lapse_manager.start_time_lapse_async())
+
+        self.assertEqual(0, self.time_lapse_manager.captured_frames)
+        self.assertFalse(self.mock_async_camera.is_set_up)
+
+        run(self.time_lapse_manager.start_time_lapse_async())
+
+        self.assertEqual(3, self.time_lapse_manager.captured_frames)
+
+    def test_time_lapse_can_run_on_several_event_loops(self):
+        self.time_lapse_manager.capture_interval = 0.01
+
+        for _ in range(3):
+            self.time_lapse_manager.capture_limit += 1
+            run(self.time_lapse_manager.start_time_lapse_async())
+
+        self.assertEqual(6, self.time_lapse_manager.captured_frames)
+
+    def test_synchronous_start_time_lapse_runs_on_its_own_loop(self):
+        self.time_lapse_manager.start_time_lapse()
+
+        self.assertEqual(3, self.time_lapse_manager.captured_frames)
+        self.assertFalse(self.mock_async_camera.is_set_up)
+
+    def test_synchronous_capture_frame_runs_on_its_own_loop(self):
+        self.time_lapse_manager.capture_frame()
+
+        self.assertEqual(1, self.time_lapse_manager.captured_frames)
+        self.assertEqual(1, self.mock_async_camera.captures)
+        self.assertEqual(1, len(self.mock_camera.get_captured_image_paths()))
+
+    def test_cancellation_tears_down_cameras(self):
+        self.time_lapse_manager.capture_limit = None
+        self.time_lapse_manager.capture_interval = 60
+
+        async def run_and_cancel():
+            task = create_task(
+                self.time_lapse_manager.start_time_lapse_async())
+            await sleep(0.05)
+            task.cancel()
+            with self.assertRaises(CancelledError):
+                await task
+
+        run(run_and_cancel())
+
+        self.assertFalse(self.mock_async_camera.is_set_up)
+        self.assertFalse(self.time_lapse_manager.running)
+
+    def test_hung_camera_times_out_without_delaying_others(self):
+        hung_camera = HungAsyncCamera("Hung")
+        monitor = CameraHealthMonitor(failure_threshold=5,
+                                      capture_timeout=0.05)
+        time_lapse_manager = AsyncTimeLapseManager(
+            [hung_camera, self.mock_async_camera],
+            0.001,
+            3,
+            health_monitor=monitor)
+
+        run(time_lapse_manager.start_time_lapse_async())
+
+        self.assertEqual(3, self.mock_async_camera.captures)
+        self.assertIsInstance(
+            time_lapse_manager.last_frame_result.get_exceptions()[0],
+            CameraTimeoutError)
+        self.assertEqual(3, monitor.get_health(
+            hung_camera).consecutive_failures)
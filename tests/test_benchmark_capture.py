@@ -0,0 +1,50 @@
+from unittest import TestCase
+
+from benchmarks.benchmark_capture import (benchmark_storage,
+                                          compare_results,
+                                          get_percentile,
+                                          run_benchmarks)
+from camera.exceptions import CameraCaptureError
+from tests.mocks.mock_camera import MockCamera
+
+
+class TestBenchmarkCapture(TestCase):
+    def test_run_benchmarks_reports_every_benchmark(self):
+        results = run_benchmarks(frames=100,
+                                 camera_count=2,
+                                 jitter_frames=3,
+                                 capture_interval=0.001,
+                                 capture_latency=0,
+                                 skew_frames=2,
+                                 storage_frames=5,
+                                 payload_size=1024)
+
+        self.assertEqual({"throughput", "jitter", "skew", "storage"},
+                         set(results["results"]))
+        self.assertEqual(100, results["results"]["throughput"]["frames"])
+
+    def test_storage_benchmark_writes_every_payload(self):
+        results = benchmark_storage(frames=5, camera_count=2,
+                                    payload_size=1024)
+
+        self.assertEqual(10, results["written_frames"])
+        self.assertEqual(0, results["failed_writes"])
+        self.assertGreater(results["bytes_per_second"], 0)
+
+    def test_compare_results_reports_relative_change(self):
+        old_results = {"results": {"throughput": {"frames_per_second": 100}}}
+        new_results = {"results": {"throughput": {"frames_per_second": 150}}}
+
+        self.assertEqual([("throughput.frames_per_second", 100, 150, 0.5)],
+                         compare_results(old_results, new_results))
+
+    def test_get_percentile_uses_nearest_rank(self):
+        self.assertEqual(99, get_percentile(list(range(1, 101)), 99))
+
+    def test_synthetic_camera_fails_at_failure_rate(self):
+        camera = MockCamera("Synthetic", failure_rate=1)
+
+        with self.assertRaises(CameraCaptureError):
+            camera.capture_image()
+
+        self.assertEqual([None], camera.get_captured_image_paths())
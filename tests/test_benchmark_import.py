@@ -0,0 +1,25 @@
+from unittest import TestCase
+
+from benchmarks.benchmark_import import check_budget, run_benchmarks
+
+
+class TestBenchmarkImport(TestCase):
+    def test_camera_implementations_do_not_import_their_dependencies(self):
+        results = run_benchmarks(
+            ("camera.registry",
+             "camera.implementations.raspberry_pi_camera",
+             "camera.implementations.screenshot_camera",
+             "time_lapse_manager"),
+            repeats=1)
+
+        for result in results["results"]["import"].values():
+            self.assertEqual([], result["heavy_modules"])
+            self.assertEqual(1, result["seconds"]["count"])
+
+    def test_check_budget_reports_slow_and_heavy_modules(self):
+        results = {"results": {"import": {
+            "fast": {"seconds": {"median": 0.01}, "heavy_modules": []},
+            "slow": {"seconds": {"median": 0.5}, "heavy_modules": ["wx"]}}}}
+
+        self.assertEqual(["slow takes 500.0ms to import", "slow imports wx"],
+                         check_budget(results, 0.1))
@@ -0,0 +1,229 @@
+from threading import Event
+from unittest import TestCase
+
+from camera.exceptions import (CameraCaptureError, CameraConnectionError,
+                               CameraTimeoutError, ImageStorageError)
+from camera_health import (CIRCUIT_CLOSED, CIRCUIT_HALF_OPEN, CIRCUIT_OPEN,
+                           CameraHealthMonitor)
+from tests.mocks.mock_camera import MockCamera
+from time_lapse_manager import TimeLapseManager
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyMockCamera(MockCamera):
+    def __init__(self, name):
+        super().__init__(name)
+        self.failing = False
+        self.set_up_count = 0
+        self.tear_down_count = 0
+
+    def set_up(self):
+        self.set_up_count += 1
+        if self.failing:
+            raise CameraConnectionError()
+
+    def tear_down(self):
+        self.tear_down_count += 1
+
+    def capture_image(self):
+        if self.failing:
+            self._record_failed_image()
+            raise CameraCaptureError()
+        super().capture_image()
+
+
+class HungMockCamera(MockCamera):
+    def __init__(self, name):
+        super().__init__(name)
+        self.release = Event()
+
+    def capture_image(self):
+        self.release.wait()
+        super().capture_image()
+
+
+class TestCameraHealthMonitor(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.monitor = CameraHealthMonitor(failure_threshold=2,
+                                           base_backoff=10,
+                                           max_backoff=25,
+                                           clock=self.clock)
+        self.camera = MockCamera("Camera")
+
+    def test_circuit_opens_after_failure_threshold(self):
+        self.monitor.record_failure(self.camera, CameraCaptureError())
+        self.assertEqual(CIRCUIT_CLOSED, self.monitor.get_state(self.camera))
+        self.assertTrue(self.monitor.is_available(self.camera))
+
+        self.monitor.record_failure(self.camera, CameraCaptureError())
+        self.assertEqual(CIRCUIT_OPEN, self.monitor.get_state(self.camera))
+        self.assertFalse(self.monitor.is_available(self.camera))
+
+    def test_open_circuit_becomes_half_open_after_backoff(self):
+        for _ in range(2):
+            self.monitor.record_failure(self.camera, CameraCaptureError())
+
+        self.clock.now = 10
+
+        self.assertTrue(self.monitor.is_available(self.camera))
+        self.assertEqual(CIRCUIT_HALF_OPEN,
+                         self.monitor.get_state(self.camera))
+        self.assertTrue(self.monitor.needs_set_up(self.camera))
+
+    def test_backoff_doubles_up_to_max_backoff(self):
+        backoffs = []
+
+        for _ in range(5):
+            self.monitor.record_failure(self.camera, CameraCaptureError())
+            backoffs.append(self.monitor.get_backoff(self.camera))
+
+        self.assertEqual([10, 10, 20, 25, 25], backoffs)
+
+    def test_success_closes_circuit(self):
+        for _ in range(2):
+            self.monitor.record_failure(self.camera, CameraCaptureError())
+        self.clock.now = 10
+        self.monitor.is_available(self.camera)
+
+        self.monitor.record_success(self.camera)
+
+        self.assertEqual(CIRCUIT_CLOSED, self.monitor.get_state(self.camera))
+        self.assertEqual(0, self.monitor.get_health(
+            self.camera).consecutive_failures)
+
+    def test_failed_probe_reopens_circuit(self):
+        for _ in range(2):
+            self.monitor.record_failure(self.camera, CameraCaptureError())
+        self.clock.now = 10
+        self.monitor.is_available(self.camera)
+
+        self.monitor.record_failure(self.camera, CameraCaptureError())
+
+        self.assertEqual(CIRCUIT_OPEN, self.monitor.get_state(self.camera))
+        self.assertEqual(30, self.monitor.get_health(self.camera).retry_time)
+
+    def test_per_camera_capture_timeout_overrides_default(self):
+        monitor = CameraHealthMonitor(capture_timeout=5)
+        other_camera = MockCamera("Other")
+
+        monitor.set_capture_timeout(self.camera, 1)
+
+        self.assertEqual(1, monitor.get_capture_timeout(self.camera))
+        self.assertEqual(5, monitor.get_capture_timeout(other_camera))
+
+    def test_handles_camera_errors_only(self):
+        self.assertTrue(self.monitor.handles(CameraTimeoutError()))
+        self.assertTrue(self.monitor.handles(CameraConnectionError()))
+        self.assertFalse(self.monitor.handles(ImageStorageError()))
+
+
+class TestTimeLapseManagerWithHealthMonitor(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        self.monitor = CameraHealthMonitor(failure_threshold=1,
+                                           base_backoff=10,
+                                           clock=self.clock)
+        self.flaky_camera = FlakyMockCamera("Flaky")
+        self.healthy_camera = MockCamera("Healthy")
+
+    def create_manager(self, concurrent_capture=False):
+        return TimeLapseManager([self.flaky_camera, self.healthy_camera],
+                                capture_interval=0.001,
+                                capture_limit=3,
+                                concurrent_capture=concurrent_capture,
+                                health_monitor=self.monitor)
+
+    def test_failing_camera_does_not_stop_other_cameras(self):
+        manager = self.create_manager()
+        self.flaky_camera.failing = True
+
+        for _ in range(3):
+            manager.capture_frame()
+
+        self.assertEqual(3, len(
+            self.healthy_camera.get_captured_image_paths()))
+        self.assertEqual([None], self.flaky_camera.get_captured_image_paths())
+        self.assertEqual(CIRCUIT_OPEN,
+                         self.monitor.get_state(self.flaky_camera))
+
+    def test_failed_set_up_sidelines_camera(self):
+        self.flaky_camera.failing = True
+        manager = self.create_manager()
+
+        manager.start_time_lapse()
+
+        self.assertEqual(3, manager.captured_frames)
+        self.assertEqual([], self.flaky_camera.get_captured_image_paths())
+        self.assertEqual(3, len(
+            self.healthy_camera.get_captured_image_paths()))
+
+    def test_recovered_camera_is_set_up_again(self):
+        manager = self.create_manager()
+        self.flaky_camera.failing = True
+        manager.capture_frame()
+
+        self.flaky_camera.failing = False
+        manager.capture_frame()
+        self.assertEqual(0, self.flaky_camera.set_up_count)
+
+        self.clock.now = 10
+        manager.capture_frame()
+
+        self.assertEqual(1, self.flaky_camera.set_up_count)
+        self.assertEqual(1, self.flaky_camera.tear_down_count)
+        self.assertEqual(CIRCUIT_CLOSED,
+                         self.monitor.get_state(self.flaky_camera))
+        self.assertEqual(2, len(
+            self.flaky_camera.get_captured_image_paths()))
+
+    def test_unhandled_exception_is_raised(self):
+        self.flaky_camera.capture_image = self.raise_storage_error
+        manager = self.create_manager()
+
+        with self.assertRaises(ImageStorageError):
+            manager.capture_frame()
+
+    def test_hung_camera_times_out_without_delaying_others(self):
+        hung_camera = HungMockCamera("Hung")
+        self.addCleanup(hung_camera.release.set)
+        monitor = CameraHealthMonitor(failure_threshold=5,
+                                      capture_timeout=0.05)
+        manager = TimeLapseManager([hung_camera, self.healthy_camera],
+                                   capture_interval=0.001,
+                                   capture_limit=2,
+                                   health_monitor=monitor)
+
+        manager.capture_frame()
+        manager.capture_frame()
+
+        exceptions = manager.last_frame_result.get_exceptions()
+        self.assertEqual(1, len(exceptions))
+        self.assertIsInstance(exceptions[0], CameraTimeoutError)
+        self.assertEqual(2, len(
+            self.healthy_camera.get_captured_image_paths()))
+        self.assertEqual(2, monitor.get_health(
+            hung_camera).consecutive_failures)
+
+        hung_camera.release.set()
+        manager._frame_capturer.shut_down()
+
+    def test_concurrent_capture_records_each_camera(self):
+        self.flaky_camera.failing = True
+        manager = self.create_manager(concurrent_capture=True)
+
+        manager.start_time_lapse()
+
+        self.assertEqual(3, len(
+            self.healthy_camera.get_captured_image_paths()))
+
+    @staticmethod
+    def raise_storage_error():
+        raise ImageStorageError()
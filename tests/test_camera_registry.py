@@ -0,0 +1,86 @@
+import sys
+from unittest import TestCase
+from unittest.mock import patch
+
+from camera.registry import BUILT_IN_CAMERAS, CameraRegistry
+from tests.mocks.mock_camera import MockCamera
+
+
+class FakeEntryPoint:
+    def __init__(self, name, target):
+        self.name = name
+        self.target = target
+        self.loads = 0
+
+    def load(self):
+        self.loads += 1
+        return self.target
+
+
+class TestCameraRegistry(TestCase):
+    def test_built_in_cameras_are_not_imported_until_used(self):
+        with patch.dict(sys.modules):
+            for module_name in list(sys.modules):
+                if module_name.startswith("camera.implementations."):
+                    del sys.modules[module_name]
+
+            registry = CameraRegistry(entry_point_group=None)
+
+            self.assertEqual(sorted(BUILT_IN_CAMERAS), registry.get_names())
+            self.assertFalse(registry.is_loaded("raspberry_pi"))
+            self.assertNotIn("camera.implementations.raspberry_pi_camera",
+                             sys.modules)
+
+    def test_reference_is_imported_on_first_use(self):
+        registry = CameraRegistry(entry_point_group=None,
+                                  include_built_in=False)
+        registry.register("mock", "tests.mocks.mock_camera:MockCamera")
+
+        camera = registry.create_camera("mock", "Mock")
+
+        self.assertIsInstance(camera, MockCamera)
+        self.assertEqual("Mock", str(camera))
+        self.assertTrue(registry.is_loaded("mock"))
+
+    def test_classes_can_be_registered_directly(self):
+        registry = CameraRegistry(entry_point_group=None)
+        registry.register("mock", MockCamera)
+
+        self.assertIs(MockCamera, registry.get_camera_class("mock"))
+
+        registry.unregister("mock")
+
+        with self.assertRaises(ValueError):
+            registry.get_camera_class("mock")
+
+    def test_entry_points_are_discovered_once_and_loaded_lazily(self):
+        entry_point = FakeEntryPoint("webcam", MockCamera)
+        registry = CameraRegistry(entry_point_group="test.cameras",
+                                  include_built_in=False)
+
+        with patch("camera.registry._get_entry_points",
+                   return_value=[entry_point]) as get_entry_points:
+            self.assertEqual(["webcam"], registry.get_names())
+            self.assertEqual(0, entry_point.loads)
+
+            registry.get_camera_class("webcam")
+            registry.get_camera_class("webcam")
+
+        get_entry_points.assert_called_once_with("test.cameras")
+        self.assertEqual(1, entry_point.loads)
+
+    def test_registered_cameras_take_precedence_over_entry_points(self):
+        registry = CameraRegistry(entry_point_group="test.cameras")
+        registry.register("raspberry_pi", MockCamera)
+
+        with patch("camera.registry._get_entry_points",
+                   return_value=[FakeEntryPoint("raspberry_pi", object)]):
+            self.assertIs(MockCamera,
+                          registry.get_camera_class("raspberry_pi"))
+
+    def test_invalid_reference_raises_value_error(self):
+        registry = CameraRegistry(entry_point_group=None)
+        registry.register("broken", "tests.mocks.mock_camera")
+
+        with self.assertRaises(ValueError):
+            registry.get_camera_class("broken")
@@ -0,0 +1,149 @@
+import os
+from hashlib import blake2b
+from itertools import count
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from camera.capture_ledger import (CAPTURE_STATUS_CAPTURED,
+                                   CAPTURE_STATUS_FAILED,
+                                   CAPTURE_STATUS_SKIPPED)
+from storage.capture_catalog import CaptureCatalog
+from storage.write_behind_storage import WriteBehindStorage
+from tests.mocks.mock_camera import MockCamera
+
+
+class TestCaptureCatalog(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+        self.database_path = os.path.join(self.temporary_directory.name,
+                                          "catalog.sqlite")
+        self.wall_times = count(1000)
+
+    def open_catalog(self, batch_size=100):
+        catalog = CaptureCatalog(self.database_path,
+                                 batch_size,
+                                 wall_clock=lambda: next(self.wall_times))
+        self.addCleanup(catalog.close)
+        return catalog
+
+    def test_record_stores_size_and_digest_of_image_data(self):
+        catalog = self.open_catalog()
+
+        catalog.record("First", 1, path="00000001.jpg", image_data=b"image")
+
+        entry, = catalog.query()
+        self.assertEqual(("First", 1, 1000, "00000001.jpg", 5,
+                          blake2b(b"image").hexdigest(),
+                          CAPTURE_STATUS_CAPTURED),
+                         (entry.camera_name, entry.sequence, entry.wall_time,
+                          entry.path, entry.size, entry.digest,
+                          entry.status))
+
+    def test_captures_are_written_in_batches(self):
+        catalog = self.open_catalog(batch_size=3)
+
+        for sequence in range(1, 3):
+            catalog.record("First", sequence)
+        reader = CaptureCatalog(self.database_path)
+        self.addCleanup(reader.close)
+        self.assertEqual(0, reader.count())
+
+        catalog.record("First", 3)
+
+        self.assertEqual(3, reader.count())
+
+    def test_status_changes_are_written_in_batches(self):
+        catalog = self.open_catalog(batch_size=2)
+        catalog.record("First", 1)
+        catalog.record("First", 2)
+        reader = CaptureCatalog(self.database_path)
+        self.addCleanup(reader.close)
+
+        catalog.set_status("First", 1, CAPTURE_STATUS_SKIPPED)
+        self.assertEqual(0, reader.count(status=CAPTURE_STATUS_SKIPPED))
+        catalog.set_status("First", 2, CAPTURE_STATUS_SKIPPED)
+
+        self.assertEqual(2, reader.count(status=CAPTURE_STATUS_SKIPPED))
+
+    def test_query_filters_by_camera_and_time_range(self):
+        catalog = self.open_catalog()
+        for sequence in range(1, 6):
+            catalog.record("First", sequence)
+            catalog.record("Second", sequence)
+
+        entries = catalog.query("First", start=1002, end=1006)
+
+        self.assertEqual([2, 3], [entry.sequence for entry in entries])
+
+    def test_query_returns_every_nth_capture(self):
+        catalog = self.open_catalog()
+        for sequence in range(1, 11):
+            catalog.record("First", sequence, path=str(sequence))
+
+        self.assertEqual(["1", "4", "7", "10"],
+                         catalog.get_paths("First", every=3))
+
+    def test_query_filters_by_status(self):
+        catalog = self.open_catalog()
+        catalog.record("First", 1)
+        catalog.record("First", 2, CAPTURE_STATUS_FAILED)
+
+        self.assertEqual([1], [entry.sequence for entry in catalog.query()])
+        self.assertEqual(2, len(catalog.query(status=None)))
+        self.assertEqual(1, catalog.count("First", CAPTURE_STATUS_FAILED))
+
+    def test_recording_a_sequence_again_replaces_it(self):
+        catalog = self.open_catalog()
+        catalog.record("First", 1, CAPTURE_STATUS_FAILED)
+
+        catalog.record("First", 1)
+
+        self.assertEqual(1, catalog.count())
+        self.assertEqual(CAPTURE_STATUS_CAPTURED,
+                         catalog.query(status=None)[0].status)
+
+    def test_catalog_survives_reopening(self):
+        catalog = self.open_catalog()
+        catalog.record("Second", 1)
+        catalog.record("First", 1)
+        catalog.close()
+
+        self.assertEqual(["First", "Second"],
+                         self.open_catalog().get_camera_names())
+
+    def test_cameras_record_every_outcome(self):
+        catalog = self.open_catalog()
+        camera = MockCamera("First", self.temporary_directory.name)
+        camera.capture_catalog = catalog
+
+        camera._store_image(b"image")
+        camera._record_failed_image()
+        camera._record_skipped_image()
+
+        entries = catalog.query(status=None)
+        self.assertEqual([(1, CAPTURE_STATUS_CAPTURED, 5),
+                          (2, CAPTURE_STATUS_FAILED, None),
+                          (3, CAPTURE_STATUS_SKIPPED, None)],
+                         [(entry.sequence, entry.status, entry.size)
+                          for entry in entries])
+        self.assertEqual(camera.get_captured_image_paths()[0],
+                         entries[0].path)
+
+    def test_cameras_record_failed_storage_writer_writes(self):
+        catalog = self.open_catalog()
+        camera = MockCamera("First",
+                            os.path.join(self.temporary_directory.name,
+                                         "missing"))
+        camera.capture_catalog = catalog
+        camera.storage_writer = WriteBehindStorage()
+        camera.storage_writer.start()
+        self.addCleanup(camera.storage_writer.stop)
+
+        camera._store_image(b"image")
+        camera.storage_writer.flush()
+
+        self.assertEqual([None], camera.get_captured_image_paths())
+        self.assertEqual(1, catalog.count("First", CAPTURE_STATUS_FAILED))
+        self.assertEqual(1, camera.capture_ledger.get_status_count(
+            CAPTURE_STATUS_FAILED))
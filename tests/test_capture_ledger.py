@@ -0,0 +1,194 @@
+import json
+import os
+from unittest import TestCase
+
+from camera.capture_ledger import (CAPTURE_STATUS_CAPTURED,
+                                   CAPTURE_STATUS_EVICTED,
+                                   CAPTURE_STATUS_FAILED,
+                                   CAPTURE_STATUS_SKIPPED,
+                                   CaptureLedger)
+
+
+class TestCaptureLedger(TestCase):
+    def setUp(self):
+        self.ledger = CaptureLedger()
+
+    def test_next_filename_starts_at_one(self):
+        self.assertEqual("00000001", self.ledger.get_next_filename())
+
+    def test_record_capture_returns_path_and_advances(self):
+        path = self.ledger.record_capture("images", "jpeg")
+
+        self.assertEqual(os.path.join("images", "00000001.jpeg"), path)
+        self.assertEqual("00000002", self.ledger.get_next_filename())
+
+    def test_record_capture_without_storage_directory(self):
+        self.assertEqual("00000001.jpg",
+                         self.ledger.record_capture(None, "jpg"))
+
+    def test_paths_are_none_for_failed_and_skipped_captures(self):
+        self.ledger.record_capture(None, "jpg")
+        self.ledger.record_failure()
+        self.ledger.record_skip()
+        self.ledger.record_skip()
+        self.ledger.record_capture(None, "jpg")
+
+        self.assertEqual(["00000001.jpg", None, None, None, "00000005.jpg"],
+                         self.ledger.get_paths())
+
+    def test_captures_without_file_extension_have_no_path(self):
+        self.assertIsNone(self.ledger.record_capture("images", None))
+        self.ledger.record_capture("images", "jpg")
+
+        self.assertEqual([None, os.path.join("images", "00000002.jpg")],
+                         self.ledger.get_paths())
+        self.assertEqual(CAPTURE_STATUS_CAPTURED, self.ledger.get_status(1))
+
+    def test_consecutive_uncaptured_images_share_a_run(self):
+        for _ in range(1000):
+            self.ledger.record_skip()
+
+        self.assertEqual(1, len(self.ledger._runs))
+        self.assertEqual(CAPTURE_STATUS_SKIPPED, self.ledger.get_status(500))
+        self.assertEqual(1000,
+                         self.ledger.get_status_count(CAPTURE_STATUS_SKIPPED))
+
+    def test_paths_follow_storage_setting_changes(self):
+        self.ledger.record_capture("first", "jpg")
+        self.ledger.record_capture("second", "png")
+
+        self.assertEqual([os.path.join("first", "00000001.jpg"),
+                          os.path.join("second", "00000002.png")],
+                         self.ledger.get_paths())
+
+    def test_get_status_raises_index_error_for_unrecorded_sequence(self):
+        with self.assertRaises(IndexError):
+            self.ledger.get_status(1)
+
+    def test_paths_view_does_not_include_later_captures(self):
+        self.ledger.record_capture(None, "jpg")
+        paths = self.ledger.get_paths()
+
+        self.ledger.record_capture(None, "jpg")
+
+        self.assertEqual(1, len(paths))
+
+    def test_paths_view_supports_paging_and_negative_indices(self):
+        for _ in range(10):
+            self.ledger.record_capture(None, "jpg")
+        self.ledger.record_failure()
+
+        paths = self.ledger.get_paths()
+
+        self.assertEqual(["00000003.jpg", "00000004.jpg"], paths[2:4])
+        self.assertIsNone(paths[-1])
+        self.assertEqual(CAPTURE_STATUS_CAPTURED, self.ledger.get_status(10))
+        self.assertEqual(CAPTURE_STATUS_FAILED, self.ledger.get_status(11))
+
+    def test_memory_does_not_grow_with_captures(self):
+        for _ in range(10000):
+            self.ledger.record_capture("images", "jpeg")
+
+        self.assertEqual(1, len(self.ledger._segments))
+        self.assertEqual(0, len(self.ledger._runs))
+        self.assertEqual(10000, len(self.ledger))
+
+    def test_evicted_captures_have_no_path(self):
+        for _ in range(5):
+            self.ledger.record_capture(None, "jpg")
+        self.ledger.record_failure()
+
+        self.ledger.record_eviction(2)
+        self.ledger.record_eviction(4)
+        self.ledger.record_eviction(6)
+
+        self.assertEqual(["00000001.jpg", None, "00000003.jpg", None,
+                          "00000005.jpg", None],
+                         self.ledger.get_paths())
+        self.assertEqual(CAPTURE_STATUS_EVICTED, self.ledger.get_status(4))
+        self.assertEqual(CAPTURE_STATUS_FAILED, self.ledger.get_status(6))
+        self.assertEqual(3, self.ledger.get_status_count(
+            CAPTURE_STATUS_CAPTURED))
+        self.assertEqual(2, self.ledger.get_status_count(
+            CAPTURE_STATUS_EVICTED))
+
+    def test_evicting_oldest_captures_extends_one_run(self):
+        for _ in range(100):
+            self.ledger.record_capture(None, "jpg")
+
+        for sequence in range(1, 100):
+            self.ledger.record_eviction(sequence)
+
+        self.assertEqual([[1, 1, 99]], self.ledger._evictions)
+        self.assertEqual([None] * 99 + ["00000100.jpg"],
+                         self.ledger.get_paths())
+
+    def test_thinning_captures_extends_one_run(self):
+        for _ in range(1000):
+            self.ledger.record_capture(None, "jpg")
+
+        for sequence in range(2, 1001, 2):
+            self.ledger.record_eviction(sequence)
+
+        self.assertEqual([[2, 2, 500]], self.ledger._evictions)
+        self.assertEqual(0, len(self.ledger._runs))
+        self.assertEqual(CAPTURE_STATUS_CAPTURED, self.ledger.get_status(999))
+        self.assertEqual(CAPTURE_STATUS_EVICTED, self.ledger.get_status(1000))
+        self.assertEqual(500, self.ledger.get_status_count(
+            CAPTURE_STATUS_EVICTED))
+
+    def test_lost_images_merge_with_neighbouring_failures(self):
+        for _ in range(3):
+            self.ledger.record_capture(None, "jpg")
+        self.ledger.record_failure()
+
+        self.ledger.record_lost_image(3)
+        self.ledger.record_lost_image(1)
+
+        self.assertEqual([None, "00000002.jpg", None, None],
+                         self.ledger.get_paths())
+        self.assertEqual([(1, 2, CAPTURE_STATUS_FAILED),
+                          (3, 5, CAPTURE_STATUS_FAILED)],
+                         [(start,) + run for start, run
+                          in zip(self.ledger._run_starts,
+                                 self.ledger._runs)])
+        self.assertEqual(3, self.ledger.get_status_count(
+            CAPTURE_STATUS_FAILED))
+
+    def test_out_of_order_evictions(self):
+        for _ in range(5):
+            self.ledger.record_capture(None, "jpg")
+
+        for sequence in (4, 2, 3):
+            self.ledger.record_eviction(sequence)
+
+        self.assertEqual(["00000001.jpg", None, None, None, "00000005.jpg"],
+                         self.ledger.get_paths())
+
+    def test_evictions_round_trip_through_json(self):
+        for _ in range(10):
+            self.ledger.record_capture(None, "jpg")
+        for sequence in (3, 6, 9):
+            self.ledger.record_eviction(sequence)
+
+        restored = CaptureLedger()
+        restored.set_state(json.loads(json.dumps(self.ledger.get_state())))
+        restored.record_eviction(10)
+
+        self.assertEqual(self.ledger.get_paths()[:9],
+                         restored.get_paths()[:9])
+        self.assertEqual(CAPTURE_STATUS_EVICTED, restored.get_status(10))
+        self.assertEqual(4, restored.get_status_count(
+            CAPTURE_STATUS_EVICTED))
+
+    def test_state_round_trips_through_json(self):
+        self.ledger.record_capture("images", "jpeg")
+        self.ledger.record_failure()
+        self.ledger.record_capture("images", "jpeg")
+
+        restored = CaptureLedger()
+        restored.set_state(json.loads(json.dumps(self.ledger.get_state())))
+
+        self.assertEqual(self.ledger.get_paths(), restored.get_paths())
+        self.assertEqual("00000004", restored.get_next_filename())
+        self.assertEqual(1, restored.get_status_count(CAPTURE_STATUS_FAILED))
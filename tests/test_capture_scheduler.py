@@ -0,0 +1,164 @@
+from unittest import TestCase
+
+from capture_scheduler import (CaptureScheduler,
+                               LATE_POLICY_CATCH_UP,
+                               LATE_POLICY_COALESCE,
+                               LATE_POLICY_SKIP)
+
+
+class FakeClock:
+    def __init__(self, now=100.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+class TestCaptureScheduler(TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+
+    def create_scheduler(self, late_policy=LATE_POLICY_SKIP, interval=10):
+        scheduler = CaptureScheduler(interval,
+                                     late_policy,
+                                     clock=self.clock,
+                                     sleeper=self.clock.sleep)
+        scheduler.start()
+        return scheduler
+
+    def test_init_raises_value_error_when_late_policy_is_unknown(self):
+        with self.assertRaises(ValueError):
+            CaptureScheduler(10, "Test")
+
+    def test_first_frame_is_due_immediately(self):
+        scheduler = self.create_scheduler()
+
+        self.assertEqual(0, scheduler.get_delay())
+
+    def test_capture_time_does_not_cause_drift(self):
+        scheduler = self.create_scheduler()
+
+        for _ in range(5):
+            scheduler.wait_for_next_frame()
+            self.clock.now += 3
+
+        timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual(5, timing.slot)
+        self.assertEqual(150.0, timing.started)
+        self.assertEqual(0.0, timing.lateness)
+
+    def test_catch_up_fires_every_missed_slot(self):
+        scheduler = self.create_scheduler(LATE_POLICY_CATCH_UP)
+        scheduler.wait_for_next_frame()
+        self.clock.now += 25
+
+        slots = [scheduler.wait_for_next_frame().slot for _ in range(3)]
+
+        self.assertEqual([1, 2, 3], slots)
+        self.assertEqual(130.0, self.clock.now)
+
+    def test_skip_waits_for_next_future_slot(self):
+        scheduler = self.create_scheduler(LATE_POLICY_SKIP)
+        scheduler.wait_for_next_frame()
+        self.clock.now += 25
+
+        timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual(3, timing.slot)
+        self.assertEqual(2, timing.skipped_slots)
+        self.assertEqual(130.0, timing.started)
+
+    def test_skip_fires_late_frame_when_no_slot_was_missed(self):
+        scheduler = self.create_scheduler(LATE_POLICY_SKIP)
+        scheduler.wait_for_next_frame()
+        self.clock.now += 12
+
+        timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual(1, timing.slot)
+        self.assertEqual(2.0, timing.lateness)
+
+    def test_coalesce_fires_one_frame_immediately(self):
+        scheduler = self.create_scheduler(LATE_POLICY_COALESCE)
+        scheduler.wait_for_next_frame()
+        self.clock.now += 25
+
+        first_timing = scheduler.wait_for_next_frame()
+        second_timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual(2, first_timing.slot)
+        self.assertEqual(1, first_timing.skipped_slots)
+        self.assertEqual(125.0, first_timing.started)
+        self.assertEqual(3, second_timing.slot)
+        self.assertEqual(130.0, second_timing.started)
+
+    def test_jitter_measures_deviation_from_interval(self):
+        scheduler = self.create_scheduler(LATE_POLICY_CATCH_UP)
+        scheduler.wait_for_next_frame()
+        self.clock.now += 14
+
+        timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual(4.0, timing.jitter)
+
+    def test_shorter_interval_moves_next_deadline_earlier(self):
+        scheduler = self.create_scheduler()
+        scheduler.wait_for_next_frame()
+
+        scheduler.interval = 2
+
+        self.assertEqual(2.0, scheduler.get_delay())
+        self.assertEqual(102.0, scheduler.wait_for_next_frame().started)
+        self.assertEqual(104.0, scheduler.wait_for_next_frame().started)
+
+    def test_shorter_interval_already_passed_is_due_now(self):
+        scheduler = self.create_scheduler()
+        scheduler.wait_for_next_frame()
+        self.clock.now += 6
+
+        scheduler.interval = 2
+
+        self.assertEqual(0.0, scheduler.get_delay())
+        self.assertEqual(0.0, scheduler.begin_frame().lateness)
+
+    def test_timing_after_interval_change_uses_scheduled_interval(self):
+        scheduler = self.create_scheduler()
+        scheduler.wait_for_next_frame()
+
+        scheduler.interval = 2
+        first_timing = scheduler.wait_for_next_frame()
+        self.clock.now += 1
+        scheduler.interval = 5
+        second_timing = scheduler.wait_for_next_frame()
+        third_timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual((2.0, 0.0), (first_timing.interval,
+                                      first_timing.jitter))
+        self.assertEqual((5.0, 0.0), (second_timing.interval,
+                                      second_timing.jitter))
+        self.assertEqual((5.0, 0.0), (third_timing.interval,
+                                      third_timing.jitter))
+
+    def test_timing_of_frame_due_at_once_after_change_has_no_jitter(self):
+        scheduler = self.create_scheduler()
+        scheduler.wait_for_next_frame()
+        self.clock.now += 6
+
+        scheduler.interval = 2
+        timing = scheduler.wait_for_next_frame()
+
+        self.assertEqual((6.0, 0.0), (timing.interval, timing.jitter))
+        self.assertEqual(108.0, scheduler.wait_for_next_frame().started)
+
+    def test_changing_interval_before_first_frame_keeps_first_deadline(self):
+        scheduler = self.create_scheduler()
+        scheduler.start(105.0)
+
+        scheduler.interval = 5
+
+        self.assertEqual(105.0, scheduler.wait_for_next_frame().started)
+        self.assertEqual(110.0, scheduler.wait_for_next_frame().started)
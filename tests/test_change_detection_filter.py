@@ -0,0 +1,78 @@
+from unittest import TestCase, skipUnless
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from tests.mocks.mock_camera import MockCamera
+
+if numpy is not None:
+    from camera.change_detection_filter import (ChangeDetectionFilter,
+                                                reduce_pixels)
+
+
+@skipUnless(numpy, "NumPy is not installed")
+class TestChangeDetectionFilter(TestCase):
+    def create_frame(self, value, height=48, width=64):
+        return numpy.full((height, width, 3), value, dtype=numpy.uint8)
+
+    def test_reduce_pixels_averages_blocks(self):
+        pixels = numpy.zeros((4, 4), dtype=numpy.uint8)
+        pixels[:2, :2] = 255
+
+        reduced = reduce_pixels(pixels, (2, 2))
+
+        numpy.testing.assert_allclose([[1, 0], [0, 0]], reduced)
+
+    def test_first_frame_is_kept(self):
+        frame_filter = ChangeDetectionFilter()
+
+        self.assertTrue(frame_filter.should_keep(self.create_frame(0)))
+
+    def test_unchanged_frame_is_skipped(self):
+        frame_filter = ChangeDetectionFilter(threshold=0.05)
+        frame_filter.should_keep(self.create_frame(100))
+
+        self.assertFalse(frame_filter.should_keep(self.create_frame(101)))
+        self.assertEqual(1, frame_filter.skipped_frames)
+
+    def test_changed_frame_is_kept(self):
+        frame_filter = ChangeDetectionFilter(threshold=0.05)
+        frame_filter.should_keep(self.create_frame(0))
+
+        self.assertTrue(frame_filter.should_keep(self.create_frame(255)))
+        self.assertAlmostEqual(1.0, frame_filter.last_difference, places=5)
+
+    def test_change_outside_region_mask_is_ignored(self):
+        region_mask = numpy.zeros((48, 64), dtype=bool)
+        region_mask[:, :32] = True
+        frame_filter = ChangeDetectionFilter(threshold=0.05,
+                                             region_mask=region_mask)
+        frame_filter.should_keep(self.create_frame(0))
+        changed_frame = self.create_frame(0)
+        changed_frame[:, 32:] = 255
+
+        self.assertFalse(frame_filter.should_keep(changed_frame))
+
+    def test_frame_is_kept_after_max_gap(self):
+        frame_filter = ChangeDetectionFilter(max_gap=2)
+        frame_filter.should_keep(self.create_frame(0))
+
+        decisions = [frame_filter.should_keep(self.create_frame(0))
+                     for _ in range(3)]
+
+        self.assertEqual([False, False, True], decisions)
+
+    def test_skipped_frames_are_recorded_in_capture_ledger(self):
+        camera = MockCamera("First")
+        camera.frame_filter = ChangeDetectionFilter()
+        camera.pixels = self.create_frame(0)
+
+        camera.capture_image()
+        camera.capture_image()
+        camera.pixels = self.create_frame(255)
+        camera.capture_image()
+
+        self.assertEqual(["00000001.jpg", None, "00000003.jpg"],
+                         camera.get_captured_image_paths())
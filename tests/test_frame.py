@@ -0,0 +1,82 @@
+from unittest import TestCase, skipUnless
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from camera.frame import FRAME_FORMAT_RGB, FramePool
+from tests.mocks.mock_camera import MockCamera
+
+
+class TestFramePool(TestCase):
+    def setUp(self):
+        self.pool = FramePool()
+
+    def test_released_frame_is_reused(self):
+        for _ in range(10):
+            with self.pool.acquire(100) as frame:
+                frame.buffer[:3] = b"abc"
+
+        self.assertEqual(1, self.pool.allocated_frames)
+        self.assertEqual(1, self.pool.free_frames)
+
+    def test_larger_frame_is_allocated_when_free_frames_are_too_small(self):
+        self.pool.acquire(10).release()
+
+        frame = self.pool.acquire(20)
+
+        self.assertEqual(2, self.pool.allocated_frames)
+        self.assertEqual(20, frame.capacity)
+
+    def test_pool_keeps_at_most_max_free_frames(self):
+        pool = FramePool(max_free_frames=2)
+        frames = [pool.acquire(10) for _ in range(4)]
+
+        for frame in frames:
+            frame.release()
+
+        self.assertEqual(2, pool.free_frames)
+
+    def test_data_is_read_only_view_of_image(self):
+        frame = self.pool.acquire(10)
+        frame.buffer[:4] = b"jpeg"
+        frame.set_metadata("camera", 0, 0, 0, "jpg", 4)
+
+        self.assertEqual(b"jpeg", bytes(frame.data))
+        self.assertTrue(frame.data.readonly)
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_as_array_skips_row_padding(self):
+        frame = self.pool.acquire(2 * 8)
+        frame.buffer[:16] = bytes(range(16))
+        frame.set_metadata("camera", 0, 2, 2, FRAME_FORMAT_RGB, 16, stride=8)
+
+        pixels = frame.as_array()
+
+        self.assertEqual((2, 2, 3), pixels.shape)
+        self.assertEqual([[[0, 1, 2], [3, 4, 5]], [[8, 9, 10], [11, 12, 13]]],
+                         pixels.tolist())
+
+
+class TestMockCameraCaptureToFrame(TestCase):
+    def test_frame_holds_image_without_storing_it(self):
+        camera = MockCamera(payload_size=16)
+
+        with camera.capture_to_frame() as frame:
+            self.assertEqual(b"\0" * 16, bytes(frame.data))
+            self.assertEqual("jpg", frame.pixel_format)
+
+        self.assertEqual(0, len(camera.get_captured_image_paths()))
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_frame_holds_pixels(self):
+        camera = MockCamera()
+        camera.pixels = numpy.full((4, 6, 3), 7, dtype=numpy.uint8)
+
+        for _ in range(3):
+            with camera.capture_to_frame() as frame:
+                self.assertEqual((4, 6, 3), frame.as_array().shape)
+                self.assertEqual(7, frame.as_array()[3, 5, 2])
+
+        self.assertEqual(1, camera.frame_pool.allocated_frames)
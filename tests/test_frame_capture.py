@@ -0,0 +1,127 @@
+from threading import enumerate as enumerate_threads
+from time import sleep
+from unittest import TestCase
+
+from camera.exceptions import CameraCaptureError, CameraTimeoutError
+from frame_capture import ParallelFrameCapturer, SerialFrameCapturer
+from tests.mocks.mock_camera import MockCamera
+
+
+class SlowMockCamera(MockCamera):
+    def __init__(self, name, delay, exception=None):
+        super().__init__(name)
+        self.delay = delay
+        self.exception = exception
+
+    def capture_image(self):
+        sleep(self.delay)
+        if self.exception is not None:
+            raise self.exception
+        super().capture_image()
+
+
+class TestSerialFrameCapturer(TestCase):
+    def test_capture_stops_at_first_failure(self):
+        cameras = [SlowMockCamera("First", 0, CameraCaptureError()),
+                   SlowMockCamera("Second", 0)]
+
+        result = SerialFrameCapturer().capture(cameras)
+
+        self.assertFalse(result.succeeded)
+        self.assertEqual(1, len(result.get_camera_results()))
+        self.assertEqual([], cameras[1].get_captured_image_paths())
+
+    def test_capture_can_continue_after_failure(self):
+        cameras = [SlowMockCamera("First", 0, CameraCaptureError()),
+                   SlowMockCamera("Second", 0)]
+
+        result = SerialFrameCapturer(stop_on_failure=False).capture(cameras)
+
+        self.assertEqual(2, len(result.get_camera_results()))
+        self.assertEqual(1, len(cameras[1].get_captured_image_paths()))
+
+    def test_capture_gives_up_on_camera_after_timeout(self):
+        capturer = SerialFrameCapturer(stop_on_failure=False)
+        self.addCleanup(capturer.shut_down)
+        cameras = [SlowMockCamera("Slow", 0.5), SlowMockCamera("Fast", 0)]
+
+        result = capturer.capture(cameras, [0.05, None])
+
+        self.assertIsInstance(result.get_exceptions()[0], CameraTimeoutError)
+        self.assertLess(result.duration, 0.4)
+        self.assertEqual(1, len(cameras[1].get_captured_image_paths()))
+
+    def test_released_camera_worker_thread_exits(self):
+        capturer = SerialFrameCapturer()
+        self.addCleanup(capturer.shut_down)
+        camera = SlowMockCamera("First", 0)
+        capturer.capture([camera], [1])
+        thread_name = "capture-" + str(camera)
+
+        capturer.release_camera(camera)
+
+        for _ in range(100):
+            thread_names = [thread.name for thread in enumerate_threads()]
+            if thread_name not in thread_names:
+                break
+            sleep(0.01)
+        self.assertNotIn(thread_name, thread_names)
+        self.assertEqual(1, len(capturer.capture([camera], [1])
+                                .get_camera_results()))
+
+
+class TestParallelFrameCapturer(TestCase):
+    def setUp(self):
+        self.capturer = ParallelFrameCapturer()
+
+    def tearDown(self):
+        self.capturer.shut_down()
+
+    def test_capture_takes_max_rather_than_sum_of_latencies(self):
+        cameras = [SlowMockCamera(str(index), 0.1) for index in range(8)]
+
+        result = self.capturer.capture(cameras)
+
+        self.assertTrue(result.succeeded)
+        self.assertLess(result.duration, 0.1 * 4)
+        self.assertLess(result.spread, 0.1)
+
+    def test_capture_collects_every_camera_result_after_a_failure(self):
+        error = CameraCaptureError()
+        cameras = [SlowMockCamera("First", 0, error),
+                   SlowMockCamera("Second", 0)]
+
+        result = self.capturer.capture(cameras)
+
+        self.assertEqual([error], result.get_exceptions())
+        self.assertEqual(2, len(result.get_camera_results()))
+        self.assertEqual(1, len(cameras[1].get_captured_image_paths()))
+
+    def test_pool_is_reused_across_frames(self):
+        cameras = [MockCamera("First"), MockCamera("Second")]
+        self.capturer.capture(cameras)
+        executor = self.capturer._executor
+
+        self.capturer.capture(cameras)
+
+        self.assertIs(executor, self.capturer._executor)
+        self.assertEqual(2, self.capturer.pool_size)
+
+    def test_pool_grows_with_camera_set(self):
+        self.capturer.capture([MockCamera("First")])
+
+        self.capturer.capture([MockCamera("First"), MockCamera("Second")])
+
+        self.assertEqual(2, self.capturer.pool_size)
+
+    def test_busy_camera_is_not_captured_again(self):
+        camera = SlowMockCamera("Slow", 0.2)
+
+        first_result = self.capturer.capture([camera], [0.01])
+        second_result = self.capturer.capture([camera], [0.01])
+        sleep(0.3)
+
+        for result in (first_result, second_result):
+            self.assertIsInstance(result.get_exceptions()[0],
+                                  CameraTimeoutError)
+        self.assertEqual(1, len(camera.get_captured_image_paths()))
@@ -0,0 +1,159 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from camera.exceptions import (CameraCaptureError,
+                               CameraConnectionError,
+                               ImageStorageError)
+from camera.implementations.http_snapshot_camera import (HTTPConnectionPool,
+                                                         HTTPSnapshotCamera)
+from frame_capture import ParallelFrameCapturer
+from tests.mocks.fake_snapshot_server import FakeSnapshotServer
+
+
+class _FailingStorageWriter:
+    def submit(self, path, data, encoder=None, failure_handler=None):
+        raise OSError("The disk is full.")
+
+
+class TestHTTPSnapshotCamera(TestCase):
+    def setUp(self):
+        self.server = FakeSnapshotServer()
+        self.addCleanup(self.server.stop)
+
+        self.pool = HTTPConnectionPool(timeout=5)
+        self.addCleanup(self.pool.close)
+
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+
+    def create_camera(self, name="Network Camera", **kwargs):
+        return HTTPSnapshotCamera(self.server.url,
+                                  name=name,
+                                  storage_directory=
+                                  self.temporary_directory.name,
+                                  connection_pool=self.pool,
+                                  **kwargs)
+
+    def read_image(self, path):
+        with open(path, "rb") as image:
+            return image.read()
+
+    def test_capture_image_streams_snapshot_to_file(self):
+        self.server.image = bytes(range(256)) * 1000
+        camera = self.create_camera(chunk_size=4096)
+
+        camera.capture_image()
+
+        self.assertEqual(self.server.image,
+                         self.read_image(camera.get_captured_image_paths()[0]))
+
+    def test_connection_is_kept_alive_between_captures(self):
+        camera = self.create_camera(conditional=False)
+
+        for _ in range(5):
+            camera.capture_image()
+
+        self.assertEqual(1, self.server.connections)
+        self.assertEqual(1, self.pool.created_connections)
+        self.assertEqual(1, self.pool.idle_connections)
+
+    def test_unchanged_snapshot_is_skipped(self):
+        camera = self.create_camera()
+
+        camera.capture_image()
+        camera.capture_image()
+        self.server.image = b"snapshot 2"
+        camera.capture_image()
+
+        paths = camera.get_captured_image_paths()
+        self.assertEqual(3, len(paths))
+        self.assertIsNone(paths[1])
+        self.assertEqual(b"snapshot 2", self.read_image(paths[2]))
+        self.assertNotIn("If-None-Match", self.server.requests[0])
+        self.assertIn("If-None-Match", self.server.requests[1])
+
+    def test_snapshot_that_failed_to_store_is_downloaded_again(self):
+        camera = self.create_camera()
+        camera.storage_writer = _FailingStorageWriter()
+
+        with self.assertRaises(ImageStorageError):
+            camera.capture_image()
+
+        camera.storage_writer = None
+        camera.capture_image()
+
+        paths = camera.get_captured_image_paths()
+        self.assertIsNone(paths[0])
+        self.assertEqual(b"snapshot 1", self.read_image(paths[1]))
+        self.assertNotIn("If-None-Match", self.server.requests[1])
+
+    def test_connection_closed_by_camera_is_replaced(self):
+        self.server.drop_idle_connections = True
+        camera = self.create_camera(conditional=False)
+
+        for _ in range(3):
+            camera.capture_image()
+
+        self.assertEqual(3, len([path for path in
+                                 camera.get_captured_image_paths() if path]))
+
+    def test_snapshot_without_content_length_is_captured(self):
+        self.server.chunked = True
+        camera = self.create_camera()
+
+        camera.capture_image()
+        frame = camera.capture_to_frame()
+
+        self.assertEqual(b"snapshot 1",
+                         self.read_image(camera.get_captured_image_paths()[0]))
+        self.assertEqual(b"snapshot 1", bytes(frame.data))
+        self.assertEqual(0, self.pool.idle_connections)
+
+    def test_error_status_raises_camera_capture_error(self):
+        self.server.status = 500
+        camera = self.create_camera()
+
+        with self.assertRaises(CameraCaptureError):
+            camera.capture_image()
+
+        self.assertEqual([None], camera.get_captured_image_paths())
+        self.assertEqual(1, self.pool.idle_connections)
+
+    def test_unreachable_camera_raises_camera_connection_error(self):
+        camera = self.create_camera()
+        self.server.stop()
+
+        with self.assertRaises(CameraConnectionError):
+            camera.capture_image()
+
+        self.assertEqual([None], camera.get_captured_image_paths())
+
+    def test_capture_to_buffer_and_frame_return_snapshot(self):
+        camera = self.create_camera()
+
+        self.assertEqual(b"snapshot 1", camera.capture_to_buffer())
+
+        with camera.capture_to_frame() as frame:
+            self.assertEqual(b"snapshot 1", bytes(frame.data))
+            self.assertEqual("jpeg", frame.pixel_format)
+
+        self.assertEqual(0, len(camera.get_captured_image_paths()))
+
+    def test_cameras_capture_concurrently_within_host_limit(self):
+        self.pool = HTTPConnectionPool(max_connections_per_host=2, timeout=5)
+        cameras = [self.create_camera("Camera " + str(index))
+                   for index in range(6)]
+        frame_capturer = ParallelFrameCapturer()
+        self.addCleanup(frame_capturer.shut_down)
+
+        for _ in range(3):
+            frame_capturer.capture(cameras)
+
+        for camera in cameras:
+            self.assertEqual(b"snapshot 1", self.read_image(
+                camera.get_captured_image_paths()[0]))
+        self.assertLessEqual(self.pool.created_connections, 2)
+
+    def test_invalid_url_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            HTTPSnapshotCamera("ftp://camera/snapshot.jpg")
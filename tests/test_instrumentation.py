@@ -0,0 +1,176 @@
+from os.path import join
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from camera.exceptions import CameraCaptureError, ImageStorageError
+from instrumentation import (EVENT_CAPTURE, EVENT_SET_UP, EVENT_STORE,
+                             EVENT_TEAR_DOWN, Instrumentation,
+                             LatencyHistogram, PrometheusExporter)
+from tests.mocks.mock_camera import MockCamera
+from time_lapse_manager import TimeLapseManager
+
+
+class FailingSetUpCamera(MockCamera):
+    def set_up(self):
+        raise CameraCaptureError()
+
+
+class TestLatencyHistogram(TestCase):
+    def test_cumulative_counts_include_every_smaller_duration(self):
+        histogram = LatencyHistogram((0.1, 1))
+
+        for duration in (0.05, 0.1, 0.5, 2):
+            histogram.observe(duration)
+
+        self.assertEqual([(0.1, 2), (1, 3), (float("inf"), 4)],
+                         histogram.get_cumulative_counts())
+        self.assertEqual(4, histogram.count)
+        self.assertAlmostEqual(2.65, histogram.sum)
+
+
+class TestInstrumentation(TestCase):
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+
+    def test_observe_groups_durations_by_event_and_camera(self):
+        self.instrumentation.observe(EVENT_CAPTURE, "First", 0.01)
+        self.instrumentation.observe(EVENT_CAPTURE, "First", 0.02)
+        self.instrumentation.observe(EVENT_STORE, "First", 0.01)
+
+        self.assertEqual(2, self.instrumentation.get_histogram(
+            EVENT_CAPTURE, "First").count)
+        self.assertIsNone(self.instrumentation.get_histogram(EVENT_CAPTURE,
+                                                             "Second"))
+
+    def test_observe_counts_errors_by_exception_type(self):
+        self.instrumentation.observe(EVENT_CAPTURE, "First", 0,
+                                     CameraCaptureError())
+        self.instrumentation.observe(EVENT_STORE, "First", 0,
+                                     CameraCaptureError())
+        self.instrumentation.observe(EVENT_STORE, "First", 0,
+                                     ImageStorageError())
+
+        self.assertEqual(2, self.instrumentation.get_error_count(
+            "First", CameraCaptureError))
+        self.assertEqual(1, self.instrumentation.get_error_count(
+            "First", "CameraCaptureError", EVENT_STORE))
+        self.assertEqual(1, self.instrumentation.get_error_count(
+            "First", ImageStorageError))
+
+    def test_hooks_are_called_after_each_observation(self):
+        calls = []
+        self.instrumentation.add_hook(EVENT_SET_UP,
+                                      lambda *args: calls.append(args))
+
+        self.instrumentation.observe(EVENT_SET_UP, "First", 0.5)
+        self.instrumentation.observe(EVENT_TEAR_DOWN, "First", 0.5)
+
+        self.assertEqual([(EVENT_SET_UP, "First", 0.5, None)], calls)
+
+    def test_add_hook_rejects_unknown_events(self):
+        with self.assertRaises(ValueError):
+            self.instrumentation.add_hook("focus", print)
+
+    def test_render_prometheus_escapes_camera_names(self):
+        self.instrumentation.observe(EVENT_CAPTURE, 'Front "door"', 0.01,
+                                     CameraCaptureError())
+
+        metrics = self.instrumentation.render_prometheus()
+
+        self.assertIn('time_lapse_camera_operation_seconds_bucket{'
+                      'camera="Front \\"door\\"",operation="capture",'
+                      'le="+Inf"} 1', metrics)
+        self.assertIn('time_lapse_camera_errors_total{camera="Front '
+                      '\\"door\\"",operation="capture",'
+                      'exception="CameraCaptureError"} 1', metrics)
+
+
+class TestManagerInstrumentation(TestCase):
+    def test_time_lapse_reports_every_camera_operation(self):
+        instrumentation = Instrumentation()
+        with TemporaryDirectory() as directory:
+            camera = MockCamera("First", directory)
+            manager = TimeLapseManager([camera], 0.001, 3,
+                                       instrumentation=instrumentation)
+
+            manager.start_time_lapse()
+
+        for event in (EVENT_SET_UP, EVENT_TEAR_DOWN):
+            self.assertEqual(1, instrumentation.get_histogram(event,
+                                                              camera).count)
+        self.assertEqual(3, instrumentation.get_histogram(EVENT_CAPTURE,
+                                                          camera).count)
+        self.assertIs(instrumentation, camera.instrumentation)
+
+    def test_capture_failures_are_counted(self):
+        instrumentation = Instrumentation()
+        camera = MockCamera("First", failure_rate=1)
+        manager = TimeLapseManager([camera], instrumentation=instrumentation)
+
+        with self.assertRaises(CameraCaptureError):
+            manager.capture_frame()
+
+        self.assertEqual(1, instrumentation.get_error_count(
+            camera, CameraCaptureError, EVENT_CAPTURE))
+
+    def test_set_up_failures_are_counted(self):
+        instrumentation = Instrumentation()
+        camera = FailingSetUpCamera("First")
+        manager = TimeLapseManager([camera], 0.001, 1,
+                                   instrumentation=instrumentation)
+
+        with self.assertRaises(CameraCaptureError):
+            manager.start_time_lapse()
+
+        self.assertEqual(1, instrumentation.get_error_count(
+            camera, CameraCaptureError, EVENT_SET_UP))
+
+    def test_store_failures_are_counted(self):
+        instrumentation = Instrumentation()
+        with TemporaryDirectory() as directory:
+            camera = MockCamera("First", join(directory, "missing"))
+            camera.instrumentation = instrumentation
+
+            with self.assertRaises(ImageStorageError):
+                camera._store_image(b"image")
+
+        self.assertEqual(1, instrumentation.get_error_count(
+            camera, ImageStorageError, EVENT_STORE))
+
+    def test_cameras_are_not_instrumented_by_default(self):
+        camera = MockCamera("First")
+
+        TimeLapseManager([camera]).capture_frame()
+
+        self.assertIsNone(camera.instrumentation)
+
+
+class TestPrometheusExporter(TestCase):
+    def setUp(self):
+        self.instrumentation = Instrumentation()
+        self.exporter = PrometheusExporter(self.instrumentation, port=0)
+        self.exporter.start()
+
+    def tearDown(self):
+        self.exporter.stop()
+
+    def test_metrics_are_served(self):
+        self.instrumentation.observe(EVENT_CAPTURE, "First", 0.01)
+
+        url = "http://127.0.0.1:{}/metrics".format(self.exporter.port)
+        with urlopen(url) as response:
+            metrics = response.read().decode()
+
+        self.assertIn('time_lapse_camera_operation_seconds_count{'
+                      'camera="First",operation="capture"} 1', metrics)
+
+    def test_other_paths_are_not_found(self):
+        url = "http://127.0.0.1:{}/".format(self.exporter.port)
+
+        with self.assertRaises(HTTPError) as context:
+            urlopen(url)
+        context.exception.close()
+
+        self.assertEqual(404, context.exception.code)
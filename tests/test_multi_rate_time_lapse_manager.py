@@ -0,0 +1,194 @@
+from threading import Event, Thread
+from time import monotonic, sleep
+from unittest import TestCase
+
+from multi_rate_time_lapse_manager import (CameraSchedule,
+                                           MultiRateTimeLapseManager)
+from tests.mocks.mock_camera import MockCamera
+
+
+class TrackedMockCamera(MockCamera):
+    def __init__(self, name):
+        super().__init__(name)
+        self.is_set_up = False
+        self.set_up_count = 0
+
+    def set_up(self):
+        self.is_set_up = True
+        self.set_up_count += 1
+
+    def tear_down(self):
+        self.is_set_up = False
+
+    def capture_image(self):
+        if not self.is_set_up:
+            raise AssertionError("Capturing while torn down.")
+        super().capture_image()
+
+
+class SlowTearDownMockCamera(TrackedMockCamera):
+    def __init__(self, name):
+        super().__init__(name)
+        self.tearing_down = Event()
+        self.released = Event()
+
+    def tear_down(self):
+        self.tearing_down.set()
+        self.released.wait(5)
+        super().tear_down()
+
+
+class TestCameraSchedule(TestCase):
+    def test_invalid_schedule_raises_value_error(self):
+        camera = MockCamera("Camera")
+
+        for arguments in ((0,), (1, -1), (1, 0, 0)):
+            with self.assertRaises(ValueError):
+                CameraSchedule(camera, *arguments)
+
+    def test_next_deadline_follows_phase_and_interval(self):
+        schedule = CameraSchedule(MockCamera("Camera"), 5, phase=2)
+        self.assertIsNone(schedule.next_deadline)
+
+        schedule.start(100)
+
+        self.assertEqual(102, schedule.next_deadline)
+
+
+class TestMultiRateTimeLapseManager(TestCase):
+    def setUp(self):
+        self.fast_camera = TrackedMockCamera("Fast")
+        self.slow_camera = TrackedMockCamera("Slow")
+
+        self.manager = MultiRateTimeLapseManager(capture_interval=0.01)
+        self.manager.add_camera(self.fast_camera,
+                                capture_interval=0.01,
+                                capture_limit=6)
+        self.manager.add_camera(self.slow_camera,
+                                capture_interval=0.03,
+                                phase=0.005,
+                                capture_limit=2)
+
+    def test_cameras_capture_at_their_own_rates(self):
+        self.manager.start_time_lapse()
+
+        self.assertEqual(6, len(self.fast_camera.get_captured_image_paths()))
+        self.assertEqual(2, len(self.slow_camera.get_captured_image_paths()))
+        self.assertFalse(self.fast_camera.is_set_up)
+        self.assertFalse(self.slow_camera.is_set_up)
+
+    def test_frames_follow_each_camera_timeline(self):
+        self.manager.start_time_lapse()
+
+        fast_schedule = self.manager.get_camera_schedule(self.fast_camera)
+        slow_schedule = self.manager.get_camera_schedule(self.slow_camera)
+        self.assertEqual(5, fast_schedule.last_frame_timing.slot)
+        self.assertEqual(1, slow_schedule.last_frame_timing.slot)
+        # Both timelines start together, with the slow one offset by its
+        # phase, so slot 1 of the slow camera is due 15ms before slot 5 of
+        # the fast camera.
+        self.assertAlmostEqual(
+            -0.015,
+            slow_schedule.last_frame_timing.deadline -
+            fast_schedule.last_frame_timing.deadline,
+            places=6)
+
+    def test_time_lapse_can_be_started_again(self):
+        self.manager.start_time_lapse()
+        self.manager.start_time_lapse()
+
+        self.assertEqual(12, len(self.fast_camera.get_captured_image_paths()))
+        self.assertEqual(4, len(self.slow_camera.get_captured_image_paths()))
+        self.assertEqual(2, self.fast_camera.set_up_count)
+        self.assertFalse(self.fast_camera.is_set_up)
+
+    def test_manager_capture_limit_counts_frames(self):
+        self.manager.capture_limit = 3
+
+        self.manager.start_time_lapse()
+
+        self.assertEqual(3, self.manager.captured_frames)
+
+    def test_camera_can_be_added_and_removed_while_running(self):
+        late_camera = TrackedMockCamera("Late")
+        self.manager.remove_camera(self.fast_camera)
+        self.manager.add_camera(self.fast_camera, 0.01)
+
+        def change_cameras():
+            sleep(0.02)
+            self.manager.add_camera(late_camera,
+                                    capture_interval=0.01,
+                                    capture_limit=2)
+            sleep(0.02)
+            self.manager.remove_camera(self.fast_camera)
+
+        changer = Thread(target=change_cameras)
+        changer.start()
+        self.manager.start_time_lapse()
+        changer.join()
+
+        self.assertEqual(2, len(late_camera.get_captured_image_paths()))
+        self.assertEqual(1, late_camera.set_up_count)
+        self.assertFalse(late_camera.is_set_up)
+        self.assertFalse(self.fast_camera.is_set_up)
+        self.assertFalse(self.manager.has_camera(self.fast_camera))
+        self.assertEqual(2, len(self.slow_camera.get_captured_image_paths()))
+
+    def test_removed_camera_is_torn_down_without_blocking_changes(self):
+        slow_camera = SlowTearDownMockCamera("Slow tear down")
+        added_camera = TrackedMockCamera("Added")
+        self.manager.add_camera(slow_camera, 0.01)
+        self.manager.add_camera(TrackedMockCamera("Endless"), 0.01)
+        add_durations = []
+
+        def change_cameras():
+            sleep(0.02)
+            self.manager.remove_camera(slow_camera)
+            slow_camera.tearing_down.wait(5)
+            started = monotonic()
+            self.manager.add_camera(added_camera, 0.01)
+            add_durations.append(monotonic() - started)
+            slow_camera.released.set()
+            self.manager.stop()
+
+        changer = Thread(target=change_cameras)
+        changer.start()
+        self.manager.start_time_lapse()
+        changer.join()
+
+        self.assertLess(add_durations[0], 1)
+        self.assertFalse(slow_camera.is_set_up)
+
+    def test_stop_ends_time_lapse(self):
+        self.manager.add_camera(TrackedMockCamera("Endless"), 0.01)
+        stopper = Thread(target=lambda: (sleep(0.05), self.manager.stop()))
+
+        stopper.start()
+        self.manager.start_time_lapse()
+        stopper.join()
+
+        self.assertFalse(self.manager.running)
+
+    def test_capture_frame_captures_only_due_cameras(self):
+        self.manager.capture_frame()
+
+        self.assertEqual(1, len(self.fast_camera.get_captured_image_paths()))
+        self.assertEqual(0, len(self.slow_camera.get_captured_image_paths()))
+
+    def test_many_cameras_share_a_heap(self):
+        manager = MultiRateTimeLapseManager()
+        cameras = [MockCamera(str(index)) for index in range(200)]
+
+        for index, camera in enumerate(cameras):
+            manager.add_camera(camera,
+                               capture_interval=0.01 * (1 + index % 4),
+                               capture_limit=2)
+
+        manager.start_time_lapse()
+
+        self.assertTrue(all(len(camera.get_captured_image_paths()) == 2
+                            for camera in cameras))
+
+    def test_checkpoint_is_not_supported(self):
+        with self.assertRaises(ValueError):
+            MultiRateTimeLapseManager(checkpoint=object())
@@ -0,0 +1,186 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+if numpy is not None:
+    from post_processing import (PostProcessor,
+                                 apply_corrections,
+                                 estimate_shifts,
+                                 get_grey,
+                                 get_luminance,
+                                 read_frame,
+                                 rolling_mean,
+                                 write_frame)
+
+
+def create_scene(height=64, width=80):
+    generator = numpy.random.default_rng(0)
+    scene = generator.integers(0, 256, (height // 4, width // 4, 3))
+
+    return numpy.repeat(numpy.repeat(scene, 4, axis=0), 4, axis=1).astype(
+        numpy.uint8) // 2 + 64
+
+
+@skipUnless(numpy, "NumPy is not installed")
+class TestPostProcessingFunctions(TestCase):
+    def test_rolling_mean_shortens_window_at_edges(self):
+        numpy.testing.assert_allclose([1.5, 2, 3, 4, 4.5],
+                                      rolling_mean([1, 2, 3, 4, 5], 3))
+
+    def test_get_luminance_weights_channels(self):
+        frames = numpy.zeros((2, 2, 2, 3), dtype=numpy.uint8)
+        frames[1, ..., 1] = 100
+
+        numpy.testing.assert_allclose([0, 58.7], get_luminance(frames),
+                                      rtol=1e-5)
+
+    def test_estimate_shifts_finds_translation(self):
+        scene = create_scene()
+        frames = numpy.stack([scene,
+                              numpy.roll(scene, (3, -5), axis=(0, 1))])
+
+        shifts = estimate_shifts(get_grey(frames), get_grey(frames)[0])
+
+        numpy.testing.assert_array_equal([[0, 0], [-3, 5]], shifts)
+
+    def test_apply_corrections_moves_and_scales_frames(self):
+        frames = numpy.zeros((1, 3, 3), dtype=numpy.uint8)
+        frames[0, 0, 0] = 100
+
+        corrected = apply_corrections(frames, [1.5], numpy.array([[1, 1]]))
+
+        numpy.testing.assert_array_equal([[150, 150, 0],
+                                          [150, 150, 0],
+                                          [0, 0, 0]], corrected[0])
+
+    def test_read_frame_reads_written_ppm(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, "frame.ppm")
+            scene = create_scene()
+
+            write_frame(path, scene)
+
+            numpy.testing.assert_array_equal(scene, read_frame(path))
+
+
+@skipUnless(numpy, "NumPy is not installed")
+class TestPostProcessor(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+
+        self.input_directory = os.path.join(self.temporary_directory.name,
+                                            "input")
+        self.output_directory = os.path.join(self.temporary_directory.name,
+                                             "output")
+        os.makedirs(self.input_directory)
+
+    def write_frames(self, frames):
+        paths = []
+
+        for index, frame in enumerate(frames):
+            path = os.path.join(self.input_directory,
+                                str(index + 1).rjust(8, "0") + ".ppm")
+            write_frame(path, frame)
+            paths.append(path)
+
+        return paths
+
+    def test_process_evens_out_flicker_across_batches(self):
+        scene = create_scene()
+        brightness = [1.0, 0.8, 1.2] * 4
+        frames = [numpy.clip(scene * factor, 0, 255).astype(numpy.uint8)
+                  for factor in brightness]
+        paths = self.write_frames(frames)
+        post_processor = PostProcessor(self.output_directory,
+                                       batch_size=5,
+                                       deflicker_window=3,
+                                       stabilise=False,
+                                       process_count=2)
+
+        output_paths = post_processor.process(paths + [None])
+
+        self.assertEqual(len(paths), len(output_paths))
+        luminance = numpy.array([read_frame(path).mean()
+                                 for path in output_paths])
+        self.assertLess(numpy.ptp(luminance[1:-1]), 2)
+        self.assertGreater(numpy.ptp([frame.mean() for frame in frames]),
+                           20)
+
+    def test_process_matches_deflickering_every_frame_at_once(self):
+        scene = create_scene(16, 16)
+        brightness = [1.0, 0.7, 1.1, 0.9, 1.3, 0.8, 1.2] * 3
+        frames = [numpy.clip(scene * factor, 0, 255).astype(numpy.uint8)
+                  for factor in brightness]
+        paths = self.write_frames(frames)
+        luminance = get_luminance(numpy.stack(frames))
+
+        for batch_size, deflicker_window in ((4, 5), (3, 8), (20, 2)):
+            post_processor = PostProcessor(self.output_directory,
+                                           batch_size=batch_size,
+                                           deflicker_window=deflicker_window,
+                                           stabilise=False,
+                                           process_count=1)
+
+            output_paths = post_processor.process(iter(paths))
+
+            expected = apply_corrections(
+                numpy.stack(frames),
+                rolling_mean(luminance, deflicker_window) / luminance,
+                numpy.zeros((len(frames), 2), dtype=numpy.int64))
+            numpy.testing.assert_array_equal(
+                expected,
+                numpy.stack([read_frame(path) for path in output_paths]))
+
+    def test_process_writes_frames_before_reading_every_path(self):
+        scene = create_scene(16, 16)
+        paths = self.write_frames([scene] * 40)
+        first_written = []
+
+        def get_paths():
+            yield from paths
+            first_written.append(os.path.exists(
+                os.path.join(self.output_directory, "00000001.ppm")))
+
+        post_processor = PostProcessor(self.output_directory,
+                                       batch_size=2,
+                                       deflicker_window=3,
+                                       stabilise=False,
+                                       process_count=1)
+
+        post_processor.process(get_paths())
+
+        self.assertEqual([True], first_written)
+
+    def test_process_aligns_frames_with_first(self):
+        scene = create_scene()
+        offsets = [(0, 0), (2, -1), (-3, 4), (1, 1)]
+        frames = [numpy.roll(scene, offset, axis=(0, 1))
+                  for offset in offsets]
+        paths = self.write_frames(frames)
+        post_processor = PostProcessor(self.output_directory,
+                                       batch_size=3,
+                                       deflicker=False,
+                                       process_count=1)
+
+        output_paths = post_processor.process(paths)
+
+        for output_path in output_paths:
+            numpy.testing.assert_array_equal(
+                scene[8:-8, 8:-8], read_frame(output_path)[8:-8, 8:-8])
+
+    def test_output_extension_changes_output_path(self):
+        post_processor = PostProcessor(self.output_directory,
+                                       output_extension="pgm")
+
+        self.assertEqual(os.path.join(self.output_directory, "00000001.pgm"),
+                         post_processor.get_output_path("in/00000001.jpg"))
+
+    def test_batch_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            PostProcessor(self.output_directory, batch_size=0)
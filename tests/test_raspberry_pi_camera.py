@@ -0,0 +1,203 @@
+import sys
+from importlib import import_module
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from camera.exceptions import CameraCaptureError
+from tests.mocks import fake_picamera
+
+if numpy is not None:
+    from camera.change_detection_filter import ChangeDetectionFilter
+
+
+class TestRaspberryPiCamera(TestCase):
+    def setUp(self):
+        modules_patcher = patch.dict(sys.modules,
+                                     {"picamera": fake_picamera})
+        modules_patcher.start()
+        self.addCleanup(modules_patcher.stop)
+        sys.modules.pop("camera.implementations.raspberry_pi_camera", None)
+
+        self.raspberry_pi_camera = import_module(
+            "camera.implementations.raspberry_pi_camera")
+
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+
+    def create_camera(self, continuous=False):
+        return self.raspberry_pi_camera.RaspberryPiCamera(
+            storage_directory=self.temporary_directory.name,
+            continuous=continuous)
+
+    def read_image(self, camera, index):
+        with open(camera.get_captured_image_paths()[index], "rb") as image:
+            return image.read()
+
+    def test_camera_is_opened_by_set_up(self):
+        camera = self.create_camera()
+
+        self.assertIsNone(camera._camera_handle)
+
+        camera.set_up()
+        camera.tear_down()
+        camera.set_up()
+
+        self.assertFalse(camera._camera_handle.closed)
+
+    def test_capture_opens_camera_if_not_set_up(self):
+        camera = self.create_camera()
+
+        camera.capture_image()
+
+        self.assertEqual(b"jpeg:1", self.read_image(camera, 0))
+
+    def test_capture_image_uses_still_port_by_default(self):
+        camera = self.create_camera()
+        camera.set_up()
+
+        camera.capture_image()
+
+        self.assertEqual(1, camera._camera_handle.still_captures)
+        self.assertEqual(b"jpeg:1", self.read_image(camera, 0))
+
+    def test_continuous_capture_uses_video_port(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+
+        for _ in range(3):
+            camera.capture_image()
+
+        self.assertEqual(0, camera._camera_handle.still_captures)
+        self.assertEqual(3, camera._camera_handle.video_port_captures)
+        self.assertEqual(b"jpeg:3", self.read_image(camera, 2))
+
+    def test_capture_to_buffer_returns_image_without_storing_it(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+
+        self.assertEqual(b"jpeg:1", camera.capture_to_buffer())
+        self.assertEqual(b"jpeg:2", camera.capture_to_buffer())
+        self.assertEqual(0, len(camera.get_captured_image_paths()))
+
+    def test_failed_capture_raises_camera_capture_error(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+        camera._camera_handle.fail_next_capture = True
+
+        with self.assertRaises(CameraCaptureError):
+            camera.capture_image()
+
+        self.assertEqual([None], camera.get_captured_image_paths())
+        self.assertTrue(camera._camera_handle.closed)
+
+    def test_tear_down_stops_continuous_capture(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+        camera.capture_image()
+
+        camera.tear_down()
+
+        self.assertIsNone(camera._continuous_captures)
+        self.assertTrue(camera._camera_handle.closed)
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_capture_to_frame_reuses_padded_buffer(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+
+        for frame_number in range(1, 4):
+            with camera.capture_to_frame() as frame:
+                self.assertEqual(128 * 3, frame.stride)
+                self.assertEqual((50, 100, 3), frame.as_array().shape)
+                self.assertTrue((frame.as_array() == frame_number).all())
+
+        self.assertEqual(1, camera.frame_pool.allocated_frames)
+        self.assertEqual(0, len(camera.get_captured_image_paths()))
+
+    def test_capture_to_frame_runs_alongside_continuous_capture(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+        camera.capture_image()
+
+        with camera.capture_to_frame() as frame:
+            self.assertEqual(100, frame.width)
+
+        camera.capture_image()
+
+        self.assertEqual(2, len(camera.get_captured_image_paths()))
+        self.assertFalse(camera._camera_handle.closed)
+
+    def test_failed_capture_to_frame_raises_camera_capture_error(self):
+        camera = self.create_camera(continuous=True)
+        camera.set_up()
+        camera._camera_handle.fail_next_capture = True
+
+        with self.assertRaises(CameraCaptureError):
+            camera.capture_to_frame()
+
+        self.assertEqual(1, camera.frame_pool.free_frames)
+        self.assertTrue(camera._camera_handle.closed)
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_frame_filter_sees_low_resolution_capture(self):
+        camera = self.create_camera()
+        camera.frame_filter = ChangeDetectionFilter(max_gap=None)
+        camera.set_up()
+
+        camera.capture_image()
+        camera.capture_image()
+
+        self.assertEqual(2, camera._camera_handle.video_port_captures)
+        self.assertEqual(2, len(camera.get_captured_image_paths()))
+        self.assertIsNotNone(camera.frame_filter.last_difference)
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_frame_filter_runs_alongside_continuous_capture(self):
+        camera = self.create_camera(continuous=True)
+        camera.frame_filter = ChangeDetectionFilter(max_gap=None)
+        camera.set_up()
+
+        for _ in range(3):
+            camera.capture_image()
+
+        self.assertEqual(0, camera._camera_handle.still_captures)
+        self.assertEqual(3, len(camera.get_captured_image_paths()))
+        self.assertFalse(camera._camera_handle.closed)
+
+    def test_thumbnails_are_built_from_stored_image(self):
+        camera = self.create_camera(continuous=True)
+        camera.thumbnail_generator = _RecordingThumbnailGenerator()
+        camera.set_up()
+
+        camera.capture_image()
+
+        self.assertEqual([(str(camera), "00000001", b"jpeg:1")],
+                         camera.thumbnail_generator.submitted)
+
+    def test_thumbnails_of_stored_files_are_given_the_path(self):
+        camera = self.create_camera()
+        camera.thumbnail_generator = _RecordingThumbnailGenerator()
+        camera.set_up()
+
+        camera.capture_image()
+
+        self.assertEqual([(str(camera), "00000001",
+                           camera.get_captured_image_paths()[0])],
+                         camera.thumbnail_generator.submitted)
+
+
+class _RecordingThumbnailGenerator:
+    """A thumbnail generator that records what it is given."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, camera_name, filename, image):
+        self.submitted.append((camera_name, filename, image))
+        return True
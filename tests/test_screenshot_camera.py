@@ -0,0 +1,130 @@
+import os
+import sys
+from importlib import import_module
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+from unittest.mock import patch
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from camera.exceptions import CameraCaptureError
+from tests.mocks import fake_wx
+
+if numpy is not None:
+    from camera.change_detection_filter import ChangeDetectionFilter
+
+
+class TestScreenshotCamera(TestCase):
+    def setUp(self):
+        fake_wx.reset()
+
+        modules_patcher = patch.dict(sys.modules, {"wx": fake_wx})
+        modules_patcher.start()
+        self.addCleanup(modules_patcher.stop)
+        sys.modules.pop("camera.implementations.screenshot_camera", None)
+
+        screenshot_camera = import_module(
+            "camera.implementations.screenshot_camera")
+
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+
+        self.camera = screenshot_camera.ScreenshotCamera(
+            storage_directory=self.temporary_directory.name,
+            file_extension="png")
+
+    def test_capture_reuses_app_and_bitmap(self):
+        self.camera.set_up()
+
+        for _ in range(5):
+            self.camera.capture_image()
+
+        self.assertEqual(1, len(fake_wx.created_apps))
+        self.assertEqual(1, len(fake_wx.created_bitmaps))
+        self.assertEqual(5, len(self.camera.get_captured_image_paths()))
+
+    def test_bitmap_is_reallocated_when_resolution_changes(self):
+        self.camera.set_up()
+        self.camera.capture_image()
+
+        fake_wx.screen_size = (1280, 720)
+        self.camera.capture_image()
+
+        self.assertEqual([(1920, 1080), (1280, 720)],
+                         [bitmap.GetSize()
+                          for bitmap in fake_wx.created_bitmaps])
+
+    def test_capture_region_is_clipped_to_screen(self):
+        self.camera.capture_region = (1800, 1000, 400, 400)
+        self.camera.set_up()
+
+        self.camera.capture_image()
+
+        self.assertEqual(("Blit", 0, 0, 120, 80, 1800, 1000),
+                         self.camera._memory.blits[-1])
+
+    def test_scale_captures_downscaled_image(self):
+        self.camera.scale = 0.5
+        self.camera.set_up()
+
+        self.camera.capture_image()
+
+        with open(self.camera.get_captured_image_paths()[0], "rb") as image:
+            self.assertEqual(b"png:960x540", image.read())
+
+    def test_scale_setter_raises_value_error_when_scale_is_not_positive(self):
+        with self.assertRaises(ValueError):
+            self.camera.scale = 0
+
+    def test_tear_down_releases_bitmap(self):
+        self.camera.set_up()
+        self.camera.capture_image()
+
+        self.camera.tear_down()
+
+        self.assertIsNone(self.camera._bitmap)
+        self.assertTrue(os.path.exists(
+            self.camera.get_captured_image_paths()[0]))
+
+    def test_capture_to_frame_copies_screen_into_reused_frame(self):
+        fake_wx.screen_size = (8, 4)
+        self.camera.set_up()
+
+        for pixel_value in (10, 20, 30):
+            fake_wx.screen_pixel_value = pixel_value
+            with self.camera.capture_to_frame() as frame:
+                self.assertEqual((8, 4), (frame.width, frame.height))
+                self.assertEqual(bytes([pixel_value]) * (8 * 4 * 3),
+                                 bytes(frame.data))
+
+        self.assertEqual(1, self.camera.frame_pool.allocated_frames)
+        self.assertEqual(1, len(fake_wx.created_bitmaps))
+        self.assertEqual(0, len(self.camera.get_captured_image_paths()))
+
+    def test_failed_capture_to_frame_releases_frame(self):
+        self.camera.set_up()
+
+        with patch.object(fake_wx.Bitmap,
+                          "CopyToBuffer",
+                          side_effect=RuntimeError("Copy failed")):
+            with self.assertRaises(CameraCaptureError):
+                self.camera.capture_to_frame()
+
+        self.assertEqual(1, self.camera.frame_pool.free_frames)
+
+    @skipUnless(numpy, "NumPy is not installed")
+    def test_unchanged_screen_is_skipped_by_frame_filter(self):
+        self.camera.frame_filter = ChangeDetectionFilter()
+        self.camera.set_up()
+
+        self.camera.capture_image()
+        self.camera.capture_image()
+        fake_wx.screen_pixel_value = 255
+        self.camera.capture_image()
+
+        self.assertEqual([False, True, False],
+                         [path is None for path
+                          in self.camera.get_captured_image_paths()])
@@ -0,0 +1,100 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from camera.capture_ledger import CAPTURE_STATUS_CAPTURED
+from storage.segment_frame_store import SegmentFrameReader, SegmentFrameStore
+from tests.mocks.mock_camera import MockCamera
+
+
+class TestSegmentFrameStore(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+        self.directory = os.path.join(self.temporary_directory.name, "store")
+
+    def open_reader(self):
+        reader = SegmentFrameReader(self.directory)
+        self.addCleanup(reader.close)
+        return reader
+
+    def test_frames_can_be_read_back_by_camera_and_frame_number(self):
+        store = SegmentFrameStore(self.directory)
+        store.append("First", 1, b"first-1")
+        store.append("Second", 1, b"second-1")
+        store.append("First", 2, b"first-2")
+        store.close()
+
+        reader = self.open_reader()
+
+        self.assertEqual(3, len(reader))
+        self.assertEqual(b"first-2", bytes(reader.get_frame("First", 2)))
+        self.assertEqual(b"second-1", bytes(reader.get_frame("Second", 1)))
+
+    def test_get_frame_raises_key_error_for_missing_frame(self):
+        store = SegmentFrameStore(self.directory)
+        store.append("First", 1, b"first-1")
+        store.close()
+
+        with self.assertRaises(KeyError):
+            self.open_reader().get_frame("First", 2)
+
+    def test_new_segment_is_started_when_segment_is_full(self):
+        store = SegmentFrameStore(self.directory, max_segment_size=10)
+        for frame_number in range(1, 5):
+            store.append("First", frame_number, b"123456")
+        store.close()
+
+        reader = self.open_reader()
+
+        self.assertEqual([1, 2, 3, 4],
+                         [record.segment for record, _
+                          in reader.iter_frames()])
+        self.assertEqual(b"123456", bytes(reader.get_frame("First", 4)))
+
+    def test_reopened_store_keeps_appending(self):
+        store = SegmentFrameStore(self.directory)
+        store.append("First", 1, b"first-1")
+        store.close()
+
+        store = SegmentFrameStore(self.directory)
+        store.append("First", 2, b"first-2")
+        store.close()
+
+        reader = self.open_reader()
+
+        self.assertEqual(2, len(reader))
+        self.assertEqual(["First"], reader.get_camera_names())
+        self.assertEqual(b"first-1", bytes(reader.get_frame("First", 1)))
+
+    def test_export_to_files_writes_one_file_per_frame(self):
+        store = SegmentFrameStore(self.directory)
+        store.append("First", 1, b"first-1")
+        store.append("Second", 1, b"second-1")
+        store.close()
+        export_directory = os.path.join(self.temporary_directory.name,
+                                        "export")
+
+        exported_frames = self.open_reader().export_to_files(export_directory,
+                                                             "jpg")
+
+        self.assertEqual(2, exported_frames)
+        with open(os.path.join(export_directory,
+                               "Second",
+                               "00000001.jpg"), "rb") as image_file:
+            self.assertEqual(b"second-1", image_file.read())
+
+    def test_camera_appends_to_frame_store_when_set(self):
+        store = SegmentFrameStore(self.directory)
+        camera = MockCamera("First")
+        camera.frame_store = store
+
+        camera.capture_image()
+        camera.capture_image()
+        store.close()
+
+        self.assertEqual(b"00000002",
+                         bytes(self.open_reader().get_frame("First", 2)))
+        self.assertEqual([None, None], camera.get_captured_image_paths())
+        self.assertEqual(2, camera.capture_ledger.get_status_count(
+            CAPTURE_STATUS_CAPTURED))
@@ -0,0 +1,167 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from camera.exceptions import CameraCaptureError
+from session_checkpoint import CheckpointError, SessionCheckpoint
+from tests.mocks.mock_camera import MockCamera
+from time_lapse_manager import TimeLapseManager
+
+
+class CrashingMockCamera(MockCamera):
+    def __init__(self, name, crash_after):
+        super().__init__(name)
+        self.crash_after = crash_after
+
+    def capture_image(self):
+        if len(self.capture_ledger) == self.crash_after:
+            raise CameraCaptureError("The process died.")
+        super().capture_image()
+
+
+class FakeClocks:
+    def __init__(self, monotonic_time, wall_time):
+        self.monotonic_time = monotonic_time
+        self.wall_time = wall_time
+
+    def monotonic(self):
+        return self.monotonic_time
+
+    def time(self):
+        return self.wall_time
+
+
+class TestSessionCheckpoint(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+        self.path = os.path.join(self.temporary_directory.name,
+                                 "session.json")
+
+    def test_restore_without_checkpoint_does_nothing(self):
+        manager = TimeLapseManager([MockCamera("First")])
+
+        self.assertFalse(SessionCheckpoint(self.path).restore(manager))
+        self.assertFalse(manager._scheduler.started)
+
+    def test_save_is_atomic(self):
+        SessionCheckpoint(self.path).save(TimeLapseManager())
+
+        self.assertEqual(["session.json"],
+                         os.listdir(self.temporary_directory.name))
+
+    def test_resumed_session_continues_counters_and_filenames(self):
+        manager = TimeLapseManager([CrashingMockCamera("First", 3)],
+                                   0.001,
+                                   5,
+                                   checkpoint=SessionCheckpoint(
+                                       self.path, save_every=1))
+        with self.assertRaises(CameraCaptureError):
+            manager.start_time_lapse()
+
+        camera = MockCamera("First")
+        resumed_manager = TimeLapseManager([camera],
+                                           0.001,
+                                           checkpoint=SessionCheckpoint(
+                                               self.path))
+        resumed_manager.start_time_lapse()
+
+        self.assertEqual(5, resumed_manager.captured_frames)
+        self.assertEqual(5, resumed_manager.capture_limit)
+        self.assertEqual(["00000001.jpg", "00000002.jpg", "00000003.jpg",
+                          "00000004.jpg", "00000005.jpg"],
+                         camera.get_captured_image_paths())
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_images_captured_after_the_last_save_are_kept(self):
+        directory = self.temporary_directory.name
+        manager = TimeLapseManager([MockCamera("First", directory)])
+        manager.capture_frame()
+        SessionCheckpoint(self.path, save_every=3).save(manager)
+
+        for filename in ("00000002.jpg", "00000004.jpg"):
+            with open(os.path.join(directory, filename), "wb"):
+                pass
+
+        camera = MockCamera("First", directory)
+        SessionCheckpoint(self.path).restore(TimeLapseManager([camera]))
+
+        self.assertEqual("00000005", camera.get_next_filename())
+        self.assertEqual([os.path.join(directory, "00000001.jpg"),
+                          os.path.join(directory, "00000002.jpg"),
+                          None,
+                          os.path.join(directory, "00000004.jpg")],
+                         list(camera.get_captured_image_paths()))
+
+    def test_remote_cameras_skip_the_unsaved_sequence_numbers(self):
+        SessionCheckpoint(self.path, save_every=3).save(
+            TimeLapseManager([MockCamera("First")]))
+
+        camera = MockCamera("First", images_stored_locally=False)
+        SessionCheckpoint(self.path).restore(TimeLapseManager([camera]))
+
+        self.assertEqual("00000004", camera.get_next_filename())
+
+    def test_resumed_session_keeps_its_timeline(self):
+        clocks = FakeClocks(100, 1000)
+        checkpoint = SessionCheckpoint(self.path,
+                                       clock=clocks.monotonic,
+                                       wall_clock=clocks.time)
+        manager = TimeLapseManager([MockCamera("First")], 10)
+        manager._scheduler.start(anchor=110, slot=1)
+        checkpoint.save(manager)
+
+        clocks.monotonic_time = 5000
+        clocks.wall_time = 1004
+        resumed_manager = TimeLapseManager([MockCamera("First")], 10)
+        checkpoint.restore(resumed_manager)
+
+        state = resumed_manager.get_session_state()
+        self.assertEqual(1, state["next_slot"])
+        self.assertAlmostEqual(5006, state["next_deadline"])
+
+    def test_restore_rejects_unknown_cameras(self):
+        SessionCheckpoint(self.path).save(
+            TimeLapseManager([MockCamera("First")]))
+
+        with self.assertRaises(CheckpointError):
+            SessionCheckpoint(self.path).restore(
+                TimeLapseManager([MockCamera("Second")]))
+
+    def test_checkpoint_is_saved_every_n_frames(self):
+        checkpoint = SessionCheckpoint(self.path, save_every=2)
+        manager = TimeLapseManager([MockCamera("First")])
+
+        checkpoint.frame_captured(manager)
+        self.assertFalse(checkpoint.exists())
+        checkpoint.frame_captured(manager)
+
+        self.assertTrue(checkpoint.exists())
+
+    def test_checkpoint_is_saved_after_save_interval(self):
+        clocks = FakeClocks(100, 1000)
+        checkpoint = SessionCheckpoint(self.path,
+                                       save_interval=60,
+                                       clock=clocks.monotonic,
+                                       wall_clock=clocks.time)
+        manager = TimeLapseManager([MockCamera("First")])
+
+        checkpoint.frame_captured(manager)
+        clocks.monotonic_time = 159
+        checkpoint.frame_captured(manager)
+        self.assertFalse(checkpoint.exists())
+        clocks.monotonic_time = 160
+        checkpoint.frame_captured(manager)
+
+        self.assertTrue(checkpoint.exists())
+
+    def test_finished_session_removes_its_checkpoint(self):
+        checkpoint = SessionCheckpoint(self.path, save_every=1)
+        manager = TimeLapseManager([MockCamera("First")],
+                                   0.001,
+                                   2,
+                                   checkpoint=checkpoint)
+
+        manager.start_time_lapse()
+
+        self.assertFalse(checkpoint.exists())
@@ -0,0 +1,124 @@
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from camera.exceptions import CameraCaptureError
+from sharded_time_lapse_manager import ShardedTimeLapseManager
+from tests.mocks.mock_camera import MockCamera
+
+
+class TestShardedTimeLapseManager(TestCase):
+    def create_manager(self, cameras, **kwargs):
+        manager = ShardedTimeLapseManager(cameras, 0.001, **kwargs)
+        self.addCleanup(manager.shut_down)
+        return manager
+
+    def test_time_lapse_captures_with_every_camera(self):
+        cameras = [MockCamera(str(index)) for index in range(40)]
+        manager = self.create_manager(cameras, capture_limit=3, shard_count=4)
+
+        manager.start_time_lapse()
+
+        self.assertEqual(3, manager.captured_frames)
+        camera_results = manager.last_frame_result.get_camera_results()
+        self.assertEqual(40, len(camera_results))
+        for camera in cameras:
+            self.assertEqual(3, len(camera.get_captured_image_paths()))
+
+    def test_session_state_includes_ledgers_of_the_workers(self):
+        cameras = [MockCamera("a"), MockCamera("b")]
+        manager = self.create_manager(cameras, shard_count=2)
+
+        for _ in range(3):
+            manager.capture_frame()
+
+        state = manager.get_session_state()
+
+        self.assertEqual(2, manager.shard_count)
+        self.assertEqual([4, 4], [state["cameras"][name]["next_sequence"]
+                                  for name in ("a", "b")])
+
+    def test_no_more_shards_are_started_than_there_are_cameras(self):
+        manager = self.create_manager([MockCamera("First")], shard_count=4)
+
+        manager.capture_frame()
+
+        self.assertEqual(1, manager.shard_count)
+
+    def test_frames_are_passed_back_through_shared_memory(self):
+        frames = {}
+        cameras = [MockCamera(str(index), payload_size=1000)
+                   for index in range(4)]
+        manager = self.create_manager(
+            cameras,
+            shard_count=2,
+            frame_buffer_size=4096,
+            frame_handler=lambda camera, frame: frames.update(
+                {str(camera): bytes(frame)}))
+
+        manager.capture_frame()
+
+        self.assertEqual({str(index): bytes(1000) for index in range(4)},
+                         frames)
+
+    def test_frames_are_stored_by_the_parent_without_a_handler(self):
+        with TemporaryDirectory() as directory:
+            camera = MockCamera("First", directory, payload_size=10)
+            manager = self.create_manager([camera], frame_buffer_size=64)
+
+            manager.capture_frame()
+            manager.capture_frame()
+
+            paths = camera.get_captured_image_paths()
+            self.assertEqual(2, len(paths))
+            with open(paths[1], "rb") as image_file:
+                self.assertEqual(bytes(10), image_file.read())
+
+    def test_frames_too_large_for_the_buffer_fail(self):
+        manager = self.create_manager([MockCamera("First", payload_size=65)],
+                                      frame_buffer_size=64)
+
+        with self.assertRaises(CameraCaptureError):
+            manager.capture_frame()
+
+    def test_frames_are_released_once_handled(self):
+        kept_frames = []
+        manager = self.create_manager(
+            [MockCamera("First", payload_size=10)],
+            frame_buffer_size=64,
+            frame_handler=lambda camera, frame: kept_frames.append(frame))
+
+        manager.capture_frame()
+
+        with self.assertRaises(ValueError):
+            kept_frames[0].tobytes()
+
+    def test_failed_captures_are_recorded_by_the_parent(self):
+        with TemporaryDirectory() as directory:
+            camera = MockCamera("First", directory, payload_size=65)
+            manager = self.create_manager([camera], frame_buffer_size=64)
+
+            with self.assertRaises(CameraCaptureError):
+                manager.capture_frame()
+
+            self.assertEqual([None], camera.get_captured_image_paths())
+
+    def test_errors_are_aggregated_from_every_shard(self):
+        cameras = [MockCamera("First", failure_rate=1),
+                   MockCamera("Second"),
+                   MockCamera("Third", failure_rate=1)]
+        manager = self.create_manager(cameras, shard_count=3)
+
+        with self.assertRaises(CameraCaptureError):
+            manager.capture_frame()
+
+        frame_result = manager.last_frame_result
+        self.assertEqual(2, len(frame_result.get_exceptions()))
+        self.assertEqual(cameras, [result.camera for result
+                                   in frame_result.get_camera_results()])
+        self.assertEqual(0, manager.captured_frames)
+
+    def test_invalid_arguments_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ShardedTimeLapseManager(shard_count=0)
+        with self.assertRaises(ValueError):
+            ShardedTimeLapseManager(frame_buffer_size=-1)
@@ -0,0 +1,256 @@
+import os
+from tempfile import TemporaryDirectory
+from threading import Event, Thread
+from unittest import TestCase
+
+from camera.capture_ledger import CAPTURE_STATUS_EVICTED
+from storage.capture_catalog import CaptureCatalog
+from storage.storage_quota import (EVICTION_POLICY_THIN,
+                                   StorageQuotaManager)
+from storage.write_behind_storage import WriteBehindStorage
+from tests.mocks.mock_camera import MockCamera
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class TestStorageQuotaManager(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+
+    def create_camera(self, name, storage_manager, payload_size=10):
+        storage_directory = os.path.join(self.temporary_directory.name, name)
+        os.makedirs(storage_directory)
+
+        camera = MockCamera(name,
+                            storage_directory=storage_directory,
+                            payload_size=payload_size)
+        camera.storage_manager = storage_manager
+
+        return camera
+
+    def write_image(self, name, size):
+        path = os.path.join(self.temporary_directory.name, name)
+
+        with open(path, "wb") as image_file:
+            image_file.write(bytes(size))
+
+        return path
+
+    def record_images(self, storage_manager, camera_name, count, size):
+        for sequence in range(1, count + 1):
+            storage_manager.record(
+                camera_name,
+                sequence,
+                self.write_image(camera_name + str(sequence), size))
+
+    def test_camera_quota_evicts_oldest_images(self):
+        storage_manager = StorageQuotaManager(camera_quota=35)
+
+        self.record_images(storage_manager, "Camera", 6, 10)
+
+        self.assertEqual(["Camera4", "Camera5", "Camera6"],
+                         [os.path.basename(path) for path in
+                          storage_manager.get_image_paths("Camera")])
+        self.assertFalse(os.path.exists(
+            os.path.join(self.temporary_directory.name, "Camera3")))
+        self.assertEqual(30, storage_manager.get_camera_size("Camera"))
+        self.assertEqual(3, storage_manager.evicted_images)
+
+    def test_global_quota_evicts_from_largest_camera(self):
+        storage_manager = StorageQuotaManager(global_quota=60)
+
+        self.record_images(storage_manager, "Small", 3, 10)
+        self.record_images(storage_manager, "Large", 3, 20)
+
+        self.assertEqual(30, storage_manager.get_camera_size("Small"))
+        self.assertEqual(20, storage_manager.get_camera_size("Large"))
+        self.assertEqual(50, storage_manager.total_size)
+
+    def test_newest_image_is_never_evicted(self):
+        storage_manager = StorageQuotaManager(camera_quota=5)
+
+        self.record_images(storage_manager, "Camera", 2, 10)
+
+        self.assertEqual(["Camera2"],
+                         [os.path.basename(path) for path in
+                          storage_manager.get_image_paths("Camera")])
+
+    def test_forgotten_images_no_longer_count(self):
+        storage_manager = StorageQuotaManager()
+
+        self.record_images(storage_manager, "Camera", 3, 10)
+        storage_manager.forget("Camera", 1)
+        storage_manager.forget("Camera", 1)
+        storage_manager.forget("Unknown", 1)
+
+        self.assertEqual(["Camera2", "Camera3"],
+                         [os.path.basename(path) for path in
+                          storage_manager.get_image_paths("Camera")])
+        self.assertEqual(20, storage_manager.total_size)
+        self.assertEqual(0, storage_manager.evicted_images)
+
+    def test_eviction_handler_is_told_of_evictions(self):
+        evictions = []
+        storage_manager = StorageQuotaManager(
+            camera_quota=10,
+            eviction_handler=lambda *eviction: evictions.append(eviction))
+
+        self.record_images(storage_manager, "Camera", 2, 10)
+
+        self.assertEqual([("Camera", 1, os.path.join(
+            self.temporary_directory.name, "Camera1"))], evictions)
+
+    def test_evictions_are_finished_outside_the_lock(self):
+        sizes = []
+
+        def read_size_from_another_thread(*_):
+            thread = Thread(target=lambda: sizes.append(
+                storage_manager.get_camera_size("Camera")))
+            thread.start()
+            thread.join(5)
+
+        storage_manager = StorageQuotaManager(
+            camera_quota=10, eviction_handler=read_size_from_another_thread)
+
+        self.record_images(storage_manager, "Camera", 2, 10)
+
+        self.assertEqual([10], sizes)
+
+    def test_thinning_keeps_every_nth_older_image(self):
+        storage_manager = StorageQuotaManager(
+            camera_quota=1,
+            eviction_policy=EVICTION_POLICY_THIN)
+        storage_manager.set_camera_quota("Camera", 100)
+
+        for sequence in range(1, 14):
+            storage_manager.record("Camera",
+                                   sequence,
+                                   self.write_image(str(sequence), 10))
+
+        remaining = [int(os.path.basename(path)) for path
+                     in storage_manager.get_image_paths("Camera")]
+        self.assertEqual(10, len(remaining))
+        self.assertEqual([2, 4, 6], remaining[:3])
+        self.assertEqual(list(range(7, 14)), remaining[3:])
+
+    def test_thinning_becomes_sparser_on_each_pass(self):
+        storage_manager = StorageQuotaManager(
+            camera_quota=40,
+            eviction_policy=EVICTION_POLICY_THIN)
+
+        for sequence in range(1, 9):
+            storage_manager.record("Camera",
+                                   sequence,
+                                   self.write_image(str(sequence), 10))
+
+        remaining = [int(os.path.basename(path)) for path
+                     in storage_manager.get_image_paths("Camera")]
+        self.assertEqual([4, 6, 7, 8], remaining)
+
+    def test_unsized_images_are_sized_once_written(self):
+        storage_manager = StorageQuotaManager()
+        path = os.path.join(self.temporary_directory.name, "pending")
+
+        storage_manager.record("Camera", 1, path)
+        self.assertEqual(0, storage_manager.total_size)
+
+        self.write_image("pending", 10)
+        storage_manager.record("Camera", 2, self.write_image("written", 5))
+
+        self.assertEqual(15, storage_manager.total_size)
+
+    def test_images_never_written_are_forgotten_after_timeout(self):
+        clock = FakeClock()
+        storage_manager = StorageQuotaManager(unsized_timeout=10,
+                                              clock=clock)
+        storage_manager.record(
+            "Camera", 1, os.path.join(self.temporary_directory.name, "lost"))
+
+        clock.now = 11
+        written_path = self.write_image("written", 5)
+        storage_manager.record("Camera", 2, written_path)
+
+        self.assertEqual([written_path],
+                         storage_manager.get_image_paths("Camera"))
+        self.assertEqual([], storage_manager._unsized_images)
+
+    def test_evicted_images_are_marked_on_camera(self):
+        storage_manager = StorageQuotaManager(camera_quota=25)
+        camera = self.create_camera("Camera", storage_manager)
+        camera.capture_catalog = CaptureCatalog(":memory:", batch_size=1)
+        self.addCleanup(camera.capture_catalog.close)
+
+        for _ in range(4):
+            camera._store_image(bytes(10))
+
+        paths = camera.get_captured_image_paths()
+        self.assertEqual([None, None], paths[:2])
+        self.assertTrue(all(os.path.exists(path) for path in paths[2:]))
+        self.assertEqual(2, camera.capture_catalog.count(
+            "Camera", CAPTURE_STATUS_EVICTED))
+        self.assertEqual(paths[2:], camera.capture_catalog.get_paths())
+
+    def test_storage_writer_images_are_counted(self):
+        storage_manager = StorageQuotaManager()
+        camera = self.create_camera("Camera", storage_manager)
+        camera.storage_writer = WriteBehindStorage()
+        camera.storage_writer.start()
+        self.addCleanup(camera.storage_writer.stop)
+
+        camera.capture_image()
+        camera.storage_writer.flush()
+        camera.capture_image()
+        camera.storage_writer.flush()
+        storage_manager.record("Other", 1, self.write_image("other", 1))
+
+        self.assertEqual(20, storage_manager.get_camera_size("Camera"))
+
+    def test_aged_images_are_recompressed_in_background(self):
+        clock = FakeClock()
+        recompressed = Event()
+
+        def recompress(path, quality):
+            with open(path, "wb") as image_file:
+                image_file.write(bytes(quality))
+            recompressed.set()
+
+        storage_manager = StorageQuotaManager(recompress_after=10,
+                                              recompression_quality=3,
+                                              recompressor=recompress,
+                                              clock=clock)
+        storage_manager.start()
+        self.addCleanup(storage_manager.stop)
+
+        clock.now = -10
+        storage_manager.record("Camera", 1, self.write_image("old", 10))
+        clock.now = 0
+        storage_manager.record("Camera", 2, self.write_image("new", 10))
+
+        self.assertTrue(recompressed.wait(5))
+        storage_manager.stop()
+
+        self.assertEqual(1, storage_manager.recompressed_images)
+        self.assertEqual(13, storage_manager.total_size)
+
+    def test_load_from_catalog_counts_existing_images(self):
+        catalog = CaptureCatalog(":memory:")
+        self.addCleanup(catalog.close)
+        catalog.record("Camera", 1, path=self.write_image("kept", 10))
+        catalog.record("Camera", 2, path=os.path.join(
+            self.temporary_directory.name, "deleted"))
+        storage_manager = StorageQuotaManager()
+
+        storage_manager.load_from_catalog(catalog)
+
+        self.assertEqual(10, storage_manager.get_camera_size("Camera"))
+
+    def test_invalid_eviction_policy_raises_value_error(self):
+        with self.assertRaises(ValueError):
+            StorageQuotaManager(eviction_policy="random")
@@ -0,0 +1,163 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipUnless
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from tests.mocks.mock_camera import MockCamera
+
+if numpy is not None:
+    from storage.thumbnail_generator import (ThumbnailGenerator,
+                                             build_pyramid,
+                                             downscale_pixels,
+                                             encode_ppm)
+
+
+@skipUnless(numpy, "NumPy is not installed")
+class TestThumbnailFunctions(TestCase):
+    def test_downscale_pixels_averages_blocks(self):
+        pixels = numpy.zeros((4, 4, 3), dtype=numpy.uint8)
+        pixels[:2, :2] = 200
+
+        numpy.testing.assert_array_equal([[200, 0], [0, 0]],
+                                         downscale_pixels(pixels, 2)[..., 0])
+
+    def test_build_pyramid_builds_every_level(self):
+        pixels = numpy.arange(64 * 48 * 3, dtype=numpy.uint32).reshape(
+            48, 64, 3).astype(numpy.uint8)
+
+        quarter, sixteenth = build_pyramid(pixels, (4, 16))
+
+        self.assertEqual((12, 16, 3), quarter.shape)
+        self.assertEqual((3, 4, 3), sixteenth.shape)
+        numpy.testing.assert_array_equal(downscale_pixels(quarter, 4),
+                                         sixteenth)
+
+    def test_encode_ppm_writes_binary_header(self):
+        pixels = numpy.zeros((2, 3, 3), dtype=numpy.uint8)
+
+        encoded = encode_ppm(pixels)
+
+        self.assertEqual(b"P6\n3 2\n255\n" + bytes(18), encoded)
+
+    def test_encode_ppm_writes_greyscale_as_pgm(self):
+        self.assertTrue(encode_ppm(numpy.zeros((2, 3), dtype=numpy.uint8))
+                        .startswith(b"P5\n3 2\n"))
+
+
+@skipUnless(numpy, "NumPy is not installed")
+class TestThumbnailGenerator(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+        self.directory = self.temporary_directory.name
+
+    def create_generator(self, **kwargs):
+        generator = ThumbnailGenerator(self.directory,
+                                       process_count=1,
+                                       **kwargs)
+        self.addCleanup(generator.stop)
+        return generator
+
+    def test_thumbnails_are_written_for_each_factor(self):
+        generator = self.create_generator()
+
+        generator.submit("First", "00000001",
+                         numpy.zeros((64, 64, 3), dtype=numpy.uint8))
+        generator.stop()
+
+        for factor, size in ((4, b"16 16"), (16, b"4 4")):
+            path = generator.get_thumbnail_path("First", "00000001", factor)
+            with open(path, "rb") as thumbnail_file:
+                self.assertEqual(b"P6\n" + size + b"\n255\n",
+                                 thumbnail_file.read(len(size) + 8))
+        self.assertEqual(1, generator.generated_frames)
+
+    def test_frames_are_dropped_when_too_many_are_pending(self):
+        generator = self.create_generator(max_pending=1)
+        pixels = numpy.zeros((2000, 2000, 3), dtype=numpy.uint8)
+
+        accepted = [generator.submit("First", str(index), pixels)
+                    for index in range(3)]
+        generator.stop()
+
+        self.assertEqual([True, False, False], accepted)
+        self.assertEqual(2, generator.dropped_frames)
+        self.assertEqual(1, generator.generated_frames)
+
+    def test_dropped_frames_are_not_prepared(self):
+        generator = self.create_generator(max_pending=1)
+        pixels = numpy.zeros((2000, 2000, 3), dtype=numpy.uint8)
+        prepared = []
+
+        def get_image():
+            prepared.append(True)
+            return pixels
+
+        accepted = [generator.submit("First", str(index), get_image)
+                    for index in range(3)]
+        generator.stop()
+
+        self.assertEqual([True, False, False], accepted)
+        self.assertEqual(1, len(prepared))
+
+    def test_encoded_frames_are_decoded_by_the_workers(self):
+        generator = self.create_generator()
+
+        generator.submit("First", "00000001", b"not an image")
+        generator.stop()
+
+        # Decoding fails in the worker (with Pillow missing or the image
+        # being invalid) rather than on the calling thread.
+        self.assertEqual(1, generator.failed_frames)
+
+    def test_failures_are_recorded(self):
+        generator = self.create_generator()
+
+        generator.submit("First", "00000001", numpy.zeros(4))
+        generator.stop()
+
+        self.assertEqual(1, generator.failed_frames)
+        self.assertEqual(1, len(generator.get_errors()))
+
+    def test_invalid_arguments_are_rejected(self):
+        with self.assertRaises(ValueError):
+            ThumbnailGenerator(self.directory, max_pending=0)
+        with self.assertRaises(ValueError):
+            ThumbnailGenerator(self.directory, factors=(1, 4))
+
+    def test_cameras_submit_kept_frames(self):
+        generator = self.create_generator()
+        camera = MockCamera("First")
+        camera.thumbnail_generator = generator
+        camera.pixels = numpy.zeros((16, 16, 3), dtype=numpy.uint8)
+
+        camera.capture_image()
+        generator.stop()
+
+        self.assertTrue(os.path.exists(
+            generator.get_thumbnail_path("First", "00000001", 4)))
+
+    def test_images_that_are_not_stored_get_no_thumbnail(self):
+        generator = self.create_generator()
+        camera = MockCamera("First")
+        camera.thumbnail_generator = generator
+        camera.storage_writer = _RejectingStorageWriter()
+        camera.pixels = numpy.zeros((16, 16, 3), dtype=numpy.uint8)
+
+        camera.capture_image()
+        generator.stop()
+
+        self.assertEqual([None], camera.get_captured_image_paths())
+        self.assertFalse(os.path.exists(
+            generator.get_thumbnail_path("First", "00000001", 4)))
+
+
+class _RejectingStorageWriter:
+    """A storage writer whose queue is always full."""
+
+    def submit(self, path, image_data, encoder=None, failure_handler=None):
+        return False
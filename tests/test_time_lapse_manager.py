@@ -1,9 +1,19 @@
 from unittest import TestCase
 
+from adaptive_interval import AdaptiveIntervalController
+from capture_scheduler import LATE_POLICY_CATCH_UP
 from tests.mocks.mock_camera import MockCamera
 from time_lapse_manager import TimeLapseManager
 
 
+class StaticActivityFilter:
+    def __init__(self, last_difference):
+        self.last_difference = last_difference
+
+    def should_keep(self, pixels):
+        return True
+
+
 class TestTimeLapseManager(TestCase):
     def setUp(self):
         self.first_mock_camera = MockCamera("First")
@@ -166,3 +176,57 @@ class TestTimeLapseManager(TestCase):
         except Exception:
             self.fail("TimeLapseManager threw an exception when capturing a "
                       "time-lapse frame.")
+
+    def test_start_time_lapse_captures_capture_limit_frames(self):
+        time_lapse_manager = TimeLapseManager(self.mock_camera_collection,
+                                              0.001,
+                                              3)
+
+        time_lapse_manager.start_time_lapse()
+
+        self.assertEqual(3, time_lapse_manager.captured_frames)
+        self.assertEqual(
+            3, len(self.first_mock_camera.get_captured_image_paths()))
+
+    def test_start_time_lapse_records_frame_timings(self):
+        time_lapse_manager = TimeLapseManager(
+            self.mock_camera_collection,
+            0.001,
+            3,
+            late_policy=LATE_POLICY_CATCH_UP)
+
+        time_lapse_manager.start_time_lapse()
+
+        self.assertEqual([0, 1, 2],
+                         [timing.slot for timing in
+                          time_lapse_manager.get_frame_timings()])
+        self.assertEqual(2, time_lapse_manager.last_frame_timing.slot)
+
+    def test_init_raises_value_error_when_late_policy_is_unknown(self):
+        with self.assertRaises(ValueError):
+            TimeLapseManager(late_policy="Test")
+
+    def test_capture_frame_with_concurrent_capture_uses_every_camera(self):
+        time_lapse_manager = TimeLapseManager(self.mock_camera_collection,
+                                              concurrent_capture=True)
+
+        time_lapse_manager.capture_frame()
+
+        self.assertEqual(
+            2, len(time_lapse_manager.last_frame_result.get_camera_results()))
+        self.assertEqual(1, time_lapse_manager.captured_frames)
+
+    def test_interval_controller_adjusts_capture_interval(self):
+        controller = AdaptiveIntervalController(1, 60, hysteresis_frames=1)
+        time_lapse_manager = TimeLapseManager(self.mock_camera_collection,
+                                              10,
+                                              interval_controller=controller)
+
+        time_lapse_manager.capture_frame()
+
+        self.assertEqual(10, time_lapse_manager.capture_interval)
+
+        self.first_mock_camera.frame_filter = StaticActivityFilter(0.5)
+        time_lapse_manager.capture_frame()
+
+        self.assertEqual(5, time_lapse_manager.capture_interval)
@@ -0,0 +1,253 @@
+import os
+import tarfile
+from io import BytesIO
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest import TestCase
+
+from storage.s3_client import S3Client
+from storage.storage_quota import StorageQuotaManager
+from storage.upload_sync import UploadSync
+from tests.mocks.fake_s3_server import FakeS3Server
+from tests.mocks.mock_camera import MockCamera
+
+
+class SizedMockCamera(MockCamera):
+    """A camera that stores images of the given sizes, where None fails."""
+
+    def __init__(self, name, storage_directory, sizes=()):
+        super().__init__(name, storage_directory)
+        self.sizes = list(sizes)
+
+    def capture_image(self):
+        size = self.sizes.pop(0)
+
+        if size is None:
+            self._record_failed_image()
+            return
+
+        self._store_image(
+            bytes([self.capture_ledger.next_sequence % 256]) * size)
+
+    def capture_all(self):
+        while self.sizes:
+            self.capture_image()
+
+
+class TestUploadSync(TestCase):
+    def setUp(self):
+        self.server = FakeS3Server()
+        self.addCleanup(self.server.stop)
+
+        self.client = S3Client(self.server.endpoint_url,
+                               "test-key",
+                               "test-secret")
+
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+
+    def create_camera(self, name, sizes, storage_manager=None):
+        directory = os.path.join(self.temporary_directory.name, name)
+        os.mkdir(directory)
+
+        camera = SizedMockCamera(name, directory, sizes)
+        camera.storage_manager = storage_manager
+        camera.capture_all()
+
+        return camera
+
+    def create_sync(self, **kwargs):
+        options = {"batch_threshold": 200,
+                   "multipart_threshold": 1000,
+                   "part_size": 400}
+        options.update(kwargs)
+
+        upload_sync = UploadSync(self.client, "frames", **options)
+        self.addCleanup(upload_sync.close)
+
+        return upload_sync
+
+    def get_object(self, key):
+        return self.server.objects[("frames", key)]
+
+    def test_small_frames_are_uploaded_in_batches(self):
+        camera = self.create_camera("Camera", [100] * 10)
+        upload_sync = self.create_sync(max_batch_frames=4)
+
+        result = upload_sync.sync([camera])
+
+        self.assertEqual(10, result.uploaded_frames)
+        self.assertEqual(3, result.objects)
+        self.assertEqual(11, upload_sync.get_cursor("Camera"))
+
+        key = "Camera/batches/00000001-00000004.tar"
+        with tarfile.open(fileobj=BytesIO(self.get_object(key))) as archive:
+            self.assertEqual(["00000001.jpg", "00000002.jpg",
+                              "00000003.jpg", "00000004.jpg"],
+                             archive.getnames())
+            self.assertEqual(bytes([2]) * 100,
+                             archive.extractfile("00000002.jpg").read())
+
+    def test_large_frames_are_uploaded_in_parts(self):
+        camera = self.create_camera("Camera", [500, 1000])
+
+        result = self.create_sync().sync([camera])
+
+        self.assertEqual(2, result.objects)
+        self.assertEqual(bytes([1]) * 500,
+                         self.get_object("Camera/00000001.jpg"))
+        self.assertEqual(bytes([2]) * 1000,
+                         self.get_object("Camera/00000002.jpg"))
+        self.assertEqual(3, len([request for request in self.server.requests
+                                 if "partNumber" in request[2]]))
+
+    def test_uploads_run_concurrently_within_limit(self):
+        self.server.latency = 0.02
+        cameras = [self.create_camera("Camera " + str(index), [500] * 6)
+                   for index in range(2)]
+
+        result = self.create_sync(max_concurrency=3).sync(cameras)
+
+        self.assertEqual(12, result.uploaded_frames)
+        self.assertEqual(3, self.server.max_active_requests)
+
+    def test_sync_resumes_from_saved_cursor(self):
+        cursor_path = os.path.join(self.temporary_directory.name,
+                                   "cursor.json")
+        camera = self.create_camera("Camera", [500, 500])
+        self.create_sync(cursor_path=cursor_path).sync([camera])
+
+        camera.sizes = [500]
+        camera.capture_all()
+        self.server.requests.clear()
+        result = self.create_sync(cursor_path=cursor_path).sync([camera])
+
+        self.assertEqual(1, result.uploaded_frames)
+        self.assertEqual([("PUT", "/frames/Camera/00000003.jpg", {})],
+                         self.server.requests)
+
+    def test_cursor_saved_for_another_prefix_is_ignored(self):
+        cursor_path = os.path.join(self.temporary_directory.name,
+                                   "cursor.json")
+        camera = self.create_camera("Camera", [500, 500])
+        self.create_sync(cursor_path=cursor_path).sync([camera])
+
+        upload_sync = self.create_sync(cursor_path=cursor_path,
+                                       prefix="site-b/")
+        result = upload_sync.sync([camera])
+
+        self.assertEqual(2, result.uploaded_frames)
+        self.assertIn(("frames", "site-b/Camera/00000001.jpg"),
+                      self.server.objects)
+
+    def test_failed_upload_holds_cursor_and_is_retried(self):
+        camera = self.create_camera("Camera", [500, 500, 500])
+        self.server.failing_keys.add("Camera/00000002.jpg")
+        upload_sync = self.create_sync()
+
+        result = upload_sync.sync([camera])
+
+        self.assertEqual((2, 1), (result.uploaded_frames,
+                                  result.failed_frames))
+        self.assertEqual(2, upload_sync.get_cursor("Camera"))
+        self.assertEqual("Camera/00000002.jpg",
+                         upload_sync.get_errors()[0][1])
+
+        self.server.failing_keys.clear()
+        result = upload_sync.sync([camera])
+
+        self.assertEqual(1, result.uploaded_frames)
+        self.assertEqual(4, upload_sync.get_cursor("Camera"))
+
+    def test_failed_multipart_upload_is_aborted(self):
+        camera = self.create_camera("Camera", [1000])
+        upload_sync = self.create_sync()
+
+        original_upload_part = self.client.upload_part
+
+        def failing_upload_part(*args):
+            original_upload_part(*args)
+            raise OSError("Connection lost.")
+
+        self.client.upload_part = failing_upload_part
+
+        result = upload_sync.sync([camera])
+
+        self.assertEqual(1, result.failed_frames)
+        self.assertEqual({}, self.server.uploads)
+        self.assertEqual("DELETE", self.server.requests[-1][0])
+
+    def test_uploaded_frames_are_deleted_once_confirmed(self):
+        camera = self.create_camera("Camera", [500, 100, 100, 500])
+        self.server.failing_keys.add("Camera/00000004.jpg")
+        paths = list(camera.get_captured_image_paths())
+
+        self.create_sync(delete_uploaded=True).sync([camera])
+
+        self.assertEqual([False, False, False, True],
+                         [os.path.exists(path) for path in paths])
+
+    def test_deleted_frames_are_forgotten_by_storage_manager(self):
+        storage_manager = StorageQuotaManager()
+        camera = self.create_camera("Camera", [500, 100, 100, 500],
+                                    storage_manager)
+        self.server.failing_keys.add("Camera/00000004.jpg")
+
+        self.create_sync(delete_uploaded=True).sync([camera])
+
+        self.assertEqual([camera.get_captured_image_paths()[3]],
+                         storage_manager.get_image_paths("Camera"))
+        self.assertEqual(500, storage_manager.total_size)
+
+    def test_connections_are_kept_alive_between_passes(self):
+        camera = self.create_camera("Camera", [500])
+        upload_sync = self.create_sync()
+        upload_sync.sync([camera])
+
+        camera.sizes = [500]
+        camera.capture_all()
+        upload_sync.sync([camera])
+
+        self.assertEqual(1, self.server.connections)
+
+        upload_sync.close()
+        camera.sizes = [500]
+        camera.capture_all()
+        upload_sync.sync([camera])
+
+        self.assertEqual(2, self.server.connections)
+
+    def test_failed_captures_and_missing_frames_are_skipped(self):
+        camera = self.create_camera("Camera", [500, None, 500, 500])
+        os.remove(camera.get_captured_image_paths()[2])
+        upload_sync = self.create_sync()
+
+        result = upload_sync.sync([camera])
+
+        self.assertEqual(2, result.uploaded_frames)
+        self.assertEqual(5, upload_sync.get_cursor("Camera"))
+        self.assertEqual(1, len(upload_sync.get_errors()))
+
+    def test_background_sync_uploads_on_stop(self):
+        camera = self.create_camera("Camera", [500])
+        upload_sync = self.create_sync()
+
+        upload_sync.start([camera], sync_interval=60)
+        sleep(0.01)
+        upload_sync.stop()
+
+        self.assertIn(("frames", "Camera/00000001.jpg"), self.server.objects)
+
+    def test_background_sync_survives_failed_passes(self):
+        camera = self.create_camera("Camera", [500])
+        upload_sync = self.create_sync(cursor_path=os.path.join(
+            self.temporary_directory.name, "missing", "cursor.json"))
+
+        upload_sync.start([camera], sync_interval=0.001)
+        sleep(0.05)
+        upload_sync.stop()
+
+        errors = upload_sync.get_errors()
+        self.assertGreater(len(errors), 1)
+        self.assertEqual((None, None), errors[-1][:2])
+        self.assertIsInstance(errors[-1][2], FileNotFoundError)
@@ -0,0 +1,144 @@
+import os
+import sys
+from collections.abc import Sequence
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from video_assembler import StreamingVideoAssembler, VideoAssemblyError
+
+COPY_STDIN_SCRIPT = ("import shutil, sys\n"
+                     "with open(sys.argv[1], 'wb') as output:\n"
+                     "    shutil.copyfileobj(sys.stdin.buffer, output)\n")
+
+
+class CopyingVideoAssembler(StreamingVideoAssembler):
+    """An assembler whose 'encoder' concatenates the frames it is sent."""
+
+    def _build_command(self, output_path):
+        return [sys.executable, "-c", COPY_STDIN_SCRIPT, output_path]
+
+
+class FailingVideoAssembler(StreamingVideoAssembler):
+    """An assembler whose 'encoder' writes part of a segment and fails."""
+
+    def _build_command(self, output_path):
+        return [sys.executable, "-c", COPY_STDIN_SCRIPT + "sys.exit(1)\n",
+                output_path]
+
+
+class UnsliceablePaths(Sequence):
+    """A sequence of paths that fails if it is sliced."""
+
+    def __init__(self, paths):
+        self._paths = paths
+
+    def __len__(self):
+        return len(self._paths)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            raise AssertionError("The paths were sliced.")
+        return self._paths[index]
+
+
+class TestStreamingVideoAssembler(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.addCleanup(self.temporary_directory.cleanup)
+        self.output_directory = os.path.join(self.temporary_directory.name,
+                                             "video")
+
+    def write_frames(self, count, start=1):
+        paths = []
+
+        for frame_number in range(start, start + count):
+            path = os.path.join(self.temporary_directory.name,
+                                str(frame_number) + ".jpg")
+            with open(path, "wb") as image_file:
+                image_file.write(str(frame_number).encode() + b";")
+            paths.append(path)
+
+        return paths
+
+    def read(self, path):
+        with open(path, "rb") as segment_file:
+            return segment_file.read()
+
+    def test_frames_are_split_into_segments(self):
+        assembler = CopyingVideoAssembler(self.output_directory,
+                                          frames_per_segment=2,
+                                          chunk_size=1)
+
+        assembler.assemble(self.write_frames(5))
+        assembler.finish()
+
+        segments = assembler.get_completed_segments()
+        self.assertEqual(3, len(segments))
+        self.assertEqual(b"3;4;", self.read(segments[1]))
+        self.assertEqual(b"5;", self.read(segments[2]))
+
+    def test_assemble_only_streams_new_frames(self):
+        assembler = CopyingVideoAssembler(self.output_directory,
+                                          frames_per_segment=10)
+        paths = self.write_frames(2)
+
+        assembler.assemble(paths)
+        paths += self.write_frames(1, start=3)
+        streamed_frames = assembler.assemble(paths)
+        assembler.finish()
+
+        self.assertEqual(1, streamed_frames)
+        self.assertEqual(b"1;2;3;",
+                         self.read(assembler.get_completed_segments()[0]))
+
+    def test_assemble_skips_uncaptured_and_waits_for_missing_frames(self):
+        assembler = CopyingVideoAssembler(self.output_directory)
+        paths = self.write_frames(1) + [None, "missing.jpg"]
+
+        self.assertEqual(1, assembler.assemble(paths))
+        self.assertEqual(2, assembler.position)
+
+    def test_restarted_assembler_resumes_after_last_segment(self):
+        paths = self.write_frames(3)
+        assembler = CopyingVideoAssembler(self.output_directory,
+                                          frames_per_segment=2)
+        assembler.assemble(paths)
+        assembler.abort()
+
+        resumed_assembler = CopyingVideoAssembler(self.output_directory,
+                                                  frames_per_segment=2)
+        resumed_assembler.assemble(paths + self.write_frames(1, start=4))
+        concat_list_path = resumed_assembler.finish()
+
+        self.assertEqual(2, len(resumed_assembler.get_completed_segments()))
+        self.assertEqual(b"3;4;", self.read(
+            resumed_assembler.get_completed_segments()[1]))
+        with open(concat_list_path, encoding="utf-8") as concat_list:
+            self.assertEqual(2, len(concat_list.readlines()))
+
+    def test_failed_encoding_raises_video_assembly_error(self):
+        assembler = FailingVideoAssembler(self.output_directory,
+                                          frames_per_segment=1)
+
+        with self.assertRaises(VideoAssemblyError):
+            assembler.assemble(self.write_frames(1))
+
+        self.assertEqual(0, assembler.position)
+        self.assertEqual([], os.listdir(self.output_directory))
+
+    def test_missing_ffmpeg_raises_video_assembly_error(self):
+        assembler = StreamingVideoAssembler(
+            self.output_directory,
+            ffmpeg_path=os.path.join(self.temporary_directory.name,
+                                     "missing-ffmpeg"))
+
+        with self.assertRaises(VideoAssemblyError):
+            assembler.assemble(self.write_frames(1))
+
+    def test_paths_are_read_one_at_a_time(self):
+        assembler = CopyingVideoAssembler(self.output_directory,
+                                          frames_per_segment=2)
+
+        self.assertEqual(3, assembler.assemble(
+            UnsliceablePaths(self.write_frames(3))))
+        self.assertEqual(3, assembler.position)
@@ -0,0 +1,125 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from storage.write_behind_storage import (OVERFLOW_POLICY_DROP_NEWEST,
+                                          OVERFLOW_POLICY_DROP_OLDEST,
+                                          WriteBehindStorage, _STOP)
+
+
+class TestWriteBehindStorage(TestCase):
+    def setUp(self):
+        self.temporary_directory = TemporaryDirectory()
+        self.directory = self.temporary_directory.name
+
+    def tearDown(self):
+        self.temporary_directory.cleanup()
+
+    def get_path(self, filename):
+        return os.path.join(self.directory, filename)
+
+    def read(self, filename):
+        with open(self.get_path(filename), "rb") as image_file:
+            return image_file.read()
+
+    def test_submitted_frames_are_written(self):
+        storage = WriteBehindStorage(writer_count=2, fsync_batch_size=4)
+        storage.start()
+
+        for index in range(10):
+            storage.submit(self.get_path(str(index)), bytes([index]))
+        storage.stop()
+
+        self.assertEqual(10, storage.written_frames)
+        self.assertEqual(bytes([7]), self.read("7"))
+        self.assertEqual(0, storage.queue_depth)
+        self.assertIsNotNone(storage.mean_write_latency)
+
+    def test_encoder_runs_before_write(self):
+        storage = WriteBehindStorage()
+        storage.start()
+
+        storage.submit(self.get_path("encoded"), "frame", str.encode)
+        storage.stop()
+
+        self.assertEqual(b"frame", self.read("encoded"))
+
+    def test_drop_newest_rejects_frames_when_queue_is_full(self):
+        storage = WriteBehindStorage(
+            max_queue_size=2,
+            overflow_policy=OVERFLOW_POLICY_DROP_NEWEST)
+
+        accepted = [storage.submit(self.get_path(str(index)), b"")
+                    for index in range(3)]
+
+        self.assertEqual([True, True, False], accepted)
+        self.assertEqual(1, storage.dropped_frames)
+        self.assertEqual(2, storage.queue_depth)
+
+    def test_drop_oldest_discards_queued_frame_when_queue_is_full(self):
+        storage = WriteBehindStorage(
+            max_queue_size=2,
+            overflow_policy=OVERFLOW_POLICY_DROP_OLDEST)
+
+        for index in range(3):
+            storage.submit(self.get_path(str(index)), b"")
+        storage.start()
+        storage.stop()
+
+        self.assertEqual(1, storage.dropped_frames)
+        self.assertFalse(os.path.exists(self.get_path("0")))
+        self.assertTrue(os.path.exists(self.get_path("2")))
+
+    def test_failed_writes_are_recorded(self):
+        storage = WriteBehindStorage()
+        storage.start()
+
+        storage.submit(self.get_path("missing/frame"), b"")
+        storage.stop()
+
+        self.assertEqual(1, storage.failed_writes)
+        self.assertEqual(self.get_path("missing/frame"),
+                         storage.get_errors()[0][0])
+
+    def test_failure_handler_is_called_for_frames_never_written(self):
+        failures = []
+        storage = WriteBehindStorage(
+            max_queue_size=1,
+            overflow_policy=OVERFLOW_POLICY_DROP_OLDEST)
+
+        storage.submit(self.get_path("dropped"), b"",
+                       failure_handler=lambda: failures.append("dropped"))
+        storage.submit(self.get_path("missing/frame"), b"",
+                       failure_handler=lambda: failures.append("missing"))
+        storage.start()
+        storage.stop()
+
+        self.assertEqual(["dropped", "missing"], failures)
+
+    def test_drop_oldest_never_discards_stop_signal(self):
+        storage = WriteBehindStorage(
+            max_queue_size=1,
+            writer_count=1,
+            overflow_policy=OVERFLOW_POLICY_DROP_OLDEST)
+        storage._queue.put(_STOP)
+
+        accepted = storage.submit(self.get_path("late"), b"")
+
+        self.assertFalse(accepted)
+        self.assertEqual(1, storage.dropped_frames)
+        self.assertIs(_STOP, storage._queue.get_nowait())
+
+    def test_failed_write_is_removed_and_not_counted_as_written(self):
+        storage = WriteBehindStorage()
+        storage.start()
+
+        storage.submit(self.get_path("frame"), "frame")
+        storage.stop()
+
+        self.assertEqual(1, storage.failed_writes)
+        self.assertEqual(0, storage.written_frames)
+        self.assertFalse(os.path.exists(self.get_path("frame")))
+
+    def test_init_raises_value_error_when_overflow_policy_is_unknown(self):
+        with self.assertRaises(ValueError):
+            WriteBehindStorage(overflow_policy="Test")
@@ -1,35 +1,89 @@
 """A library for managing time-lapse sequences."""
-from time import sleep
+from collections import deque
+from os.path import getsize
+from time import monotonic
+
+from capture_scheduler import CaptureScheduler, LATE_POLICY_SKIP
+from frame_capture import ParallelFrameCapturer, SerialFrameCapturer
+from instrumentation import EVENT_CAPTURE, EVENT_SET_UP, EVENT_TEAR_DOWN
+
 
 class TimeLapseManager:
     """A basic time-lapse manager."""
 
-    def __init__(self, cameras=None, capture_interval=10, capture_limit=None):
+    def __init__(self,
+                 cameras=None,
+                 capture_interval=10,
+                 capture_limit=None,
+                 late_policy=LATE_POLICY_SKIP,
+                 timing_history=1000,
+                 concurrent_capture=False,
+                 interval_controller=None,
+                 instrumentation=None,
+                 checkpoint=None,
+                 health_monitor=None):
         """Initialise the time-lapse manager with the camera that will be used.
 
         Args:
             cameras: A collection of cameras that will be used when capturing
                 images using this time-lapse manager.
-            capture_interval: The interval (in seconds) to wait between
-                capturing images.
+            capture_interval: The interval (in seconds) between the start of
+                each frame.
             capture_limit: The maximum number of images to capture (or None for
                 infinite).
+            late_policy: The policy used by the scheduler when one or more
+                frames are missed (see capture_scheduler).
+            timing_history: The number of recent frame timings to keep.
+            concurrent_capture: Whether to trigger every camera at the same
+                instant from a thread pool rather than one after another.
+            interval_controller: An AdaptiveIntervalController that adjusts
+                capture_interval after each frame from the activity reported
+                by the frame filters of the cameras (or None to keep
+                capture_interval fixed).
+            instrumentation: An Instrumentation that the time taken by, and
+                errors raised from, each camera operation are reported to (or
+                None).
+            checkpoint: A SessionCheckpoint that progress is saved to after
+                each frame and, if it exists, resumed from when the
+                time-lapse starts (or None).
+            health_monitor: A CameraHealthMonitor that times out hung
+                cameras and sidelines failing ones, so the other cameras keep
+                capturing (or None to stop at the first camera that fails).
 
         Raises:
-            ValueError: If capture_interval is not greater than 0 or if
-                capture_limit is not greater than 0 or None.
+            ValueError: If capture_interval is not greater than 0, if
+                capture_limit is not greater than 0 or None or if late_policy
+                is not a recognised policy.
             TypeError: If capture_interval is not a numeric type or if
                 capture_limit is not a numeric type or None.
         """
+        self._instrumentation = instrumentation
+        self._health_monitor = health_monitor
+
+        if concurrent_capture:
+            self._frame_capturer = ParallelFrameCapturer()
+        else:
+            self._frame_capturer = SerialFrameCapturer(
+                stop_on_failure=health_monitor is None)
+        self._last_frame_result = None
+
+        self._cameras = []
         if cameras is not None:
             self.set_cameras(cameras[:])
-        else:
-            self.set_cameras([])
+
+        self._scheduler = CaptureScheduler(capture_interval, late_policy)
+        self._frame_timings = deque(maxlen=timing_history)
 
         self.capture_interval = capture_interval
         self.capture_limit = capture_limit
         self._captured_frames = 0
 
+        self._checkpoint = checkpoint
+
+        self._interval_controller = interval_controller
+        if interval_controller is not None:
+            self.capture_interval = interval_controller.reset(capture_interval)
+
     def add_camera(self, camera):
         """Add a camera to the collection on this time-lapse manager.
 
@@ -37,6 +91,7 @@ class TimeLapseManager:
             camera: The camera to add
         """
         if camera not in self._cameras:
+            self._attach_instrumentation(camera)
             self._cameras.append(camera)
 
     def remove_camera(self, camera):
@@ -46,6 +101,7 @@ class TimeLapseManager:
             ValueError: If the camera does not exist.
         """
         self._cameras.remove(camera)
+        self._frame_capturer.release_camera(camera)
 
     def set_cameras(self, cameras):
         """Set the cameras that will be used with this time-lapse manager.
@@ -54,6 +110,13 @@ class TimeLapseManager:
             cameras: The cameras that will be used when capturing images using
                 this time-lapse manager.
         """
+        for camera in cameras:
+            self._attach_instrumentation(camera)
+
+        for camera in self._cameras:
+            if camera not in cameras:
+                self._frame_capturer.release_camera(camera)
+
         self._cameras = cameras[:]
 
     def get_cameras(self):
@@ -97,6 +160,7 @@ class TimeLapseManager:
         try:
             if capture_interval > 0:
                 self._capture_interval = capture_interval
+                self._scheduler.interval = capture_interval
             else:
                 raise ValueError("capture_interval must be greater than 0.")
         except TypeError as error:
@@ -141,37 +205,421 @@ class TimeLapseManager:
         """
         return self._captured_frames
 
+    @property
+    def late_policy(self):
+        """Get the policy used by the scheduler when frames are missed.
+
+        Returns: The policy used by the scheduler when frames are missed.
+        """
+        return self._scheduler.late_policy
+
+    @property
+    def instrumentation(self):
+        """Return the instrumentation that camera operations are reported to.
+
+        Returns: An Instrumentation (or None).
+        """
+        return self._instrumentation
+
+    @property
+    def health_monitor(self):
+        """Return the monitor deciding which cameras capture each frame.
+
+        Returns: A CameraHealthMonitor (or None).
+        """
+        return self._health_monitor
+
+    @property
+    def last_frame_timing(self):
+        """Return the timing of the most recently scheduled frame.
+
+        Returns: A FrameTiming (or None if no frame has been scheduled).
+        """
+        if self._frame_timings:
+            return self._frame_timings[-1]
+        else:
+            return None
+
+    @property
+    def last_frame_result(self):
+        """Return the per-camera outcome of the most recent frame.
+
+        Returns: A FrameCaptureResult (or None if no frame has been captured).
+        """
+        return self._last_frame_result
+
+    def get_frame_timings(self):
+        """Return the timings of the most recently scheduled frames.
+
+        Returns: A list of FrameTiming, oldest first.
+        """
+        return list(self._frame_timings)
+
+    def get_session_state(self):
+        """Return the progress of this manager so that it can be resumed.
+
+        Returns: A dictionary of JSON-serialisable values, where
+            next_deadline is the monotonic time of the next frame (or None if
+            the time-lapse has not started).
+        """
+        next_slot = self._scheduler.next_slot
+        next_deadline = None
+
+        if self._scheduler.started:
+            next_deadline = self._scheduler.get_deadline(next_slot)
+
+        return {"captured_frames": self._captured_frames,
+                "capture_limit": self.capture_limit,
+                "capture_interval": self.capture_interval,
+                "next_slot": next_slot,
+                "next_deadline": next_deadline,
+                "cameras": {str(camera): camera.capture_ledger.get_state()
+                            for camera in self.get_cameras()
+                            if hasattr(camera, "capture_ledger")}}
+
+    def restore_session_state(self, state):
+        """Resume the progress saved by get_session_state.
+
+        The scheduler is started so that the next frame is due at the saved
+        next_deadline, keeping the original timeline.
+
+        Args:
+            state: A dictionary returned by get_session_state.
+        """
+        self.capture_limit = state["capture_limit"]
+        self.capture_interval = state["capture_interval"]
+        if self._interval_controller is not None:
+            self._interval_controller.reset(self.capture_interval)
+        self._captured_frames = state["captured_frames"]
+
+        for camera in self.get_cameras():
+            if str(camera) in state["cameras"]:
+                camera.capture_ledger.set_state(state["cameras"][str(camera)])
+
+        if state["next_deadline"] is None:
+            self._scheduler.start()
+        else:
+            self._scheduler.start(state["next_deadline"], state["next_slot"])
+
     def start_time_lapse(self):
-        """Start the time-lapse process."""
+        """Start the time-lapse process.
+
+        Frames are captured on a fixed timeline that starts when this is
+        called, so the time spent capturing does not delay later frames. If a
+        checkpoint has been saved, the time-lapse resumes from it instead, and
+        it is deleted once the capture limit is reached. With a health
+        monitor, cameras that fail to set up sit out until they can be set up
+        again rather than stopping the time-lapse.
+        """
+        resumed = self._resume_from_checkpoint()
+
         try:
             for camera in self.get_cameras():
-                camera.set_up()
+                self._set_up_camera(camera)
 
-            if self.capture_limit is not None:
-                for _ in range(self.capture_limit):
-                    self.capture_frame()
-                    sleep(self.capture_interval)
-            else:
-                while True:
-                    self.capture_frame()
-                    sleep(self.capture_interval)
+            if not resumed:
+                self._scheduler.start()
+
+            while not self._is_capture_limit_reached():
+                timing = self._scheduler.wait_for_next_frame()
+                self._frame_timings.append(timing)
+                self.capture_frame()
+                self._save_checkpoint()
         except Exception:
-            for camera in self.get_cameras():
-                camera.tear_down()
+            self._tear_down_cameras()
             raise
+        finally:
+            self._frame_capturer.shut_down()
+
+        self._tear_down_cameras()
+        self._remove_finished_checkpoint()
 
     def capture_frame(self):
-        """Capture images using the cameras on this time-lapse manager."""
-        if self.capture_limit is None:
-            capture_limit_reached = False
+        """Capture images using the cameras on this time-lapse manager.
+
+        With a health monitor, only cameras whose circuits are not open
+        capture, and their failures are recorded rather than raised.
+
+        Raises:
+            Exception: The first exception raised by a camera (or, with a
+                health monitor, the first it does not handle), once the
+                outcome of the frame has been recorded in last_frame_result.
+        """
+        if not self._is_capture_limit_reached():
+            self._capture_with_cameras(self.get_cameras())
         else:
-            capture_limit_reached = self.captured_frames >= \
-                self.capture_limit
+            self._tear_down_cameras()
 
-        if not capture_limit_reached:
-            for camera in self.get_cameras():
-                camera.capture_image()
-            self._captured_frames += 1
+    def _capture_with_cameras(self, cameras):
+        """Capture a frame with some of the cameras on this manager.
+
+        Args:
+            cameras: The cameras due to capture.
+
+        Returns: The FrameCaptureResult of the frame.
+
+        Raises:
+            Exception: The first exception raised by a camera (or, with a
+                health monitor, the first it does not handle).
+        """
+        cameras = self._get_capturing_cameras(cameras)
+        frame_result = self._frame_capturer.capture(
+            cameras,
+            self._get_capture_timeouts(cameras))
+        self._record_frame_result(frame_result)
+        self._check_frame_result(frame_result)
+        self._captured_frames += 1
+        self._adapt_capture_interval()
+
+        return frame_result
+
+    def _resume_from_checkpoint(self):
+        """Restore the progress saved in the checkpoint, if there is one.
+
+        Returns: A boolean specifying whether progress was restored.
+        """
+        if self._checkpoint is None:
+            return False
+
+        return self._checkpoint.restore(self)
+
+    def _save_checkpoint(self):
+        """Let the checkpoint save the progress of a captured frame."""
+        if self._checkpoint is not None:
+            self._checkpoint.frame_captured(self)
+
+    def _remove_finished_checkpoint(self):
+        """Delete the checkpoint once the capture limit has been reached.
+
+        Otherwise the next session would resume at the limit and end at
+        once.
+        """
+        if self._checkpoint is not None and self._is_capture_limit_reached():
+            self._checkpoint.remove()
+
+    def _tear_down_cameras(self):
+        """Tear down every camera on this time-lapse manager."""
+        for camera in self.get_cameras():
+            self._tear_down_camera(camera)
+
+    def _set_up_camera(self, camera):
+        """Set up a camera, sidelining it if the health monitor allows.
+
+        Args:
+            camera: The camera.
+
+        Returns: A boolean specifying whether the camera was set up.
+        """
+        try:
+            self._run_camera_step(EVENT_SET_UP, camera, camera.set_up)
+        except Exception as exc:
+            if not self._is_handled_failure(exc):
+                raise
+            self._health_monitor.record_failure(camera,
+                                                exc,
+                                                needs_set_up=True)
+            return False
+
+        if self._health_monitor is not None:
+            self._health_monitor.record_set_up(camera)
+
+        return True
+
+    def _tear_down_camera(self, camera):
+        """Tear down a camera, ignoring failures the health monitor handles.
+
+        Args:
+            camera: The camera.
+        """
+        try:
+            self._run_camera_step(EVENT_TEAR_DOWN, camera, camera.tear_down)
+        except Exception as exc:
+            if not self._is_handled_failure(exc):
+                raise
+
+    def _is_handled_failure(self, exception):
+        """Return whether the health monitor handles a camera exception.
+
+        Args:
+            exception: The exception raised by a camera.
+
+        Returns: A boolean specifying whether the exception is handled.
+        """
+        return (self._health_monitor is not None and
+                self._health_monitor.handles(exception))
+
+    def _get_capturing_cameras(self, due_cameras):
+        """Return the cameras that should capture the next frame.
+
+        Cameras whose circuits are open are left out, and cameras coming
+        back from a failure are torn down and set up again first.
+
+        Args:
+            due_cameras: The cameras due to capture the next frame.
+
+        Returns: A list of cameras.
+        """
+        if self._health_monitor is None:
+            return list(due_cameras)
+
+        cameras = []
+
+        for camera in due_cameras:
+            if not self._health_monitor.is_available(camera):
+                continue
+
+            if self._health_monitor.needs_set_up(camera):
+                self._tear_down_camera(camera)
+                if not self._set_up_camera(camera):
+                    continue
+
+            cameras.append(camera)
+
+        return cameras
+
+    def _get_capture_timeouts(self, cameras):
+        """Return the time each camera is given to capture.
+
+        Args:
+            cameras: The cameras capturing the next frame.
+
+        Returns: A list of timeouts (in seconds, or None), or None if there
+            is no health monitor.
+        """
+        if self._health_monitor is None:
+            return None
+
+        return [self._health_monitor.get_capture_timeout(camera)
+                for camera in cameras]
+
+    def _check_frame_result(self, frame_result):
+        """Report the outcome of a frame to the health monitor.
+
+        Args:
+            frame_result: The FrameCaptureResult of the frame.
+
+        Raises:
+            Exception: The first exception raised by a camera that the health
+                monitor does not handle (or any exception if there is no
+                health monitor).
+        """
+        if self._health_monitor is None:
+            frame_result.raise_first_exception()
+            return
+
+        unhandled_exceptions = []
+
+        for camera_result in frame_result.get_camera_results():
+            if camera_result.exception is None:
+                self._health_monitor.record_success(camera_result.camera)
+            elif self._health_monitor.handles(camera_result.exception):
+                self._health_monitor.record_failure(camera_result.camera,
+                                                    camera_result.exception)
+            else:
+                unhandled_exceptions.append(camera_result.exception)
+
+        if unhandled_exceptions:
+            raise unhandled_exceptions[0]
+
+    def _attach_instrumentation(self, camera):
+        """Let a camera report to the instrumentation of this manager.
+
+        Args:
+            camera: The camera.
+        """
+        if (self._instrumentation is not None and
+                hasattr(camera, "instrumentation")):
+            camera.instrumentation = self._instrumentation
+
+    def _run_camera_step(self, event, camera, step):
+        """Run a camera operation, reporting it to the instrumentation.
+
+        Args:
+            event: The instrumentation event of the operation.
+            camera: The camera performing the operation.
+            step: A function performing the operation.
+        """
+        if self._instrumentation is None:
+            step()
+            return
+
+        started = monotonic()
+
+        try:
+            step()
+        except Exception as exc:
+            self._instrumentation.observe(event,
+                                          camera,
+                                          monotonic() - started,
+                                          exc)
+            raise
+
+        self._instrumentation.observe(event, camera, monotonic() - started)
+
+    def _record_frame_result(self, frame_result):
+        """Keep the outcome of a frame and report it to the instrumentation.
+
+        Args:
+            frame_result: The FrameCaptureResult of the frame.
+        """
+        self._last_frame_result = frame_result
+
+        if self._instrumentation is None:
+            return
+
+        for camera_result in frame_result.get_camera_results():
+            self._instrumentation.observe(EVENT_CAPTURE,
+                                          camera_result.camera,
+                                          camera_result.finished -
+                                          camera_result.started,
+                                          camera_result.exception)
+
+    def _is_capture_limit_reached(self):
+        """Return whether the capture limit has been reached.
+
+        Returns: A boolean specifying whether the capture limit has been
+            reached.
+        """
+        if self.capture_limit is None:
+            return False
         else:
+            return self.captured_frames >= self.capture_limit
+
+    def _adapt_capture_interval(self):
+        """Let the interval controller choose the next capture_interval."""
+        if self._interval_controller is None:
+            return
+
+        activities = [camera.frame_filter.last_difference
+                      for camera in self.get_cameras()
+                      if getattr(camera, "frame_filter", None) is not None and
+                      camera.frame_filter.last_difference is not None]
+        activity = max(activities) if activities else None
+
+        frame_bytes = 0
+        if self._interval_controller.tracks_bytes:
             for camera in self.get_cameras():
-                camera.tear_down()
+                frame_bytes += self._get_last_image_size(camera)
+
+        self.capture_interval = self._interval_controller.update(activity,
+                                                                 frame_bytes)
+
+    @staticmethod
+    def _get_last_image_size(camera):
+        """Return the size of the most recent image stored by a camera.
+
+        Args:
+            camera: The camera.
+
+        Returns: The size (in bytes) of the image, or 0 if it was not stored
+            as a file that exists yet.
+        """
+        captured_image_paths = camera.get_captured_image_paths()
+
+        if not captured_image_paths or captured_image_paths[-1] is None:
+            return 0
+
+        try:
+            return getsize(captured_image_paths[-1])
+        except OSError:
+            return 0
@@ -0,0 +1,320 @@
+"""A library for assembling captured frames into video while capturing."""
+import json
+from os import makedirs, remove, replace
+from os.path import exists, join
+from subprocess import DEVNULL, PIPE, Popen
+
+STATE_FILENAME = "assembly_state.json"
+CONCAT_LIST_FILENAME = "segments.txt"
+
+
+class VideoAssemblyError(Exception):
+    """A video segment could not be encoded."""
+    pass
+
+
+class StreamingVideoAssembler:
+    """Encode captured frames into a series of video segments with ffmpeg.
+
+    Frames are streamed to an ffmpeg subprocess in fixed-size chunks as soon
+    as they are available, so memory use does not depend on the length of
+    the session. Every frames_per_segment frames the segment is finished and
+    its position is saved, so a restarted assembler only re-encodes the
+    segment that was in progress. The finished segments are listed in a file
+    that ffmpeg's concat demuxer can join without re-encoding.
+    """
+
+    def __init__(self,
+                 output_directory,
+                 frame_rate=25,
+                 frames_per_segment=1500,
+                 ffmpeg_path="ffmpeg",
+                 output_extension="mp4",
+                 encoder_arguments=("-c:v", "libx264", "-pix_fmt", "yuv420p"),
+                 chunk_size=64 * 1024):
+        """Initialise the assembler, resuming from any saved state.
+
+        Args:
+            output_directory: The directory that segments and state are
+                written to.
+            frame_rate: The frame rate of the output video.
+            frames_per_segment: The number of frames in each segment.
+            ffmpeg_path: The ffmpeg executable to run.
+            output_extension: The file extension of the segments.
+            encoder_arguments: The ffmpeg output arguments used to encode
+                each segment.
+            chunk_size: The size (in bytes) of the chunks frames are streamed
+                to ffmpeg in.
+
+        Raises:
+            ValueError: If frame_rate or frames_per_segment is not greater
+                than 0.
+        """
+        if frame_rate <= 0:
+            raise ValueError("frame_rate must be greater than 0.")
+        if frames_per_segment <= 0:
+            raise ValueError("frames_per_segment must be greater than 0.")
+
+        makedirs(output_directory, exist_ok=True)
+
+        self._output_directory = output_directory
+        self._frame_rate = frame_rate
+        self._frames_per_segment = frames_per_segment
+        self._ffmpeg_path = ffmpeg_path
+        self._output_extension = output_extension
+        self._encoder_arguments = list(encoder_arguments)
+        self._chunk_size = chunk_size
+
+        self._committed_position = 0
+        self._completed_segments = []
+        self._load_state()
+
+        self._position = self._committed_position
+        self._process = None
+        self._segment_frames = 0
+
+    @property
+    def position(self):
+        """Return the number of captured paths consumed so far.
+
+        Returns: The index of the next captured path to be assembled.
+        """
+        return self._position
+
+    def get_completed_segments(self):
+        """Return the paths of the segments that have been finished.
+
+        Returns: A list of segment paths, in order.
+        """
+        return [join(self._output_directory, filename)
+                for filename in self._completed_segments]
+
+    def assemble(self, image_paths):
+        """Stream any newly available frames to the encoder.
+
+        This can be called repeatedly while capturing with the growing list of
+        captured paths. Paths of None (images that were not stored) are
+        skipped. Assembly stops at the first image that does not exist yet,
+        so images still being written are picked up by a later call.
+
+        Args:
+            image_paths: A sequence of every captured image path, such as the
+                result of get_captured_image_paths on a camera, which is
+                indexed one path at a time so that a lazily generated view
+                is never copied.
+
+        Returns: The number of frames streamed to the encoder.
+
+        Raises:
+            VideoAssemblyError: If ffmpeg cannot be started or fails to
+                encode a segment.
+        """
+        streamed_frames = 0
+
+        while self._position < len(image_paths):
+            image_path = image_paths[self._position]
+
+            if image_path is not None:
+                if not exists(image_path):
+                    break
+                self._stream_frame(image_path)
+                streamed_frames += 1
+
+            self._position += 1
+
+            if self._segment_frames >= self._frames_per_segment:
+                self._finish_segment()
+
+        return streamed_frames
+
+    def finish(self):
+        """Finish the segment in progress, even if it is not full.
+
+        Returns: The path of the list of segments for ffmpeg's concat
+            demuxer.
+
+        Raises:
+            VideoAssemblyError: If ffmpeg fails to encode the segment.
+        """
+        if self._process is not None:
+            self._finish_segment()
+
+        concat_list_path = join(self._output_directory, CONCAT_LIST_FILENAME)
+
+        with open(concat_list_path, "w", encoding="utf-8") as concat_list:
+            for filename in self._completed_segments:
+                concat_list.write("file '" + filename + "'\n")
+
+        return concat_list_path
+
+    def abort(self):
+        """Stop the segment in progress without saving it."""
+        if self._process is not None:
+            self._process.kill()
+            self._process.wait()
+            self._process = None
+            self._remove_partial_segment()
+
+        self._position = self._committed_position
+        self._segment_frames = 0
+
+    def _build_command(self, output_path):
+        """Return the command that encodes a segment read from stdin.
+
+        Args:
+            output_path: The path the segment should be written to.
+
+        Returns: A list of command line arguments.
+        """
+        return ([self._ffmpeg_path,
+                 "-y",
+                 "-loglevel", "error",
+                 "-f", "image2pipe",
+                 "-framerate", str(self._frame_rate),
+                 "-i", "-"] +
+                self._encoder_arguments +
+                ["-f", self._get_container_format(), output_path])
+
+    def _get_container_format(self):
+        """Return the ffmpeg container format for the output extension.
+
+        Returns: The ffmpeg container format name.
+        """
+        if self._output_extension == "mkv":
+            return "matroska"
+
+        return self._output_extension
+
+    def _stream_frame(self, image_path):
+        """Stream a frame to the encoder in chunks.
+
+        Args:
+            image_path: The path of the frame.
+
+        Raises:
+            VideoAssemblyError: If ffmpeg cannot be started or has stopped
+                accepting frames.
+        """
+        if self._process is None:
+            self._start_segment()
+
+        try:
+            with open(image_path, "rb") as image_file:
+                while True:
+                    chunk = image_file.read(self._chunk_size)
+                    if not chunk:
+                        break
+                    self._process.stdin.write(chunk)
+        except BrokenPipeError as exc:
+            self.abort()
+            raise VideoAssemblyError(
+                "ffmpeg stopped accepting frames.") from exc
+
+        self._segment_frames += 1
+
+    def _start_segment(self):
+        """Start an encoder for the next segment.
+
+        Raises:
+            VideoAssemblyError: If ffmpeg cannot be started.
+        """
+        segment_path = self._get_segment_path(len(self._completed_segments))
+
+        try:
+            self._process = Popen(
+                self._build_command(segment_path + ".partial"),
+                stdin=PIPE,
+                stdout=DEVNULL,
+                stderr=DEVNULL)
+        except OSError as exc:
+            raise VideoAssemblyError("ffmpeg could not be started: " +
+                                     str(exc)) from exc
+
+        self._segment_frames = 0
+
+    def _finish_segment(self):
+        """Wait for the encoder to finish the segment and save progress.
+
+        Raises:
+            VideoAssemblyError: If ffmpeg fails to encode the segment.
+        """
+        segment_path = self._get_segment_path(len(self._completed_segments))
+
+        try:
+            self._process.stdin.close()
+        except BrokenPipeError:
+            pass
+        return_code = self._process.wait()
+        self._process = None
+
+        if return_code != 0:
+            self._position = self._committed_position
+            self._segment_frames = 0
+            self._remove_partial_segment()
+            raise VideoAssemblyError("ffmpeg exited with code " +
+                                     str(return_code) + ".")
+
+        replace(segment_path + ".partial", segment_path)
+
+        self._completed_segments.append(self._get_segment_filename(
+            len(self._completed_segments)))
+        self._committed_position = self._position
+        self._segment_frames = 0
+        self._save_state()
+
+    def _get_segment_filename(self, segment_index):
+        """Return the filename of a segment.
+
+        Args:
+            segment_index: The index of the segment.
+
+        Returns: The filename of the segment.
+        """
+        return ("segment-" + str(segment_index + 1).rjust(5, "0") + "." +
+                self._output_extension)
+
+    def _get_segment_path(self, segment_index):
+        """Return the path of a segment.
+
+        Args:
+            segment_index: The index of the segment.
+
+        Returns: The path of the segment.
+        """
+        return join(self._output_directory,
+                    self._get_segment_filename(segment_index))
+
+    def _load_state(self):
+        """Restore the progress saved by a previous assembler."""
+        state_path = join(self._output_directory, STATE_FILENAME)
+
+        if not exists(state_path):
+            return
+
+        with open(state_path, "r", encoding="utf-8") as state_file:
+            state = json.load(state_file)
+
+        self._committed_position = state["position"]
+        self._completed_segments = state["completed_segments"]
+        self._remove_partial_segment()
+
+    def _remove_partial_segment(self):
+        """Remove the output of the segment in progress, if there is any."""
+        partial_path = self._get_segment_path(
+            len(self._completed_segments)) + ".partial"
+
+        try:
+            remove(partial_path)
+        except FileNotFoundError:
+            pass
+
+    def _save_state(self):
+        """Save the progress of the assembler atomically."""
+        state_path = join(self._output_directory, STATE_FILENAME)
+
+        with open(state_path + ".tmp", "w", encoding="utf-8") as state_file:
+            json.dump({"position": self._committed_position,
+                       "completed_segments": self._completed_segments},
+                      state_file)
+
+        replace(state_path + ".tmp", state_path)